@@ -3,6 +3,7 @@ from pathlib import Path
 from datetime import date, datetime as dt
 from typing import Any, List, Optional, Dict, Union, Tuple, Set
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 
 # ============================================================================
@@ -435,6 +436,64 @@ def calculate_rent_progression(
     return result
 
 
+def calculate_rent_progressions(
+    items: List[Tuple[Any, Any, Any, Any]],
+    tufe_cache: Optional[Dict[tuple, float]] = None,
+) -> List[Dict[str, Any]]:
+    """calculate_rent_progression'ın toplu hali.
+
+    items: (start_year, start_month, initial_rent, manual_current) dörtlüleri.
+    Yıl adımı başına tüm müşteriler tek NumPy çarpımıyla ilerler; çarpım sırası ve
+    yıl sonu round(…, 2) tekil fonksiyonla aynı olduğundan sonuçlar birebirdir.
+    """
+    cache = tufe_cache if tufe_cache is not None else get_tufe_cache()
+    today = date.today()
+    results: List[Dict[str, Any]] = []
+    gecerli: List[int] = []
+    for start_year, start_month, initial_rent, _manual in items:
+        results.append({
+            "start_year": start_year,
+            "start_month": start_month,
+            "initial_rent": initial_rent,
+            "years": {}
+        })
+        if start_year and start_month and initial_rent and initial_rent > 0:
+            gecerli.append(len(results) - 1)
+
+    if gecerli:
+        sy = np.array([int(items[i][0]) for i in gecerli], dtype=np.int64)
+        ay_adlari = [str(items[i][1]).replace(" (%)", "").strip() for i in gecerli]
+        ay_index: Dict[str, int] = {}
+        ay = np.array([ay_index.setdefault(a, len(ay_index)) for a in ay_adlari], dtype=np.int64)
+        rent = np.array([float(items[i][2]) for i in gecerli], dtype=np.float64)
+        y0 = int(sy.min())
+        yillar = list(range(y0, today.year + 1))
+        oranlar = np.zeros((len(yillar), len(ay_index)), dtype=np.float64)
+        for k, year in enumerate(yillar):
+            for ad, j in ay_index.items():
+                rate = cache.get((year, ad))
+                if rate is not None and rate > 0:
+                    oranlar[k, j] = rate
+        degerler = np.full((len(gecerli), len(yillar)), np.nan, dtype=np.float64)
+        for k, year in enumerate(yillar):
+            rate = oranlar[k, ay]
+            artir = (sy < year) & (rate > 0)
+            if artir.any():
+                rent = np.where(artir, rent * (1 + rate / 100), rent)
+            degerler[:, k] = np.where(sy <= year, rent, np.nan)
+        for satir, i in enumerate(gecerli):
+            bas = int(sy[satir]) - y0
+            years = results[i]["years"]
+            for k, v in enumerate(degerler[satir, bas:].tolist(), start=bas):
+                years[yillar[k]] = round(v, 2)
+
+    for i in gecerli:
+        manual_current = items[i][3]
+        if manual_current is not None and manual_current > 0:
+            results[i]["manual_current"] = round(manual_current, 2)
+    return results
+
+
 def get_tufe_for_year(year: int) -> Dict[str, float]:
     """Belirli bir yıl için tüm TÜFE oranlarını getir."""
     rows = fetch_all(
@@ -695,25 +754,21 @@ def get_all_customers_with_rent_progression(
     else:
         rows = fetch_all(sql)
 
-    result = []
-    for row in rows:
-        customer = dict(row)
-
-        start_year = customer.get("rent_start_year")
-        start_month = customer.get("rent_start_month") or "Ocak"
-        initial_rent = float(customer.get("ilk_kira_bedeli") or 0)
+    customers = [dict(row) for row in rows]
+    items = []
+    for customer in customers:
         manual_curr = customer.get("current_rent")
         if manual_curr:
             manual_curr = float(manual_curr)
+        items.append((
+            customer.get("rent_start_year"),
+            customer.get("rent_start_month") or "Ocak",
+            float(customer.get("ilk_kira_bedeli") or 0),
+            manual_curr,
+        ))
 
-        progression = calculate_rent_progression(
-            start_year=start_year,
-            start_month=start_month,
-            initial_rent=initial_rent,
-            manual_current=manual_curr,
-            tufe_cache=tufe_cache,
-        )
-
+    result = []
+    for customer, progression in zip(customers, calculate_rent_progressions(items, tufe_cache)):
         customer["rent_progression"] = progression
         customer["rent_years_dict"] = progression.get("years", {})
         result.append(customer)
@@ -35,6 +35,39 @@ def _tenant_bind_and_session_lock():
     return bind_request_tenant()
 
 
+@app.before_request
+def _sql_profile_begin():
+    """DB_SQL_PROFILE=1: istek başına SQL ölçümü (kapalıyken no-op)."""
+    from db import sql_profile_begin
+
+    sql_profile_begin()
+
+
+@app.after_request
+def _sql_profile_finish(response):
+    """Server-Timing başlığı + yavaş istek / N+1 log satırı (bkz. db.sql_profile_finish)."""
+    from db import sql_profile_finish
+
+    return sql_profile_finish(response)
+
+
+@app.after_request
+def _db_request_conn_commit(response):
+    """DB_REQUEST_TX modunda istek transaction'ı yanıt gönderilmeden commit edilir."""
+    from db import commit_request_conn
+
+    commit_request_conn()
+    return response
+
+
+@app.teardown_request
+def _db_request_conn_release(exc):
+    """İstek boyunca tutulan havuz bağlantısını iade et (bkz. db.db)."""
+    from db import release_request_conn
+
+    release_request_conn(exc)
+
+
 def _format_tr_number(value, decimals=2):
     """1.234,56 biçiminde TR sayı gösterimi."""
     try:
@@ -93,6 +126,7 @@ from routes.randevu_routes import bp as randevu_bp
 from routes.pdovam_routes import bp as pdovam_bp
 from routes.whatsapp_routes import bp as whatsapp_bp
 from routes.masraf_routes import bp as fis_masraflari_bp
+from routes.jobs_routes import bp as jobs_bp
 try:
     from routes.ilan_robotu_routes import bp as ilan_robotu_bp
 except Exception as e:
@@ -125,6 +159,7 @@ app.register_blueprint(randevu_bp)
 app.register_blueprint(pdovam_bp, url_prefix="/pdovam")
 app.register_blueprint(whatsapp_bp)
 app.register_blueprint(fis_masraflari_bp, url_prefix="/fis-masraflari")
+app.register_blueprint(jobs_bp, url_prefix="/jobs")
 if ilan_robotu_bp is not None:
     app.register_blueprint(ilan_robotu_bp, url_prefix="/ilan-robotu")
 
@@ -397,9 +432,23 @@ def _start_background_jobs():
     except Exception as e:
         print("[WARN] Background scheduler devre dışı:", e)
         return
+    from db import sql_profile_scope
+    from services.job_queue import enqueue, job_workers_count
+
+    def _auto_invoice_tick():
+        # İşçi havuzu açıksa kuyruğa: takip edilebilir, çoklu worker'da dedupe ile tek çalışma.
+        if job_workers_count() > 0:
+            try:
+                enqueue("auto_invoice_cycle", {"force": False}, tenant_schema=None, dedupe_key="auto_invoice_cycle")
+                return
+            except Exception as e:
+                print("[WARN] auto_invoice_cycle kuyruğa alınamadı:", e)
+        with sql_profile_scope("auto_invoice_cycle"):
+            run_auto_invoice_cycle(force=False)
+
     scheduler = BackgroundScheduler(timezone="Europe/Istanbul")
     scheduler.add_job(
-        lambda: run_auto_invoice_cycle(force=False),
+        _auto_invoice_tick,
         "interval",
         minutes=15,
         id="auto_invoice_cycle",
@@ -554,12 +603,17 @@ def inject_globals():
 def ilk_kurulum():
     """Uygulama ilk başladığında tabloları oluştur ve admin kullanıcı ekle."""
     try:
-        from db import init_schema, fetch_one, execute
+        from db import migrate_schema, migrate_tenant_schemas, fetch_one, execute
         from werkzeug.security import generate_password_hash
         from auth import generate_security_stamp
 
-        # Şema oluştur
-        init_schema()
+        # Şema oluştur / eksik migrasyonları uygula (defter güncelse tek sorgu)
+        uygulanan = migrate_schema()
+        if uygulanan:
+            print(f"Schema migrations applied (public): {uygulanan}")
+        for schema, sonuc in migrate_tenant_schemas().items():
+            if sonuc:
+                print(f"Schema migrations ({schema}): {sonuc}")
 
         # Admin yoksa oluştur (ilk giriş: admin / admin123)
         admin = fetch_one("SELECT id FROM users WHERE role='admin' LIMIT 1")
@@ -608,9 +662,43 @@ try:
     log_startup_accelerators()
 except Exception:
     pass
-# Debug reloader'da parent process'te çift scheduler açmamak için sadece child'da başlat.
-if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or os.environ.get("GUNICORN_CMD_ARGS"):
-    _start_background_jobs()
+def _start_job_workers():
+    """Arka plan iş kuyruğu işçileri (JOB_WORKERS=0 ile kapalı)."""
+    try:
+        from services.job_queue import start_job_workers
+
+        start_job_workers(app)
+    except Exception as e:
+        print("[WARN] İş kuyruğu işçileri başlatılamadı:", e)
+
+
+def _havuz_cocugu_mu() -> bool:
+    """Süreç havuzu (spawn) çocuğu: app.py'yi ``__mp_main__`` olarak yeniden yükler, ortamı miras alır."""
+    import multiprocessing
+
+    return multiprocessing.parent_process() is not None
+
+
+def _gunicorn_mu() -> bool:
+    return os.path.basename(sys.argv[0] or "").startswith("gunicorn")
+
+
+# Debug reloader'da parent process'te çift scheduler / işçi açmamak için sadece child'da başlat.
+# CLI betikleri (app'i import eden) ve havuz çocukları işçi açmaz; `python app.py` (reloader
+# kapalı) işçileri __main__ bloğunda açar.
+if not _havuz_cocugu_mu():
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or os.environ.get("GUNICORN_CMD_ARGS"):
+        _start_background_jobs()
+        _start_job_workers()
+    elif _gunicorn_mu():
+        _start_job_workers()
+# Çoklu worker / instance: önbellek geçersiz kılma olaylarını dinle (CACHE_BUS=1).
+try:
+    from cache_bus import start_cache_bus_listener
+
+    start_cache_bus_listener()
+except Exception as e:
+    print("[WARN] cache_bus dinleyici başlatılamadı:", e)
 
 def _dev_yerel_ag_ipv4():
     """Bu makinenin LAN IP'si (başka PC'ler 127.0.0.1 ile erişemez)."""
@@ -658,6 +746,8 @@ if __name__ == "__main__":
     _reload_on = os.environ.get("BESTOFFICE_DEV_RELOAD", "").strip().lower() in ("1", "true", "yes", "on")
     if not _reload_on:
         print("  [DEV] Otomatik yeniden başlatma kapalı (BESTOFFICE_DEV_RELOAD=1 ile açılır).\n")
+        # Reloader yok: sunucu bu süreç (reloader açıkken işçiler child'da import sırasında açılır).
+        _start_job_workers()
     use_waitress = (os.environ.get("BESTOFFICE_USE_WAITRESS", "0") or "").strip().lower() in ("1", "true", "yes")
     if use_waitress:
         from waitress import serve
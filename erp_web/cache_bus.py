@@ -0,0 +1,148 @@
+"""
+Worker'lar arası önbellek geçersiz kılma (PostgreSQL LISTEN/NOTIFY).
+
+cache_utils bölgelerinde invalidate / invalidate_tag / clear çağrıları yerelde
+uygulanır ve ``CACHE_BUS=1`` ise ``pg_notify`` ile yayınlanır. Her worker'da bir
+dinleyici thread olayları kendi bölgelerine uygular; böylece ``gunicorn -w N``
+veya birden çok instance bayat grid / ekstre servis etmez.
+
+NOTIFY transaction'a bağlıdır ve commit'te teslim edilir. Açık bir db() bloğu içinden
+yayınlanırsa en dıştaki bloğun bağlantısında çalışır (``db.acik_baglanti``); blok
+dışındaysa istek transaction'ında (DB_REQUEST_TX) commit'le, yoksa hemen gider (yazım
+zaten commit edilmiştir). Diğer worker'lar yeni veri görünmeden silip eski satırları
+yeniden yüklemez; rollback'te olay düşer.
+Dinleyici bağlantısı havuz dışıdır; Supabase transaction pooler (6543) LISTEN
+iletmediği için ``CACHE_BUS_DATABASE_URL`` ile session/direct URI verilebilir.
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CACHE_BUS_CHANNEL = "bo_cache_invalidate"
+# NOTIFY payload üst sınırı 8000 bayt; aşan anahtar bölge temizliğine düşer.
+_PAYLOAD_MAX = 7500
+_POLL_SEC = 5.0
+_ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_LISTENER_LOCK = threading.Lock()
+_LISTENER_THREAD = None
+_STOP = threading.Event()
+
+
+def cache_bus_enabled() -> bool:
+    """CACHE_BUS=1 ile açılır (tek worker'da gereksiz NOTIFY round-trip'i olmasın)."""
+    return (os.environ.get("CACHE_BUS") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _bus_dsn():
+    return (os.environ.get("CACHE_BUS_DATABASE_URL") or "").strip() or None
+
+
+def _encode(op: str, region: str, tenant, arg) -> str:
+    body = {"o": _ORIGIN, "op": op, "r": region, "s": tenant, "a": arg}
+    raw = json.dumps(body, ensure_ascii=False, separators=(",", ":"), default=str)
+    if len(raw.encode("utf-8")) <= _PAYLOAD_MAX:
+        return raw
+    body.update(op="clear", a=False)
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _as_key(v):
+    """JSON listeleri tuple'a çevirir (bölge anahtarları tuple olarak yazılır)."""
+    if isinstance(v, list):
+        return tuple(_as_key(x) for x in v)
+    return v
+
+
+def publish(op: str, region: str, tenant, arg) -> None:
+    """Olayı yayınlar (commit'te teslim; bkz. modül notu); hata yerel geçersiz kılmayı bozmaz (yalnız log)."""
+    try:
+        from db import acik_baglanti, execute
+
+        sql, params = "SELECT pg_notify(%s, %s)", (CACHE_BUS_CHANNEL, _encode(op, region, tenant, arg))
+        conn = acik_baglanti()
+        if conn is not None and not conn.closed:
+            conn.cursor().execute(sql, params)
+        else:
+            execute(sql, params)
+    except Exception as e:
+        logger.warning("cache_bus publish başarısız (%s %s): %s", op, region, e)
+
+
+def _apply(payload: str) -> None:
+    from cache_utils import apply_remote_invalidation
+    from db import _TENANT_SCHEMA_RE
+
+    try:
+        ev = json.loads(payload)
+    except (TypeError, ValueError):
+        return
+    if not isinstance(ev, dict) or ev.get("o") == _ORIGIN:
+        return
+    tenant = ev.get("s")
+    if tenant is not None and not _TENANT_SCHEMA_RE.fullmatch(str(tenant)):
+        return
+    apply_remote_invalidation(str(ev.get("op") or ""), str(ev.get("r") or ""), tenant, _as_key(ev.get("a")))
+
+
+def _listen_loop() -> None:
+    from cache_utils import cache_clear_all_local
+    from db import get_unpooled_conn
+
+    backoff = 1.0
+    baglandi_once = False
+    while not _STOP.is_set():
+        conn = None
+        try:
+            conn = get_unpooled_conn(_bus_dsn())
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CACHE_BUS_CHANNEL}")
+            if baglandi_once:
+                # Kopukken gelen olaylar kayıp: yerel önbelleği güvenli tarafta boşalt.
+                cache_clear_all_local()
+                logger.info("cache_bus yeniden bağlandı; yerel önbellek boşaltıldı")
+            baglandi_once = True
+            backoff = 1.0
+            while not _STOP.is_set():
+                if select.select([conn], [], [], _POLL_SEC) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _apply(conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning("cache_bus dinleyici hatası: %s (%.0fs sonra yeniden)", e, backoff)
+            _STOP.wait(backoff)
+            backoff = min(60.0, backoff * 2)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def start_cache_bus_listener() -> bool:
+    """Worker başına bir dinleyici thread başlatır (idempotent); kapalıysa False."""
+    global _LISTENER_THREAD
+    if not cache_bus_enabled():
+        return False
+    with _LISTENER_LOCK:
+        if _LISTENER_THREAD is not None and _LISTENER_THREAD.is_alive():
+            return True
+        _STOP.clear()
+        _LISTENER_THREAD = threading.Thread(target=_listen_loop, name="cache-bus-listener", daemon=True)
+        _LISTENER_THREAD.start()
+    return True
+
+
+def stop_cache_bus_listener(timeout: float = 2.0) -> None:
+    _STOP.set()
+    th = _LISTENER_THREAD
+    if th is not None:
+        th.join(timeout)
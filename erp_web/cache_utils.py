@@ -1,26 +1,300 @@
-import time
+"""
+Süreç içi önbellek.
+
+Adlandırılmış bölgeler (``cache_region``): her bölgenin giriş sayısı ve yaklaşık
+bayt sınırı, LRU tahliyesi ve TTL'i vardır; anahtarlar varsayılan olarak aktif
+kiracı şemasıyla (g.tenant_schema / tenant_schema_scope) ön eklenir. Girişler
+etiketlenebilir (ör. ``musteri:123``) ve ``cache_invalidate_tag`` ile tüm
+bölgelerden birlikte silinir. Sayaçlar ``cache_stats()`` ile okunur.
 
-_SIMPLE_CACHE = {}
+512 MB Render örneğinde bellek öngörülebilir kalsın diye bölge sınırları
+``CACHE_<BÖLGE>_MAX_MB`` / ``CACHE_<BÖLGE>_MAX_ENTRIES`` ile daraltılabilir.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
 
 CACHE_KEY_HIZMET_TURLERI = "giris:hizmet_turleri:get:v1"
 CACHE_KEY_DUZENLI_FATURA = "giris:duzenli_fatura_secenekleri:get:v1"
 CACHE_KEY_TUFE_VERILERI = "giris:tufe_verileri:get:v1"
 CACHE_TTL_SEC = 300.0
 
+_MB = 1024 * 1024
+# Boyut tahmininde gezilecek en fazla düğüm; büyük payload'larda ortalama ile tahmin.
+_SIZE_WALK_LIMIT = 20000
 
-def simple_cache_get(key, max_age_sec=CACHE_TTL_SEC):
-    entry = _SIMPLE_CACHE.get(key)
-    if not entry:
-        return None
-    ts, val = entry
-    if (time.time() - ts) > max_age_sec:
+
+def _approx_bytes(obj) -> int:
+    """dict/list/tuple/set içini gezerek yaklaşık bellek (sys.getsizeof toplamı)."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    n = 0
+    while stack:
+        o = stack.pop()
+        oid = id(o)
+        if oid in seen:
+            continue
+        seen.add(oid)
+        total += sys.getsizeof(o, 64)
+        n += 1
+        if n >= _SIZE_WALK_LIMIT:
+            total += len(stack) * (total // n)
+            break
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return total
+
+
+def _cache_tenant():
+    """Anahtarın kiracı parçası: production'da None, kiracı isteğinde şema adı."""
+    try:
+        from db import _tenant_schema_for_request
+    except ImportError:
         return None
-    return val
+    return _tenant_schema_for_request()
+
+
+def _env_limit(region: str, suffix: str, default):
+    raw = (os.environ.get(f"CACHE_{region.upper()}_{suffix}") or "").strip()
+    if not raw:
+        return default
+    try:
+        return type(default)(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+class CacheRegion:
+    """Tek bölge: OrderedDict üzerinde LRU + TTL + giriş/bayt sınırı, thread-safe."""
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 256,
+        max_bytes: int = 8 * _MB,
+        ttl_sec: float = CACHE_TTL_SEC,
+        tenant_scoped: bool = True,
+    ):
+        self.name = name
+        self.max_entries = max(1, _env_limit(name, "MAX_ENTRIES", int(max_entries)))
+        self.max_bytes = max(1, int(_env_limit(name, "MAX_MB", float(max_bytes) / _MB) * _MB))
+        self.ttl_sec = float(ttl_sec)
+        self.tenant_scoped = bool(tenant_scoped)
+        self._lock = threading.RLock()
+        # (kiracı, anahtar) -> [bitiş_monotonic, yazılma_monotonic, bayt, değer, etiketler]
+        self._data: OrderedDict = OrderedDict()
+        self._tags: dict = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def _tenant(self):
+        return _cache_tenant() if self.tenant_scoped else None
+
+    def _drop(self, fk) -> None:
+        ent = self._data.pop(fk, None)
+        if ent is None:
+            return
+        self._bytes -= ent[2]
+        for tag in ent[4]:
+            keys = self._tags.get((fk[0], tag))
+            if keys is not None:
+                keys.discard(fk)
+                if not keys:
+                    self._tags.pop((fk[0], tag), None)
+
+    def get(self, key, default=None, max_age_sec=None):
+        """Girdi; yoksa / TTL veya ``max_age_sec`` aşıldıysa ``default``."""
+        fk = (self._tenant(), key)
+        now = time.monotonic()
+        with self._lock:
+            ent = self._data.get(fk)
+            if ent is None:
+                self.misses += 1
+                return default
+            if now >= ent[0] or (max_age_sec is not None and now - ent[1] > max_age_sec):
+                self._drop(fk)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(fk)
+            self.hits += 1
+            return ent[3]
+
+    def set(self, key, value, ttl_sec=None, tags=()) -> bool:
+        """Yazar; tek başına bayt sınırını aşan değer saklanmaz (False)."""
+        size = _approx_bytes(value)
+        fk = (self._tenant(), key)
+        if size > self.max_bytes:
+            with self._lock:
+                self._drop(fk)
+                self.rejected += 1
+            return False
+        now = time.monotonic()
+        ttl = self.ttl_sec if ttl_sec is None else float(ttl_sec)
+        tag_set = frozenset(str(t) for t in tags or ())
+        with self._lock:
+            self._drop(fk)
+            self._data[fk] = [now + ttl, now, size, value, tag_set]
+            self._bytes += size
+            for tag in tag_set:
+                self._tags.setdefault((fk[0], tag), set()).add(fk)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                old = next(iter(self._data))
+                self._drop(old)
+                self.evictions += 1
+        return True
+
+    # Geçersiz kılma: yerelde uygulanır, cache_bus açıksa diğer worker'lara yayınlanır.
+    def invalidate(self, key) -> None:
+        tenant = self._tenant()
+        self._invalidate_local(tenant, key)
+        _publish("key", self.name, tenant, key)
+
+    def invalidate_tag(self, tag) -> int:
+        """Aktif kiracıda ``tag`` ile yazılmış girişleri siler; silinen sayısı."""
+        tenant = self._tenant()
+        n = self._invalidate_tag_local(tenant, tag)
+        _publish("tag", self.name, tenant, str(tag))
+        return n
+
+    def clear(self, all_tenants: bool = False) -> None:
+        """Aktif kiracının girişlerini (veya tümünü) siler."""
+        tenant = None if all_tenants else self._tenant()
+        self._clear_local(tenant, all_tenants)
+        _publish("clear", self.name, tenant, bool(all_tenants))
+
+    def _invalidate_local(self, tenant, key) -> None:
+        with self._lock:
+            self._drop((tenant, key))
+
+    def _invalidate_tag_local(self, tenant, tag) -> int:
+        tk = (tenant, str(tag))
+        with self._lock:
+            keys = list(self._tags.get(tk) or ())
+            for fk in keys:
+                self._drop(fk)
+        return len(keys)
+
+    def _clear_local(self, tenant, all_tenants: bool = False) -> None:
+        with self._lock:
+            if all_tenants or not self.tenant_scoped:
+                self._data.clear()
+                self._tags.clear()
+                self._bytes = 0
+                return
+            for fk in [k for k in self._data if k[0] == tenant]:
+                self._drop(fk)
+
+    def stats(self) -> dict:
+        with self._lock:
+            istek = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / istek, 4) if istek else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+            }
+
+
+_REGIONS: dict = {}
+_REGIONS_LOCK = threading.Lock()
+
+
+def cache_region(name: str, **kwargs) -> CacheRegion:
+    """Adlandırılmış bölgeyi döndürür; ilk çağrıda ``kwargs`` ile oluşturur."""
+    reg = _REGIONS.get(name)
+    if reg is not None:
+        return reg
+    with _REGIONS_LOCK:
+        reg = _REGIONS.get(name)
+        if reg is None:
+            reg = _REGIONS[name] = CacheRegion(name, **kwargs)
+        return reg
+
+
+def cache_invalidate_tag(tag) -> int:
+    """Tüm bölgelerde aktif kiracının ``tag`` etiketli girişlerini siler (tek yayın)."""
+    tenant = _cache_tenant()
+    n = sum(
+        reg._invalidate_tag_local(tenant if reg.tenant_scoped else None, tag)
+        for reg in list(_REGIONS.values())
+    )
+    _publish("tag", "*", tenant, str(tag))
+    return n
+
+
+def _publish(op: str, region: str, tenant, arg) -> None:
+    from cache_bus import cache_bus_enabled, publish
+
+    if cache_bus_enabled():
+        publish(op, region, tenant, arg)
+
+
+def apply_remote_invalidation(op: str, region: str, tenant, arg) -> None:
+    """Başka worker'dan gelen olayı yalnızca yerelde uygular (yeniden yayınlamaz)."""
+    if region == "*":
+        regs = list(_REGIONS.values())
+    else:
+        reg = _REGIONS.get(region)
+        regs = [reg] if reg is not None else []
+    for reg in regs:
+        t = tenant if reg.tenant_scoped else None
+        if op == "key":
+            reg._invalidate_local(t, arg)
+        elif op == "tag":
+            reg._invalidate_tag_local(t, arg)
+        elif op == "clear":
+            reg._clear_local(t, bool(arg))
+
+
+def cache_clear_all_local() -> None:
+    """Tüm bölgeleri (tüm kiracılar) yerelde boşaltır; olay kaçırıldığında kullanılır."""
+    for reg in list(_REGIONS.values()):
+        reg._clear_local(None, True)
+
+
+def cache_stats() -> dict:
+    """İzleme için bölge başına sayaçlar + toplam bayt."""
+    bolgeler = {name: reg.stats() for name, reg in sorted(_REGIONS.items())}
+    return {
+        "regions": bolgeler,
+        "total_entries": sum(s["entries"] for s in bolgeler.values()),
+        "total_bytes": sum(s["bytes"] for s in bolgeler.values()),
+    }
+
+
+def musteri_tag(musteri_id) -> str:
+    return f"musteri:{int(musteri_id)}"
+
+
+# Küçük GET yanıtları (hizmet türleri, düzenli fatura seçenekleri, TÜFE listesi).
+_SIMPLE_REGION = cache_region("simple", max_entries=256, max_bytes=4 * _MB, ttl_sec=CACHE_TTL_SEC)
+
+
+def simple_cache_get(key, max_age_sec=CACHE_TTL_SEC):
+    return _SIMPLE_REGION.get(key, max_age_sec=max_age_sec)
 
 
 def simple_cache_set(key, val):
-    _SIMPLE_CACHE[key] = (time.time(), val)
+    _SIMPLE_REGION.set(key, val)
 
 
 def simple_cache_invalidate(key):
-    _SIMPLE_CACHE.pop(key, None)
+    _SIMPLE_REGION.invalidate(key)
@@ -1,6 +1,9 @@
 """
 Supabase PostgreSQL Bağlantı Katmanı
 """
+import functools
+import itertools
+import json
 import logging
 import os
 import re
@@ -20,12 +23,32 @@ from config import Config
 _TENANT_SCHEMA_RE = re.compile(r"^tenant_[a-z0-9_]+$")
 
 
+_TENANT_SCHEMA_OVERRIDE = threading.local()
+
+
+@contextmanager
+def tenant_schema_scope(schema):
+    """İstek dışı kod (migrasyon, CLI) için kiracı şeması; None → public."""
+    if schema is not None and not _TENANT_SCHEMA_RE.fullmatch(str(schema)):
+        raise ValueError("geçersiz tenant_schema")
+    prev = getattr(_TENANT_SCHEMA_OVERRIDE, "schema", False)
+    _TENANT_SCHEMA_OVERRIDE.schema = schema
+    try:
+        yield
+    finally:
+        _TENANT_SCHEMA_OVERRIDE.schema = prev
+
+
 def _tenant_schema_for_request():
     """Flask g.tenant_schema tanımlı değilse None — production'da tam no-op.
 
     Request / app context yoksa (defer thread, CLI) da None döner; ekstra SQL yok.
     Geçersiz bir değer set edilmişse fail-closed (public'e sessiz düşülmez).
+    tenant_schema_scope() içindeyse o şema (None = public) önceliklidir.
     """
+    override = getattr(_TENANT_SCHEMA_OVERRIDE, "schema", False)
+    if override is not False:
+        return override
     try:
         from flask import g, has_app_context
     except Exception:
@@ -69,48 +92,103 @@ def _dsn_with_sslmode(dsn: str, sslmode: str = "require") -> str:
         return f"{raw}{sep}sslmode={mode}"
 
 
+# Fatura notlarındaki GİB / ERP etiketleri faturalar üzerinde üretilmiş (STORED) boolean
+# sütunlara çıkarılır (ensure_faturalar_not_durum_kolonlari); sql_expr_fatura_* koşulları
+# varsayılan olarak bu sütunları okur. FATURA_NOT_DURUM_REGEX=1 → notlar üzerinde regex
+# (eski davranış; doğrulama / karşılaştırma için). Sütun ifadeleri aşağıdaki regex'lerin aynısıdır.
+_FATURA_NOT_DURUM_REGEX = (os.environ.get("FATURA_NOT_DURUM_REGEX", "0") or "").strip().lower() in (
+    "1", "true", "yes", "on"
+)
+_FATURA_NOT_NORM = "regexp_replace(COALESCE({c}, ''), '[İIıi]', 'I', 'g')"
+
+
+def _fatura_notlar_sutunu(notlar_column: str) -> str:
+    c = (notlar_column or "").strip()
+    if not c:
+        raise ValueError("notlar_column gerekli")
+    return c
+
+
+def _fatura_durum_sutun_oneki(c: str):
+    """``notlar`` → "", ``f.notlar`` → "f."; sütun kipi kapalıysa / ifade tanınmazsa None (regex)."""
+    if _FATURA_NOT_DURUM_REGEX:
+        return None
+    if c == "notlar":
+        return ""
+    tablo, _, sutun = c.rpartition(".")
+    if sutun == "notlar" and tablo.isidentifier():
+        return tablo + "."
+    return None
+
+
+def _fatura_not_re_gib_taslak(c: str) -> str:
+    return _FATURA_NOT_NORM.format(c=c) + " ~* 'GIB[[:space:]]+DURUM[[:space:]]*:[[:space:]]+TASLAK'"
+
+
+def _fatura_not_re_erp_taslak(c: str) -> str:
+    return _FATURA_NOT_NORM.format(c=c) + " ~* 'ERP[[:space:]]+DURUM[[:space:]]*:[[:space:]]+TASLAK'"
+
+
+def _fatura_not_re_gib_imzali(c: str) -> str:
+    # LIKE içindeki % → psycopg2 execute(..., params) ile birleşince yer tutucu sanılmasın diye %% (tek % PG'ye gider).
+    # Parametresiz execute de biçimlendirir (params=()), DDL'de de %% doğru.
+    norm = _FATURA_NOT_NORM.format(c=c)
+    return (
+        "("
+        "COALESCE(" + c + ", '') LIKE '%%GİB İMZALANDI%%' OR "
+        + norm + " ~* 'GIB[[:space:]]+IMZALANDI' OR "
+        + norm + " ~* 'GIB[[:space:]]+DURUM[[:space:]]*:[[:space:]]+IMZALI[[:>:]]'"
+        ")"
+    )
+
+
+def _fatura_not_re_gib_no_tasindi(c: str) -> str:
+    return "COALESCE(" + c + ", '') LIKE '%%|GIB_NO_TASINDI|%%'"
+
+
+# sütun → notlar regex'i (migrasyon ve doğrulama aynı tanımı kullanır)
+FATURA_NOT_DURUM_SUTUNLARI = (
+    ("gib_taslak", _fatura_not_re_gib_taslak),
+    ("erp_taslak", _fatura_not_re_erp_taslak),
+    ("gib_imzali", _fatura_not_re_gib_imzali),
+    ("gib_no_tasindi", _fatura_not_re_gib_no_tasindi),
+)
+
+
 def sql_expr_fatura_not_gib_taslak(notlar_column: str) -> str:
     """PostgreSQL koşulu: notlarda «GİB durum: taslak» ve «ERP durum: taslak» olmayan faturalar.
 
     notlar_column: tam sütun ifadesi, örn. ``f.notlar`` veya ``notlar``.
     """
-    c = (notlar_column or "").strip()
-    if not c:
-        raise ValueError("notlar_column gerekli")
-    norm = "regexp_replace(COALESCE(" + c + ", ''), '[İIıi]', 'I', 'g')"
+    c = _fatura_notlar_sutunu(notlar_column)
+    on = _fatura_durum_sutun_oneki(c)
+    if on is not None:
+        return "NOT (" + on + "gib_taslak OR " + on + "erp_taslak)"
     return (
         "(" + c + " IS NULL OR NOT ("
-        + norm + " ~* 'GIB[[:space:]]+DURUM[[:space:]]*:[[:space:]]+TASLAK'"
-        " OR "
-        + norm + " ~* 'ERP[[:space:]]+DURUM[[:space:]]*:[[:space:]]+TASLAK'"
-        "))"
+        + _fatura_not_re_gib_taslak(c)
+        + " OR "
+        + _fatura_not_re_erp_taslak(c)
+        + "))"
     )
 
 
 def sql_expr_fatura_erp_taslak(notlar_column: str) -> str:
     """PostgreSQL koşulu: notlarda «ERP durum: taslak» etiketi olan faturalar."""
-    c = (notlar_column or "").strip()
-    if not c:
-        raise ValueError("notlar_column gerekli")
-    return (
-        "regexp_replace(COALESCE(" + c + ", ''), '[İIıi]', 'I', 'g') "
-        "~* 'ERP[[:space:]]+DURUM[[:space:]]*:[[:space:]]+TASLAK'"
-    )
+    c = _fatura_notlar_sutunu(notlar_column)
+    on = _fatura_durum_sutun_oneki(c)
+    if on is not None:
+        return on + "erp_taslak"
+    return _fatura_not_re_erp_taslak(c)
 
 
 def sql_expr_fatura_gib_imzalanmis(notlar_column: str) -> str:
     """PostgreSQL koşulu: ERP notunda GİB imzalı kesin fatura (SMS sonrası yazılan etiketler)."""
-    c = (notlar_column or "").strip()
-    if not c:
-        raise ValueError("notlar_column gerekli")
-    # LIKE içindeki % → psycopg2 execute(..., params) ile birleşince yer tutucu sanılmasın diye %% (tek % PG'ye gider).
-    return (
-        "("
-        "COALESCE(" + c + ", '') LIKE '%%GİB İMZALANDI%%' OR "
-        "regexp_replace(COALESCE(" + c + ", ''), '[İIıi]', 'I', 'g') ~* 'GIB[[:space:]]+IMZALANDI' OR "
-        "regexp_replace(COALESCE(" + c + ", ''), '[İIıi]', 'I', 'g') ~* 'GIB[[:space:]]+DURUM[[:space:]]*:[[:space:]]+IMZALI[[:>:]]'"
-        ")"
-    )
+    c = _fatura_notlar_sutunu(notlar_column)
+    on = _fatura_durum_sutun_oneki(c)
+    if on is not None:
+        return on + "gib_imzali"
+    return _fatura_not_re_gib_imzali(c)
 
 
 def sql_expr_fatura_gib_no_tasindi_degil(notlar_column: str) -> str:
@@ -120,20 +198,197 @@ def sql_expr_fatura_gib_no_tasindi_degil(notlar_column: str) -> str:
     açık/borçlandırılabilir ay taramalarından hariç tutmak için.
     notlar_column: tam sütun ifadesi, örn. ``f.notlar`` veya ``notlar``.
     """
-    c = (notlar_column or "").strip()
-    if not c:
-        raise ValueError("notlar_column gerekli")
+    c = _fatura_notlar_sutunu(notlar_column)
+    on = _fatura_durum_sutun_oneki(c)
+    if on is not None:
+        return "NOT " + on + "gib_no_tasindi"
     # LIKE içindeki % → psycopg2 execute(..., params) ile birleşince yer tutucu sanılmasın diye %%
     return "COALESCE(" + c + ", '') NOT LIKE '%%|GIB_NO_TASINDI|%%'"
 
 
+# ── SQL ölçümü (DB_SQL_PROFILE=1) ───────────────────────────────────────────
+# Flask isteği başına: normalize SQL parmak izi → adet / toplam süre / satır.
+# Kapalıyken cursor.execute yalnızca tek bir global bool kontrolü ekler.
+_SQL_PROFILE_ENABLED = (os.environ.get("DB_SQL_PROFILE", "0") or "").strip().lower() in ("1", "true", "yes", "on")
+_SQL_PROFILE_SLOW_MS = float(os.environ.get("DB_SQL_PROFILE_SLOW_MS", "500") or 500)
+_SQL_PROFILE_N1_LIMIT = int(os.environ.get("DB_SQL_PROFILE_N1", "20") or 20)
+_SQL_PROFILE_ATTR = "_sql_profil"
+_SQL_FP_STR_RE = re.compile(r"'(?:[^']|'')*'")
+_SQL_FP_NUM_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_FP_IN_RE = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))+\s*\)")
+_SQL_FP_WS_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def sql_fingerprint(sql_text: str) -> str:
+    """Literal / sayı / IN listesi / boşluk farkı olmayan SQL parmak izi (N+1 gruplaması)."""
+    s = _SQL_FP_STR_RE.sub("?", sql_text or "")
+    s = _SQL_FP_NUM_RE.sub("?", s)
+    s = _SQL_FP_WS_RE.sub(" ", s).strip()
+    s = _SQL_FP_IN_RE.sub("(?)", s)
+    return s[:400]
+
+
+_SQL_PROFILE_LOCAL = threading.local()
+
+
+def _sql_profile_current():
+    """Aktif ölçüm sözlüğü (sql_profile_scope veya Flask isteği); kapalı → None."""
+    if not _SQL_PROFILE_ENABLED:
+        return None
+    prof = getattr(_SQL_PROFILE_LOCAL, "prof", None)
+    if prof is not None:
+        return prof
+    try:
+        from flask import g, has_app_context
+    except Exception:
+        return None
+    if not has_app_context():
+        return None
+    return g.get(_SQL_PROFILE_ATTR)
+
+
+def _sql_profile_record(prof: dict, query, elapsed: float, rowcount) -> None:
+    text = query if isinstance(query, str) else (
+        query.decode("utf-8", "replace") if isinstance(query, bytes) else repr(query)
+    )
+    fp = sql_fingerprint(text)
+    st = prof["sorgular"].get(fp)
+    if st is None:
+        st = prof["sorgular"][fp] = [0, 0.0, 0]
+    st[0] += 1
+    st[1] += elapsed
+    if isinstance(rowcount, int) and rowcount > 0:
+        st[2] += rowcount
+
+
+class _SqlProfileMixin:
+    """cursor.execute / executemany süresini isteğin ölçüm sözlüğüne yazar."""
+
+    def execute(self, query, vars=None):
+        prof = _sql_profile_current() if _SQL_PROFILE_ENABLED else None
+        if prof is None:
+            return super().execute(query, vars)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _sql_profile_record(prof, query, time.perf_counter() - t0, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        prof = _sql_profile_current() if _SQL_PROFILE_ENABLED else None
+        if prof is None:
+            return super().executemany(query, vars_list)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _sql_profile_record(prof, query, time.perf_counter() - t0, self.rowcount)
+
+
+class ProfiledRealDictCursor(_SqlProfileMixin, RealDictCursor):
+    """Varsayılan cursor: RealDictCursor + SQL ölçümü."""
+
+
+class ProfiledTupleCursor(_SqlProfileMixin, psycopg2.extensions.cursor):
+    """fetch_iter (named cursor) için tuple satırlı cursor + SQL ölçümü."""
+
+
+def sql_profile_begin() -> None:
+    """before_request: ölçüm sözlüğünü başlat (kapalıyken no-op)."""
+    if not _SQL_PROFILE_ENABLED:
+        return
+    from flask import g
+
+    setattr(g, _SQL_PROFILE_ATTR, {"t0": time.perf_counter(), "sorgular": {}})
+
+
+def _sql_profile_report(prof: dict, meta: dict) -> tuple:
+    """Ölçümü özetle; N+1 ve eşik üstü süre için log satırı yaz. (db_ms, adet, toplam_ms) döner."""
+    toplam_ms = (time.perf_counter() - prof["t0"]) * 1000.0
+    sorgular = prof["sorgular"]
+    db_ms = sum(v[1] for v in sorgular.values()) * 1000.0
+    adet = sum(v[0] for v in sorgular.values())
+    n1 = [
+        {"fp": fp, "n": v[0], "ms": round(v[1] * 1000.0, 1)}
+        for fp, v in sorgular.items()
+        if v[0] > _SQL_PROFILE_N1_LIMIT
+    ]
+    for item in n1:
+        logger.warning("sql_n_plus_1 %s", json.dumps({**meta, **item}, ensure_ascii=False))
+    if toplam_ms >= _SQL_PROFILE_SLOW_MS:
+        en_agir = sorted(sorgular.items(), key=lambda kv: kv[1][1], reverse=True)[:10]
+        logger.warning(
+            "sql_profile_slow %s",
+            json.dumps(
+                {
+                    **meta,
+                    "ms": round(toplam_ms, 1),
+                    "db_ms": round(db_ms, 1),
+                    "n": adet,
+                    "fp_n": len(sorgular),
+                    "n_plus_1": len(n1),
+                    "top": [
+                        {"fp": fp, "n": v[0], "ms": round(v[1] * 1000.0, 1), "rows": v[2]}
+                        for fp, v in en_agir
+                    ],
+                },
+                ensure_ascii=False,
+            ),
+        )
+    return db_ms, adet, toplam_ms
+
+
+def sql_profile_finish(response):
+    """after_request: Server-Timing başlığı, yavaş istek ve N+1 log satırları."""
+    if not _SQL_PROFILE_ENABLED:
+        return response
+    from flask import g, request
+
+    prof = g.pop(_SQL_PROFILE_ATTR, None)
+    if prof is None:
+        return response
+    db_ms, adet, toplam_ms = _sql_profile_report(
+        prof,
+        {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": getattr(response, "status_code", None),
+        },
+    )
+    try:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={db_ms:.1f};desc="sql n={adet} fp={len(prof["sorgular"])}", app;dur={toplam_ms:.1f}',
+        )
+    except Exception:
+        pass
+    return response
+
+
+@contextmanager
+def sql_profile_scope(label: str):
+    """İstek dışı işler (scheduler, CLI, thread) için ölçüm kapsamı; çıkışta aynı log satırları."""
+    if not _SQL_PROFILE_ENABLED or getattr(_SQL_PROFILE_LOCAL, "prof", None) is not None:
+        yield
+        return
+    prof = {"t0": time.perf_counter(), "sorgular": {}}
+    _SQL_PROFILE_LOCAL.prof = prof
+    try:
+        yield
+    finally:
+        _SQL_PROFILE_LOCAL.prof = None
+        _sql_profile_report(prof, {"job": label})
+
+
 def _db_connect_kwargs_common():
     """Ortak libpq parametreleri (kopmalara karşı keepalive, TLS)."""
     is_prod_like = bool(os.environ.get("GUNICORN_CMD_ARGS") or os.environ.get("RENDER"))
     default_connect_timeout = "10"
     return dict(
         connect_timeout=int(os.environ.get("DB_CONNECT_TIMEOUT", default_connect_timeout)),
-        cursor_factory=psycopg2.extras.RealDictCursor,
+        cursor_factory=ProfiledRealDictCursor,
         keepalives=1,
         keepalives_idle=int(os.environ.get("DB_KEEPALIVES_IDLE", "30")),
         keepalives_interval=10,
@@ -275,13 +530,270 @@ def get_conn():
     raise last_err  # pragma: no cover
 
 
+def get_unpooled_conn(dsn: str | None = None):
+    """Havuz dışı, uzun ömürlü bağlantı (LISTEN, oturum kilidi tutan işçiler).
+
+    ``dsn`` verilmezse get_conn ile aynı hedef. Supabase transaction pooler
+    (6543) LISTEN iletmez; bu işler için session/direct URI verilmelidir.
+    Çağıran kapatır (``conn.close()``).
+    """
+    extra = _db_connect_kwargs_common()
+    dsn_raw = (dsn or os.environ.get("DATABASE_URL") or os.environ.get("SUPABASE_DB_URL") or "").strip()
+    dsn_ok = _dsn_with_sslmode(dsn_raw, str(extra.get("sslmode") or "require"))
+    if dsn_ok:
+        return psycopg2.connect(dsn_ok, **extra)
+    if not Config.DB_HOST:
+        raise psycopg2.OperationalError(
+            "DB_HOST tanımlı değil. .env içinde DATABASE_URL veya DB_HOST / DB_* değişkenlerini ayarlayın."
+        )
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        dbname=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        **extra,
+    )
+
+
+# ── İstek bağlantısı (request-bound) ────────────────────────────────────────
+# Flask isteği içindeki ilk db() çağrısı havuzdan tek bağlantı alır; sonraki
+# çağrılar aynı bağlantıyı kullanır (kilit / checkout / release rollback yok).
+# teardown_request'te havuza iade edilir. İstek dışı (thread, CLI, executor)
+# ve iç içe db() blokları eskisi gibi çağrı başına bağlantı alır.
+_REQUEST_CONN_ATTR = "_db_request_conn"
+_REQUEST_SAVEPOINT = "bo_db_blok"
+
+
+def _db_request_conn_enabled() -> bool:
+    return (os.environ.get("DB_REQUEST_CONN", "1") or "").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _db_request_tx_enabled() -> bool:
+    """DB_REQUEST_TX=1: istek tek transaction; bloklar SAVEPOINT, commit after_request'te."""
+    return (os.environ.get("DB_REQUEST_TX", "0") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _request_conn_owner():
+    """(thread, request nesnesi) kimliği; request context yoksa None.
+
+    test_request_context ile iç içe açılan istekler ve executor thread'leri
+    farklı sahip sayılır → dış isteğin bağlantısına dokunmazlar.
+    """
+    try:
+        from flask import has_request_context, request
+    except Exception:
+        return None
+    if not has_request_context():
+        return None
+    return (threading.get_ident(), id(request._get_current_object()))
+
+
+def _request_conn_state(owner):
+    from flask import g
+
+    st = g.get(_REQUEST_CONN_ATTR)
+    if st is None or st["owner"] != owner:
+        return None
+    return st
+
+
+def _request_conn_acquire(schema):
+    """İsteğe bağlı bağlantı durumunu döndür; kullanılamıyorsa None (çağrı başına bağlantı)."""
+    if not _db_request_conn_enabled():
+        return None
+    owner = _request_conn_owner()
+    if owner is None:
+        return None
+    from flask import g
+
+    st = g.get(_REQUEST_CONN_ATTR)
+    if st is not None:
+        if st["owner"] != owner or st["depth"] > 0 or st["schema"] != schema:
+            return None
+        return st
+    tx = _db_request_tx_enabled()
+    conn = get_conn()
+    try:
+        if schema is not None:
+            # Oturum düzeyinde bir kez; iade ederken RESET search_path.
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL("SET search_path TO {}, pg_catalog").format(psql.Identifier(schema))
+            )
+            if not tx:
+                conn.commit()
+    except BaseException:
+        _release_conn(conn)
+        raise
+    st = {"conn": conn, "owner": owner, "schema": schema, "depth": 0, "tx": tx}
+    setattr(g, _REQUEST_CONN_ATTR, st)
+    return st
+
+
+def _request_conn_drop(st) -> None:
+    """Bağlantıyı istekten ayır ve havuza iade et (search_path sıfırlanır)."""
+    from flask import g
+
+    if g.get(_REQUEST_CONN_ATTR) is st:
+        g.pop(_REQUEST_CONN_ATTR, None)
+    conn = st["conn"]
+    try:
+        if not conn.closed:
+            conn.rollback()
+            if st["schema"] is not None:
+                conn.cursor().execute("RESET search_path")
+                conn.commit()
+    except Exception as e:
+        logger.warning("İstek bağlantısı sıfırlanamadı: %s", e)
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _release_conn(conn)
+
+
+@contextmanager
+def _request_conn_block(st):
+    conn = st["conn"]
+    st["depth"] += 1
+    try:
+        if st["tx"]:
+            conn.cursor().execute("SAVEPOINT " + _REQUEST_SAVEPOINT)
+        try:
+            yield conn
+        except BaseException:
+            try:
+                if st["tx"]:
+                    conn.cursor().execute("ROLLBACK TO SAVEPOINT " + _REQUEST_SAVEPOINT)
+                else:
+                    conn.rollback()
+            except Exception as e:
+                # Savepoint kurtarılamadı / bağlantı koptu: sonraki çağrı havuzdan yenisini alır.
+                logger.warning("İstek bağlantısı blok geri alınamadı: %s", e)
+                st["bozuk"] = True
+            raise
+        if st["tx"]:
+            conn.cursor().execute("RELEASE SAVEPOINT " + _REQUEST_SAVEPOINT)
+        else:
+            conn.commit()
+    finally:
+        st["depth"] -= 1
+        if st.get("bozuk") or conn.closed:
+            _request_conn_drop(st)
+
+
+def commit_request_conn() -> None:
+    """after_request: DB_REQUEST_TX modunda istek transaction'ını commit eder.
+
+    Commit hatası yanıt gönderilmeden önce yükselir (500); teardown'a kalmaz.
+    """
+    owner = _request_conn_owner()
+    if owner is None:
+        return
+    st = _request_conn_state(owner)
+    if st is None or not st["tx"] or st["depth"] > 0:
+        return
+    st["conn"].commit()
+
+
+def release_request_conn(exc=None) -> None:
+    """teardown_request: istek bağlantısını havuza iade eder.
+
+    DB_REQUEST_TX modunda hata yoksa bekleyen iş commit edilir (stream yanıtları),
+    hata varsa rollback. Varsayılan modda bloklar zaten kendi commit'ini yapmıştır.
+    """
+    owner = _request_conn_owner()
+    if owner is None:
+        return
+    st = _request_conn_state(owner)
+    if st is None:
+        return
+    conn = st["conn"]
+    if st["tx"] and exc is None and not conn.closed:
+        try:
+            conn.commit()
+        except Exception as e:
+            logger.error("İstek transaction commit edilemedi: %s", e)
+    _request_conn_drop(st)
+
+
+# migrate_schema birim çalıştırırken: birim içinde yakalanıp yutulan (print / pass) DB
+# hataları burada toplanır. Geçici hata bırakan birim deftere yazılmaz; kalıcı hata
+# (eski veride çakışan benzersiz indeks, yetki, eksik eklenti …) birimin kabul ettiği
+# başarısızlıktır, loglanır ve birim yazılır (bkz. migrate_schema).
+_MIGRASYON = threading.local()
+
+# Yeniden denemeyle düzelebilecek SQLSTATE sınıfları: bağlantı, deadlock / serileştirme,
+# kaynak yetersizliği, iptal / statement_timeout / kapanış; ayrıca 55P03 (lock_not_available).
+_GECICI_SQLSTATE_SINIFLARI = ("08", "40", "53", "57")
+
+
+def _gecici_db_hatasi(e) -> bool:
+    kod = getattr(e, "pgcode", None)
+    if not kod:
+        return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    return kod[:2] in _GECICI_SQLSTATE_SINIFLARI or kod == "55P03"
+
+
+def _migrasyon_hatasi_kaydet(e) -> None:
+    hatalar = getattr(_MIGRASYON, "hatalar", None)
+    if hatalar is not None:
+        hatalar.append(e)
+
+
+@contextmanager
+def istege_bagli_ddl():
+    """Başarısızlığı her koşulda kabul edilen DDL (geçici hata dahil): hatası birimi düşürmez."""
+    onceki = getattr(_MIGRASYON, "hatalar", None)
+    _MIGRASYON.hatalar = None
+    try:
+        yield
+    finally:
+        _MIGRASYON.hatalar = onceki
+
+
+# İş parçacığı başına açık db() bağlantıları (dıştan içe). cache_bus NOTIFY'ı en dıştakine
+# bağlar: yazan transaction commit edilmeden diğer worker'lara teslim edilmez.
+_ACIK_BAGLANTILAR = threading.local()
+
+
+def acik_baglanti():
+    """Bu iş parçacığında açık en dıştaki db() bağlantısı; blok dışındaysa None."""
+    yigin = getattr(_ACIK_BAGLANTILAR, "yigin", None)
+    return yigin[0] if yigin else None
+
+
 @contextmanager
 def db():
     """Context manager: otomatik commit/rollback.
 
     g.tenant_schema yoksa: search_path'e dokunulmaz, ek SQL yok (bugünkü production).
     g.tenant_schema varsa: transaction başında SET LOCAL search_path (havuz sızıntısı yok).
+    Flask isteği içinde istek bağlantısı kullanılır (bkz. _request_conn_acquire).
     """
+    try:
+        with _db_baglanti() as conn:
+            yigin = getattr(_ACIK_BAGLANTILAR, "yigin", None)
+            if yigin is None:
+                yigin = _ACIK_BAGLANTILAR.yigin = []
+            yigin.append(conn)
+            try:
+                yield conn
+            finally:
+                yigin.pop()
+    except Exception as e:
+        _migrasyon_hatasi_kaydet(e)
+        raise
+
+
+@contextmanager
+def _db_baglanti():
+    st = _request_conn_acquire(_tenant_schema_for_request())
+    if st is not None:
+        with _request_conn_block(st) as conn:
+            yield conn
+        return
     conn = get_conn()
     try:
         schema = _tenant_schema_for_request()
@@ -309,6 +821,41 @@ def fetch_all(sql: str, params=()) -> list:
         return [dict(r) for r in cur.fetchall()]
 
 
+_ITER_CURSOR_SEQ = itertools.count(1)
+
+
+def fetch_iter(sql: str, params=(), batch_size: int = 2000, header: bool = False):
+    """Server-side (named) cursor ile satırları tuple olarak akıtır.
+
+    fetch_all'dan farkı: sonuç belleğe toplanmaz, batch_size satırlık FETCH'lerle
+    gelir (RealDictRow/dict kopyası yok). header=True ise ilk eleman sütun adları.
+    Generator tüketilene veya kapatılana kadar db() bloğu (transaction) açık kalır;
+    bu sırada yapılan fetch_one/execute çağrıları ayrı bağlantı kullanır.
+    """
+    n = max(1, int(batch_size or 2000))
+    with db() as conn:
+        cur = conn.cursor(
+            name=f"bo_iter_{next(_ITER_CURSOR_SEQ)}",
+            cursor_factory=ProfiledTupleCursor,
+        )
+        try:
+            cur.itersize = n
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(n)
+                if header:
+                    header = False
+                    yield tuple(d[0] for d in (cur.description or ()))
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+
 def fetch_one(sql: str, params=()) -> dict | None:
     """Tek satır getir."""
     with db() as conn:
@@ -335,6 +882,47 @@ def execute_returning(sql: str, params=()) -> dict | None:
         return dict(row) if row else None
 
 
+# ── Şema sürüm defteri (schema_migrations) ──────────────────────────────────
+# ensure_* fonksiyonları @_schema_ensure ile sarılıdır: aktif şemanın defteri
+# SCHEMA_VERSION'daysa DDL round-trip'i yapmadan döner (route'lardaki lazy
+# ensure çağrıları dahil). Defter yok / geride ise eski davranış: DDL çalışır.
+# Defter durumu süreç başına şema başına bir kez okunur.
+_SCHEMA_LEDGER_STATE: dict = {}
+
+
+def _schema_ledger_version(key: str) -> int:
+    """``<şema>.schema_migrations`` içindeki en yüksek sürüm; tablo yoksa 0."""
+    try:
+        row = fetch_one(
+            psql.SQL("SELECT COALESCE(MAX(version), 0) AS v FROM {}.schema_migrations").format(
+                psql.Identifier(key)
+            )
+        )
+    except psycopg2.Error:
+        return 0
+    return int((row or {}).get("v") or 0)
+
+
+def _schema_ledger_current(key: str) -> bool:
+    st = _SCHEMA_LEDGER_STATE.get(key)
+    if st is None:
+        st = _schema_ledger_version(key) >= SCHEMA_VERSION
+        _SCHEMA_LEDGER_STATE[key] = st
+    return st
+
+
+def _schema_ensure(fn):
+    """ensure_* sarmalayıcı: şema defteri güncelse no-op."""
+
+    @functools.wraps(fn)
+    def wrapper():
+        if _schema_ledger_current(_tenant_schema_for_request() or "public"):
+            return None
+        return fn()
+
+    return wrapper
+
+
 # ── Şema oluşturma ───────────────────────────────────────────────────────────
 
 SCHEMA_SQL = """
@@ -588,6 +1176,7 @@ def init_schema():
     print("✅ Supabase şema oluşturuldu.")
 
 
+@_schema_ensure
 def ensure_group_report_indexes():
     """Grup raporu ve cari finans özet sorguları için temel indeksler."""
     stmts = (
@@ -624,6 +1213,7 @@ def ensure_group_report_indexes():
             print(f"group report index error: {e}")
 
 
+@_schema_ensure
 def ensure_firma_ozet_report_indexes():
     """Tekil müşteri (firma_ozet) listesi süzgeçleri için hafif indeksler."""
     stmts = (
@@ -648,6 +1238,7 @@ def ensure_firma_ozet_report_indexes():
             print(f"firma ozet index error: {e}")
 
 
+@_schema_ensure
 def ensure_group_report_rpc():
     """Grup bazlı cari finans özetini DB katmanında toplar (N+1 ve Python döngülerini azaltır)."""
     try:
@@ -753,6 +1344,7 @@ def ensure_group_report_rpc():
         print(f"group report rpc error: {e}")
 
 
+@_schema_ensure
 def ensure_personel_extra_columns():
     """personel tablosuna mesai, giris_tarihi, mac_adres, notlar sütunlarını ekle (varsa dokunma)."""
     for col, ctype in (
@@ -768,6 +1360,7 @@ def ensure_personel_extra_columns():
             print(f"personel.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_personel_bilgi_dogum_tarihi():
     """personel_bilgi tablosuna dogum_tarihi (4857 yaş istisnası için) ekler."""
     try:
@@ -776,6 +1369,7 @@ def ensure_personel_bilgi_dogum_tarihi():
         print(f"personel_bilgi.dogum_tarihi: {e}")
 
 
+@_schema_ensure
 def ensure_personel_izin_onay_durumu():
     """personel_izin tablosuna onay_durumu ekler (yoksa). Mevcut kayıtlara dokunulmaz (NULL kalır)."""
     try:
@@ -784,6 +1378,7 @@ def ensure_personel_izin_onay_durumu():
         print(f"personel_izin.onay_durumu: {e}")
 
 
+@_schema_ensure
 def ensure_personel_izin_saat_sayisi():
     """personel_izin tablosuna saatlik izin için saat_sayisi ekler (günlük izinde 0)."""
     try:
@@ -792,6 +1387,7 @@ def ensure_personel_izin_saat_sayisi():
         print(f"personel_izin.saat_sayisi: {e}")
 
 
+@_schema_ensure
 def ensure_personel_izin_saat_sayisi_numeric():
     """saat_sayisi: tam saat + kesir (örn. 5.5) için NUMERIC(4,1)."""
     try:
@@ -806,6 +1402,7 @@ def ensure_personel_izin_saat_sayisi_numeric():
         print(f"personel_izin.saat_sayisi numeric: {e}")
 
 
+@_schema_ensure
 def ensure_personel_izin_otomatik_unique():
     """Aynı personel + gün için tek otomatik izin kaydı (aciklama işaretçili)."""
     try:
@@ -820,6 +1417,7 @@ def ensure_personel_izin_otomatik_unique():
         print(f"personel_izin otomatik unique: {e}")
 
 
+@_schema_ensure
 def ensure_personel_ozluk():
     """Özlük / detay bilgileri tablosu (sadece admin)."""
     try:
@@ -838,6 +1436,7 @@ def ensure_personel_ozluk():
         print(f"personel_ozluk: {e}")
 
 
+@_schema_ensure
 def ensure_personel_ozluk_izin_columns():
     """personel_ozluk tablosuna izin hakediş/kalan (gün+saat) sütunlarını ekler."""
     for col in ("izin_hakedis_gun", "izin_hakedis_saat", "izin_kalan_gun", "izin_kalan_saat"):
@@ -847,6 +1446,7 @@ def ensure_personel_ozluk_izin_columns():
             print(f"personel_ozluk.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_crm_leads():
     """CRM Lead tablosu: potansiyel müşteriler ve satış pipeline alanları."""
     try:
@@ -877,6 +1477,7 @@ def ensure_crm_leads():
 _musteri_kyc_columns_done = False
 
 
+@_schema_ensure
 def ensure_musteri_kyc_columns():
     """Supabase musteri_kyc tablosunu web tarafındaki KYC şemasına yaklaştırır.
 
@@ -941,6 +1542,7 @@ def ensure_musteri_kyc_columns():
     _musteri_kyc_columns_done = True
 
 
+@_schema_ensure
 def ensure_musteri_kyc_arama_kolonlari():
     """Geniş müşteri araması (musteri_kyc EXISTS …) için kolonlar; eski DB'lerde tek seferlik ALTER.
 
@@ -967,6 +1569,7 @@ def ensure_musteri_kyc_arama_kolonlari():
             print(f"musteri_kyc arama kolonu {col}: {e}")
 
 
+@_schema_ensure
 def ensure_customers_hazir_ofis_oda():
     """Hazır Ofis oda numarası (200–230); doluluk raporu için customers üzerinde."""
     try:
@@ -975,6 +1578,7 @@ def ensure_customers_hazir_ofis_oda():
         print(f"customers.hazir_ofis_oda_no: {e}")
 
 
+@_schema_ensure
 def ensure_musteri_kyc_hazir_ofis_oda_no():
     """KYC satırında Hazır Ofis oda no (ensure_musteri_kyc_columns tek seferlik olduğu için ayrı)."""
     try:
@@ -983,6 +1587,7 @@ def ensure_musteri_kyc_hazir_ofis_oda_no():
         print(f"musteri_kyc.hazir_ofis_oda_no: {e}")
 
 
+@_schema_ensure
 def ensure_musteri_kyc_odeme_duzeni():
     """Ödeme düzeni (aylık / manuel vb.) — aylık grid dışı müşteriler için."""
     try:
@@ -992,6 +1597,7 @@ def ensure_musteri_kyc_odeme_duzeni():
         print(f"musteri_kyc.odeme_duzeni: {e}")
 
 
+@_schema_ensure
 def ensure_musteri_kyc_kira_banka():
     """Aylık kira ödeme tipi: Banka (Nakit ile karşılıklı; KDV mantığı yine kira_nakit)."""
     try:
@@ -1011,6 +1617,7 @@ def ensure_musteri_kyc_kira_banka():
 _musteri_kyc_latest_idx_done = False
 
 
+@_schema_ensure
 def ensure_musteri_kyc_latest_lookup_index():
     """Son KYC satırı (musteri_id başına en yüksek id) sorgularını hızlandırır."""
     global _musteri_kyc_latest_idx_done
@@ -1025,6 +1632,7 @@ def ensure_musteri_kyc_latest_lookup_index():
         logger.warning("musteri_kyc indeks idx_musteri_kyc_musteri_id_id_desc: %s", e)
 
 
+@_schema_ensure
 def ensure_contracts_engine():
     """Sözleşme / taksit / hukuk motoru tablolarını oluştur."""
     try:
@@ -1100,6 +1708,7 @@ def ensure_contracts_engine():
         print(f"legal_cases: {e}")
 
 
+@_schema_ensure
 def ensure_masraflar_table():
     """Fiş masrafları (AI OCR + onay akışı). Banka /masraflar API'sinden bağımsız."""
     try:
@@ -1150,6 +1759,7 @@ def ensure_masraflar_table():
         print(f"masraflar: {e}")
 
 
+@_schema_ensure
 def ensure_auto_invoice_tables():
     """Otomatik fatura + GIB gönderim ayar/run/log tabloları."""
     try:
@@ -1214,6 +1824,7 @@ def ensure_auto_invoice_tables():
         print(f"auto_invoice_items: {e}")
 
 
+@_schema_ensure
 def ensure_potansiyel_musteriler():
     """Potansiyel müşteri havuzu: teklif aşamasındakiler + hatırlatma tarihleri.
 
@@ -1242,6 +1853,7 @@ def ensure_potansiyel_musteriler():
 
 
 
+@_schema_ensure
 def ensure_office_rentals():
     """office_rentals tablosu yoksa oluştur (migration)."""
     try:
@@ -1291,6 +1903,7 @@ def _ensure_office_rentals_extra_columns():
             print(f"office_rentals.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_customers_musteri_adi():
     """Şirket ünvanından ayrı kısa / görünen müşteri adı (opsiyonel)."""
     try:
@@ -1299,6 +1912,7 @@ def ensure_customers_musteri_adi():
         print(f"customers.musteri_adi: {e}")
 
 
+@_schema_ensure
 def ensure_customers_musteri_no():
     """Sabit müşteri sıra no: 1001'den başlar; eski kayıtlar id sırasıyla numaralanır; yeni kayıt sequence ile."""
     def _exec_fast(sql: str, params=()):
@@ -1359,6 +1973,7 @@ def ensure_customers_musteri_no():
 _customers_is_active_column_done = False
 
 
+@_schema_ensure
 def ensure_customers_is_active():
     """Eski veritabanlarında customers.is_active yoksa ekler (rapor / pasif kart süzgeci)."""
     global _customers_is_active_column_done
@@ -1374,6 +1989,7 @@ def ensure_customers_is_active():
 _customers_arsivli_column_done = False
 
 
+@_schema_ensure
 def ensure_customers_arsivli():
     """customers.arsivli (+ meta) — liste/arama gizleme; mevcut satırlar DEFAULT FALSE."""
     global _customers_arsivli_column_done
@@ -1394,6 +2010,7 @@ def ensure_customers_arsivli():
 _mukerrer_arsiv_batch_done = False
 
 
+@_schema_ensure
 def ensure_mukerrer_arsiv_batch():
     """mukerrer_arsiv_batch — A5 grup arşiv audit / geri alma (IF NOT EXISTS)."""
     global _mukerrer_arsiv_batch_done
@@ -1427,6 +2044,7 @@ def ensure_mukerrer_arsiv_batch():
         print(f"mukerrer_arsiv_batch: {e}")
 
 
+@_schema_ensure
 def ensure_customers_notes():
     """Customers tablosuna notes ve ev_adres sütunlarını ekle."""
     try:
@@ -1442,6 +2060,7 @@ def ensure_customers_notes():
 _customers_rent_columns_done = False
 
 
+@_schema_ensure
 def ensure_customers_rent_columns():
     """Customers tablosuna kira başlangıç ve ilk/güncel kira sütunları ekle (toplu tahsilat için)."""
     global _customers_rent_columns_done
@@ -1462,6 +2081,7 @@ def ensure_customers_rent_columns():
     _customers_rent_columns_done = True
 
 
+@_schema_ensure
 def ensure_customers_excel_columns():
     """Excel'den gelen ekstra alanlar: yetkili_kisi, hizmet_turu, phone2, yetkili_tcno."""
     for col, typ in (
@@ -1476,6 +2096,7 @@ def ensure_customers_excel_columns():
             print(f"customers.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_customers_quick_edit_columns():
     """Hızlı bilgi düzenleme: manuel_borc, son_odeme_tarihi (cari kart / listede gösterim)."""
     for col, typ in (
@@ -1491,6 +2112,7 @@ def ensure_customers_quick_edit_columns():
 _hizmet_turleri_table_ensured = False
 
 
+@_schema_ensure
 def ensure_hizmet_turleri_table():
     """Sözleşme / müşteri formunda seçilebilir hizmet türleri (kullanıcı yeni ekleyebilir)."""
     global _hizmet_turleri_table_ensured
@@ -1535,6 +2157,7 @@ def ensure_hizmet_turleri_table():
 _duzenli_fatura_secenekleri_table_ensured = False
 
 
+@_schema_ensure
 def ensure_duzenli_fatura_secenekleri_table():
     """Giriş formu Düzenli Fatura açılır listesi (varsayılanlar + kullanıcı ekleri)."""
     global _duzenli_fatura_secenekleri_table_ensured
@@ -1577,6 +2200,7 @@ def ensure_duzenli_fatura_secenekleri_table():
     _duzenli_fatura_secenekleri_table_ensured = True
 
 
+@_schema_ensure
 def ensure_customers_calisma_sekli():
     """Müşteri çalışma şekli: sirali (kiracı/grid) veya cari (tahsilat/fatura/tediye)."""
     try:
@@ -1587,6 +2211,7 @@ def ensure_customers_calisma_sekli():
         print(f"customers.calisma_sekli: {e}")
 
 
+@_schema_ensure
 def ensure_customers_cari_columns():
     """Cari kart: vergi_dairesi, mersis_no, nace_kodu, ofis_tipi, tebligat_adresi."""
     for col, typ in (
@@ -1602,6 +2227,7 @@ def ensure_customers_cari_columns():
             print(f"customers.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_customers_hierarchy_columns():
     """Konsolide cari hiyerarşisi için ek kolonlar (incremental)."""
     try:
@@ -1614,6 +2240,7 @@ def ensure_customers_hierarchy_columns():
         print(f"customers.is_group: {e}")
 
 
+@_schema_ensure
 def ensure_customer_financial_profile():
     """Cari kart finansal profil: risk limiti, vade günü, tahmini ödeme günü, karlılık, hukuki eşik, mutabakat, notlar."""
     try:
@@ -1641,6 +2268,7 @@ def ensure_customer_financial_profile():
         print(f"customer_financial_profile: {e}")
 
 
+@_schema_ensure
 def ensure_customers_balance_trigger():
     """Customers.current_balance için yürüyen bakiye trigger'ı oluştur.
 
@@ -1724,6 +2352,7 @@ def ensure_customers_balance_trigger():
         print(f"trg_tahsilatlar_update_balance: {e}")
 
 
+@_schema_ensure
 def ensure_randevular_takip_columns():
     """Randevu Takip: baslangic/bitis, toplam_ucret, pakete_dahil_mi, durum, randevu_tipi, tekrarlayan, hatirlatma."""
     for col, sql in [
@@ -1745,6 +2374,7 @@ def ensure_randevular_takip_columns():
             print(f"randevular.{col}: {e}")
 
 
+@_schema_ensure
 def ensure_cari_360_tables():
     """360° Cari Kart: randevular, iletisim_log, audit_log, cari_belgeler."""
     try:
@@ -1837,6 +2467,7 @@ def ensure_cari_360_tables():
         print(f"cari_belgeler: {e}")
 
 
+@_schema_ensure
 def ensure_customers_kapanis_tarihi():
     """Şirket pasifken kapanış tarihi (customers.durum = pasif ile birlikte)."""
     try:
@@ -1848,6 +2479,7 @@ def ensure_customers_kapanis_tarihi():
 _customers_kapanis_sonrasi_borc_ay_ensured = False
 
 
+@_schema_ensure
 def ensure_customers_kapanis_sonrasi_borc_ay():
     """Pasif müşteride kapanıştan sonra borç gösterilecek ek ay sayısı (1-12, boş=hepsi).
     Süreç başına bir kez yeterli; her API isteğinde ALTER TABLE çalıştırmaya gerek yok."""
@@ -1864,6 +2496,7 @@ def ensure_customers_kapanis_sonrasi_borc_ay():
 _customers_bizim_hesap_ensured = False
 
 
+@_schema_ensure
 def ensure_customers_bizim_hesap():
     """Bizim Hesap uygulamasında takip edilen cariler (işaretleme). Süreç başına bir kez yeterli."""
     global _customers_bizim_hesap_ensured
@@ -1879,6 +2512,7 @@ def ensure_customers_bizim_hesap():
 _grup2_etiketleri_table_ensured = False
 
 
+@_schema_ensure
 def ensure_grup2_etiketleri_table():
     """Müşteri kartı «Grup 2» çoklu etiketleri (slug + görünen ad; kullanıcı yeni ekleyebilir).
     Süreç başına bir kez yeterli; her API isteğinde CREATE+INSERT çalıştırmaya gerek yok."""
@@ -1921,6 +2555,7 @@ _customers_grup2_migration_done = False
 _customers_grup2_column_ensured = False
 
 
+@_schema_ensure
 def ensure_customers_grup2_secimleri():
     """customers.grup2_secimleri: slug listesi (TEXT[]). bizim_hesap ile geriye dönük uyum."""
     global _customers_grup2_migration_done, _customers_grup2_column_ensured
@@ -1957,6 +2592,7 @@ def ensure_customers_grup2_secimleri():
 _grup2_bh_array_sync_v1_done = False
 
 
+@_schema_ensure
 def ensure_grup2_bizim_hesap_into_array():
     """customers.bizim_hesap=TRUE iken grup2_secimleri'nde bizim_hesap yoksa ekle (tek seferlik tamir)."""
     global _grup2_bh_array_sync_v1_done
@@ -1980,6 +2616,7 @@ def ensure_grup2_bizim_hesap_into_array():
 _cari_kart_perf_indexes_done = False
 
 
+@_schema_ensure
 def ensure_cari_kart_perf_indexes():
     """Cari Kart ve müşteri kartı ekranı için kritik indeksler (tek seferlik).
 
@@ -2029,6 +2666,7 @@ def ensure_cari_kart_perf_indexes():
 _customers_durum_migration_done = False
 
 
+@_schema_ensure
 def ensure_customers_durum():
     """Customers tablosuna durum sütunu ekle; Excel'deki faal/terk değerlerini aktif/pasif'e çevirir.
 
@@ -2077,6 +2715,7 @@ def ensure_customers_durum():
     _customers_durum_migration_done = True
 
 
+@_schema_ensure
 def ensure_tahsilatlar_columns():
     """tahsilatlar tablosunda musteri_id / fatura_id yoksa ekle (eski şemalar için)."""
     try:
@@ -2152,6 +2791,7 @@ def ensure_tahsilatlar_columns():
         print(f"tahsilatlar.islem_grubu_id indeks: {e}")
 
 
+@_schema_ensure
 def ensure_tediyeler_columns():
     """tediyeler tablosu ve indeksleri (yeni kurulum + mevcut DB migrasyonu)."""
     try:
@@ -2206,6 +2846,7 @@ def ensure_tediyeler_columns():
             print(f"tediyeler indeks: {e}")
 
 
+@_schema_ensure
 def ensure_banka_hesaplar_columns():
     """Eski Supabase / migrate şemalarında eksik olabilen banka_hesaplar sütunları (ör. sube)."""
     for stmt in (
@@ -2220,6 +2861,7 @@ def ensure_banka_hesaplar_columns():
             print(f"banka_hesaplar şema: {e}")
 
 
+@_schema_ensure
 def ensure_banka_hareketleri_import_columns():
     """
     banka_hareketleri: ekstre import (referans, bakiye, kaynak banka) + mükerrer dekont/referans koruması.
@@ -2260,6 +2902,7 @@ def ensure_banka_hareketleri_import_columns():
         )
 
 
+@_schema_ensure
 def ensure_kargolar_durum():
     """kargolar tablosuna durum sütunu ekle (beklemede / teslim_alindi)."""
     try:
@@ -2271,6 +2914,7 @@ def ensure_kargolar_durum():
 _faturalar_amount_columns_done = False
 
 
+@_schema_ensure
 def ensure_faturalar_amount_columns():
     """faturalar tablosunda tutar/toplam/kdv_tutar yoksa ekle (farklı şemalarda sadece biri olabilir)."""
     global _faturalar_amount_columns_done
@@ -2310,6 +2954,7 @@ def ensure_faturalar_amount_columns():
 _faturalar_yon_kolon_done = False
 
 
+@_schema_ensure
 def ensure_faturalar_yon_kolon():
     """faturalar.yon: 'giden' (bizim kestiğimiz) | 'gelen' (tedarikçi faturası)."""
     global _faturalar_yon_kolon_done
@@ -2326,6 +2971,7 @@ def ensure_faturalar_yon_kolon():
     _faturalar_yon_kolon_done = True
 
 
+@_schema_ensure
 def ensure_user_ui_preferences_table():
     """Sayfa / grid UI tercihleri (JSON, kullanıcı başına)."""
     try:
@@ -2344,6 +2990,7 @@ def ensure_user_ui_preferences_table():
         print(f"user_ui_preferences: {e}")
 
 
+@_schema_ensure
 def ensure_platform_tenants_table():
     """Platform katalogu: yalnız public.tenants.
 
@@ -2371,6 +3018,7 @@ def ensure_platform_tenants_table():
     ensure_platform_tenants_signup_columns()
 
 
+@_schema_ensure
 def ensure_platform_tenants_signup_columns():
     """public.tenants: kayıt formu metadata (B0 signup — yalnız platform katalog)."""
     try:
@@ -2398,6 +3046,7 @@ def ensure_platform_tenants_signup_columns():
         print(f"public.tenants status constraint: {e}")
 
 
+@_schema_ensure
 def ensure_tenant_user_lookup_table():
     """E-posta → kiracı slug yönlendirme indeksi (yalnız public; şifre/PII yok)."""
     ensure_platform_tenants_table()
@@ -2424,6 +3073,7 @@ def ensure_tenant_user_lookup_table():
         print(f"tenant_user_lookup_slug_idx: {e}")
 
 
+@_schema_ensure
 def ensure_password_reset_tokens_table():
     """Şifre sıfırlama tokenları — public.users FK (Ofisbir / public şema)."""
     execute(
@@ -2457,6 +3107,7 @@ def ensure_password_reset_tokens_table():
         print(f"password_reset_tokens indexes: {e}")
 
 
+@_schema_ensure
 def ensure_users_security_stamp_column():
     """Oturum geçersiz kılma — users.security_stamp (R2.5-S1, public şema)."""
     execute("ALTER TABLE public.users ADD COLUMN IF NOT EXISTS security_stamp TEXT")
@@ -2473,6 +3124,7 @@ def ensure_users_security_stamp_column():
         print(f"users.security_stamp NOT NULL: {e}")
 
 
+@_schema_ensure
 def ensure_pricing_tables():
     """Platform fiyatlandırması: yalnız public.pricing_*.
 
@@ -2688,6 +3340,1368 @@ def _seed_pricing_tr() -> None:
     )
 
 
+@_schema_ensure
+def ensure_musteri_aylik_grid_cache_table():
+    """Aylık grid payload önbelleği (giriş sözleşme sekmesi)."""
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS musteri_aylik_grid_cache (
+            musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+            payload TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+@_schema_ensure
+def ensure_musteri_reel_donem_tutar_table():
+    """Reel dönem (yıl) tutarları + giriş/hibrit kolonları."""
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS musteri_reel_donem_tutar (
+            musteri_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+            donem_yil INTEGER NOT NULL,
+            tutar_kdv_dahil NUMERIC(14, 2) NOT NULL,
+            giris_tip TEXT,
+            giris_tutar NUMERIC(14, 2),
+            hibrit_toplam NUMERIC(14, 2),
+            hibrit_net NUMERIC(14, 2),
+            hibrit_banka NUMERIC(14, 2),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (musteri_id, donem_yil)
+        )
+        """
+    )
+    for col_sql in (
+        "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS giris_tip TEXT",
+        "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS giris_tutar NUMERIC(14, 2)",
+        "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_toplam NUMERIC(14, 2)",
+        "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_net NUMERIC(14, 2)",
+        "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_banka NUMERIC(14, 2)",
+    ):
+        try:
+            execute(col_sql)
+        except Exception:
+            pass
+
+
+@_schema_ensure
+def ensure_musteri_tahsilat_panel_detay_table():
+    """Tahsilat paneli ay detayı (by_iso JSON)."""
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS musteri_tahsilat_panel_detay (
+            musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+            by_iso TEXT NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+@_schema_ensure
+def ensure_tahsilatlar_tahsil_eden_column():
+    """tahsilatlar.tahsil_eden (makbuz / tahsilat raporu)."""
+    ensure_tahsilatlar_columns()
+    execute("ALTER TABLE tahsilatlar ADD COLUMN IF NOT EXISTS tahsil_eden TEXT")
+
+
+@_schema_ensure
+def ensure_tahsilatlar_banka_referans_no():
+    """tahsilatlar.banka_referans_no (Akbank / TF import)."""
+    execute("ALTER TABLE tahsilatlar ADD COLUMN IF NOT EXISTS banka_referans_no TEXT")
+
+
+@_schema_ensure
+def ensure_akbank_import_dosyalar_table():
+    """Yüklenen Akbank Excel dosyalarını ERP içinde saklar."""
+    try:
+        execute(
+            """
+            CREATE TABLE IF NOT EXISTS akbank_import_dosyalar (
+                id SERIAL PRIMARY KEY,
+                ad_gosterim TEXT NOT NULL UNIQUE,
+                orijinal_filename TEXT,
+                yuklenme_tarihi TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                excel_binary BYTEA NOT NULL
+            )
+            """
+        )
+    except Exception:
+        pass
+    try:
+        execute(
+            "CREATE INDEX IF NOT EXISTS ix_akbank_import_dosyalar_yuklenme ON akbank_import_dosyalar (yuklenme_tarihi DESC)"
+        )
+    except Exception:
+        pass
+    try:
+        execute(
+            "CREATE INDEX IF NOT EXISTS ix_akbank_import_excel_binary_hash ON akbank_import_dosyalar USING hash (excel_binary)"
+        )
+    except Exception:
+        pass
+
+
+@_schema_ensure
+def ensure_akbank_dekont_musteri_map_table():
+    """Manuel seçilen dekont gönderici anahtarı → müşteri (sonraki Excel analizlerinde öncelik)."""
+    try:
+        execute(
+            """
+            CREATE TABLE IF NOT EXISTS akbank_dekont_musteri_map (
+                sender_key TEXT PRIMARY KEY,
+                musteri_id INTEGER NOT NULL,
+                ornek_aciklama TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+    except Exception:
+        pass
+    try:
+        execute(
+            "CREATE INDEX IF NOT EXISTS ix_akbank_dekont_map_musteri ON akbank_dekont_musteri_map (musteri_id)"
+        )
+    except Exception:
+        pass
+
+
+@_schema_ensure
+def ensure_whatsapp_geciken_haric_table():
+    """WhatsApp geciken listesinden hariç tutulan müşteriler."""
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS whatsapp_geciken_haric (
+            musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+@_schema_ensure
+def ensure_urunler_kdv_column():
+    """urunler.kdv_orani (varsayılan %20)."""
+    execute("ALTER TABLE urunler ADD COLUMN IF NOT EXISTS kdv_orani INTEGER DEFAULT 20")
+
+
+@_schema_ensure
+def ensure_dashboard_kisayol_tables():
+    """Dashboard kısayol slotları (+ varsayılanlar) ve kullanıcı bazlı override tablosu."""
+    try:
+        execute("""
+            CREATE TABLE IF NOT EXISTS dashboard_kisayollar (
+                slot_key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                url TEXT,
+                icon TEXT NOT NULL,
+                sira INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """)
+        # URL'ler url_for ile çözülmüş path'ler:
+        # faturalar.yeni_fatura -> /faturalar/yeni
+        # tahsilat.index -> /tahsilat/
+        # randevu.panel -> /randevu/panel
+        # sira: yeni_fatura/yeni_tahsilat sidebar'da mevcut dinamik kutulardan önce;
+        # randevu kart satırına (cards-slot) gider.
+        defaults = [
+            ("yeni_fatura", "Yeni Fatura", "/faturalar/yeni", "fa-file-invoice", 0),
+            ("yeni_tahsilat", "Yeni Tahsilat", "/tahsilat/", "fa-money-bill-wave", 1),
+            ("randevu", "Randevu", "/randevu/panel", "fa-calendar", 0),
+            ("tediye", "Tediye", "/giris/?tab=11", "fa-hand-holding-dollar", 1),
+            ("musteri_ekle_1", "Müşteri Ekle", "/musteriler/ekle", "fa-user-plus", 2),
+            ("musteri_listesi", "Müşteri Listesi", "/musteriler/list", "fa-list", 3),
+            ("musteri_ekle_2", "Müşteri Ekle", "/musteriler/ekle", "fa-user-plus", 4),
+            ("toplu_whatsapp", "Toplu WhatsApp", "/musteriler/list?filtre=whatsapp", "fa-whatsapp", 5),
+            ("toplu_faturalama", "Toplu Faturalama", "/faturalar/", "fa-file-invoice", 6),
+            ("tufe_senaryosu", "TÜFE Senaryosu", "/tufe/", "fa-chart-line", 7),
+            ("geri_donus", "Geri Dönüş", None, "fa-clock-o", 8),
+            # İstatistik kartları (Aşama 3) — sira 100+; UI dash-stat-wrap ile bağlanır
+            ("stat_bugun_kargo", "📦 Bugün Gelen Kargolar", "/dashboard/?filtre=kargo", "fa-truck", 100),
+            ("stat_geciken_toplam", "💰 Geciken Toplam Alacak", "/dashboard/?filtre=kritik", "fa-money-bill", 101),
+            ("stat_kritik", "⚠ Kritik Geciken (30+ gün)", "/dashboard/?filtre=kritik", "fa-exclamation-triangle", 102),
+            ("stat_yakin", "⏳ Yakın Geciken (1–30 gün)", "/dashboard/?filtre=yakin", "fa-hourglass-half", 103),
+            ("stat_bugun_tahsilat", "✅ Bugün Beklenen Tahsilat", "/tahsilat/", "fa-hand-holding-usd", 104),
+            ("stat_tufe", "📈 TÜFE Güncel / Oran", "/tufe/", "fa-chart-line", 105),
+            ("stat_sozlesme", "📅 Sözleşmesi Bitecekler", "/dashboard/?filtre=sozlesme", "fa-calendar", 106),
+            ("stat_bos", "🏢 Boş Ofis", "/dashboard/?filtre=bos", "fa-building", 107),
+            # Filtre butonları — url daima NULL; data-filtre HTML'de sabit kalır
+            ("filtre_tumu", "Tümü", None, "fa-th-large", 50),
+            ("filtre_bos", "Boş Ofisler", None, "fa-building", 51),
+            ("filtre_tam", "Ödemesi Tam", None, "fa-check-circle", 52),
+            ("filtre_sozlesme", "Sözleşme Bitiş Yakın", None, "fa-calendar", 53),
+            ("filtre_yakin", "Yakın Gecikme", None, "fa-hourglass-half", 54),
+            ("filtre_kritik", "Kritik Gecikme", None, "fa-exclamation-triangle", 55),
+            ("filtre_kargo", "Kargosu Bekleyen", None, "fa-truck", 56),
+        ]
+        for slot_key, label, url, icon, sira in defaults:
+            execute(
+                """
+                INSERT INTO dashboard_kisayollar (slot_key, label, url, icon, sira)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (slot_key) DO NOTHING
+                """,
+                (slot_key, label, url, icon, sira),
+            )
+        execute("""
+            CREATE TABLE IF NOT EXISTS dashboard_kisayollar_user (
+                user_id INTEGER NOT NULL,
+                slot_key TEXT NOT NULL,
+                label TEXT NULL,
+                url TEXT NULL,
+                icon TEXT NULL,
+                sira INTEGER NULL,
+                gorunur_mu BOOLEAN NOT NULL DEFAULT TRUE,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (user_id, slot_key)
+            )
+        """)
+    except Exception as e:
+        print(f"dashboard_kisayollar: {e}")
+
+
+@_schema_ensure
+def ensure_bo_jobs_table():
+    """Arka plan iş kuyruğu — public.bo_jobs (tüm kiracılar tek tablo; bkz. services/job_queue)."""
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS public.bo_jobs (
+            id               BIGSERIAL PRIMARY KEY,
+            kind             TEXT NOT NULL,
+            tenant_schema    TEXT,
+            params           JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status           TEXT NOT NULL DEFAULT 'queued',
+            progress_done    INTEGER NOT NULL DEFAULT 0,
+            progress_total   INTEGER,
+            mesaj            TEXT,
+            result           JSONB,
+            error            TEXT,
+            attempts         INTEGER NOT NULL DEFAULT 0,
+            max_attempts     INTEGER NOT NULL DEFAULT 1,
+            cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+            dedupe_key       TEXT,
+            created_by       INTEGER,
+            worker           TEXT,
+            run_after        TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            started_at       TIMESTAMPTZ,
+            heartbeat_at     TIMESTAMPTZ,
+            finished_at      TIMESTAMPTZ,
+            CONSTRAINT bo_jobs_status_ok CHECK (
+                status IN ('queued', 'running', 'done', 'failed', 'cancelled')
+            )
+        )
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS bo_jobs_queued_idx
+        ON public.bo_jobs (run_after, id)
+        WHERE status = 'queued'
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS bo_jobs_running_tenant_idx
+        ON public.bo_jobs (tenant_schema)
+        WHERE status = 'running'
+        """
+    )
+    execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS bo_jobs_dedupe_queued_uq
+        ON public.bo_jobs (COALESCE(tenant_schema, ''), kind, dedupe_key)
+        WHERE status = 'queued' AND dedupe_key IS NOT NULL
+        """
+    )
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS bo_jobs_tenant_created_idx
+        ON public.bo_jobs (COALESCE(tenant_schema, ''), created_at DESC)
+        """
+    )
+
+
+# Müşteri veri sürümü: grid girdisi olan tablolar (tablo, id kolonları, UPDATE WHEN koşulu,
+# UPDATE OF kolonları). customers yalnız kapanış/durum — bakiye trigger'ının
+# current_balance yazımı sürüm artırmaz.
+_MUSTERI_DATA_VERSION_TRIGGERS = (
+    ("tahsilatlar", ("musteri_id", "customer_id"), "OLD.* IS DISTINCT FROM NEW.*", None),
+    ("musteri_reel_donem_tutar", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    (
+        "musteri_tahsilat_panel_detay",
+        ("musteri_id",),
+        "OLD.by_iso IS DISTINCT FROM NEW.by_iso OR OLD.musteri_id IS DISTINCT FROM NEW.musteri_id",
+        None,
+    ),
+    ("musteri_kyc", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    (
+        "customers",
+        ("id",),
+        "OLD.kapanis_tarihi IS DISTINCT FROM NEW.kapanis_tarihi"
+        " OR OLD.kapanis_sonrasi_borc_ay IS DISTINCT FROM NEW.kapanis_sonrasi_borc_ay"
+        " OR OLD.durum IS DISTINCT FROM NEW.durum",
+        ("kapanis_tarihi", "kapanis_sonrasi_borc_ay", "durum"),
+    ),
+)
+
+
+def _musteri_data_version_trigger_sql(tanimlar) -> list[str]:
+    """Trigger tanımlarından DROP/CREATE TRIGGER ifadeleri (fn_musteri_data_version_bump)."""
+    parcalar = []
+    for tablo, kolonlar, kosul, upd_kolonlar in tanimlar:
+        argv = ", ".join(f"'{k}'" for k in kolonlar)
+        upd = f"UPDATE OF {', '.join(upd_kolonlar)}" if upd_kolonlar else "UPDATE"
+        if tablo != "customers":
+            parcalar.append(
+                f"""
+                DROP TRIGGER IF EXISTS trg_{tablo}_data_version ON {tablo};
+                CREATE TRIGGER trg_{tablo}_data_version
+                AFTER INSERT OR DELETE ON {tablo}
+                FOR EACH ROW EXECUTE FUNCTION fn_musteri_data_version_bump({argv});
+                """
+            )
+        parcalar.append(
+            f"""
+            DROP TRIGGER IF EXISTS trg_{tablo}_data_version_upd ON {tablo};
+            CREATE TRIGGER trg_{tablo}_data_version_upd
+            AFTER {upd} ON {tablo}
+            FOR EACH ROW WHEN ({kosul})
+            EXECUTE FUNCTION fn_musteri_data_version_bump({argv});
+            """
+        )
+    return parcalar
+
+
+@_schema_ensure
+def ensure_musteri_data_version():
+    """musteri_data_version: grid girdisi değişince trigger ile artan müşteri sayacı.
+
+    Aylık grid tazelik kontrolü bu satırı tek indeksli okumayla kıyaslar
+    (bkz. giris_routes._aylik_grid_freshness_fingerprint). Tablo, fonksiyon ve
+    trigger'lar tek transaction'da kurulur: tablo varsa trigger'lar da vardır.
+    """
+    ensure_musteri_reel_donem_tutar_table()
+    ensure_musteri_tahsilat_panel_detay_table()
+    parcalar = [
+        """
+        CREATE OR REPLACE FUNCTION fn_musteri_data_version_bump()
+        RETURNS trigger AS $$
+        DECLARE
+            v_ids BIGINT[] := ARRAY[]::BIGINT[];
+            v_kol TEXT;
+        BEGIN
+            FOREACH v_kol IN ARRAY TG_ARGV LOOP
+                IF TG_OP <> 'DELETE' THEN
+                    v_ids := v_ids || (to_jsonb(NEW) ->> v_kol)::BIGINT;
+                END IF;
+                IF TG_OP <> 'INSERT' THEN
+                    v_ids := v_ids || (to_jsonb(OLD) ->> v_kol)::BIGINT;
+                END IF;
+            END LOOP;
+            -- Kiracı şeması: trigger'ın bağlı olduğu tablonun şeması (search_path'e bakılmaz)
+            EXECUTE 'INSERT INTO ' || quote_ident(TG_TABLE_SCHEMA) || '.musteri_data_version AS v
+                     (musteri_id, version, updated_at)
+                     SELECT DISTINCT x, 1, NOW() FROM unnest($1) AS x WHERE x > 0 ORDER BY x
+                     ON CONFLICT (musteri_id) DO UPDATE
+                     SET version = v.version + 1, updated_at = NOW()'
+            USING v_ids;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    ]
+    parcalar.extend(_musteri_data_version_trigger_sql(_MUSTERI_DATA_VERSION_TRIGGERS))
+    parcalar.append(
+        """
+        CREATE TABLE IF NOT EXISTS musteri_data_version (
+            musteri_id BIGINT PRIMARY KEY,
+            version    BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        """
+    )
+    execute("\n".join(parcalar))
+
+
+# Kart uçlarının (ETag) okuduğu ek tablolar. customers UPDATE trigger'ı tam satıra
+# genişler; bakiye trigger'ının yazdığı current_balance hariç.
+_MUSTERI_DATA_VERSION_KART_TRIGGERS = (
+    ("faturalar", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    ("contracts", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    ("contract_installments", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    ("customer_financial_profile", ("musteri_id",), "OLD.* IS DISTINCT FROM NEW.*", None),
+    (
+        "customers",
+        ("id",),
+        "(to_jsonb(OLD) - 'current_balance') IS DISTINCT FROM (to_jsonb(NEW) - 'current_balance')",
+        None,
+    ),
+)
+
+
+@_schema_ensure
+def ensure_musteri_data_version_kart():
+    """musteri_data_version kapsamı: müşteri kartı / cari kart ETag'leri (fatura, sözleşme,
+    taksit, finansal profil, customers tam satır). Trigger'lar tek transaction'da kurulur."""
+    ensure_musteri_data_version()
+    ensure_contracts_engine()
+    ensure_customer_financial_profile()
+    execute("\n".join(_musteri_data_version_trigger_sql(_MUSTERI_DATA_VERSION_KART_TRIGGERS)))
+
+
+@_schema_ensure
+def ensure_musteri_ekstre_snapshot_table():
+    """Cari ekstre açılış durumu: müşteri × kapanmış ay (açılış bakiyesi, FIFO artığı, toplamlar).
+
+    imza girdilerin içerik özetidir; eşleşmeyen satır kullanılmaz (bkz. giris_routes
+    _ekstre_acilis_bakiyesi_snapshotli).
+    """
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS musteri_ekstre_snapshot (
+            musteri_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+            ay DATE NOT NULL,
+            imza TEXT NOT NULL,
+            acilis_bakiye NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            borc_toplam NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            alacak_toplam NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            fifo_durum TEXT NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (musteri_id, ay)
+        )
+        """
+    )
+
+
+# Grid payload'ından ay tutarları: senaryo 01 _firma_ozet_classify_borc_month ile aynı
+# kural (tutar boşsa brüt; 0 < tutar < 0,5 ve brüt ≈ 0 → placeholder). Ay başına en
+# büyük pozitif tutar + placeholder sayısı; payload'ın dizi kısmını alır (saf fonksiyon).
+_GRID_TUTAR_SAYI_RE = "^[-+]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][-+]?[0-9]+)?$"
+
+
+@_schema_ensure
+def ensure_musteri_aylik_grid_tutar():
+    """musteri_aylik_grid_tutar: grid cache'in müşteri × ay tutar sütun kopyası (senaryo 01).
+
+    musteri_aylik_grid_cache üzerindeki trigger her payload yazımında / silinmesinde
+    müşterinin satırlarını yeniden üretir; durum tablosu payload tipi ve compute_rev'i
+    tutar (rev uyumu okuma tarafında süzülür). Kurulum tek transaction'da; trigger'dan
+    önce yazılmış cache satırları aynı transaction'da doldurulur.
+    """
+    ensure_musteri_aylik_grid_cache_table()
+    execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS musteri_aylik_grid_tutar (
+            musteri_id INTEGER NOT NULL,
+            ay DATE NOT NULL,
+            tutar NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            placeholder_adet INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (musteri_id, ay)
+        );
+        CREATE INDEX IF NOT EXISTS idx_musteri_aylik_grid_tutar_ay
+            ON musteri_aylik_grid_tutar (ay, musteri_id);
+        CREATE TABLE IF NOT EXISTS musteri_aylik_grid_tutar_durum (
+            musteri_id INTEGER PRIMARY KEY,
+            payload_tipi TEXT NOT NULL,
+            compute_rev INTEGER,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        CREATE OR REPLACE FUNCTION fn_musteri_aylik_grid_tutar_aylar(p_aylar JSONB)
+        RETURNS TABLE (ay DATE, tutar NUMERIC, placeholder_adet INTEGER) AS $$
+            SELECT make_date(x.yil, x.ay, 1),
+                   COALESCE(MAX(ROUND(x.tut, 2)) FILTER (WHERE NOT x.ph AND ROUND(x.tut, 2) > 0), 0),
+                   (COUNT(*) FILTER (WHERE x.ph))::INTEGER
+            FROM (
+                SELECT CASE WHEN COALESCE(e->>'yil', '') ~ '^[0-9]{{4}}$' THEN (e->>'yil')::INTEGER END AS yil,
+                       CASE WHEN COALESCE(e->>'ay', '') ~ '^[0-9]{{1,2}}$' THEN (e->>'ay')::INTEGER END AS ay,
+                       n.tut,
+                       (n.tut > 0 AND n.tut < 0.5 AND n.brut <= 0.001) AS ph
+                FROM jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(p_aylar) = 'array' THEN p_aylar ELSE '[]'::jsonb END
+                ) AS e
+                CROSS JOIN LATERAL (
+                    SELECT COALESCE(NULLIF(btrim(e->>'tutar_kdv_dahil'), ''), e->>'brut_tutar_kdv') AS tut_s,
+                           e->>'brut_tutar_kdv' AS brut_s
+                ) s
+                CROSS JOIN LATERAL (
+                    SELECT CASE WHEN btrim(COALESCE(s.tut_s, '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                THEN btrim(s.tut_s)::NUMERIC ELSE 0 END AS tut,
+                           CASE WHEN btrim(COALESCE(s.brut_s, '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                THEN btrim(s.brut_s)::NUMERIC ELSE 0 END AS brut
+                ) n
+                WHERE jsonb_typeof(e) = 'object'
+            ) x
+            WHERE x.yil >= 1 AND x.ay BETWEEN 1 AND 12
+            GROUP BY x.yil, x.ay
+            HAVING MAX(ROUND(x.tut, 2)) FILTER (WHERE NOT x.ph) > 0 OR COUNT(*) FILTER (WHERE x.ph) > 0
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_aylik_grid_tutar_yaz(p_sema TEXT, p_mid BIGINT, p_payload TEXT)
+        RETURNS void AS $$
+        DECLARE
+            v_t TEXT := quote_ident(p_sema) || '.';
+            v_js JSONB;
+            v_tip TEXT;
+            v_rev INTEGER;
+        BEGIN
+            EXECUTE 'DELETE FROM ' || v_t || 'musteri_aylik_grid_tutar WHERE musteri_id = $1' USING p_mid;
+            IF p_payload IS NULL THEN
+                EXECUTE 'DELETE FROM ' || v_t || 'musteri_aylik_grid_tutar_durum WHERE musteri_id = $1' USING p_mid;
+                RETURN;
+            END IF;
+            BEGIN
+                v_js := p_payload::jsonb;
+            EXCEPTION WHEN others THEN
+                v_js := NULL;
+            END;
+            v_tip := COALESCE(jsonb_typeof(v_js), 'gecersiz');
+            IF v_tip = 'object' AND COALESCE(v_js->>'compute_rev', '') ~ '^[0-9]{{1,9}}$' THEN
+                v_rev := (v_js->>'compute_rev')::INTEGER;
+            END IF;
+            EXECUTE 'INSERT INTO ' || v_t || 'musteri_aylik_grid_tutar_durum AS d
+                     (musteri_id, payload_tipi, compute_rev, updated_at)
+                     VALUES ($1, $2, $3, NOW())
+                     ON CONFLICT (musteri_id) DO UPDATE
+                     SET payload_tipi = EXCLUDED.payload_tipi, compute_rev = EXCLUDED.compute_rev, updated_at = NOW()'
+            USING p_mid, v_tip, v_rev;
+            IF v_tip = 'object' THEN
+                v_js := v_js->'aylar';
+            END IF;
+            IF v_tip IN ('array', 'object') THEN
+                EXECUTE 'INSERT INTO ' || v_t || 'musteri_aylik_grid_tutar (musteri_id, ay, tutar, placeholder_adet)
+                         SELECT $1, a.ay, a.tutar, a.placeholder_adet
+                         FROM ' || v_t || 'fn_musteri_aylik_grid_tutar_aylar($2) AS a'
+                USING p_mid, v_js;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_aylik_grid_tutar_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM fn_musteri_aylik_grid_tutar_yaz(TG_TABLE_SCHEMA, OLD.musteri_id, NULL);
+            ELSE
+                PERFORM fn_musteri_aylik_grid_tutar_yaz(TG_TABLE_SCHEMA, NEW.musteri_id, NEW.payload);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_musteri_aylik_grid_tutar ON musteri_aylik_grid_cache;
+        CREATE TRIGGER trg_musteri_aylik_grid_tutar
+        AFTER INSERT OR DELETE OR UPDATE OF payload ON musteri_aylik_grid_cache
+        FOR EACH ROW EXECUTE FUNCTION fn_musteri_aylik_grid_tutar_sync();
+
+        SELECT fn_musteri_aylik_grid_tutar_yaz(current_schema(), c.musteri_id, c.payload)
+        FROM musteri_aylik_grid_cache c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM musteri_aylik_grid_tutar_durum d WHERE d.musteri_id = c.musteri_id
+        );
+        """
+    )
+
+
+# Tahsilat açıklamasındaki ay marker'ları: |AYLIK_TAH|YYYY-AA-GG| (gevşek YYYY-A-G yazımı
+# da eşleşir) ve |AYLIK_PAY|YYYY-AA-GG=tutar|.
+_TAHSILAT_AY_TAH_RE = "[|]AYLIK_TAH[|]([0-9]{4}-[0-9]{1,2}-[0-9]{1,2})[|]"
+_TAHSILAT_AY_PAY_RE = "[|]AYLIK_PAY[|]([0-9]{4}-[0-9]{2}-[0-9]{2})=([0-9]+(?:[.][0-9]+)?)[|]"
+
+
+@_schema_ensure
+def ensure_tahsilat_ay_dagitim():
+    """tahsilat_ay_dagitim: tahsilat açıklamasındaki ay marker'larının satır kopyası.
+
+    tur='tah' → |AYLIK_TAH| (tutar = tahsilat tutarı), tur='pay' → |AYLIK_PAY| (ayın payı; 0 da yazılır).
+    gun_metin marker'daki tarih metnidir (LIKE aramasıyla birebir); ay geçerli tarihin ayın 1'i.
+    musteri_id hem musteri_id hem customer_id için yazılır (tekil sorgulardaki OR ile aynı küme).
+    Satırlar tahsilatlar trigger'ıyla üretilir — tüm yazıcılar (route, script, import) kapsanır.
+    Tablo ilk kurulduğunda mevcut tahsilatlar aynı transaction'da doldurulur.
+    """
+    ensure_tahsilatlar_columns()
+    execute(
+        f"""
+        CREATE OR REPLACE FUNCTION fn_tahsilat_marker_ay(p_gun TEXT)
+        RETURNS DATE AS $$
+            SELECT CASE
+                WHEN split_part(p_gun, '-', 1)::INTEGER >= 1
+                     AND split_part(p_gun, '-', 2)::INTEGER BETWEEN 1 AND 12
+                THEN CASE
+                    WHEN split_part(p_gun, '-', 3)::INTEGER BETWEEN 1 AND EXTRACT(DAY FROM (
+                        make_date(split_part(p_gun, '-', 1)::INTEGER, split_part(p_gun, '-', 2)::INTEGER, 1)
+                        + INTERVAL '1 month - 1 day'))::INTEGER
+                    THEN make_date(split_part(p_gun, '-', 1)::INTEGER, split_part(p_gun, '-', 2)::INTEGER, 1)
+                END
+            END
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION fn_tahsilat_ay_dagitim_satirlar(p_aciklama TEXT, p_tutar NUMERIC)
+        RETURNS TABLE (tur TEXT, gun_metin TEXT, ay DATE, tutar NUMERIC) AS $$
+            SELECT 'tah', m.g, fn_tahsilat_marker_ay(m.g), COALESCE(p_tutar, 0)
+            FROM (
+                SELECT DISTINCT r[1] AS g
+                FROM regexp_matches(COALESCE(p_aciklama, ''), '{_TAHSILAT_AY_TAH_RE}', 'g') AS r
+            ) m
+            UNION ALL
+            SELECT 'pay', p.g, fn_tahsilat_marker_ay(p.g), SUM(p.v)
+            FROM (
+                SELECT r[1] AS g, ROUND(r[2]::NUMERIC, 2) AS v
+                FROM regexp_matches(COALESCE(p_aciklama, ''), '{_TAHSILAT_AY_PAY_RE}', 'g') AS r
+            ) p
+            GROUP BY p.g
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION fn_tahsilat_ay_dagitim_sync()
+        RETURNS trigger AS $$
+        DECLARE
+            v_t TEXT;
+        BEGIN
+            v_t := quote_ident(TG_TABLE_SCHEMA) || '.';
+            IF TG_OP = 'UPDATE' THEN
+                EXECUTE 'DELETE FROM ' || v_t || 'tahsilat_ay_dagitim WHERE tahsilat_id = $1' USING OLD.id;
+            END IF;
+            IF strpos(COALESCE(NEW.aciklama, ''), '|AYLIK_') > 0 THEN
+                EXECUTE 'INSERT INTO ' || v_t || 'tahsilat_ay_dagitim
+                         (tahsilat_id, musteri_id, tur, gun_metin, ay, tutar)
+                         SELECT $1, m.mid, s.tur, s.gun_metin, s.ay, s.tutar
+                         FROM ' || v_t || 'fn_tahsilat_ay_dagitim_satirlar($2, $3) AS s
+                         CROSS JOIN (SELECT DISTINCT x AS mid FROM unnest(ARRAY[$4, $5]) AS x WHERE x > 0) m'
+                USING NEW.id, NEW.aciklama, NEW.tutar, NEW.musteri_id, NEW.customer_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DO $$
+        DECLARE
+            v_yeni BOOLEAN := to_regclass('tahsilat_ay_dagitim') IS NULL;
+        BEGIN
+            CREATE TABLE IF NOT EXISTS tahsilat_ay_dagitim (
+                tahsilat_id INTEGER NOT NULL REFERENCES tahsilatlar(id) ON DELETE CASCADE,
+                musteri_id INTEGER NOT NULL,
+                tur TEXT NOT NULL,
+                gun_metin TEXT NOT NULL,
+                ay DATE,
+                tutar NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (tahsilat_id, musteri_id, tur, gun_metin)
+            );
+            CREATE INDEX IF NOT EXISTS idx_tahsilat_ay_dagitim_musteri_ay
+                ON tahsilat_ay_dagitim (musteri_id, ay);
+
+            DROP TRIGGER IF EXISTS trg_tahsilat_ay_dagitim ON tahsilatlar;
+            CREATE TRIGGER trg_tahsilat_ay_dagitim
+            AFTER INSERT OR UPDATE OF aciklama, tutar, musteri_id, customer_id ON tahsilatlar
+            FOR EACH ROW EXECUTE FUNCTION fn_tahsilat_ay_dagitim_sync();
+
+            IF v_yeni THEN
+                INSERT INTO tahsilat_ay_dagitim (tahsilat_id, musteri_id, tur, gun_metin, ay, tutar)
+                SELECT t.id, m.mid, s.tur, s.gun_metin, s.ay, s.tutar
+                FROM tahsilatlar t
+                CROSS JOIN LATERAL fn_tahsilat_ay_dagitim_satirlar(t.aciklama, t.tutar) AS s
+                CROSS JOIN LATERAL (
+                    SELECT DISTINCT x AS mid FROM unnest(ARRAY[t.musteri_id, t.customer_id]) AS x WHERE x > 0
+                ) m
+                WHERE strpos(COALESCE(t.aciklama, ''), '|AYLIK_') > 0;
+            END IF;
+        END
+        $$;
+        """
+    )
+
+
+@_schema_ensure
+def ensure_faturalar_not_durum_kolonlari():
+    """faturalar: notlar etiketlerinden üretilmiş (STORED) durum sütunları + kısmi indeksler.
+
+    gib_taslak / erp_taslak / gib_imzali / gib_no_tasindi — ifadeler sql_expr_fatura_*
+    regex'lerinin aynısı; PG her yazımda hesaplar, ADD COLUMN mevcut satırları doldurur
+    (tek ALTER → tek tablo yeniden yazımı).
+    """
+    ekle = ",\n            ".join(
+        f"ADD COLUMN IF NOT EXISTS {ad} BOOLEAN GENERATED ALWAYS AS ({ifade('notlar')}) STORED"
+        for ad, ifade in FATURA_NOT_DURUM_SUTUNLARI
+    )
+    execute(
+        f"""
+        ALTER TABLE faturalar
+            {ekle};
+        CREATE INDEX IF NOT EXISTS idx_faturalar_taslak_musteri
+            ON faturalar (musteri_id) WHERE gib_taslak OR erp_taslak;
+        CREATE INDEX IF NOT EXISTS idx_faturalar_erp_taslak_tarih
+            ON faturalar (fatura_tarihi) WHERE erp_taslak;
+        CREATE INDEX IF NOT EXISTS idx_faturalar_gib_imzali_tarih
+            ON faturalar (fatura_tarihi) WHERE gib_imzali;
+        CREATE INDEX IF NOT EXISTS idx_faturalar_gib_no_tasindi_musteri
+            ON faturalar (musteri_id) WHERE gib_no_tasindi;
+        CREATE INDEX IF NOT EXISTS idx_faturalar_kesin_musteri_tarih
+            ON faturalar (musteri_id, fatura_tarihi)
+            WHERE NOT (gib_taslak OR erp_taslak) AND NOT gib_no_tasindi;
+        """
+    )
+
+
+def fatura_not_durum_farklari() -> dict:
+    """Doğrulama: durum sütunu ile notlar regex'inin ayrıştığı fatura sayısı (sütun başına; hepsi 0 beklenir)."""
+    secim = ", ".join(
+        f"COUNT(*) FILTER (WHERE {ad} IS DISTINCT FROM ({ifade('notlar')})) AS {ad}"
+        for ad, ifade in FATURA_NOT_DURUM_SUTUNLARI
+    )
+    row = fetch_one(f"SELECT COUNT(*) AS toplam, {secim} FROM faturalar") or {}
+    return {k: int(v or 0) for k, v in row.items()}
+
+
+# Müşteri arama belgesi (utils/musteri_arama.py): alanlar Türkçe fold + küçük harf, chr(31)
+# ayraçlı tek metin — LIKE '%q%' alan sınırını aşmaz (sorgu chr(31) içermez).
+_ARAMA_FOLD_FROM = "\u0130I\u0131\u015E\u015F\u011E\u011F\u00DC\u00FC\u00D6\u00F6\u00C7\u00E7"
+_ARAMA_FOLD_TO = "iiissgguuoocc"
+# customers: çekirdek (ad) alanları + geniş arama alanları
+MUSTERI_ARAMA_AD_ALANLARI = ("name", "musteri_adi", "yetkili_kisi")
+MUSTERI_ARAMA_CUST_ALANLARI = MUSTERI_ARAMA_AD_ALANLARI + (
+    "tax_number", "office_code", "vergi_dairesi", "address", "ev_adres", "phone", "phone2",
+    "email", "yetkili_tcno", "musteri_no", "hizmet_turu", "notes",
+)
+MUSTERI_ARAMA_KYC_ALANLARI = (
+    "musteri_adi", "vergi_dairesi", "yeni_adres", "yetkili_ikametgah", "yetkili_adsoyad",
+    "yetkili_tcno", "yetkili_tel", "yetkili_tel2", "yetkili_email", "email", "sirket_unvani",
+    "unvan", "vergi_no", "faaliyet_konusu", "hizmet_turu", "notlar",
+)
+
+
+def _arama_fold(expr: str) -> str:
+    return (
+        f"NULLIF(lower(translate(TRIM(COALESCE({expr}::text, '')), "
+        f"'{_ARAMA_FOLD_FROM}', '{_ARAMA_FOLD_TO}')), '')"
+    )
+
+
+def _arama_rakam(expr: str) -> str:
+    return f"NULLIF(regexp_replace(TRIM(COALESCE({expr}, '')), '[^0-9]', '', 'g'), '')"
+
+
+def _arama_eposta(expr: str) -> str:
+    return f"NULLIF(regexp_replace(lower(TRIM(COALESCE({expr}, ''))), '[[:space:]]+', '', 'g'), '')"
+
+
+@_schema_ensure
+def ensure_musteri_arama_belge():
+    """musteri_arama_belge: müşteri başına aranabilir belge (geniş arama tek indeksli tabloya).
+
+    ad: ünvan / müşteri adı / yetkili + KYC müşteri adları; metin: geniş aramanın tüm alanları
+    (customers + tüm KYC satırları); rakam: telefonların rakamları (boşluk ayraçlı);
+    eposta: boşluksuz küçük harf e-postalar. customers / musteri_kyc trigger'ları müşterinin
+    satırını yeniden yazar; tablo ilk kurulduğunda aynı transaction'da doldurulur.
+    pg_trgm varsa ad / metin / rakam / eposta GIN trigram indeksli (LIKE '%q%' indeks kullanır).
+    """
+    ensure_customers_musteri_adi()
+    ensure_customers_musteri_no()
+    ensure_customers_notes()
+    ensure_customers_excel_columns()
+    ensure_customers_cari_columns()
+    ensure_musteri_kyc_columns()
+    ensure_musteri_kyc_arama_kolonlari()
+    ayr = "chr(31)"
+    c_ad = ", ".join(_arama_fold(f"c.{k}") for k in MUSTERI_ARAMA_AD_ALANLARI)
+    c_metin = ", ".join(_arama_fold(f"c.{k}") for k in MUSTERI_ARAMA_CUST_ALANLARI)
+    k_metin = ", ".join(_arama_fold(f"mk.{k}") for k in MUSTERI_ARAMA_KYC_ALANLARI)
+    yaz_sql = f"""
+        INSERT INTO @S@musteri_arama_belge AS b (musteri_id, ad, metin, rakam, eposta, updated_at)
+        SELECT c.id,
+               concat_ws({ayr}, {c_ad}, k.ad),
+               concat_ws({ayr}, {c_metin}, k.metin),
+               concat_ws(' ', {_arama_rakam("c.phone")}, {_arama_rakam("c.phone2")}, k.rakam),
+               concat_ws({ayr}, {_arama_eposta("c.email")}, k.eposta),
+               NOW()
+        FROM @S@customers c
+        LEFT JOIN LATERAL (
+            SELECT string_agg({_arama_fold("mk.musteri_adi")}, {ayr}) AS ad,
+                   string_agg(concat_ws({ayr}, {k_metin}), {ayr}) AS metin,
+                   string_agg(concat_ws(' ', {_arama_rakam("mk.yetkili_tel")}, {_arama_rakam("mk.yetkili_tel2")}), ' ') AS rakam,
+                   string_agg(concat_ws({ayr}, {_arama_eposta("mk.yetkili_email")}, {_arama_eposta("mk.email")}), {ayr}) AS eposta
+            FROM @S@musteri_kyc mk
+            WHERE mk.musteri_id = c.id
+        ) k ON TRUE
+        WHERE c.id = ANY($1)
+        ON CONFLICT (musteri_id) DO UPDATE
+        SET ad = EXCLUDED.ad, metin = EXCLUDED.metin, rakam = EXCLUDED.rakam,
+            eposta = EXCLUDED.eposta, updated_at = NOW()
+    """
+    cust_kolonlar = ", ".join(MUSTERI_ARAMA_CUST_ALANLARI)
+    execute(
+        f"""
+        CREATE OR REPLACE FUNCTION fn_musteri_arama_belge_yaz(p_sema TEXT, p_mids INTEGER[])
+        RETURNS void AS $$
+        BEGIN
+            EXECUTE replace($q${yaz_sql}$q$, '@S@', quote_ident(p_sema) || '.') USING p_mids;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_arama_belge_customers_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM fn_musteri_arama_belge_yaz(TG_TABLE_SCHEMA, ARRAY[NEW.id]);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_arama_belge_kyc_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM fn_musteri_arama_belge_yaz(TG_TABLE_SCHEMA, ARRAY[NEW.musteri_id]);
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM fn_musteri_arama_belge_yaz(TG_TABLE_SCHEMA, ARRAY[OLD.musteri_id]);
+            ELSE
+                PERFORM fn_musteri_arama_belge_yaz(TG_TABLE_SCHEMA, ARRAY[OLD.musteri_id, NEW.musteri_id]);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DO $$
+        DECLARE
+            v_yeni BOOLEAN := to_regclass('musteri_arama_belge') IS NULL;
+        BEGIN
+            CREATE TABLE IF NOT EXISTS musteri_arama_belge (
+                musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+                ad TEXT NOT NULL DEFAULT '',
+                metin TEXT NOT NULL DEFAULT '',
+                rakam TEXT NOT NULL DEFAULT '',
+                eposta TEXT NOT NULL DEFAULT '',
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+
+            DROP TRIGGER IF EXISTS trg_musteri_arama_belge ON customers;
+            CREATE TRIGGER trg_musteri_arama_belge
+            AFTER INSERT OR UPDATE OF {cust_kolonlar} ON customers
+            FOR EACH ROW EXECUTE FUNCTION fn_musteri_arama_belge_customers_sync();
+
+            DROP TRIGGER IF EXISTS trg_musteri_arama_belge ON musteri_kyc;
+            CREATE TRIGGER trg_musteri_arama_belge
+            AFTER INSERT OR UPDATE OR DELETE ON musteri_kyc
+            FOR EACH ROW EXECUTE FUNCTION fn_musteri_arama_belge_kyc_sync();
+
+            IF v_yeni THEN
+                PERFORM fn_musteri_arama_belge_yaz(current_schema(), ARRAY(SELECT id FROM customers));
+            END IF;
+        END
+        $$;
+        """
+    )
+    # pg_trgm: yetki yoksa / eklenti kurulamıyorsa tablo indekssiz de çalışır (dar tablo taraması).
+    try:
+        with istege_bagli_ddl():
+            execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        logger.info("pg_trgm kurulamadı: %s", e)
+    row = fetch_one(
+        "SELECT n.nspname FROM pg_opclass o "
+        "JOIN pg_namespace n ON n.oid = o.opcnamespace "
+        "JOIN pg_am a ON a.oid = o.opcmethod "
+        "WHERE o.opcname = 'gin_trgm_ops' AND a.amname = 'gin' LIMIT 1"
+    )
+    if not row:
+        return
+    ops = '"' + str(row["nspname"]).replace('"', '""') + '".gin_trgm_ops'
+    for kolon in ("ad", "metin", "rakam", "eposta"):
+        execute(
+            f"CREATE INDEX IF NOT EXISTS idx_musteri_arama_belge_{kolon}_trgm "
+            f"ON musteri_arama_belge USING gin ({kolon} {ops})"
+        )
+
+
+# Firma özet borç kuralı (giris_routes._firma_ozet_ozet_from_grid_cache_payload): referans aya
+# kadar tahsil edilmemiş / kısmi ayların kalanı; AYLIK_GRID_TAM_ODENDI_TOLERANS altı sayılmaz.
+_BORC_OZET_TOLERANS = "0.05"
+
+
+@_schema_ensure
+def ensure_musteri_borc_ozet():
+    """musteri_borc_ozet: müşteri × referans ay borç özeti (firma özet raporu).
+
+    Her grid payload ayı için o aya kadar birikmiş toplam borç + geciken ay, ayın borç hücresi
+    (placeholder işaretli) ve güncel kira (musteri_aylik_grid_tutar kuralı). Referans ay R için
+    ``ay <= R`` olan son satır okunur (R payload'da yoksa borç hücresi / güncel 0). Durum
+    tablosu compute_rev ve "tahsilat bilgili object payload" bayrağını tutar; okuma tarafı
+    güncel rev ile süzer. musteri_aylik_grid_cache trigger'ı tüm yazımlarda yeniden üretir.
+    """
+    ensure_musteri_aylik_grid_tutar()
+    tol = _BORC_OZET_TOLERANS
+    execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS musteri_borc_ozet (
+            musteri_id INTEGER NOT NULL,
+            ay DATE NOT NULL,
+            toplam_borc NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            geciken_ay INTEGER NOT NULL DEFAULT 0,
+            borc_month NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            borc_month_placeholder BOOLEAN NOT NULL DEFAULT FALSE,
+            guncel_kira NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (musteri_id, ay)
+        );
+        CREATE TABLE IF NOT EXISTS musteri_borc_ozet_durum (
+            musteri_id INTEGER PRIMARY KEY,
+            compute_rev INTEGER,
+            kullanilabilir BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        CREATE OR REPLACE FUNCTION fn_borc_ozet_dogru(p JSONB)
+        RETURNS BOOLEAN AS $$
+            SELECT CASE jsonb_typeof(p)
+                WHEN 'boolean' THEN p = 'true'::jsonb
+                WHEN 'number' THEN (p #>> '{{}}')::NUMERIC <> 0
+                WHEN 'string' THEN (p #>> '{{}}') <> ''
+                WHEN 'array' THEN jsonb_array_length(p) > 0
+                WHEN 'object' THEN p <> '{{}}'::jsonb
+                ELSE FALSE
+            END
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_borc_ozet_aylar(p_aylar JSONB)
+        RETURNS TABLE (
+            ay DATE, toplam_borc NUMERIC, geciken_ay INTEGER,
+            borc_month NUMERIC, borc_month_placeholder BOOLEAN
+        ) AS $$
+            WITH e AS (
+                SELECT make_date(x.yil, x.ay, 1) AS ay, x.sira, x.tut, x.brut,
+                       CASE
+                           WHEN x.kismi THEN LEAST(x.tut, GREATEST(x.kalan, 0))
+                           WHEN NOT x.tahsil THEN x.tut
+                       END AS ekle
+                FROM (
+                    SELECT CASE WHEN COALESCE(o.e->>'yil', '') ~ '^[0-9]{{4}}$' THEN (o.e->>'yil')::INTEGER END AS yil,
+                           CASE WHEN COALESCE(o.e->>'ay', '') ~ '^[0-9]{{1,2}}$' THEN (o.e->>'ay')::INTEGER END AS ay,
+                           o.sira,
+                           COALESCE(NULLIF(n.tutar, 0), NULLIF(n.brut, 0), 0) AS tut,
+                           COALESCE(n.brut, 0) AS brut,
+                           COALESCE(n.kalan, 0) AS kalan,
+                           fn_borc_ozet_dogru(o.e->'tahsil_edildi') AS tahsil,
+                           fn_borc_ozet_dogru(o.e->'kismi_tahsilat')
+                               OR (COALESCE(n.odenen, 0) > {tol} AND COALESCE(n.kalan, 0) > {tol}) AS kismi
+                    FROM jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(p_aylar) = 'array' THEN p_aylar ELSE '[]'::jsonb END
+                    ) WITH ORDINALITY AS o(e, sira)
+                    CROSS JOIN LATERAL (
+                        SELECT CASE WHEN btrim(COALESCE(o.e->>'tutar_kdv_dahil', '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                    THEN btrim(o.e->>'tutar_kdv_dahil')::NUMERIC END AS tutar,
+                               CASE WHEN btrim(COALESCE(o.e->>'brut_tutar_kdv', '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                    THEN btrim(o.e->>'brut_tutar_kdv')::NUMERIC END AS brut,
+                               CASE WHEN btrim(COALESCE(o.e->>'kalan_tutar_kdv', '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                    THEN btrim(o.e->>'kalan_tutar_kdv')::NUMERIC END AS kalan,
+                               CASE WHEN btrim(COALESCE(o.e->>'odenen_tutar_kdv', '')) ~ '{_GRID_TUTAR_SAYI_RE}'
+                                    THEN btrim(o.e->>'odenen_tutar_kdv')::NUMERIC END AS odenen
+                    ) n
+                    WHERE jsonb_typeof(o.e) = 'object'
+                ) x
+                WHERE x.yil >= 1 AND x.ay BETWEEN 1 AND 12
+            ),
+            aylik AS (
+                SELECT e.ay,
+                       COALESCE(SUM(e.ekle) FILTER (WHERE e.ekle > {tol}), 0) AS ekle_toplam,
+                       COUNT(*) FILTER (WHERE e.ekle > {tol}) AS ekle_adet,
+                       (array_agg(e.tut ORDER BY e.sira DESC))[1] AS son_tut,
+                       (array_agg(e.brut ORDER BY e.sira DESC))[1] AS son_brut
+                FROM e
+                GROUP BY e.ay
+            )
+            SELECT a.ay,
+                   ROUND(SUM(a.ekle_toplam) OVER w, 2),
+                   (SUM(a.ekle_adet) OVER w)::INTEGER,
+                   CASE WHEN a.son_tut > 0 AND a.son_tut < 0.5 AND a.son_brut <= 0.001
+                        THEN 0 ELSE ROUND(a.son_tut, 2) END,
+                   (a.son_tut > 0 AND a.son_tut < 0.5 AND a.son_brut <= 0.001)
+            FROM aylik a
+            WINDOW w AS (ORDER BY a.ay ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_borc_ozet_yaz(p_sema TEXT, p_mid BIGINT, p_payload TEXT)
+        RETURNS void AS $$
+        DECLARE
+            v_t TEXT := quote_ident(p_sema) || '.';
+            v_js JSONB;
+            v_rev INTEGER;
+            v_kullanilabilir BOOLEAN := FALSE;
+        BEGIN
+            EXECUTE 'DELETE FROM ' || v_t || 'musteri_borc_ozet WHERE musteri_id = $1' USING p_mid;
+            IF p_payload IS NULL THEN
+                EXECUTE 'DELETE FROM ' || v_t || 'musteri_borc_ozet_durum WHERE musteri_id = $1' USING p_mid;
+                RETURN;
+            END IF;
+            BEGIN
+                v_js := p_payload::jsonb;
+            EXCEPTION WHEN others THEN
+                v_js := NULL;
+            END;
+            IF jsonb_typeof(v_js) = 'object' THEN
+                IF COALESCE(v_js->>'compute_rev', '') ~ '^[0-9]{{1,9}}$' THEN
+                    v_rev := (v_js->>'compute_rev')::INTEGER;
+                END IF;
+                -- _firma_ozet_cache_payload_usable: dolu aylar + tahsilat imzası veya tahsil alanları
+                IF jsonb_typeof(v_js->'aylar') = 'array' AND jsonb_array_length(v_js->'aylar') > 0 THEN
+                    v_kullanilabilir := fn_borc_ozet_dogru(v_js->'tahsilat_imza') OR EXISTS (
+                        SELECT 1 FROM jsonb_array_elements(v_js->'aylar') a
+                        WHERE jsonb_typeof(a) = 'object'
+                          AND (a ? 'tahsil_edildi' OR a ? 'kalan_tutar_kdv' OR a ? 'odenen_tutar_kdv')
+                    );
+                END IF;
+            END IF;
+            EXECUTE 'INSERT INTO ' || v_t || 'musteri_borc_ozet_durum AS d
+                     (musteri_id, compute_rev, kullanilabilir, updated_at)
+                     VALUES ($1, $2, $3, NOW())
+                     ON CONFLICT (musteri_id) DO UPDATE
+                     SET compute_rev = EXCLUDED.compute_rev, kullanilabilir = EXCLUDED.kullanilabilir,
+                         updated_at = NOW()'
+            USING p_mid, v_rev, v_kullanilabilir;
+            IF v_kullanilabilir THEN
+                EXECUTE 'INSERT INTO ' || v_t || 'musteri_borc_ozet
+                         (musteri_id, ay, toplam_borc, geciken_ay, borc_month, borc_month_placeholder, guncel_kira)
+                         SELECT $1, o.ay, o.toplam_borc, o.geciken_ay, o.borc_month, o.borc_month_placeholder,
+                                COALESCE(t.tutar, 0)
+                         FROM ' || v_t || 'fn_musteri_borc_ozet_aylar($2) AS o
+                         LEFT JOIN ' || v_t || 'fn_musteri_aylik_grid_tutar_aylar($2) AS t ON t.ay = o.ay'
+                USING p_mid, v_js->'aylar';
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION fn_musteri_borc_ozet_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM fn_musteri_borc_ozet_yaz(TG_TABLE_SCHEMA, OLD.musteri_id, NULL);
+            ELSE
+                PERFORM fn_musteri_borc_ozet_yaz(TG_TABLE_SCHEMA, NEW.musteri_id, NEW.payload);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_musteri_borc_ozet ON musteri_aylik_grid_cache;
+        CREATE TRIGGER trg_musteri_borc_ozet
+        AFTER INSERT OR DELETE OR UPDATE OF payload ON musteri_aylik_grid_cache
+        FOR EACH ROW EXECUTE FUNCTION fn_musteri_borc_ozet_sync();
+
+        SELECT fn_musteri_borc_ozet_yaz(current_schema(), c.musteri_id, c.payload)
+        FROM musteri_aylik_grid_cache c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM musteri_borc_ozet_durum d WHERE d.musteri_id = c.musteri_id
+        );
+        """
+    )
+
+
+@_schema_ensure
+def ensure_liste_keyset_indeksleri():
+    """Keyset sayfalı listeler (utils.sayfalama) için (tarih, id) indeksleri.
+
+    Sıralama ifadeleri sorgulardakiyle birebir: fatura raporu NULL tarihi
+    ``DATE '9999-12-31'`` ile sona atar. banka_hareketleri eski kurulumlarda yoksa atlanır.
+    """
+    execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_faturalar_tarih_id
+            ON faturalar (fatura_tarihi, id);
+        CREATE INDEX IF NOT EXISTS idx_faturalar_rapor_sira_id
+            ON faturalar ((COALESCE(fatura_tarihi, vade_tarihi, DATE '9999-12-31')), id);
+        CREATE INDEX IF NOT EXISTS idx_tahsilatlar_tarih_id
+            ON tahsilatlar (tahsilat_tarihi, id);
+        DO $$
+        BEGIN
+            IF to_regclass('banka_hareketleri') IS NOT NULL THEN
+                CREATE INDEX IF NOT EXISTS idx_banka_hareketleri_tarih_id
+                    ON banka_hareketleri (hareket_tarihi, id);
+                CREATE INDEX IF NOT EXISTS idx_banka_hareketleri_hesap_tarih_id
+                    ON banka_hareketleri (banka_hesap_id, hareket_tarihi, id);
+            END IF;
+        END
+        $$;
+        """
+    )
+
+
+@_schema_ensure
+def ensure_auto_invoice_devam():
+    """Otomatik fatura döngüsü devam noktası: run başına son işlenen müşteri + canlılık zamanı.
+
+    ``son_musteri_id`` parti faturalarıyla aynı transaction'da yazılır; yarıda kalan
+    ('running' + bayat heartbeat_at / 'failed') dönem buradan sürer. GİB aşaması
+    run'ın 'created' kalemlerini (run_id, status) indeksinden okur.
+    """
+    ensure_auto_invoice_tables()
+    execute(
+        """
+        ALTER TABLE auto_invoice_runs ADD COLUMN IF NOT EXISTS son_musteri_id INTEGER;
+        ALTER TABLE auto_invoice_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+        CREATE INDEX IF NOT EXISTS idx_auto_invoice_items_run_status
+            ON auto_invoice_items (run_id, status, period_key);
+        """
+    )
+
+
+# utils.sayfalama.liste_toplamlari önbellek anahtarının kaynağı olan tablolar.
+TABLO_YAZMA_SAYACLI = ("faturalar", "tahsilatlar", "banka_hareketleri", "musteri_kyc", "musteri_aylik_grid_cache")
+
+
+@_schema_ensure
+def ensure_tablo_yazma_sayaci():
+    """Tablo başına yazma sayacı: ``bo_yazma_<tablo>_seq`` (utils.sayfalama.tablo_yazma_surumu).
+
+    Satır yazımı commit anında (DEFERRABLE INITIALLY DEFERRED constraint trigger) sekansı
+    ilerletir: pg_stat sayaçları gibi gecikmez, sekans kilitsiz olduğu için yazanları
+    sıraya sokmaz. Geri alınan transaction'ın tetiklediği artış yalnız fazladan yeniden hesaptır.
+    """
+    execute(
+        """
+        CREATE OR REPLACE FUNCTION fn_bo_tablo_yazma_say()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM nextval((quote_ident(TG_TABLE_SCHEMA) || '.' || quote_ident('bo_yazma_' || TG_TABLE_NAME || '_seq'))::regclass);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for tablo in TABLO_YAZMA_SAYACLI:
+        if not (fetch_one("SELECT to_regclass(%s) IS NOT NULL AS var", (tablo,)) or {}).get("var"):
+            continue
+        execute(
+            f"""
+            CREATE SEQUENCE IF NOT EXISTS bo_yazma_{tablo}_seq;
+            DROP TRIGGER IF EXISTS trg_bo_yazma_{tablo} ON {tablo};
+            CREATE CONSTRAINT TRIGGER trg_bo_yazma_{tablo}
+            AFTER INSERT OR UPDATE OR DELETE ON {tablo}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION fn_bo_tablo_yazma_say();
+            """
+        )
+
+
+# ── Migrasyon birimleri ─────────────────────────────────────────────────────
+# Sıra = sürüm. Yeni DDL yalnızca sona yeni birim olarak eklenir (mevcut sürüm
+# numaraları değişmez). Kapsam "public": platform tabloları (public.*), kiracı
+# şemalarında uygulanmaz ama deftere işlenir.
+def _migration_schema_sql():
+    execute(SCHEMA_SQL)
+
+
+SCHEMA_MIGRATIONS = (
+    (1, "schema_sql", _migration_schema_sql, "all"),
+    (2, "customers_notes", ensure_customers_notes, "all"),
+    (3, "customers_musteri_adi", ensure_customers_musteri_adi, "all"),
+    (4, "customers_musteri_no", ensure_customers_musteri_no, "all"),
+    (5, "customers_hazir_ofis_oda", ensure_customers_hazir_ofis_oda, "all"),
+    (6, "customers_is_active", ensure_customers_is_active, "all"),
+    (7, "customers_rent_columns", ensure_customers_rent_columns, "all"),
+    (8, "customers_excel_columns", ensure_customers_excel_columns, "all"),
+    (9, "customers_quick_edit_columns", ensure_customers_quick_edit_columns, "all"),
+    (10, "customers_durum", ensure_customers_durum, "all"),
+    (11, "customers_calisma_sekli", ensure_customers_calisma_sekli, "all"),
+    (12, "customers_kapanis_tarihi", ensure_customers_kapanis_tarihi, "all"),
+    (13, "customers_kapanis_sonrasi_borc_ay", ensure_customers_kapanis_sonrasi_borc_ay, "all"),
+    (14, "customers_bizim_hesap", ensure_customers_bizim_hesap, "all"),
+    (15, "grup2_etiketleri_table", ensure_grup2_etiketleri_table, "all"),
+    (16, "customers_grup2_secimleri", ensure_customers_grup2_secimleri, "all"),
+    (17, "grup2_bizim_hesap_into_array", ensure_grup2_bizim_hesap_into_array, "all"),
+    (18, "customers_cari_columns", ensure_customers_cari_columns, "all"),
+    (19, "customers_hierarchy_columns", ensure_customers_hierarchy_columns, "all"),
+    (20, "group_report_indexes", ensure_group_report_indexes, "all"),
+    (21, "firma_ozet_report_indexes", ensure_firma_ozet_report_indexes, "all"),
+    (22, "group_report_rpc", ensure_group_report_rpc, "all"),
+    (23, "customer_financial_profile", ensure_customer_financial_profile, "all"),
+    (24, "customers_balance_trigger", ensure_customers_balance_trigger, "all"),
+    (25, "cari_360_tables", ensure_cari_360_tables, "all"),
+    (26, "tahsilatlar_columns", ensure_tahsilatlar_columns, "all"),
+    (27, "tediyeler_columns", ensure_tediyeler_columns, "all"),
+    (28, "kargolar_durum", ensure_kargolar_durum, "all"),
+    (29, "faturalar_amount_columns", ensure_faturalar_amount_columns, "all"),
+    (30, "faturalar_yon_kolon", ensure_faturalar_yon_kolon, "all"),
+    (31, "musteri_kyc_columns", ensure_musteri_kyc_columns, "all"),
+    (32, "musteri_kyc_arama_kolonlari", ensure_musteri_kyc_arama_kolonlari, "all"),
+    (33, "musteri_kyc_hazir_ofis_oda_no", ensure_musteri_kyc_hazir_ofis_oda_no, "all"),
+    (34, "hizmet_turleri_table", ensure_hizmet_turleri_table, "all"),
+    (35, "duzenli_fatura_secenekleri_table", ensure_duzenli_fatura_secenekleri_table, "all"),
+    (36, "office_rentals", ensure_office_rentals, "all"),
+    (37, "crm_leads", ensure_crm_leads, "all"),
+    (38, "personel_extra_columns", ensure_personel_extra_columns, "all"),
+    (39, "personel_bilgi_dogum_tarihi", ensure_personel_bilgi_dogum_tarihi, "all"),
+    (40, "personel_izin_onay_durumu", ensure_personel_izin_onay_durumu, "all"),
+    (41, "personel_izin_saat_sayisi", ensure_personel_izin_saat_sayisi, "all"),
+    (42, "personel_izin_saat_sayisi_numeric", ensure_personel_izin_saat_sayisi_numeric, "all"),
+    (43, "personel_izin_otomatik_unique", ensure_personel_izin_otomatik_unique, "all"),
+    (44, "personel_ozluk", ensure_personel_ozluk, "all"),
+    (45, "personel_ozluk_izin_columns", ensure_personel_ozluk_izin_columns, "all"),
+    (46, "contracts_engine", ensure_contracts_engine, "all"),
+    (47, "auto_invoice_tables", ensure_auto_invoice_tables, "all"),
+    (48, "masraflar_table", ensure_masraflar_table, "all"),
+    (49, "user_ui_preferences_table", ensure_user_ui_preferences_table, "all"),
+    (50, "platform_tenants_table", ensure_platform_tenants_table, "public"),
+    (51, "pricing_tables", ensure_pricing_tables, "public"),
+    (52, "tenant_user_lookup_table", ensure_tenant_user_lookup_table, "public"),
+    (53, "password_reset_tokens_table", ensure_password_reset_tokens_table, "public"),
+    (54, "users_security_stamp_column", ensure_users_security_stamp_column, "public"),
+    (55, "musteri_kyc_odeme_duzeni", ensure_musteri_kyc_odeme_duzeni, "all"),
+    (56, "musteri_kyc_kira_banka", ensure_musteri_kyc_kira_banka, "all"),
+    (57, "musteri_kyc_latest_lookup_index", ensure_musteri_kyc_latest_lookup_index, "all"),
+    (58, "potansiyel_musteriler", ensure_potansiyel_musteriler, "all"),
+    (59, "customers_arsivli", ensure_customers_arsivli, "all"),
+    (60, "mukerrer_arsiv_batch", ensure_mukerrer_arsiv_batch, "all"),
+    (61, "randevular_takip_columns", ensure_randevular_takip_columns, "all"),
+    (62, "cari_kart_perf_indexes", ensure_cari_kart_perf_indexes, "all"),
+    (63, "banka_hesaplar_columns", ensure_banka_hesaplar_columns, "all"),
+    (64, "banka_hareketleri_import_columns", ensure_banka_hareketleri_import_columns, "all"),
+    (65, "musteri_aylik_grid_cache_table", ensure_musteri_aylik_grid_cache_table, "all"),
+    (66, "musteri_reel_donem_tutar_table", ensure_musteri_reel_donem_tutar_table, "all"),
+    (67, "musteri_tahsilat_panel_detay_table", ensure_musteri_tahsilat_panel_detay_table, "all"),
+    (68, "tahsilatlar_tahsil_eden_column", ensure_tahsilatlar_tahsil_eden_column, "all"),
+    (69, "tahsilatlar_banka_referans_no", ensure_tahsilatlar_banka_referans_no, "all"),
+    (70, "akbank_import_dosyalar_table", ensure_akbank_import_dosyalar_table, "all"),
+    (71, "akbank_dekont_musteri_map_table", ensure_akbank_dekont_musteri_map_table, "all"),
+    (72, "whatsapp_geciken_haric_table", ensure_whatsapp_geciken_haric_table, "all"),
+    (73, "urunler_kdv_column", ensure_urunler_kdv_column, "all"),
+    (74, "dashboard_kisayol_tables", ensure_dashboard_kisayol_tables, "all"),
+    (75, "bo_jobs_table", ensure_bo_jobs_table, "public"),
+    (76, "musteri_data_version", ensure_musteri_data_version, "all"),
+    (77, "musteri_data_version_kart", ensure_musteri_data_version_kart, "all"),
+    (78, "musteri_ekstre_snapshot_table", ensure_musteri_ekstre_snapshot_table, "all"),
+    (79, "musteri_aylik_grid_tutar", ensure_musteri_aylik_grid_tutar, "all"),
+    (80, "tahsilat_ay_dagitim", ensure_tahsilat_ay_dagitim, "all"),
+    (81, "faturalar_not_durum_kolonlari", ensure_faturalar_not_durum_kolonlari, "all"),
+    (82, "musteri_arama_belge", ensure_musteri_arama_belge, "all"),
+    (83, "musteri_borc_ozet", ensure_musteri_borc_ozet, "all"),
+    (84, "liste_keyset_indeksleri", ensure_liste_keyset_indeksleri, "all"),
+    (85, "auto_invoice_devam", ensure_auto_invoice_devam, "all"),
+    (86, "tablo_yazma_sayaci", ensure_tablo_yazma_sayaci, "all"),
+)
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def _reset_ensure_once_flags() -> None:
+    """Süreç ömrü ``_*_done`` / ``_*_ensured`` bayraklarını sıfırla.
+
+    Bu bayraklar şemadan bağımsızdır; kiracı şeması migrate edilirken önceki
+    şemada set edilmiş bir bayrak DDL'i atlatmasın diye her koşuda temizlenir.
+    """
+    mod = globals()
+    for k, v in list(mod.items()):
+        if k.startswith("_") and (k.endswith("_done") or k.endswith("_ensured")) and v is True:
+            mod[k] = False
+
+
+def migrate_schema(schema=None) -> int:
+    """Şemayı (None = public) SCHEMA_VERSION'a getirir; uygulanan birim sayısını döndürür.
+
+    Güncel şemada tek sorgu (defter MAX(version)). Eksik birimler sırayla,
+    şema başına advisory lock altında uygulanır ve ``schema_migrations``'a yazılır;
+    bir birim hata verirse durur (sonraki birimler atlanmaz, sıra korunur). Birimin
+    kendi yakalayıp yuttuğu (print / pass) DB hatalarından geçici olanlar (kilit, zaman
+    aşımı, bağlantı; ``_gecici_db_hatasi``) da birimi düşürür: deftere yazılmaz, sonraki
+    açılışta yeniden denenir. Kalıcı olanlar birimin kabul ettiği başarısızlıktır
+    (örn. eski veride aynı makbuz_no → benzersiz indeks atlanır): uyarı loglanır, birim yazılır.
+    """
+    key = schema or "public"
+    with tenant_schema_scope(schema):
+        if _schema_ledger_version(key) >= SCHEMA_VERSION:
+            _SCHEMA_LEDGER_STATE[key] = True
+            return 0
+        ledger = psql.SQL("{}.schema_migrations").format(psql.Identifier(key))
+        lock_key = f"bo_schema_migrations:{key}"
+        lock_conn = get_conn()
+        try:
+            lock_cur = lock_conn.cursor()
+            lock_cur.execute("SELECT pg_advisory_lock(hashtext(%s))", (lock_key,))
+            lock_conn.commit()
+            _SCHEMA_LEDGER_STATE[key] = False
+            execute(
+                psql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        version    INTEGER PRIMARY KEY,
+                        name       TEXT NOT NULL,
+                        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    )
+                    """
+                ).format(ledger)
+            )
+            done = {
+                int(r["version"])
+                for r in fetch_all(psql.SQL("SELECT version FROM {}").format(ledger))
+            }
+            _reset_ensure_once_flags()
+            applied = 0
+            for version, name, fn, kapsam in SCHEMA_MIGRATIONS:
+                if version in done:
+                    continue
+                if kapsam == "all" or schema is None:
+                    t0 = time.perf_counter()
+                    _MIGRASYON.hatalar = []
+                    try:
+                        fn()
+                    except Exception:
+                        logger.exception("Şema migrasyonu başarısız şema=%s sürüm=%s (%s)", key, version, name)
+                        raise
+                    finally:
+                        hatalar, _MIGRASYON.hatalar = _MIGRASYON.hatalar, None
+                    gecici = [e for e in hatalar if _gecici_db_hatasi(e)]
+                    if gecici:
+                        logger.error(
+                            "Şema migrasyonu başarısız şema=%s sürüm=%s (%s): %s geçici hata, ilki: %s",
+                            key, version, name, len(gecici), gecici[0],
+                        )
+                        raise RuntimeError(f"Şema migrasyonu {version} ({name}) başarısız: {gecici[0]}")
+                    for e in hatalar:
+                        logger.warning(
+                            "Şema migrasyonu şema=%s sürüm=%s (%s): atlanan adım: %s", key, version, name, e
+                        )
+                    logger.info(
+                        "Şema migrasyonu şema=%s sürüm=%s (%s) %.0fms",
+                        key,
+                        version,
+                        name,
+                        (time.perf_counter() - t0) * 1000.0,
+                    )
+                execute(
+                    psql.SQL(
+                        "INSERT INTO {} (version, name) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING"
+                    ).format(ledger),
+                    (version, name),
+                )
+                applied += 1
+            _SCHEMA_LEDGER_STATE[key] = True
+            return applied
+        finally:
+            try:
+                lock_cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (lock_key,))
+                lock_conn.commit()
+            except Exception:
+                pass
+            _release_conn(lock_conn)
+
+
+def migrate_tenant_schemas() -> dict:
+    """public.tenants içindeki aktif kiracı şemalarını migrate eder: {şema: uygulanan | hata}."""
+    try:
+        rows = fetch_all(
+            "SELECT schema_name FROM public.tenants WHERE status = 'active' ORDER BY id"
+        )
+    except psycopg2.Error:
+        return {}
+    out = {}
+    for r in rows:
+        schema = str(r.get("schema_name") or "").strip()
+        if not _TENANT_SCHEMA_RE.fullmatch(schema):
+            continue
+        try:
+            out[schema] = migrate_schema(schema)
+        except Exception as e:
+            out[schema] = f"hata: {e}"
+    return out
+
+
 def clear_all_customers():
     """
     Tüm müşteri verilerini ve müşteriye bağlı kayıtları siler (geri alınamaz).
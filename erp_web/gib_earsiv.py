@@ -17,6 +17,7 @@ import json
 import logging
 import threading
 from dotenv import load_dotenv
+from cache_utils import cache_region
 
 _log = logging.getLogger(__name__)
 
@@ -60,8 +61,10 @@ def _gib_dev_http_file_line(text: str) -> None:
 
 
 # portal_kesilen_fatura_listesi_normalized için kısa TTL önbellek (aynı tarih aralığında GİB’i yormamak)
-_portal_kesilen_list_cache_lock = threading.Lock()
-_portal_kesilen_list_cache: dict[str, tuple[float, list]] = {}
+# TTL her okumada GIB_PORTAL_LISTE_CACHE_SANIYE ile uygulanır; bölge TTL'i üst sınır.
+_PORTAL_KESILEN_LIST_CACHE = cache_region(
+    "gib_portal_kesilen", max_entries=32, max_bytes=16 * 1024 * 1024, ttl_sec=3600.0
+)
 
 
 def _portal_kesilen_list_cache_key(bas_date, bit_date) -> str:
@@ -91,8 +94,7 @@ def _portal_kesilen_list_cache_ttl_saniye() -> int:
 
 def portal_kesilen_fatura_listesi_cache_clear() -> None:
     """GİB ile canlı kontrol sonrası vb. için portal liste önbelleğini boşalt."""
-    with _portal_kesilen_list_cache_lock:
-        _portal_kesilen_list_cache.clear()
+    _PORTAL_KESILEN_LIST_CACHE.clear()
 
 
 try:
@@ -988,12 +990,9 @@ class BestOfficeGIBManager:
         ttl = _portal_kesilen_list_cache_ttl_saniye()
         cache_key = _portal_kesilen_list_cache_key(bas_date, bit_date)
         if ttl > 0:
-            with _portal_kesilen_list_cache_lock:
-                ent = _portal_kesilen_list_cache.get(cache_key)
-                if ent:
-                    ts, data = ent
-                    if time.monotonic() - ts < ttl:
-                        return [dict(x) for x in data]
+            data = _PORTAL_KESILEN_LIST_CACHE.get(cache_key, max_age_sec=ttl)
+            if data is not None:
+                return [dict(x) for x in data]
 
         self._ensure_client()
         self._fresh_login()
@@ -1078,8 +1077,7 @@ class BestOfficeGIBManager:
             seen_out.add(key)
             items.append(it)
         if ttl > 0:
-            with _portal_kesilen_list_cache_lock:
-                _portal_kesilen_list_cache[cache_key] = (time.monotonic(), [dict(x) for x in items])
+            _PORTAL_KESILEN_LIST_CACHE.set(cache_key, [dict(x) for x in items], ttl_sec=ttl)
         return items
 
     @staticmethod
@@ -2,10 +2,15 @@
 """Payafin public fiyatlandırma API — bellek içi cache + salt-okuma yükleme."""
 from __future__ import annotations
 
-from cache_utils import simple_cache_get, simple_cache_invalidate, simple_cache_set
+from cache_utils import cache_region
 from db import fetch_all, fetch_one
 
 PUBLIC_PRICING_CACHE_TTL_SEC = 60.0
+# Platform (public) verisi: kiracıdan bağımsız tek kopya.
+_PUBLIC_PRICING_CACHE = cache_region(
+    "pricing_public", max_entries=64, max_bytes=1024 * 1024,
+    ttl_sec=PUBLIC_PRICING_CACHE_TTL_SEC, tenant_scoped=False,
+)
 _PUBLIC_CACHE_PREFIX = "pricing:public:v1:"
 
 
@@ -18,7 +23,7 @@ def invalidate_public_pricing_cache(country_code: str) -> None:
     cc = str(country_code or "").strip().upper()
     if not cc:
         return
-    simple_cache_invalidate(public_pricing_cache_key(cc))
+    _PUBLIC_PRICING_CACHE.invalidate(public_pricing_cache_key(cc))
 
 
 def _tier_public(row: dict) -> dict:
@@ -101,7 +106,7 @@ def get_public_pricing(country_code: str) -> dict | None:
         raise ValueError("geçersiz country")
 
     key = public_pricing_cache_key(cc)
-    cached = simple_cache_get(key, max_age_sec=PUBLIC_PRICING_CACHE_TTL_SEC)
+    cached = _PUBLIC_PRICING_CACHE.get(key)
     if cached is not None:
         return cached
 
@@ -109,5 +114,5 @@ def get_public_pricing(country_code: str) -> dict | None:
     if payload is None:
         return None
 
-    simple_cache_set(key, payload)
+    _PUBLIC_PRICING_CACHE.set(key, payload)
     return payload
@@ -72,3 +72,12 @@ def sifre_sifirla(uid):
     sifre_degistir(uid, yeni)
     flash("Şifre güncellendi.", "success")
     return redirect(url_for("admin.index"))
+
+
+@bp.route("/api/cache-istatistik")
+@admin_gerekli
+def api_cache_istatistik():
+    """Süreç içi önbellek bölgeleri: giriş/bayt, hit/miss, tahliye sayaçları."""
+    from cache_utils import cache_stats
+
+    return jsonify({"ok": True, **cache_stats()})
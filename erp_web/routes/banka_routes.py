@@ -3,7 +3,18 @@ Bankalar: hesap dökümü, ekstre yükleme, tahsilat eşleştirme, masraf takibi
 """
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from auth import giris_gerekli, admin_gerekli
-from db import fetch_all, fetch_one, execute, execute_returning, db, ensure_banka_hesaplar_columns
+from db import (
+    fetch_all,
+    fetch_iter,
+    fetch_one,
+    execute,
+    execute_returning,
+    db,
+    ensure_akbank_dekont_musteri_map_table,
+    ensure_akbank_import_dosyalar_table,
+    ensure_banka_hesaplar_columns,
+    ensure_tahsilatlar_banka_referans_no,
+)
 from services.banka_ak_import import (
     akbank_sender_key,
     dataframe_hareket_satirlari,
@@ -23,6 +34,16 @@ except ImportError:
 
     def customers_arama_params_giris_genis(q: str):
         return customers_arama_params_4(q)
+from utils.musteri_arama_indeks import musteri_arama_indeksi
+from utils.sayfalama import (
+    filtre_imzasi,
+    imlec_coz,
+    keyset_kosulu,
+    liste_toplamlari,
+    sayfa_boyutu,
+    sayfa_kes,
+    tahmini_satir_sayisi,
+)
 from datetime import datetime, date
 
 bp = Blueprint("banka", __name__)
@@ -128,34 +149,46 @@ def api_ozet():
         sql_where = " AND banka_hesap_id = %s"
         params.append(hesap_id)
 
-    toplam = fetch_one(
-        f"SELECT COUNT(*) as c FROM banka_hareketleri WHERE 1=1{sql_where}", tuple(params) or None
-    )
-    eslesti = fetch_one(
-        f"SELECT COUNT(*) as c FROM banka_hareketleri WHERE durum = 'eslesti'{sql_where}", tuple(params) or None
-    )
-    bekleyen = fetch_one(
-        f"SELECT COALESCE(SUM(tutar), 0) as t FROM banka_hareketleri WHERE durum = 'bekleyen' AND tutar > 0{sql_where}",
-        tuple(params) or None,
-    )
-    masraflar = fetch_one(
-        f"SELECT COALESCE(SUM(ABS(tutar)), 0) as t FROM banka_hareketleri WHERE (tutar < 0 OR tip = 'giden'){sql_where}",
+    # Tek tarama, canlı: içe aktarma / eşleştirmeden hemen sonra doğru olmalı.
+    row = fetch_one(
+        f"""
+        SELECT COUNT(*) AS c,
+               COUNT(*) FILTER (WHERE durum = 'eslesti') AS eslesti,
+               COALESCE(SUM(tutar) FILTER (WHERE durum = 'bekleyen' AND tutar > 0), 0) AS bekleyen,
+               COALESCE(SUM(ABS(tutar)) FILTER (WHERE tutar < 0 OR tip = 'giden'), 0) AS masraf
+        FROM banka_hareketleri
+        WHERE 1=1{sql_where}
+        """,
         tuple(params) or None,
-    )
+    ) or {}
     return jsonify({
-        "toplam": int((toplam or {}).get("c") or 0),
-        "eslesti": int((eslesti or {}).get("c") or 0),
-        "bekleyen_tutar": float((bekleyen or {}).get("t") or 0),
-        "masraflar_tutar": float((masraflar or {}).get("t") or 0),
+        "toplam": int(row.get("c") or 0),
+        "eslesti": int(row.get("eslesti") or 0),
+        "bekleyen_tutar": float(row.get("bekleyen") or 0),
+        "masraflar_tutar": float(row.get("masraf") or 0),
     })
 
 
+def _hareket_satiri(kolonlar, satir) -> dict:
+    """fetch_iter tuple satırı → JSON dict (hareket_tarihi YYYY-MM-DD)."""
+    r = dict(zip(kolonlar, satir))
+    ht = r.get("hareket_tarihi")
+    if ht:
+        r["hareket_tarihi"] = ht.isoformat()[:10] if hasattr(ht, "isoformat") else str(ht)[:10]
+    return r
+
+
 @bp.route("/api/hareketler")
 @giris_gerekli
 def api_hareketler():
-    """Banka hareketleri listesi (hesap, durum filtreli)."""
+    """Banka hareketleri listesi (hesap, durum filtreli).
+
+    ``limit`` verilirse (hareket_tarihi, id) keyset sayfası: ``imlec`` ile devam, yanıt nesne.
+    Verilmezse eski davranış (son 500 hareket, düz liste).
+    """
     hesap_id = request.args.get("hesap_id")
     durum = request.args.get("durum", "tumu").strip().lower()
+    limit = sayfa_boyutu(request.args.get("limit"))
 
     sql = """
     SELECT h.id, h.banka_hesap_id, h.hareket_tarihi, h.aciklama, h.gonderici, h.tutar, h.tip, h.durum,
@@ -172,12 +205,46 @@ def api_hareketler():
     if durum and durum != "tumu":
         sql += " AND h.durum = %s"
         params.append(durum)
-    sql += " ORDER BY h.hareket_tarihi DESC, h.id DESC LIMIT 500"
-    rows = fetch_all(sql, tuple(params) if params else None)
-    for r in rows:
-        if r.get("hareket_tarihi"):
-            r["hareket_tarihi"] = r["hareket_tarihi"].isoformat()[:10] if hasattr(r["hareket_tarihi"], "isoformat") else str(r["hareket_tarihi"])[:10]
-    return jsonify(rows or [])
+    if limit is None:
+        sql += " ORDER BY h.hareket_tarihi DESC, h.id DESC LIMIT 500"
+        it = fetch_iter(sql, tuple(params) if params else None, header=True)
+        kolonlar = next(it)
+        rows = [_hareket_satiri(kolonlar, t) for t in it]
+        return jsonify(rows)
+
+    imza = filtre_imzasi("banka_hareketler", hesap_id, durum)
+    filtre_sql, filtre_params = sql, tuple(params)
+    ks_sql, ks_params = keyset_kosulu(
+        "h.hareket_tarihi", "h.id", imlec_coz(request.args.get("imlec"), imza)
+    )
+    sql += ks_sql + " ORDER BY h.hareket_tarihi DESC, h.id DESC LIMIT %s"
+    it = fetch_iter(sql, filtre_params + ks_params + (limit + 1,), header=True)
+    kolonlar = next(it)
+    items, sonraki = sayfa_kes(
+        [_hareket_satiri(kolonlar, t) for t in it], limit, "hareket_tarihi", "id", imza
+    )
+    # Filtresiz görünüm: pg_class tahmini (COUNT(*) tam tarama yok).
+    adet = None if filtre_params else tahmini_satir_sayisi("banka_hareketleri")
+    tahmini = adet is not None
+    if adet is None:
+        adet = liste_toplamlari(
+            "banka_hareketler",
+            imza,
+            ("banka_hareketleri",),
+            lambda: int(
+                (fetch_one(f"SELECT COUNT(*) AS c FROM ({filtre_sql}) q", filtre_params or None) or {}).get("c")
+                or 0
+            ),
+        )
+    return jsonify({
+        "ok": True,
+        "items": items,
+        "limit": limit,
+        "has_more": sonraki is not None,
+        "sonraki_imlec": sonraki,
+        "adet": adet,
+        "adet_tahmini": tahmini,
+    })
 
 
 @bp.route("/api/musteri_ara")
@@ -187,6 +254,14 @@ def api_musteri_ara():
     q = (request.args.get("q") or "").strip()[:80]
     if not q:
         return jsonify([])
+    ix = musteri_arama_indeksi()
+    if ix is not None:
+        return jsonify(
+            [
+                {"id": r["id"], "name": r["name"], "musteri_adi": r["musteri_adi"]}
+                for r in ix.ara(q, limit=30, sira=False)
+            ]
+        )
     w3 = customers_arama_sql_giris_genis("")
     rows = fetch_all(
         f"SELECT id, name, musteri_adi FROM customers WHERE {w3} ORDER BY name LIMIT 30",
@@ -588,11 +663,10 @@ def api_masraflar_raporu():
         except ValueError:
             pass
     sql += " ORDER BY h.hareket_tarihi DESC, h.id DESC LIMIT 1000"
-    rows = fetch_all(sql, tuple(params) if params else None)
-    toplam = sum(float(r.get("tutar") or 0) for r in (rows or []))
-    for r in rows or []:
-        if r.get("hareket_tarihi"):
-            r["hareket_tarihi"] = r["hareket_tarihi"].isoformat()[:10] if hasattr(r["hareket_tarihi"], "isoformat") else str(r["hareket_tarihi"])[:10]
+    it = fetch_iter(sql, tuple(params) if params else None, header=True)
+    kolonlar = next(it)
+    rows = [_hareket_satiri(kolonlar, t) for t in it]
+    toplam = sum(float(r.get("tutar") or 0) for r in rows)
     return jsonify({
         "toplam": abs(toplam),
         "adet": len(rows or []),
@@ -646,39 +720,14 @@ def api_hesap_kaydet():
 
 def _ensure_tahsilat_banka_referans_no():
     try:
-        execute("ALTER TABLE tahsilatlar ADD COLUMN IF NOT EXISTS banka_referans_no TEXT")
+        ensure_tahsilatlar_banka_referans_no()
     except Exception:
         pass
 
 
 def _ensure_akbank_import_dosyalar():
     """Yüklenen Akbank Excel dosyalarını ERP içinde saklar."""
-    try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS akbank_import_dosyalar (
-                id SERIAL PRIMARY KEY,
-                ad_gosterim TEXT NOT NULL UNIQUE,
-                orijinal_filename TEXT,
-                yuklenme_tarihi TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                excel_binary BYTEA NOT NULL
-            )
-            """
-        )
-    except Exception:
-        pass
-    try:
-        execute(
-            "CREATE INDEX IF NOT EXISTS ix_akbank_import_dosyalar_yuklenme ON akbank_import_dosyalar (yuklenme_tarihi DESC)"
-        )
-    except Exception:
-        pass
-    try:
-        execute(
-            "CREATE INDEX IF NOT EXISTS ix_akbank_import_excel_binary_hash ON akbank_import_dosyalar USING hash (excel_binary)"
-        )
-    except Exception:
-        pass
+    ensure_akbank_import_dosyalar_table()
 
 
 def _akbank_allocate_ad_gosterim(d: date | None = None) -> str:
@@ -808,25 +857,7 @@ def _json_akbank_analyze_ham(ham: list, ozet: dict, kayit_dosya: dict | None) ->
 
 def _ensure_akbank_dekont_musteri_map():
     """Manuel seçilen dekont gönderici anahtarı → müşteri (sonraki Excel analizlerinde öncelik)."""
-    try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS akbank_dekont_musteri_map (
-                sender_key TEXT PRIMARY KEY,
-                musteri_id INTEGER NOT NULL,
-                ornek_aciklama TEXT,
-                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-            )
-            """
-        )
-    except Exception:
-        pass
-    try:
-        execute(
-            "CREATE INDEX IF NOT EXISTS ix_akbank_dekont_map_musteri ON akbank_dekont_musteri_map (musteri_id)"
-        )
-    except Exception:
-        pass
+    ensure_akbank_dekont_musteri_map_table()
 
 
 @bp.route("/akbank-tahsilat-import", strict_slashes=False)
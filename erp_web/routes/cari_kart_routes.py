@@ -5,9 +5,11 @@ from flask import Blueprint, render_template, request, jsonify, Response, url_fo
 from flask_login import current_user
 import psycopg2
 from auth import giris_gerekli
+from cache_utils import cache_region
 from db import fetch_all, fetch_one, db as get_db, execute_returning, sql_expr_fatura_not_gib_taslak
 from utils.text_utils import turkish_lower
 from utils.musteri_arama import customers_arama_sql_giris_genis, customers_arama_params_giris_genis
+from utils.musteri_arama_indeks import musteri_arama_indeksi
 from utils.musteri_gorunur import musteri_liste_gorunur_sql, request_pasifleri_dahil
 from services.cari_service import CariService, build_customer_levels
 from datetime import date, datetime, timedelta
@@ -500,8 +502,15 @@ def api_musteriler():
         "parent_id, COALESCE(is_group, FALSE) AS is_group "
         "FROM customers "
     )
+    ix = musteri_arama_indeksi() if q else None
     if not q:
         rows = fetch_all(base + f"WHERE {gor} ORDER BY name LIMIT 200")
+    elif ix is not None:
+        # Eşleşme bellekte; görünürlük filtresi ve alanlar PK ile SQL'de.
+        rows = fetch_all(
+            base + f"WHERE id = ANY(%s) AND {gor} ORDER BY name LIMIT 200",
+            (ix.idler(q, sira=False),),
+        )
     else:
         w = customers_arama_sql_giris_genis("")
         rows = fetch_all(
@@ -580,8 +589,9 @@ def api_set_parent_by_hizmet_turu():
     changed = CariService.set_parent_by_hizmet_turu(hizmet_turu, parent_id)
     return jsonify({"ok": True, "updated": int(changed or 0), "hizmet_turu": hizmet_turu, "group_id": parent_id})
 
-_groups_cache: dict = {}
 _GROUPS_CACHE_TTL = 30
+_GROUPS_CACHE = cache_region("groups", max_entries=128, max_bytes=4 * 1024 * 1024, ttl_sec=_GROUPS_CACHE_TTL)
+_GRUP_RAPOR_CACHE = cache_region("grup_rapor", max_entries=64, max_bytes=16 * 1024 * 1024, ttl_sec=90.0)
 
 
 @bp.route("/api/groups")
@@ -589,9 +599,9 @@ _GROUPS_CACHE_TTL = 30
 def api_groups():
     exclude_id = request.args.get("exclude_id", type=int)
     cache_key = exclude_id
-    cached = _groups_cache.get(cache_key)
-    if cached and time.time() - cached[0] < _GROUPS_CACHE_TTL:
-        return jsonify(cached[1])
+    cached = _GROUPS_CACHE.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
     if exclude_id:
         rows = fetch_all(
             """
@@ -615,7 +625,7 @@ def api_groups():
             """
         )
     result = {"ok": True, "groups": rows or []}
-    _groups_cache[cache_key] = (time.time(), result)
+    _GROUPS_CACHE.set(cache_key, result)
     return jsonify(result)
 
 
@@ -797,10 +807,6 @@ def api_groups_consolidated_report():
     grup_tipi = _grup_tipi_norm(request.args.get("grup_tipi"))
     secili_group_ids = _grup_ids_parse(request.args.get("group_ids"))
     bugun = date.today()
-    if not hasattr(api_groups_consolidated_report, "_cache"):
-        api_groups_consolidated_report._cache = {}
-    cache = api_groups_consolidated_report._cache
-    cache_ttl_sec = 90.0
     cache_key = (
         int(bugun.year),
         int(bugun.month),
@@ -809,10 +815,9 @@ def api_groups_consolidated_report():
         str(grup_tipi),
         tuple(sorted(int(x) for x in secili_group_ids if int(x) > 0)),
     )
-    now_ts = time.time()
-    cval = cache.get(cache_key)
-    if cval and (now_ts - float(cval[0])) <= cache_ttl_sec:
-        payload = dict(cval[1] or {})
+    cval = _GRUP_RAPOR_CACHE.get(cache_key)
+    if cval is not None:
+        payload = dict(cval)
         try:
             payload_meta = dict(payload.get("meta") or {})
             payload_meta["cache_hit"] = True
@@ -994,7 +999,7 @@ def api_groups_consolidated_report():
             "net_balance": round(sum_borc - sum_alacak, 2),
         },
     }
-    cache[cache_key] = (now_ts, payload)
+    _GRUP_RAPOR_CACHE.set(cache_key, payload)
     return jsonify(_json_safe_for_api(payload))
 
 
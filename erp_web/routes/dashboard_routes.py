@@ -5,7 +5,15 @@ Müşteri analizi, ödeme takibi, kargo, sözleşme alarmı, hızlı müdahale.
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import current_user
 from auth import giris_gerekli, admin_gerekli
-from db import fetch_all, fetch_one, execute, execute_returning, ensure_faturalar_amount_columns, sql_expr_fatura_not_gib_taslak
+from db import (
+    fetch_all,
+    fetch_one,
+    execute,
+    execute_returning,
+    ensure_dashboard_kisayol_tables,
+    ensure_faturalar_amount_columns,
+    sql_expr_fatura_not_gib_taslak,
+)
 from utils.musteri_arama import customers_arama_sql_giris_genis, customers_arama_params_giris_genis
 from datetime import date, timedelta
 from phone_util import format_phone_for_display
@@ -19,80 +27,9 @@ def _ensure_dashboard_kisayol_table():
     global _DASHBOARD_KISAYOL_TABLE_READY
     if _DASHBOARD_KISAYOL_TABLE_READY:
         return
-    try:
-        execute("""
-            CREATE TABLE IF NOT EXISTS dashboard_kisayollar (
-                slot_key TEXT PRIMARY KEY,
-                label TEXT NOT NULL,
-                url TEXT,
-                icon TEXT NOT NULL,
-                sira INTEGER NOT NULL DEFAULT 0,
-                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-        """)
-        # URL'ler url_for ile çözülmüş path'ler:
-        # faturalar.yeni_fatura -> /faturalar/yeni
-        # tahsilat.index -> /tahsilat/
-        # randevu.panel -> /randevu/panel
-        # sira: yeni_fatura/yeni_tahsilat sidebar'da mevcut dinamik kutulardan önce;
-        # randevu kart satırına (cards-slot) gider.
-        defaults = [
-            ("yeni_fatura", "Yeni Fatura", "/faturalar/yeni", "fa-file-invoice", 0),
-            ("yeni_tahsilat", "Yeni Tahsilat", "/tahsilat/", "fa-money-bill-wave", 1),
-            ("randevu", "Randevu", "/randevu/panel", "fa-calendar", 0),
-            ("tediye", "Tediye", "/giris/?tab=11", "fa-hand-holding-dollar", 1),
-            ("musteri_ekle_1", "Müşteri Ekle", "/musteriler/ekle", "fa-user-plus", 2),
-            ("musteri_listesi", "Müşteri Listesi", "/musteriler/list", "fa-list", 3),
-            ("musteri_ekle_2", "Müşteri Ekle", "/musteriler/ekle", "fa-user-plus", 4),
-            ("toplu_whatsapp", "Toplu WhatsApp", "/musteriler/list?filtre=whatsapp", "fa-whatsapp", 5),
-            ("toplu_faturalama", "Toplu Faturalama", "/faturalar/", "fa-file-invoice", 6),
-            ("tufe_senaryosu", "TÜFE Senaryosu", "/tufe/", "fa-chart-line", 7),
-            ("geri_donus", "Geri Dönüş", None, "fa-clock-o", 8),
-            # İstatistik kartları (Aşama 3) — sira 100+; UI dash-stat-wrap ile bağlanır
-            ("stat_bugun_kargo", "📦 Bugün Gelen Kargolar", "/dashboard/?filtre=kargo", "fa-truck", 100),
-            ("stat_geciken_toplam", "💰 Geciken Toplam Alacak", "/dashboard/?filtre=kritik", "fa-money-bill", 101),
-            ("stat_kritik", "⚠ Kritik Geciken (30+ gün)", "/dashboard/?filtre=kritik", "fa-exclamation-triangle", 102),
-            ("stat_yakin", "⏳ Yakın Geciken (1–30 gün)", "/dashboard/?filtre=yakin", "fa-hourglass-half", 103),
-            ("stat_bugun_tahsilat", "✅ Bugün Beklenen Tahsilat", "/tahsilat/", "fa-hand-holding-usd", 104),
-            ("stat_tufe", "📈 TÜFE Güncel / Oran", "/tufe/", "fa-chart-line", 105),
-            ("stat_sozlesme", "📅 Sözleşmesi Bitecekler", "/dashboard/?filtre=sozlesme", "fa-calendar", 106),
-            ("stat_bos", "🏢 Boş Ofis", "/dashboard/?filtre=bos", "fa-building", 107),
-            # Filtre butonları — url daima NULL; data-filtre HTML'de sabit kalır
-            ("filtre_tumu", "Tümü", None, "fa-th-large", 50),
-            ("filtre_bos", "Boş Ofisler", None, "fa-building", 51),
-            ("filtre_tam", "Ödemesi Tam", None, "fa-check-circle", 52),
-            ("filtre_sozlesme", "Sözleşme Bitiş Yakın", None, "fa-calendar", 53),
-            ("filtre_yakin", "Yakın Gecikme", None, "fa-hourglass-half", 54),
-            ("filtre_kritik", "Kritik Gecikme", None, "fa-exclamation-triangle", 55),
-            ("filtre_kargo", "Kargosu Bekleyen", None, "fa-truck", 56),
-        ]
-        for slot_key, label, url, icon, sira in defaults:
-            execute(
-                """
-                INSERT INTO dashboard_kisayollar (slot_key, label, url, icon, sira)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (slot_key) DO NOTHING
-                """,
-                (slot_key, label, url, icon, sira),
-            )
-        execute("""
-            CREATE TABLE IF NOT EXISTS dashboard_kisayollar_user (
-                user_id INTEGER NOT NULL,
-                slot_key TEXT NOT NULL,
-                label TEXT NULL,
-                url TEXT NULL,
-                icon TEXT NULL,
-                sira INTEGER NULL,
-                gorunur_mu BOOLEAN NOT NULL DEFAULT TRUE,
-                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                PRIMARY KEY (user_id, slot_key)
-            )
-        """)
-    except Exception as e:
-        print(f"dashboard_kisayollar: {e}")
+    ensure_dashboard_kisayol_tables()
     _DASHBOARD_KISAYOL_TABLE_READY = True
 
-
 AYLAR = ["Ocak", "Şubat", "Mart", "Nisan", "Mayıs", "Haziran",
          "Temmuz", "Ağustos", "Eylül", "Ekim", "Kasım", "Aralık"]
 
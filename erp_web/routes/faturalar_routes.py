@@ -10,20 +10,23 @@ from flask import (
     Response,
     abort,
     current_app,
+    stream_with_context,
 )
 from flask_login import login_required, current_user
 from functools import wraps
 from datetime import datetime, date, timedelta
-from cache_utils import CACHE_KEY_DUZENLI_FATURA, CACHE_TTL_SEC, simple_cache_get, simple_cache_set
+from cache_utils import CACHE_KEY_DUZENLI_FATURA, CACHE_TTL_SEC, cache_region, simple_cache_get, simple_cache_set
 from db import (
     db,
     fetch_all,
+    fetch_iter,
     fetch_one,
     execute,
     execute_returning,
     ensure_faturalar_amount_columns,
     ensure_faturalar_yon_kolon,
     ensure_auto_invoice_tables,
+    ensure_auto_invoice_devam,
     ensure_customers_durum,
     ensure_customers_is_active,
     ensure_duzenli_fatura_secenekleri_table,
@@ -38,7 +41,7 @@ from db import (
     ensure_customers_grup2_secimleri,
     ensure_grup2_etiketleri_table,
     ensure_customers_balance_trigger,
-    ensure_tahsilatlar_columns,
+    ensure_tahsilatlar_tahsil_eden_column,
     sql_expr_fatura_not_gib_taslak,
     sql_expr_fatura_erp_taslak,
     sql_expr_fatura_gib_imzalanmis,
@@ -50,7 +53,20 @@ from utils.musteri_arama import (
     customers_arama_params_giris_genis,
     customers_arama_sql_params_giris_genis_tokens,
 )
+from utils.musteri_arama_indeks import musteri_arama_indeksi
 from utils.musteri_gorunur import musteri_gorunur_sql
+from utils.sayfalama import (
+    TARIH_EN_ESKI,
+    TARIH_EN_YENI,
+    filtre_imzasi,
+    imlec_coz,
+    keyset_kosulu,
+    liste_toplamlari,
+    sayfa_boyutu,
+    sayfa_kes,
+)
+from services.job_queue import enqueue, enqueue_view_if_async, job_handler, job_progress, job_workers_count
+from services.pdf_servisi import pdf_arka_planda, pdf_olustur
 import os
 import sys
 import io
@@ -296,8 +312,7 @@ def _ensure_tahsil_eden_column():
     if _TAHSIL_EDEN_COL_READY:
         return
     try:
-        ensure_tahsilatlar_columns()
-        execute("ALTER TABLE tahsilatlar ADD COLUMN IF NOT EXISTS tahsil_eden TEXT")
+        ensure_tahsilatlar_tahsil_eden_column()
     except Exception:
         pass
     _TAHSIL_EDEN_COL_READY = True
@@ -2929,8 +2944,10 @@ def _firma_ozet_sayfa_grid_hesapla(liste_hizli: bool, page_size: int, esik: int
 
 _firma_ozet_rapor_schema_ready = False
 _firma_ozet_rapor_schema_lock = threading.Lock()
-_fatura_rapor_firma_resp_cache: dict[str, dict] = {}
-_fatura_rapor_firma_resp_cache_lock = threading.Lock()
+# TTL her okumada FIRMA_OZET_RESP_CACHE_SEC ile uygulanır; bölge TTL'i üst sınır.
+_FATURA_RAPOR_FIRMA_RESP_CACHE = cache_region(
+    "firma_ozet_resp", max_entries=96, max_bytes=32 * 1024 * 1024, ttl_sec=600.0
+)
 
 
 def _firma_ozet_rapor_schema_ensure_once() -> None:
@@ -2953,6 +2970,70 @@ def _firma_ozet_rapor_schema_ensure_once() -> None:
         _firma_ozet_rapor_schema_ready = True
 
 
+_FIRMA_OZET_BORC_OZET_KAPALI = (os.environ.get("FIRMA_OZET_BORC_OZET", "1") or "").strip().lower() in (
+    "0", "false", "no", "off"
+)
+_FIRMA_OZET_BORC_OZET_HAZIR: dict = {}
+# Özet satırı olmayan (cache yok / eski rev) sayfa müşterileri için istek başına kuyruğa atılan rebuild üst sınırı.
+_FIRMA_OZET_BORC_OZET_DEFER_MAX = 20
+
+
+def _firma_ozet_borc_ozet_hazir() -> bool:
+    """musteri_borc_ozet trigger'ı bu şemada kurulu mu; şema başına bir kez bakılır."""
+    if _FIRMA_OZET_BORC_OZET_KAPALI:
+        return False
+    from db import _tenant_schema_for_request, ensure_musteri_borc_ozet
+
+    sema = _tenant_schema_for_request() or "public"
+    hazir = _FIRMA_OZET_BORC_OZET_HAZIR.get(sema)
+    if hazir is None:
+        try:
+            ensure_musteri_borc_ozet()
+        except Exception:
+            pass
+        try:
+            hazir = bool(
+                fetch_one(
+                    "SELECT 1 AS x FROM pg_trigger "
+                    "WHERE tgname = 'trg_musteri_borc_ozet' "
+                    "AND tgrelid = 'musteri_aylik_grid_cache'::regclass"
+                )
+            )
+        except Exception:
+            hazir = False
+        _FIRMA_OZET_BORC_OZET_HAZIR[sema] = hazir
+    return hazir
+
+
+def _firma_ozet_borc_ozet_join_sql(ref: date) -> tuple[str, str]:
+    """musteri_borc_ozet okuması: (SELECT sütunları, JOIN'ler). ``ay <= ref`` olan son satır.
+
+    Yalnız güncel compute_rev + kullanılabilir payload'lı müşterilerde ``ozet_var``; diğerleri
+    current_balance yedeğine düşer (eski yoldaki grid özeti yok durumu).
+    """
+    from routes.giris_routes import AYLIK_GRID_COMPUTE_REV
+
+    ref_sql = f"DATE '{ref.isoformat()}'"
+    cols = f"""(bod.musteri_id IS NOT NULL) AS ozet_var,
+                   COALESCE(bo.toplam_borc, 0) AS ozet_toplam_borc,
+                   COALESCE(bo.geciken_ay, 0) AS ozet_geciken_ay,
+                   CASE WHEN bo.ay = {ref_sql} THEN bo.borc_month ELSE 0 END AS ozet_borc_month,
+                   CASE WHEN bo.ay = {ref_sql} THEN bo.guncel_kira ELSE 0 END AS ozet_guncel,"""
+    joins = f"""
+            LEFT JOIN musteri_borc_ozet_durum bod
+                ON bod.musteri_id = c.id
+               AND bod.kullanilabilir
+               AND bod.compute_rev = {int(AYLIK_GRID_COMPUTE_REV)}
+            LEFT JOIN LATERAL (
+                SELECT bo_i.ay, bo_i.toplam_borc, bo_i.geciken_ay, bo_i.borc_month, bo_i.guncel_kira
+                FROM musteri_borc_ozet bo_i
+                WHERE bo_i.musteri_id = c.id AND bo_i.ay <= {ref_sql}
+                ORDER BY bo_i.ay DESC
+                LIMIT 1
+            ) bo ON bod.musteri_id IS NOT NULL"""
+    return cols, joins
+
+
 def _firma_ozet_resp_cache_ttl_sec() -> float:
     try:
         return max(1.0, float(str(os.getenv("FIRMA_OZET_RESP_CACHE_SEC") or "8").strip() or "8"))
@@ -2982,23 +3063,11 @@ def _firma_ozet_resp_cache_key() -> str:
 
 
 def _firma_ozet_resp_cache_get(key: str):
-    now = time.monotonic()
-    ttl = _firma_ozet_resp_cache_ttl_sec()
-    with _fatura_rapor_firma_resp_cache_lock:
-        ent = _fatura_rapor_firma_resp_cache.get(key)
-        if not ent:
-            return None
-        if now - float(ent.get("ts") or 0) > ttl:
-            _fatura_rapor_firma_resp_cache.pop(key, None)
-            return None
-        return ent.get("payload")
+    return _FATURA_RAPOR_FIRMA_RESP_CACHE.get(key, max_age_sec=_firma_ozet_resp_cache_ttl_sec())
 
 
 def _firma_ozet_resp_cache_set(key: str, payload: dict) -> None:
-    with _fatura_rapor_firma_resp_cache_lock:
-        if len(_fatura_rapor_firma_resp_cache) > 96:
-            _fatura_rapor_firma_resp_cache.clear()
-        _fatura_rapor_firma_resp_cache[key] = {"ts": time.monotonic(), "payload": payload}
+    _FATURA_RAPOR_FIRMA_RESP_CACHE.set(key, payload)
 
 
 def _firma_ozet_sql_guncel_kdv_dahil_hizli_expr() -> str:
@@ -3072,7 +3141,9 @@ def _firma_ozet_build_rows_firma_sql(
     firma_guncel_sql: str,
     hizli: bool,
     cift_sql: str = "",
+    borc_ozet_ref: date | None = None,
 ) -> str:
+    ozet_cols, ozet_join = _firma_ozet_borc_ozet_join_sql(borc_ozet_ref) if borc_ozet_ref else ("", "")
     if hizli:
         grup2_sql = "''::text AS grup2_etiketler"
         blob_sql = "''::text AS liste_ara_blob_db"
@@ -3142,6 +3213,7 @@ def _firma_ozet_build_rows_firma_sql(
                    COALESCE(mk.aylik_kira, c.ilk_kira_bedeli) AS ilk_kira_bedeli,
                    {firma_guncel_sql} AS guncel_ay_grid_kdv_dahil,
                    COALESCE(c.current_balance, 0) AS current_balance,
+                   {ozet_cols}
                    (
                        COALESCE(c.grup2_secimleri, ARRAY[]::text[]) ||
                        CASE WHEN COALESCE(c.bizim_hesap, FALSE) THEN ARRAY['bizim_hesap']::text[] ELSE ARRAY[]::text[] END
@@ -3149,7 +3221,7 @@ def _firma_ozet_build_rows_firma_sql(
                    {grup2_sql},
                    {blob_sql}
             FROM customers c
-            {mk_join}
+            {mk_join}{ozet_join}
             WHERE {musteri_where}
               {mk_df_sql}{giri_ay_sql}{ho_sql}{arama_sql}{cift_sql}
             ORDER BY 2
@@ -3393,13 +3465,20 @@ def _firma_ozet_sql_guncel_grid_kdv_dahil_expr(ay_y: int, ay_m: int) -> str:
 )"""
 
 
-def _firma_ozet_sql_paging_queries(rows_firma_sql_no_order: str, cift_olanlar: bool):
-    """Aynı filtreli müşteri kümesi: (1) toplamlar, (2) LIMIT/OFFSET sayfa satırları."""
+def _firma_ozet_sql_paging_queries(rows_firma_sql_no_order: str, cift_olanlar: bool, borc_ozet: bool = False):
+    """Aynı filtreli müşteri kümesi: (1) toplamlar, (2) LIMIT/OFFSET sayfa satırları.
+
+    borc_ozet=True: satırlar ``borc_ozet_ref`` ile kurulmuştur; borç musteri_borc_ozet'ten.
+    """
     dk = _firma_ozet_sql_dedupe_key_sql("raw")
     pasif_rank = """(CASE WHEN lower(trim(COALESCE(raw.musteri_durum,''))) = 'pasif'
         OR (COALESCE(raw.is_active_kart, TRUE) IS NOT TRUE)
         THEN 1 ELSE 0 END)"""
     tborc = "GREATEST(0, round(COALESCE(raw.current_balance, 0)::numeric, 2))"
+    if borc_ozet:
+        tborc = f"""(CASE WHEN raw.ozet_var
+            THEN GREATEST(0, round(raw.ozet_toplam_borc::numeric, 2))
+            ELSE {tborc} END)"""
     aylik = """(CASE
         WHEN COALESCE(raw.firma_grid_aylik_net, 0) <= 0 THEN 0::numeric
         WHEN COALESCE(raw.kira_nakit, FALSE) THEN round(COALESCE(raw.firma_grid_aylik_net, 0)::numeric, 2)
@@ -3499,6 +3578,33 @@ def _firma_ozet_toplam_borc_grid_for_winner_ids(
         return 0.0
 
 
+def _firma_ozet_borc_ozet_satirlar(page_rows: list, pasifleri_dahil: bool, ref: date) -> tuple[list, list]:
+    """musteri_borc_ozet sütunlu SQL satırlarından API öğeleri; (öğeler, özetsiz müşteri id'leri).
+
+    Özetli satırda borç / geciken ay / güncel doğrudan sütunlardan; özetsizde eski yol
+    (current_balance + referans ay grid tutarı).
+    """
+    grid_map: dict[int, dict] = {}
+    for r in page_rows:
+        if r.get("ozet_var"):
+            grid_map[int(r["id"])] = {
+                "borc_month": float(r.get("ozet_borc_month") or 0),
+                "toplam_borc": float(r.get("ozet_toplam_borc") or 0),
+                "geciken_ay": int(r.get("ozet_geciken_ay") or 0),
+            }
+    satirlar = [_firma_ozet_row_to_satir_item(r, pasifleri_dahil, grid_map) for r in page_rows]
+    ozetsiz = []
+    for r, it in zip(page_rows, satirlar):
+        if r.get("ozet_var"):
+            guncel = float(r.get("ozet_guncel") or 0)
+            if guncel > 0:
+                it["guncel_kira_bedeli"] = round(guncel, 2)
+        else:
+            ozetsiz.append(it)
+    _firma_ozet_satirlara_referans_ay_guncel_uygula(ozetsiz, ref)
+    return satirlar, [int(it["musteri_id"]) for it in ozetsiz]
+
+
 def _firma_ozet_row_to_satir_item(row: dict, pasifleri_dahil: bool, grid_ozet_map: dict | None = None) -> dict:
     """Tek SQL satırından API firma_ozet öğesi (mevcut api_fatura_rapor döngüsü ile aynı mantık)."""
     gid = row.get("id")
@@ -3832,9 +3938,12 @@ def api_fatura_rapor():
                 _ensure_aylik_grid_cache_table()
             except Exception as _e_agc:
                 current_app.logger.warning("firma_ozet aylik_grid_cache ensure: %r", _e_agc)
+        # Borç özeti tablosu hazırsa borç / geciken / güncel SQL sütunlarından gelir; sayfalama,
+        # dedupe ve toplamlar tek sorguda (Python grid yürüyüşü yok). Değilse eski yol.
+        borc_ozet_ok = _firma_ozet_borc_ozet_hazir()
         _firma_guncel_grid_sql = (
             _firma_ozet_sql_guncel_kdv_dahil_hizli_expr()
-            if liste_hizli
+            if liste_hizli or borc_ozet_ok
             else _firma_ozet_sql_guncel_grid_kdv_dahil_expr(ay_y, ay_m)
         )
         musteri_where = _fatura_rapor_musteri_where_with_bizim(
@@ -3926,6 +4035,7 @@ def api_fatura_rapor():
             firma_guncel_sql=_firma_guncel_grid_sql,
             hizli=liste_hizli,
             cift_sql=cift_sql,
+            borc_ozet_ref=ref_first if borc_ozet_ok else None,
         )
         rows_firma_params = tuple(mk_df_params)
         rows_firma_sql_no_order = re.sub(r"\s+ORDER\s+BY\s+2\s*$", "", rows_firma_sql.rstrip(), flags=re.I)
@@ -3940,12 +4050,16 @@ def api_fatura_rapor():
         sql_paging_ok = False
         firma_sql_ms = None
         firma_sunucu_ms = None
-        if page_size > 0:
-            totals_sql, page_sql = _firma_ozet_sql_paging_queries(rows_firma_sql_no_order, cift_olanlar)
+        borc_ozet_kullanildi = False
+        if page_size > 0 or borc_ozet_ok:
+            totals_sql, page_sql = _firma_ozet_sql_paging_queries(
+                rows_firma_sql_no_order, cift_olanlar, borc_ozet=borc_ozet_ok
+            )
             _t_sql = time.perf_counter()
             try:
                 tot_row = fetch_one(totals_sql, rows_firma_params)
-                lim = page_size
+                # page_size=0 → tümü (LIMIT NULL).
+                lim = page_size or None
                 off = (page - 1) * page_size
                 page_rows = fetch_all(page_sql, rows_firma_params + (lim, off)) or []
                 firma_sql_ms = (time.perf_counter() - _t_sql) * 1000.0
@@ -3955,7 +4069,27 @@ def api_fatura_rapor():
                 toplam_borc = round(float(tot_row.get("sum_borc") or 0), 2)
                 toplam_aylik = round(float(tot_row.get("sum_aylik") or 0), 2)
                 grid_hesapla = _firma_ozet_sayfa_grid_hesapla(liste_hizli, page_size)
-                if not grid_hesapla:
+                if borc_ozet_ok:
+                    satirlar_resp, ozetsiz_ids = _firma_ozet_borc_ozet_satirlar(
+                        page_rows, pasifleri_dahil, ref_first
+                    )
+                    borc_ozet_kullanildi = True
+                    if ozetsiz_ids and grid_hesapla:
+                        # Eski yoldaki senkron prewarm yerine: cache yazılınca trigger özeti doldurur.
+                        try:
+                            from routes.giris_routes import _defer_aylik_grid_cache_rebuild
+
+                            for _mid in ozetsiz_ids[:_FIRMA_OZET_BORC_OZET_DEFER_MAX]:
+                                _defer_aylik_grid_cache_rebuild(_mid)
+                        except Exception as e_df:
+                            current_app.logger.warning("firma_ozet borc_ozet defer err=%r", e_df)
+                    current_app.logger.info(
+                        "firma_ozet borc_ozet page=%s rows=%s ozetsiz=%s",
+                        page,
+                        len(page_rows),
+                        len(ozetsiz_ids),
+                    )
+                elif not grid_hesapla:
                     _t_pg = time.perf_counter()
                     satirlar_resp = [
                         _firma_ozet_row_to_satir_item(r, pasifleri_dahil, None)
@@ -4064,6 +4198,7 @@ def api_fatura_rapor():
                     "firma_ozet_sql_paging fallback err=%r ms=%.2f", e_pg, firma_sql_ms
                 )
                 sql_paging_ok = False
+                borc_ozet_kullanildi = False
         _last_firma_err = None
         if not sql_paging_ok:
             _t_fb = time.perf_counter()
@@ -4210,7 +4345,8 @@ def api_fatura_rapor():
                 else ("pasif" if pasifleri_dahil else "aktif")
             )
         )
-        _firma_ozet_satirlara_referans_ay_guncel_uygula(satirlar_resp, ref_first)
+        if not borc_ozet_kullanildi:
+            _firma_ozet_satirlara_referans_ay_guncel_uygula(satirlar_resp, ref_first)
         _firma_payload = {
             "ok": True,
             "gorunum": "firma_ozet",
@@ -4274,9 +4410,13 @@ def api_fatura_rapor():
         ) = %s
         """
         df_params.append(duzenli_fatura)
-    rows_raw = fetch_all(
-        f"""
-        SELECT f.id, f.fatura_no, f.fatura_tarihi, f.vade_tarihi,
+    # Keyset yalnız sadece_faturali listede: diğer görünüm faturasız müşterileri ada göre araya katar.
+    limit = sayfa_boyutu(request.args.get("limit")) if sadece_faturali else None
+    imza = filtre_imzasi("fatura_rapor", bas, bit, duzenli_fatura)
+    sira_sql = f"COALESCE(f.fatura_tarihi::date, f.vade_tarihi::date, {TARIH_EN_YENI})"
+    rapor_sql = f"""
+        SELECT {sira_sql} AS sira_tarihi,
+               f.id, f.fatura_no, f.fatura_tarihi, f.vade_tarihi,
                f.musteri_id, f.musteri_adi,
                COALESCE(
                    NULLIF(TRIM(c.musteri_adi), ''),
@@ -4309,52 +4449,27 @@ def api_fatura_rapor():
         )
         AND {sql_expr_fatura_not_gib_taslak("f.notlar")}
         {df_where}
-        ORDER BY COALESCE(
-                f.fatura_tarihi::date,
-                f.vade_tarihi::date
-              ) ASC NULLS LAST, f.id ASC
-        """,
-        tuple([bas, bit] + df_params),
-    ) or []
-    satirlar_out = []
-    for f in rows_raw:
-        fdict = dict(f)
-        line_items = _fatura_satirlar_hesapla(fdict)
-        ft = fdict.get("fatura_tarihi")
-        ftarih = ""
-        if ft is not None and str(ft).strip():
-            ftarih = str(ft)[:10]
-        elif fdict.get("vade_tarihi") is not None and str(fdict.get("vade_tarihi") or "").strip():
-            ftarih = str(fdict.get("vade_tarihi"))[:10]
-        else:
-            ftarih = ""
-        m_ad = (fdict.get("musteri_adi_goster") or fdict.get("musteri_adi") or "").strip() or "—"
-        mid = fdict.get("musteri_id")
-        fn = (fdict.get("fatura_no") or "").strip()
-        gid = fdict.get("id")
-        genel = round(float(fdict.get("toplam") or 0), 2)
-        ettn = (str(fdict.get("ettn") or "").strip() or None)
-        for idx, ln in enumerate(line_items, start=1):
-            st = float(ln.get("satir_toplam") or 0)
-            satirlar_out.append({
-                "fatura_id": gid,
-                "fatura_no": fn,
-                "fatura_tarihi": ftarih,
-                "musteri_id": mid,
-                "musteri_adi": m_ad,
-                "satir_no": idx,
-                "satir_aciklama": ln.get("ad") or "Hizmet",
-                "miktar": round(float(ln.get("miktar") or 0), 4),
-                "birim": (ln.get("birim") or "Adet").strip(),
-                "birim_fiyat": round(float(ln.get("birim_fiyat") or 0), 2),
-                "iskonto_tutar": round(float(ln.get("iskonto_tutar") or 0), 2),
-                "kdv_orani": round(float(ln.get("kdv_orani") or 0), 2),
-                "mal_tutar": round(float(ln.get("mal_tutar") or 0), 2),
-                "kdv_tutar": round(float(ln.get("kdv_tutar") or 0), 2),
-                "satir_toplam": round(st, 2),
-                "fatura_genel_toplam": genel,
-                "ettn": ettn,
-            })
+        """
+    rapor_params = tuple([bas, bit] + df_params)
+    sayfa = {}
+    if limit is None:
+        rows_raw = fetch_all(rapor_sql + f" ORDER BY {sira_sql} ASC, f.id ASC", rapor_params) or []
+    else:
+        ks_sql, ks_params = keyset_kosulu(
+            sira_sql, "f.id", imlec_coz(request.args.get("imlec"), imza), azalan=False
+        )
+        rows_raw, sonraki = sayfa_kes(
+            fetch_all(
+                rapor_sql + ks_sql + f" ORDER BY {sira_sql} ASC, f.id ASC LIMIT %s",
+                rapor_params + ks_params + (limit + 1,),
+            ) or [],
+            limit,
+            "sira_tarihi",
+            "id",
+            imza,
+        )
+        sayfa = {"limit": limit, "has_more": sonraki is not None, "sonraki_imlec": sonraki}
+    satirlar_out = _fatura_rapor_satirlari(rows_raw)
     kesilen_fatura_satir_sayisi = len(satirlar_out)
     musteri_kapsam_adedi = 0
     donemde_faturasiz_musteri = 0
@@ -4442,7 +4557,25 @@ def api_fatura_rapor():
                 int(s.get("satir_no") or 0),
             )
         )
-    toplam_satir = round(sum(s["satir_toplam"] for s in satirlar_out), 2)
+    ozet = {
+        "fatura_adedi": len(rows_raw),
+        "satir_adedi": len(satirlar_out),
+        "kesilen_fatura_satir_sayisi": kesilen_fatura_satir_sayisi,
+        "toplam_satir_kdv_dahil": round(sum(s["satir_toplam"] for s in satirlar_out), 2),
+    }
+    if limit is not None:
+        # Sayfa değil tüm aralığın özeti; filtre kümesi başına bir kez hesaplanır.
+        def _tum_ozet():
+            faturalar_tum = fetch_all(rapor_sql, rapor_params) or []
+            tum = _fatura_rapor_satirlari(faturalar_tum)
+            return {
+                "fatura_adedi": len(faturalar_tum),
+                "satir_adedi": len(tum),
+                "kesilen_fatura_satir_sayisi": len(tum),
+                "toplam_satir_kdv_dahil": round(sum(s["satir_toplam"] for s in tum), 2),
+            }
+
+        ozet = dict(liste_toplamlari("fatura_rapor", imza, ("faturalar", "musteri_kyc"), _tum_ozet))
     kapsam_etiket = (
         "aktif"
         if sadece_aktif
@@ -4464,17 +4597,59 @@ def api_fatura_rapor():
         "sadece_aktif": sadece_aktif,
         "bizim_hesap": bizim_hesap,
         "satirlar": satirlar_out,
+        **sayfa,
         "ozet": {
-            "fatura_adedi": len(rows_raw),
-            "satir_adedi": len(satirlar_out),
-            "kesilen_fatura_satir_sayisi": kesilen_fatura_satir_sayisi,
+            **ozet,
             "musteri_kapsam_adedi": musteri_kapsam_adedi,
             "donemde_faturasiz_musteri": donemde_faturasiz_musteri,
-            "toplam_satir_kdv_dahil": toplam_satir,
         },
     })
 
 
+def _fatura_rapor_satirlari(rows_raw) -> list[dict]:
+    """Fatura rapor (satır görünümü): fatura kayıtlarından satır kırılımı öğeleri."""
+    satirlar_out = []
+    for f in rows_raw:
+        fdict = dict(f)
+        line_items = _fatura_satirlar_hesapla(fdict)
+        ft = fdict.get("fatura_tarihi")
+        ftarih = ""
+        if ft is not None and str(ft).strip():
+            ftarih = str(ft)[:10]
+        elif fdict.get("vade_tarihi") is not None and str(fdict.get("vade_tarihi") or "").strip():
+            ftarih = str(fdict.get("vade_tarihi"))[:10]
+        else:
+            ftarih = ""
+        m_ad = (fdict.get("musteri_adi_goster") or fdict.get("musteri_adi") or "").strip() or "—"
+        mid = fdict.get("musteri_id")
+        fn = (fdict.get("fatura_no") or "").strip()
+        gid = fdict.get("id")
+        genel = round(float(fdict.get("toplam") or 0), 2)
+        ettn = (str(fdict.get("ettn") or "").strip() or None)
+        for idx, ln in enumerate(line_items, start=1):
+            st = float(ln.get("satir_toplam") or 0)
+            satirlar_out.append({
+                "fatura_id": gid,
+                "fatura_no": fn,
+                "fatura_tarihi": ftarih,
+                "musteri_id": mid,
+                "musteri_adi": m_ad,
+                "satir_no": idx,
+                "satir_aciklama": ln.get("ad") or "Hizmet",
+                "miktar": round(float(ln.get("miktar") or 0), 4),
+                "birim": (ln.get("birim") or "Adet").strip(),
+                "birim_fiyat": round(float(ln.get("birim_fiyat") or 0), 2),
+                "iskonto_tutar": round(float(ln.get("iskonto_tutar") or 0), 2),
+                "kdv_orani": round(float(ln.get("kdv_orani") or 0), 2),
+                "mal_tutar": round(float(ln.get("mal_tutar") or 0), 2),
+                "kdv_tutar": round(float(ln.get("kdv_tutar") or 0), 2),
+                "satir_toplam": round(st, 2),
+                "fatura_genel_toplam": genel,
+                "ettn": ettn,
+            })
+    return satirlar_out
+
+
 @bp.route("/api/duzenli-fatura-secenekleri")
 @faturalar_gerekli
 def api_duzenli_fatura_secenekleri():
@@ -4747,6 +4922,13 @@ def yeni_fatura():
         kimlik_no = _digits(kimlik_no)
         if len(kimlik_no) not in (10, 11):
             return None
+        ix = musteri_arama_indeksi()
+        if ix is not None:
+            mid = ix.kimlik_bul(kimlik_no)
+            return fetch_one(
+                "SELECT id, name, musteri_adi, address, tax_number FROM customers WHERE id = %s",
+                (mid,),
+            ) if mid else None
         row = fetch_one(
             """
             SELECT id, name, musteri_adi, address, tax_number
@@ -5158,6 +5340,13 @@ def api_fatura_musteri_bul():
         kimlik_no = _digits(kimlik_no)
         if len(kimlik_no) not in (10, 11):
             return None
+        ix = musteri_arama_indeksi()
+        if ix is not None:
+            mid = ix.kimlik_bul(kimlik_no)
+            return fetch_one(
+                "SELECT id, name, musteri_adi, address, tax_number, vergi_dairesi FROM customers WHERE id = %s",
+                (mid,),
+            ) if mid else None
         # 10 hane VKN, 11 hane TCKN: customers ve son KYC kaydında ara.
         row = fetch_one(
             """
@@ -5786,6 +5975,24 @@ def api_musteri_odeme_duzeni():
     })
 
 
+# tahsilat_ay_dagitim'de ``t`` satırının tam biçimli |AYLIK_TAH|YYYY-MM-DD| işaretçileri (PK indeksi).
+_TAH_GUN_DAGITIM_SQL = (
+    "SELECT 1 FROM tahsilat_ay_dagitim d "
+    "WHERE d.tahsilat_id = t.id AND d.tur = 'tah' AND length(d.gun_metin) = 10"
+)
+_TAH_GUNLER_SUTUNU = (
+    "(SELECT array_agg(DISTINCT d.gun_metin) FROM tahsilat_ay_dagitim d "
+    "WHERE d.tahsilat_id = t.id AND d.tur = 'tah' AND length(d.gun_metin) = 10)"
+)
+
+
+def _tah_dagitim_hazir() -> bool:
+    """tahsilat_ay_dagitim bu şemada trigger'la güncel mi (giris_routes ile aynı kontrol)."""
+    from routes.giris_routes import _tahsilat_ay_dagitim_hazir
+
+    return _tahsilat_ay_dagitim_hazir()
+
+
 @bp.route('/tahsilatlar')
 @faturalar_gerekli
 def tahsilatlar():
@@ -5833,8 +6040,9 @@ def tahsilatlar():
             seen_ht.add(v)
             secili_hizmet_turleri.append(v)
 
-    sql = """
-        SELECT t.*,
+    dagitim = senaryo != "0" and _tah_dagitim_hazir()
+    sql = f"""
+        SELECT t.*,{(" " + _TAH_GUNLER_SUTUNU + " AS tah_gunler,") if dagitim else ""}
                c.name as musteri_adi,
                COALESCE(NULLIF(TRIM(mk.hizmet_turu), ''), NULLIF(TRIM(c.hizmet_turu), ''), '') AS rapor_hizmet_turu,
                COALESCE(mk.hazir_ofis_oda_no, c.hazir_ofis_oda_no) AS hazir_ofis_oda_no,
@@ -5857,6 +6065,21 @@ def tahsilatlar():
           AND t.created_at::date <= %s::date
         """
         params = [d0, d1]
+    elif dagitim:
+        sql += f"""
+        WHERE (
+            EXISTS (
+                {_TAH_GUN_DAGITIM_SQL}
+                  AND d.ay IS NOT NULL AND d.gun_metin::date BETWEEN %s::date AND %s::date
+            )
+            OR (
+                NOT EXISTS ({_TAH_GUN_DAGITIM_SQL})
+                AND COALESCE(f.fatura_tarihi::date, t.tahsilat_tarihi::date) >= %s::date
+                AND COALESCE(f.fatura_tarihi::date, t.tahsilat_tarihi::date) <= %s::date
+            )
+        )
+        """
+        params = [d0, d1, d0, d1]
     else:
         sql += """
         WHERE (
@@ -5954,8 +6177,11 @@ def tahsilatlar():
     filtered = []
     if senaryo != "0":
         for _t in tahsilatlar_list:
-            ac = str(_t.get("aciklama") or "")
-            marker_isos = re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac)
+            if dagitim:
+                marker_isos = list(_t.pop("tah_gunler", None) or [])
+            else:
+                ac = str(_t.get("aciklama") or "")
+                marker_isos = re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac)
             try:
                 _mid = int(_t.get("customer_id") or _t.get("musteri_id") or 0)
             except (TypeError, ValueError):
@@ -6244,6 +6470,53 @@ def _auto_inv_settings():
     }
 
 
+def _auto_month_tutar_payloaddan(payload, run_month_date, kyc_aylik_kira):
+    """_auto_month_amount_from_cache çekirdeği (sorgusuz): grid payload + son KYC aylik_kira."""
+    try:
+        from routes.giris_routes import _firma_ozet_classify_borc_month
+    except Exception:
+        _firma_ozet_classify_borc_month = None
+    if payload and isinstance(payload.get("aylar"), list):
+        key = f"{run_month_date.year}-{run_month_date.month}"
+        for a in payload["aylar"]:
+            if str(a.get("ay_key")) != key:
+                continue
+            tutar_raw = a.get("tutar_kdv_dahil")
+            brut_raw = a.get("brut_tutar_kdv")
+            if _firma_ozet_classify_borc_month is not None:
+                tutar, is_ph = _firma_ozet_classify_borc_month(tutar_raw, brut_raw)
+                if is_ph:
+                    # Placeholder (örn. 0.01 / brüt 0): geçersiz — tahmini tutar yok.
+                    return None
+                if tutar > 0:
+                    return round(float(tutar), 2)
+            else:
+                try:
+                    v = float(tutar_raw or 0)
+                    if v > 0:
+                        return round(v, 2)
+                except Exception:
+                    pass
+            break
+    net = float(kyc_aylik_kira or 0)
+    return round(net * 1.2, 2) if net > 0 else 0.0
+
+
+def _auto_month_tutar_sec(raw, son_fatura_toplam, ilk_kira_bedeli):
+    """_auto_month_amount_resolved zinciri (sorgusuz): cache → son fatura → ilk_kira_bedeli × 1.2."""
+    # Placeholder hücresi: tahmini tutar yok — fallback yok.
+    if raw is None:
+        return 0.0
+    for deger, carpan in ((raw, 1.0), (son_fatura_toplam, 1.0), (ilk_kira_bedeli, 1.2)):
+        try:
+            v = float(deger or 0)
+        except Exception:
+            v = 0.0
+        if v > 0:
+            return round(v * carpan, 2)
+    return 0.0
+
+
 def _auto_month_amount_from_cache(musteri_id, run_month_date):
     """Hedef ay grid tutarı; placeholder hücrede None (sıkı fren).
 
@@ -6253,43 +6526,18 @@ def _auto_month_amount_from_cache(musteri_id, run_month_date):
       - 0.0: ay yok / güvenilir tutar yok (KYC net×1.2 yedek veya boş)
     """
     try:
-        from routes.giris_routes import (
-            _build_aylik_grid_cache_payload,
-            _firma_ozet_classify_borc_month,
-        )
+        from routes.giris_routes import _build_aylik_grid_cache_payload
     except Exception:
         _build_aylik_grid_cache_payload = None
-        _firma_ozet_classify_borc_month = None
-    if _build_aylik_grid_cache_payload:
-        payload = _build_aylik_grid_cache_payload(int(musteri_id))
-        if payload and isinstance(payload.get("aylar"), list):
-            key = f"{run_month_date.year}-{run_month_date.month}"
-            for a in payload["aylar"]:
-                if str(a.get("ay_key")) != key:
-                    continue
-                tutar_raw = a.get("tutar_kdv_dahil")
-                brut_raw = a.get("brut_tutar_kdv")
-                if _firma_ozet_classify_borc_month is not None:
-                    tutar, is_ph = _firma_ozet_classify_borc_month(tutar_raw, brut_raw)
-                    if is_ph:
-                        # Placeholder (örn. 0.01 / brüt 0): geçersiz — tahmini tutar yok.
-                        return None
-                    if tutar > 0:
-                        return round(float(tutar), 2)
-                else:
-                    try:
-                        v = float(tutar_raw or 0)
-                        if v > 0:
-                            return round(v, 2)
-                    except Exception:
-                        pass
-                break
+    payload = _build_aylik_grid_cache_payload(int(musteri_id)) if _build_aylik_grid_cache_payload else None
+    tutar = _auto_month_tutar_payloaddan(payload, run_month_date, None)
+    if tutar is None or tutar > 0:
+        return tutar
     kyc = fetch_one(
         "SELECT aylik_kira FROM musteri_kyc WHERE musteri_id = %s ORDER BY id DESC LIMIT 1",
         (musteri_id,),
     ) or {}
-    net = float(kyc.get("aylik_kira") or 0)
-    return round(net * 1.2, 2) if net > 0 else 0.0
+    return _auto_month_tutar_payloaddan(None, run_month_date, kyc.get("aylik_kira"))
 
 
 def _auto_month_amount_resolved(musteri_id, run_month_date):
@@ -6303,15 +6551,8 @@ def _auto_month_amount_resolved(musteri_id, run_month_date):
         raw = _auto_month_amount_from_cache(musteri_id, run_month_date)
     except Exception:
         raw = 0.0
-    # Placeholder hücresi: tahmini tutar yok — fallback yok.
-    if raw is None:
-        return 0.0
-    try:
-        v = float(raw or 0)
-    except Exception:
-        v = 0.0
-    if v > 0:
-        return round(v, 2)
+    if raw is None or float(raw or 0) > 0:
+        return _auto_month_tutar_sec(raw, None, None)
 
     # KYC/cache boş ise müşterinin son pozitif toplamlı faturasını baz al.
     last_inv = fetch_one(
@@ -6326,23 +6567,12 @@ def _auto_month_amount_resolved(musteri_id, run_month_date):
         """,
         (musteri_id,),
     ) or {}
-    try:
-        v2 = float(last_inv.get("toplam") or 0)
-    except Exception:
-        v2 = 0.0
-    if v2 > 0:
-        return round(v2, 2)
-
     # Son fallback: customers.ilk_kira_bedeli (net) üzerinden KDV dahil.
     c = fetch_one(
         "SELECT ilk_kira_bedeli FROM customers WHERE id = %s",
         (musteri_id,),
     ) or {}
-    try:
-        net = float(c.get("ilk_kira_bedeli") or 0)
-    except Exception:
-        net = 0.0
-    return round(net * 1.2, 2) if net > 0 else 0.0
+    return _auto_month_tutar_sec(raw, last_inv.get("toplam"), c.get("ilk_kira_bedeli"))
 
 
 def _auto_invoice_create_for_customer(musteri_id, run_month_date):
@@ -6415,193 +6645,526 @@ def _auto_invoice_create_for_customer(musteri_id, run_month_date):
     return {"status": "created", "fatura_id": (row or {}).get("id"), "fatura_no": fatura_no, "toplam": toplam}
 
 
-def run_auto_invoice_cycle(force=False, run_date=None):
-    ensure_auto_invoice_tables()
-    now = run_date or date.today()
-    settings = _auto_inv_settings()
-    if (not force) and (not settings["enabled"]):
-        return {"ok": True, "skipped": True, "mesaj": "Otomatik fatura kapalı."}
-    if (not force) and int(now.day) != int(settings["run_day"]):
-        return {"ok": True, "skipped": True, "mesaj": "Bugün planlanan gün değil."}
-    period_key = now.strftime("%Y-%m")
-    bugun_ay = date(now.year, now.month, 1)
-    var = fetch_one("SELECT id, status FROM auto_invoice_runs WHERE period_key = %s", (period_key,))
-    if var and str(var.get("status") or "").lower() == "success" and not force:
-        return {"ok": True, "skipped": True, "mesaj": "Bu dönem zaten çalıştırılmış."}
+def _auto_invoice_env_int(ad, varsayilan, alt=1, ust=None):
+    try:
+        n = int(str(os.getenv(ad) or varsayilan).strip() or varsayilan)
+    except ValueError:
+        n = varsayilan
+    n = max(alt, n)
+    return min(ust, n) if ust is not None else n
 
-    run_row = execute_returning(
-        """INSERT INTO auto_invoice_runs (period_key, run_date, status, started_at)
-           VALUES (%s, %s, 'running', NOW())
-           ON CONFLICT (period_key)
-           DO UPDATE SET status='running', started_at=NOW(), finished_at=NULL, message=NULL
-           RETURNING id""",
-        (period_key, now),
-    )
-    run_id = (run_row or {}).get("id")
-    success_count = 0
-    fail_count = 0
-    send_gib = settings["send_gib"]
-    auto_sms = settings["auto_sms_code"]
-    gib = None
-    if send_gib:
+
+# Parti: grid girdileri / fatura INSERT / checkpoint birlikte; GİB eşzamanlılığı portal oturumu başına.
+AUTO_INVOICE_PARTI = _auto_invoice_env_int("AUTO_INVOICE_BATCH", 200)
+AUTO_INVOICE_GIB_ESZAMANLI = _auto_invoice_env_int("AUTO_INVOICE_GIB_CONCURRENCY", 2, ust=8)
+# Bu süre heartbeat gelmeyen 'running' run yarıda kalmış sayılır ve devralınır (tick = 15 dk).
+AUTO_INVOICE_BAYAT_SN = _auto_invoice_env_int("AUTO_INVOICE_STALE_SN", 900, alt=60)
+
+
+def _fatura_no_sonraki(fatura_no):
+    """_next_fatura_no biçiminde bir sonraki numara (GIB: 9, diğer önekler: 6 haneli kuyruk)."""
+    no = str(fatura_no or "")
+    w = 9 if no.upper().startswith("GIB") else 6
+    try:
+        return f"{no[:-w]}{int(no[-w:]) + 1:0{w}d}"
+    except ValueError:
+        return _next_fatura_no()
+
+
+def _auto_invoice_mevcut_aylar(bas_ay):
+    """bas_ay ve sonrası için |AUTO_INV| / |AYLIK_TUTAR| marker'lı faturalar — tek sorgu.
+
+    Dönüş: {(musteri_id, 'YYYY-MM'): {"tur", "fatura_id", "fatura_no"}}; AUTO_INV, AYLIK_TUTAR'a
+    baskın (tekil yolda önce AUTO_INV marker'ı aranır).
+    """
+    rows = fetch_all(
+        r"""
+        SELECT f.musteri_id, f.id, f.fatura_no, m[1] AS tur, m[2] AS ay
+        FROM faturalar f
+        CROSS JOIN LATERAL regexp_matches(
+            f.notlar, '\|(AUTO_INV|AYLIK_TUTAR)\|([0-9]{4}-[0-9]{2})(?:-01)?\|', 'g'
+        ) AS m
+        WHERE f.musteri_id IS NOT NULL
+          AND (f.notlar LIKE '%%|AUTO_INV|%%' OR f.notlar LIKE '%%|AYLIK_TUTAR|%%')
+          AND m[2] >= %s
+        ORDER BY f.id DESC
+        """,
+        (bas_ay.strftime("%Y-%m"),),
+    ) or []
+    mevcut = {}
+    for r in rows:
         try:
-            from gib_earsiv import BestOfficeGIBManager, build_fatura_data_from_db
-            gib = BestOfficeGIBManager()
-        except Exception:
-            gib = None
-            send_gib = False
+            k = (int(r["musteri_id"]), str(r["ay"]))
+        except (TypeError, ValueError):
+            continue
+        onceki = mevcut.get(k)
+        if onceki is None or (onceki["tur"] != "AUTO_INV" and r["tur"] == "AUTO_INV"):
+            mevcut[k] = {"tur": r["tur"], "fatura_id": r["id"], "fatura_no": r["fatura_no"]}
+    return mevcut
+
+
+def _auto_invoice_son_toplamlar(musteri_ids):
+    """Müşteri başına son pozitif toplamlı (taslak olmayan) fatura — _auto_month_amount_resolved yedeği."""
+    rows = fetch_all(
+        f"""
+        SELECT DISTINCT ON (musteri_id) musteri_id, toplam
+        FROM faturalar
+        WHERE musteri_id = ANY(%s)
+          AND COALESCE(toplam, 0) > 0
+          AND {sql_expr_fatura_not_gib_taslak("notlar")}
+        ORDER BY musteri_id, (fatura_tarihi::date) DESC, id DESC
+        """,
+        (list(musteri_ids),),
+    ) or []
+    return {int(r["musteri_id"]): r.get("toplam") for r in rows}
+
+
+_GRID_HATA = object()
 
+
+def _auto_invoice_parti_planla(parti, adlar, now, max_by_mid, mevcut, tufe_map):
+    """Parti müşterileri için ay ay karar (yazmaz): {mid: [(durum, ay, ek), ...]}.
+
+    Kurallar _auto_invoice_create_for_customer ile aynı; grid girdileri _aylik_grid_bulk_scope,
+    KYC / ilk kira parti ön yüklemesinden, son fatura toplamı tek sorgudan gelir.
+    """
     from .giris_routes import (
         _add_months,
-        _load_max_aylik_tah_iso_by_musteri,
+        _aylik_grid_bulk_scope,
+        _aylik_grid_core_scope,
+        _build_aylik_grid_cache_payload,
+        _musteri_kyc_grup_satir_son,
         _pesin_borclandirma_horizon_for_musteri,
     )
 
-    # Peşin ufuk: tek seferlik yükleme (müşteri döngüsünde tekrar sorgu yok).
-    max_by_mid = _load_max_aylik_tah_iso_by_musteri(
-        exclude_btufrt=True, only_fully_paid=True
-    )
-
-    musteri_rows = fetch_all(
-        """
-        SELECT c.id
-        FROM customers c
-        WHERE LOWER(COALESCE(c.durum, 'aktif')) != 'pasif'
-          AND EXISTS (SELECT 1 FROM musteri_kyc k WHERE k.musteri_id = c.id)
-        ORDER BY c.id
-        """
-    ) or []
-    for mr in musteri_rows:
-        mid = int(mr.get("id"))
-        try:
-            horizon = _pesin_borclandirma_horizon_for_musteri(
-                mid, max_by_mid=max_by_mid, today=now
-            )
-            # Catch-up: yalnız bugün → horizon (geçmişe gitme).
+    log = logging.getLogger(__name__)
+    bugun_ay = date(now.year, now.month, 1)
+    son_toplam = _auto_invoice_son_toplamlar(parti)
+    plan = {}
+    with _aylik_grid_bulk_scope(parti) as pre, _aylik_grid_core_scope(
+        [_musteri_kyc_grup_satir_son(k) for k in pre["kyc"].values()], tufe_map
+    ):
+        for mid in parti:
+            adimlar = plan[mid] = []
             month = bugun_ay
-            while month <= horizon:
-                item_period_key = month.strftime("%Y-%m")
-                try:
-                    created = _auto_invoice_create_for_customer(mid, month)
-                    if created.get("status") in ("skip", "exists"):
-                        execute(
-                            """INSERT INTO auto_invoice_items (run_id, musteri_id, fatura_id, period_key, status, error_message)
-                               VALUES (%s,%s,%s,%s,%s,%s)""",
-                            (
-                                run_id,
-                                mid,
-                                created.get("fatura_id"),
-                                item_period_key,
-                                created.get("status"),
-                                created.get("error"),
-                            ),
-                        )
-                        month = _add_months(month, 1)
-                        continue
-                    if created.get("status") != "created":
-                        fail_count += 1
-                        execute(
-                            """INSERT INTO auto_invoice_items (run_id, musteri_id, period_key, status, error_message)
-                               VALUES (%s,%s,%s,'error',%s)""",
-                            (
-                                run_id,
-                                mid,
-                                item_period_key,
-                                created.get("error") or "Fatura oluşturulamadı.",
-                            ),
-                        )
+            try:
+                ham = pre["kyc"].get(mid) or {}
+                horizon = _pesin_borclandirma_horizon_for_musteri(mid, max_by_mid=max_by_mid, today=now)
+                payload = False
+                # Catch-up: yalnız bugün → horizon (geçmişe gitme).
+                while month <= horizon:
+                    ay_key = month.strftime("%Y-%m")
+                    var = mevcut.get((mid, ay_key))
+                    if var is not None:
+                        if var["tur"] == "AUTO_INV":
+                            adimlar.append(("exists", month, {"fatura_id": var["fatura_id"]}))
+                        else:
+                            adimlar.append(("exists", month, {"error": "Ay için AYLIK_TUTAR/AUTO_INV faturası zaten var."}))
                         month = _add_months(month, 1)
                         continue
-                    fatura_id = int(created.get("fatura_id"))
-                    gib_uuid = None
-                    item_status = "created"
-                    err = None
-                    # Altın kural: GİB yalnız bugünün ayı; peşin/gelecek aylar fail-closed.
-                    allow_gib_for_month = bool(send_gib) and (month == bugun_ay)
-                    if month > bugun_ay:
-                        allow_gib_for_month = False
-                    if allow_gib_for_month and gib and gib.is_available():
+                    if payload is False:
                         try:
-                            from gib_earsiv import build_fatura_data_from_db
-                            f_data = build_fatura_data_from_db(fatura_id, fetch_one)
-                            gib_uuid = gib.fatura_taslak_olustur(f_data)
-                            item_status = "gib_draft" if gib_uuid else "gib_fail"
-                            # ERP faturalar satırına da yaz (auto_invoice_items status/gib_uuid aynı kalır).
-                            if gib_uuid:
-                                try:
-                                    st_draft = _gib_kayit_bekle(gib, gib_uuid, deneme=8, bekleme_s=1.5) or {}
-                                    if not st_draft:
-                                        logging.getLogger(__name__).warning(
-                                            "auto_invoice kayit_bekle_tukendi (taslak) fatura_id=%s uuid=%s",
-                                            fatura_id,
-                                            str(gib_uuid)[:36],
-                                        )
-                                    gib_ettn = _extract_gib_ettn_from_obj(st_draft) or gib_uuid
-                                    gib_fatura_no = _extract_gib_fatura_no_from_obj(st_draft)
-                                    _fatura_gib_bilgilerini_yaz(
-                                        fatura_id, gib_ettn, gib_fatura_no, gib_asama="taslak"
-                                    )
-                                except Exception:
-                                    logging.getLogger(__name__).exception(
-                                        "auto_invoice ERP taslak yazımı başarısız fatura_id=%s uuid=%s",
-                                        fatura_id,
-                                        str(gib_uuid)[:36],
-                                    )
-                            if gib_uuid and auto_sms:
-                                ok_sms = gib.sms_onay_ve_imzala(gib_uuid, auto_sms)
-                                item_status = "gib_signed" if ok_sms else "gib_sms_fail"
-                                if ok_sms:
-                                    try:
-                                        st_imza = _gib_kayit_bekle(gib, gib_uuid, deneme=10, bekleme_s=1.2) or {}
-                                        if not st_imza:
-                                            logging.getLogger(__name__).warning(
-                                                "auto_invoice kayit_bekle_tukendi (imza) fatura_id=%s uuid=%s",
-                                                fatura_id,
-                                                str(gib_uuid)[:36],
-                                            )
-                                        gib_ettn = _extract_gib_ettn_from_obj(st_imza) or gib_uuid
-                                        gib_fatura_no = _extract_gib_fatura_no_from_obj(st_imza)
-                                        _fatura_gib_bilgilerini_yaz(
-                                            fatura_id, gib_ettn, gib_fatura_no, gib_asama="imzali"
-                                        )
-                                    except Exception:
-                                        logging.getLogger(__name__).exception(
-                                            "auto_invoice ERP imza yazımı başarısız fatura_id=%s uuid=%s",
-                                            fatura_id,
-                                            str(gib_uuid)[:36],
-                                        )
-                        except Exception as ge:
-                            item_status = "gib_fail"
-                            err = str(ge)
-                    execute(
-                        """INSERT INTO auto_invoice_items (run_id, musteri_id, fatura_id, period_key, status, gib_uuid, error_message)
-                           VALUES (%s,%s,%s,%s,%s,%s,%s)""",
-                        (run_id, mid, fatura_id, item_period_key, item_status, gib_uuid, err),
-                    )
-                    success_count += 1
-                except Exception as e:
-                    fail_count += 1
-                    execute(
-                        """INSERT INTO auto_invoice_items (run_id, musteri_id, period_key, status, error_message)
-                           VALUES (%s,%s,%s,'error',%s)""",
-                        (run_id, mid, item_period_key, str(e)),
+                            payload = _build_aylik_grid_cache_payload(mid, tufe_map=tufe_map)
+                        except Exception:
+                            # Tekil yolda olduğu gibi: hesap hatası → cache tutarı 0 (KYC yedeği yok).
+                            log.exception("auto_invoice grid payload musteri_id=%s", mid)
+                            payload = _GRID_HATA
+                    if payload is _GRID_HATA:
+                        raw = 0.0
+                    else:
+                        raw = _auto_month_tutar_payloaddan(payload, month, ham.get("aylik_kira"))
+                    toplam = _auto_month_tutar_sec(raw, son_toplam.get(mid), ham.get("ilk_kira_bedeli"))
+                    if toplam <= 0:
+                        if raw is None:
+                            log.warning("auto_invoice skip placeholder musteri_id=%s ay=%s", mid, ay_key)
+                        adimlar.append(("skip", month, {"error": "Aylık tutar bulunamadı veya 0."}))
+                    else:
+                        adimlar.append(("created", month, {"toplam": toplam, "musteri_adi": adlar.get(mid)}))
+                        # Tekil yolda sonraki ayın "son fatura" yedeği bu faturayı görür.
+                        son_toplam[mid] = toplam
+                        mevcut[(mid, ay_key)] = {"tur": "AUTO_INV", "fatura_id": None, "fatura_no": None}
+                    month = _add_months(month, 1)
+            except Exception as e:
+                log.exception("auto_invoice planlama musteri_id=%s", mid)
+                adimlar.append(("error", month, {"error": str(e)}))
+    return plan
+
+
+def _auto_invoice_parti_yaz(run_id, plan, son_mid):
+    """Parti kararlarını tek transaction'da yazar: faturalar + auto_invoice_items + run checkpoint.
+
+    Dönüş: (oluşan, hatalı). Fatura numaraları parti başında bir kez _next_fatura_no ile alınıp
+    ardışık artırılır.
+    """
+    from psycopg2.extras import execute_values
+
+    olusacak = []
+    kalemler = []
+    hatali = 0
+    for mid, adimlar in plan.items():
+        for durum, month, ek in adimlar:
+            if durum == "created":
+                olusacak.append((mid, month, ek))
+                continue
+            if durum == "error":
+                hatali += 1
+            kalemler.append((run_id, mid, ek.get("fatura_id"), month.strftime("%Y-%m"), durum, ek.get("error")))
+    with db() as conn:
+        cur = conn.cursor()
+        if olusacak:
+            fatura_no = _next_fatura_no()
+            satirlar = []
+            for mid, month, ek in olusacak:
+                toplam = ek["toplam"]
+                marker = f"|AUTO_INV|{month.strftime('%Y-%m')}|"
+                notlar = f"{_AY_ADLARI_TR[month.month - 1]} {month.year} otomatik kira faturası {marker}"
+                satirlar.append(
+                    (
+                        fatura_no,
+                        mid,
+                        ek.get("musteri_adi") or "Müşteri",
+                        round(toplam / 1.2, 2),
+                        round(toplam - (toplam / 1.2), 2),
+                        toplam,
+                        "odenmedi",
+                        month,
+                        month,
+                        notlar,
                     )
-                month = _add_months(month, 1)
+                )
+                fatura_no = _fatura_no_sonraki(fatura_no)
+            # Tek VALUES listesi (page_size = satır sayısı): RETURNING sırası satır sırası.
+            donen = execute_values(
+                cur,
+                """INSERT INTO faturalar (
+                       fatura_no, musteri_id, musteri_adi, tutar, kdv_tutar, toplam,
+                       durum, fatura_tarihi, vade_tarihi, notlar
+                   ) VALUES %s
+                   RETURNING id""",
+                satirlar,
+                page_size=len(satirlar),
+                fetch=True,
+            )
+            for (mid, month, _ek), r in zip(olusacak, donen):
+                kalemler.append((run_id, mid, r["id"], month.strftime("%Y-%m"), "created", None))
+        if kalemler:
+            execute_values(
+                cur,
+                """INSERT INTO auto_invoice_items (run_id, musteri_id, fatura_id, period_key, status, error_message)
+                   VALUES %s""",
+                kalemler,
+                page_size=500,
+            )
+        cur.execute(
+            """UPDATE auto_invoice_runs
+               SET son_musteri_id = %s, success_count = COALESCE(success_count, 0) + %s,
+                   fail_count = COALESCE(fail_count, 0) + %s, heartbeat_at = NOW()
+               WHERE id = %s""",
+            (son_mid, len(olusacak), hatali, run_id),
+        )
+    return len(olusacak), hatali
+
+
+def _auto_invoice_parti_isle(run_id, parti, adlar, now, max_by_mid, mevcut, tufe_map):
+    """Planla + yaz; parti yazımı düşerse müşteri müşteri yeniden dener (hata o müşteride kalır)."""
+    plan = _auto_invoice_parti_planla(parti, adlar, now, max_by_mid, mevcut, tufe_map)
+    try:
+        return _auto_invoice_parti_yaz(run_id, plan, parti[-1])
+    except Exception:
+        logging.getLogger(__name__).exception(
+            "auto_invoice parti yazımı başarısız (%s–%s); tek tek deneniyor", parti[0], parti[-1]
+        )
+    olusan = hatali = 0
+    for mid in parti:
+        try:
+            o, h = _auto_invoice_parti_yaz(run_id, {mid: plan.get(mid) or []}, mid)
         except Exception as e:
-            fail_count += 1
+            ay = (plan.get(mid) or [(None, date(now.year, now.month, 1), None)])[0][1]
+            o, h = 0, 1
+            with db() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    """INSERT INTO auto_invoice_items (run_id, musteri_id, period_key, status, error_message)
+                       VALUES (%s,%s,%s,'error',%s)""",
+                    (run_id, mid, ay.strftime("%Y-%m"), str(e)),
+                )
+                cur.execute(
+                    """UPDATE auto_invoice_runs
+                       SET son_musteri_id = %s, fail_count = COALESCE(fail_count, 0) + 1, heartbeat_at = NOW()
+                       WHERE id = %s""",
+                    (mid, run_id),
+                )
+        olusan += o
+        hatali += h
+    return olusan, hatali
+
+
+def _auto_invoice_gib_gonder(gib, fatura_id, auto_sms, mevcut_uuid=None):
+    """Tek faturayı GİB'e taslak (+ auto_sms varsa imza) gönderir; (kalem durumu, uuid, hata).
+
+    mevcut_uuid: faturanın GİB taslağı zaten var (ETTN yazılmış) — yeni taslak açılmaz, yalnız imza.
+    """
+    from gib_earsiv import build_fatura_data_from_db
+
+    log = logging.getLogger(__name__)
+    gib_uuid = mevcut_uuid
+    try:
+        if not gib_uuid:
+            f_data = build_fatura_data_from_db(fatura_id, fetch_one)
+            gib_uuid = gib.fatura_taslak_olustur(f_data)
+        item_status = "gib_draft" if gib_uuid else "gib_fail"
+        # ERP faturalar satırına da yaz (auto_invoice_items status/gib_uuid aynı kalır).
+        if gib_uuid and not mevcut_uuid:
+            try:
+                st_draft = _gib_kayit_bekle(gib, gib_uuid, deneme=8, bekleme_s=1.5) or {}
+                if not st_draft:
+                    log.warning(
+                        "auto_invoice kayit_bekle_tukendi (taslak) fatura_id=%s uuid=%s",
+                        fatura_id,
+                        str(gib_uuid)[:36],
+                    )
+                gib_ettn = _extract_gib_ettn_from_obj(st_draft) or gib_uuid
+                gib_fatura_no = _extract_gib_fatura_no_from_obj(st_draft)
+                _fatura_gib_bilgilerini_yaz(fatura_id, gib_ettn, gib_fatura_no, gib_asama="taslak")
+            except Exception:
+                log.exception(
+                    "auto_invoice ERP taslak yazımı başarısız fatura_id=%s uuid=%s",
+                    fatura_id,
+                    str(gib_uuid)[:36],
+                )
+        if gib_uuid and auto_sms:
+            ok_sms = gib.sms_onay_ve_imzala(gib_uuid, auto_sms)
+            item_status = "gib_signed" if ok_sms else "gib_sms_fail"
+            if ok_sms:
+                try:
+                    st_imza = _gib_kayit_bekle(gib, gib_uuid, deneme=10, bekleme_s=1.2) or {}
+                    if not st_imza:
+                        log.warning(
+                            "auto_invoice kayit_bekle_tukendi (imza) fatura_id=%s uuid=%s",
+                            fatura_id,
+                            str(gib_uuid)[:36],
+                        )
+                    gib_ettn = _extract_gib_ettn_from_obj(st_imza) or gib_uuid
+                    gib_fatura_no = _extract_gib_fatura_no_from_obj(st_imza)
+                    _fatura_gib_bilgilerini_yaz(fatura_id, gib_ettn, gib_fatura_no, gib_asama="imzali")
+                except Exception:
+                    log.exception(
+                        "auto_invoice ERP imza yazımı başarısız fatura_id=%s uuid=%s",
+                        fatura_id,
+                        str(gib_uuid)[:36],
+                    )
+        return item_status, gib_uuid, None
+    except Exception as ge:
+        return "gib_fail", gib_uuid, str(ge)
+
+
+def _auto_invoice_gib_asamasi(run_id, period_key, auto_sms):
+    """Run'ın bu ay 'created' kalemlerini GİB'e gönderir (en çok AUTO_INVOICE_GIB_ESZAMANLI paralel).
+
+    Kalem GİB çağrısından önce 'gib_sending' işaretlenir, sonuç sonra yazılır; yarıda kalırsa
+    yeniden çalıştırma kalan kalemlerden sürer. Mükerrer taslak açılmaz: ETTN'i yazılmış fatura
+    yeniden gönderilmez (gerekirse yalnız imzalanır); ETTN'siz kalmış 'gib_sending' kalemi
+    (taslak GİB'de açılmış olabilir) 'gib_belirsiz' işaretlenir, elle kontrol edilir.
+    İş parçacığı başına ayrı GİB oturumu (manager durumludur). Dönüş: GİB adımı hatalı kalem sayısı.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from db import _tenant_schema_for_request, tenant_schema_scope
+
+    kalemler = fetch_all(
+        f"""SELECT i.id, i.fatura_id, i.status,
+                  NULLIF(BTRIM(COALESCE(f.ettn, '')), '') AS ettn,
+                  COALESCE({sql_expr_fatura_gib_imzalanmis('f.notlar')}, FALSE) AS imzali
+           FROM auto_invoice_items i
+           LEFT JOIN faturalar f ON f.id = i.fatura_id
+           WHERE i.run_id = %s AND i.status IN ('created', 'gib_sending') AND i.period_key = %s
+             AND i.fatura_id IS NOT NULL
+           ORDER BY i.id""",
+        (run_id, period_key),
+    ) or []
+    if not kalemler:
+        return 0
+    try:
+        from gib_earsiv import BestOfficeGIBManager
+
+        if not BestOfficeGIBManager().is_available():
+            return 0
+    except Exception:
+        return 0
+    from flask import has_request_context
+
+    sema = _tenant_schema_for_request()
+    yerel = threading.local()
+    # İstek içinde (DB_REQUEST_TX) kalemler henüz commit edilmemiş olabilir: iş parçacığı yok.
+    eszamanli = 1 if has_request_context() else min(AUTO_INVOICE_GIB_ESZAMANLI, len(kalemler))
+
+    def _bir(kalem):
+        with tenant_schema_scope(sema):
+            ettn = kalem.get("ettn")
+            if ettn and (kalem.get("imzali") or not auto_sms):
+                durum, gib_uuid, err = ("gib_signed" if kalem.get("imzali") else "gib_draft"), ettn, None
+            elif not ettn and kalem.get("status") == "gib_sending":
+                durum, gib_uuid = "gib_belirsiz", None
+                err = "Önceki GİB gönderimi yarıda kaldı; taslak portalda açılmış olabilir, elle kontrol edin."
+            else:
+                execute("UPDATE auto_invoice_items SET status = 'gib_sending' WHERE id = %s", (kalem["id"],))
+                gib = getattr(yerel, "gib", None)
+                if gib is None:
+                    gib = yerel.gib = BestOfficeGIBManager()
+                durum, gib_uuid, err = _auto_invoice_gib_gonder(
+                    gib, int(kalem["fatura_id"]), auto_sms, mevcut_uuid=ettn
+                )
             execute(
-                """INSERT INTO auto_invoice_items (run_id, musteri_id, period_key, status, error_message)
-                   VALUES (%s,%s,%s,'error',%s)""",
-                (run_id, mid, period_key, str(e)),
+                "UPDATE auto_invoice_items SET status = %s, gib_uuid = %s, error_message = %s WHERE id = %s",
+                (durum, gib_uuid, err, kalem["id"]),
             )
+            return durum
 
-    execute(
-        """UPDATE auto_invoice_runs
-           SET status=%s, finished_at=NOW(), success_count=%s, fail_count=%s, message=%s
-           WHERE id=%s""",
-        ("success" if fail_count == 0 else "partial", success_count, fail_count, f"{success_count} başarılı, {fail_count} hatalı", run_id),
+    hatali = 0
+    son_nabiz = time.monotonic()
+
+    def _sonuc(i, sonuc_al):
+        nonlocal hatali, son_nabiz
+        try:
+            if sonuc_al() in ("gib_fail", "gib_sms_fail", "gib_belirsiz"):
+                hatali += 1
+        except Exception:
+            logging.getLogger(__name__).exception("auto_invoice GİB kalemi run_id=%s", run_id)
+        job_progress(i, len(kalemler), "GİB gönderimi")
+        if time.monotonic() - son_nabiz >= 30:
+            son_nabiz = time.monotonic()
+            execute("UPDATE auto_invoice_runs SET heartbeat_at = NOW() WHERE id = %s", (run_id,))
+
+    if eszamanli <= 1:
+        for i, k in enumerate(kalemler, 1):
+            _sonuc(i, lambda k=k: _bir(k))
+        return hatali
+    pool = ThreadPoolExecutor(max_workers=eszamanli)
+    try:
+        futs = [pool.submit(_bir, k) for k in kalemler]
+        for i, fut in enumerate(as_completed(futs), 1):
+            _sonuc(i, fut.result)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return hatali
+
+
+def run_auto_invoice_cycle(force=False, run_date=None):
+    """Aylık otomatik fatura döngüsü: toplu planlama, partili yazım, ayrı GİB aşaması.
+
+    1) Müşteriler id sırasıyla AUTO_INVOICE_PARTI'lik partilerde: tutarlar ve mevcut
+       AUTO_INV / AYLIK_TUTAR faturaları toplu okunur, faturalar + kalemler + checkpoint
+       (auto_invoice_runs.son_musteri_id) parti başına tek transaction'da yazılır.
+    2) GİB (send_gib): yalnız bu ayın oluşan faturaları, sınırlı eşzamanlılıkla.
+    Yarıda kalan run ('failed' veya heartbeat'i AUTO_INVOICE_BAYAT_SN'den eski 'running')
+    son checkpoint'ten sürer; canlı bir 'running' varken ikinci çalışma başlamaz.
+    """
+    ensure_auto_invoice_tables()
+    ensure_auto_invoice_devam()
+    now = run_date or date.today()
+    settings = _auto_inv_settings()
+    if (not force) and (not settings["enabled"]):
+        return {"ok": True, "skipped": True, "mesaj": "Otomatik fatura kapalı."}
+    if (not force) and int(now.day) != int(settings["run_day"]):
+        return {"ok": True, "skipped": True, "mesaj": "Bugün planlanan gün değil."}
+    period_key = now.strftime("%Y-%m")
+    bugun_ay = date(now.year, now.month, 1)
+    var = fetch_one("SELECT id, status FROM auto_invoice_runs WHERE period_key = %s", (period_key,))
+    if var and str(var.get("status") or "").lower() == "success" and not force:
+        return {"ok": True, "skipped": True, "mesaj": "Bu dönem zaten çalıştırılmış."}
+
+    # Sahiplenme tek ifadede: canlı 'running' varsa satır dönmez. Yarıda kalan run
+    # checkpoint ve sayaçlarını korur; bitmiş (success / partial) run baştan başlar.
+    run_row = execute_returning(
+        """INSERT INTO auto_invoice_runs (period_key, run_date, status, started_at, heartbeat_at, son_musteri_id)
+           VALUES (%s, %s, 'running', NOW(), NOW(), 0)
+           ON CONFLICT (period_key) DO UPDATE SET
+               status = 'running',
+               son_musteri_id = CASE WHEN auto_invoice_runs.status IN ('running', 'failed')
+                                     THEN COALESCE(auto_invoice_runs.son_musteri_id, 0) ELSE 0 END,
+               success_count = CASE WHEN auto_invoice_runs.status IN ('running', 'failed')
+                                    THEN COALESCE(auto_invoice_runs.success_count, 0) ELSE 0 END,
+               fail_count = CASE WHEN auto_invoice_runs.status IN ('running', 'failed')
+                                 THEN COALESCE(auto_invoice_runs.fail_count, 0) ELSE 0 END,
+               started_at = NOW(), heartbeat_at = NOW(), finished_at = NULL, message = NULL
+           WHERE auto_invoice_runs.status IS DISTINCT FROM 'running'
+              OR auto_invoice_runs.heartbeat_at IS NULL
+              OR auto_invoice_runs.heartbeat_at < NOW() - make_interval(secs => %s)
+           RETURNING id, son_musteri_id""",
+        (period_key, now, AUTO_INVOICE_BAYAT_SN),
     )
-    return {"ok": True, "run_id": run_id, "success_count": success_count, "fail_count": fail_count}
+    if not run_row:
+        return {"ok": True, "skipped": True, "mesaj": "Bu dönem için çalışma sürüyor."}
+    run_id = run_row["id"]
+    son_mid = int(run_row.get("son_musteri_id") or 0)
+
+    try:
+        from .giris_routes import _load_max_aylik_tah_iso_by_musteri, _tufe_map_by_year_month_cached
+
+        # Peşin ufuk ve TÜFE: tek seferlik yükleme (müşteri döngüsünde tekrar sorgu yok).
+        max_by_mid = _load_max_aylik_tah_iso_by_musteri(exclude_btufrt=True, only_fully_paid=True)
+        tufe_map = _tufe_map_by_year_month_cached()
+        mevcut = _auto_invoice_mevcut_aylar(bugun_ay)
+        musteri_rows = fetch_all(
+            """
+            SELECT c.id, c.name
+            FROM customers c
+            WHERE LOWER(COALESCE(c.durum, 'aktif')) != 'pasif'
+              AND EXISTS (SELECT 1 FROM musteri_kyc k WHERE k.musteri_id = c.id)
+              AND c.id > %s
+            ORDER BY c.id
+            """,
+            (son_mid,),
+        ) or []
+        adlar = {int(r["id"]): r.get("name") for r in musteri_rows}
+        mids = list(adlar)
+        for i in range(0, len(mids), AUTO_INVOICE_PARTI):
+            job_progress(i, len(mids), "Faturalar oluşturuluyor")
+            _auto_invoice_parti_isle(
+                run_id, mids[i : i + AUTO_INVOICE_PARTI], adlar, now, max_by_mid, mevcut, tufe_map
+            )
+        job_progress(len(mids), len(mids), "Faturalar oluşturuldu")
+
+        # Altın kural: GİB yalnız bugünün ayı; peşin/gelecek aylar fail-closed.
+        if settings["send_gib"]:
+            gib_hatali = _auto_invoice_gib_asamasi(run_id, period_key, settings["auto_sms_code"])
+            if gib_hatali:
+                logging.getLogger(__name__).warning(
+                    "auto_invoice GİB aşaması run_id=%s hatalı=%s", run_id, gib_hatali
+                )
+    except BaseException as e:
+        # Checkpoint'e kadar yazılanlar kalır; sonraki çalışma buradan sürer.
+        try:
+            execute(
+                """UPDATE auto_invoice_runs
+                   SET status = 'failed', finished_at = NOW(), message = %s
+                   WHERE id = %s""",
+                (f"Yarıda kaldı: {e}"[:500], run_id),
+            )
+        except Exception:
+            logging.getLogger(__name__).exception("auto_invoice run durumu yazılamadı run_id=%s", run_id)
+        raise
+
+    son = execute_returning(
+        """UPDATE auto_invoice_runs
+           SET status = CASE WHEN COALESCE(fail_count, 0) = 0 THEN 'success' ELSE 'partial' END,
+               finished_at = NOW(), heartbeat_at = NOW(),
+               message = COALESCE(success_count, 0) || ' başarılı, ' || COALESCE(fail_count, 0) || ' hatalı'
+           WHERE id = %s
+           RETURNING success_count, fail_count""",
+        (run_id,),
+    ) or {}
+    return {
+        "ok": True,
+        "run_id": run_id,
+        "success_count": int(son.get("success_count") or 0),
+        "fail_count": int(son.get("fail_count") or 0),
+    }
+
+
+@job_handler("auto_invoice_cycle")
+def _auto_invoice_cycle_job(params):
+    """APScheduler tick'i kuyruğa alır; çoklu worker'da dedupe_key ile tek çalışma."""
+    return run_auto_invoice_cycle(force=bool(params.get("force")))
 
 
 @bp.route('/api/tutar-yazi')
@@ -6660,7 +7223,7 @@ def fatura_onizleme():
             "irsaliye_modu": irsaliye_modu,
             "sevk_adresi": (data.get("sevk_adresi") or "").strip() or None,
         }
-        pdf_bytes = build_fatura_pdf(fatura, musteri, satirlar, preview=True)
+        pdf_bytes = pdf_olustur("fatura", fatura, musteri, satirlar, preview=True)
         return Response(
             pdf_bytes,
             mimetype="application/pdf",
@@ -8772,41 +9335,30 @@ def api_gelen_fatura_dosya(fatura_id):
         return jsonify({"ok": False, "mesaj": str(e)}), 500
 
 
-@bp.route('/onizleme/<int:fatura_id>')
-@faturalar_gerekli
-def fatura_onizleme_ekran(fatura_id):
-    """Kaydedilmiş faturanın e-Arşiv PDF önizlemesi ("Fatura Oluştur" sonrası)."""
-    ensure_faturalar_amount_columns()
-    fatura_row = fetch_one(
-        "SELECT id, fatura_no, fatura_tarihi, musteri_id, musteri_adi, tutar, kdv_tutar, toplam, notlar, satirlar_json, sevk_adresi, ettn FROM faturalar WHERE id = %s",
-        (fatura_id,),
-    )
-    if not fatura_row:
-        abort(404)
-    fatura = dict(fatura_row)
-    musteri_id = fatura.get("musteri_id")
+def _fatura_pdf_musteri(fatura, cust=None, kyc=None):
+    """Kayıtlı fatura PDF'inin alıcı bloğu: customers satırı, son KYC vergi dairesi / no / adres öncelikli."""
     musteri = {"name": fatura.get("musteri_adi"), "address": "", "tax_number": "", "vergi_dairesi": ""}
-    if musteri_id:
-        cust = fetch_one("SELECT id, name, address, tax_number FROM customers WHERE id = %s", (musteri_id,))
-        if cust:
-            musteri["name"] = cust.get("name") or musteri["name"]
-            musteri["address"] = (cust.get("address") or "").strip()
-            musteri["tax_number"] = str(cust.get("tax_number") or "").strip()
-        vd_row = fetch_one("SELECT vergi_dairesi FROM customers WHERE id = %s", (musteri_id,))
-        if vd_row and vd_row.get("vergi_dairesi"):
-            musteri["vergi_dairesi"] = (vd_row.get("vergi_dairesi") or "").strip()
-        kyc = fetch_one(
-            "SELECT vergi_dairesi, vergi_no, yeni_adres FROM musteri_kyc WHERE musteri_id = %s ORDER BY id DESC LIMIT 1",
-            (musteri_id,),
-        )
-        if kyc:
-            if kyc.get("vergi_dairesi"):
-                musteri["vergi_dairesi"] = (kyc.get("vergi_dairesi") or "").strip()
-            if kyc.get("vergi_no"):
-                musteri["tax_number"] = str(kyc.get("vergi_no") or "").strip()
-            if kyc.get("yeni_adres"):
-                musteri["address"] = (kyc.get("yeni_adres") or "").strip() or musteri["address"]
-
+    if cust:
+        musteri["name"] = cust.get("name") or musteri["name"]
+        musteri["address"] = (cust.get("address") or "").strip()
+        musteri["tax_number"] = str(cust.get("tax_number") or "").strip()
+        if cust.get("vergi_dairesi"):
+            musteri["vergi_dairesi"] = (cust.get("vergi_dairesi") or "").strip()
+    if kyc:
+        if kyc.get("vergi_dairesi"):
+            musteri["vergi_dairesi"] = (kyc.get("vergi_dairesi") or "").strip()
+        if kyc.get("vergi_no"):
+            musteri["tax_number"] = str(kyc.get("vergi_no") or "").strip()
+        if kyc.get("yeni_adres"):
+            musteri["address"] = (kyc.get("yeni_adres") or "").strip() or musteri["address"]
+    return musteri
+
+
+def _fatura_pdf_girdileri(fatura):
+    """Kayıtlı fatura satırından (satirlar_json, tutarlar, notlar) build_fatura_pdf girdileri: (fatura sözlüğü, satırlar).
+
+    Önizleme ekranı ve toplu PDF dışa aktarımı aynı dönüşümü kullanır.
+    """
     ft = fatura.get("fatura_tarihi")
     if hasattr(ft, "strftime"):
         fatura_tarihi_str = ft.strftime("%d.%m.%Y")
@@ -8901,7 +9453,35 @@ def fatura_onizleme_ekran(fatura_id):
         "sevk_adresi": (fatura.get("sevk_adresi") or "").strip() or None,
     }
 
-    pdf_bytes = build_fatura_pdf(fatura_pdf_dict, musteri, satirlar)
+    return fatura_pdf_dict, satirlar
+
+
+@bp.route('/onizleme/<int:fatura_id>')
+@faturalar_gerekli
+def fatura_onizleme_ekran(fatura_id):
+    """Kaydedilmiş faturanın e-Arşiv PDF önizlemesi ("Fatura Oluştur" sonrası)."""
+    ensure_faturalar_amount_columns()
+    fatura_row = fetch_one(
+        "SELECT id, fatura_no, fatura_tarihi, musteri_id, musteri_adi, tutar, kdv_tutar, toplam, notlar, satirlar_json, sevk_adresi, ettn FROM faturalar WHERE id = %s",
+        (fatura_id,),
+    )
+    if not fatura_row:
+        abort(404)
+    fatura = dict(fatura_row)
+    musteri_id = fatura.get("musteri_id")
+    cust = kyc = None
+    if musteri_id:
+        cust = fetch_one(
+            "SELECT id, name, address, tax_number, vergi_dairesi FROM customers WHERE id = %s", (musteri_id,)
+        )
+        kyc = fetch_one(
+            "SELECT vergi_dairesi, vergi_no, yeni_adres FROM musteri_kyc WHERE musteri_id = %s ORDER BY id DESC LIMIT 1",
+            (musteri_id,),
+        )
+    musteri = _fatura_pdf_musteri(fatura, cust, kyc)
+    fatura_pdf_dict, satirlar = _fatura_pdf_girdileri(fatura)
+
+    pdf_bytes = pdf_olustur("fatura", fatura_pdf_dict, musteri, satirlar)
     return Response(
         pdf_bytes,
         mimetype="application/pdf",
@@ -8913,6 +9493,129 @@ def fatura_onizleme_ekran(fatura_id):
     )
 
 
+def _toplu_pdf_liste(v) -> list:
+    """JSON listesi veya virgüllü metin → boş olmayan öğeler."""
+    if isinstance(v, str):
+        v = v.split(",")
+    if not isinstance(v, (list, tuple)):
+        return []
+    return [str(x).strip() for x in v if str(x).strip()]
+
+
+@job_handler("fatura_pdf_toplu")
+def _fatura_pdf_toplu_job(params):
+    from services.fatura_pdf_toplu import toplu_pdf_dizin, toplu_pdf_eskileri_sil, toplu_pdf_yaz
+
+    tur = params.get("tur") or "fatura"
+    bicim = params.get("bicim") or "zip"
+    dizin = toplu_pdf_dizin()
+    toplu_pdf_eskileri_sil(dizin)
+    dosya = f"{tur}_pdf_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{bicim}"
+    sonuc = toplu_pdf_yaz(
+        tur,
+        os.path.join(dizin, dosya),
+        bicim=bicim,
+        baslangic=params.get("baslangic") or None,
+        bitis=params.get("bitis") or None,
+        musteri_ids=params.get("musteri_ids") or [],
+        hizmet_turleri=params.get("hizmet_turleri") or [],
+        taslaklar_dahil=bool(params.get("taslaklar_dahil")),
+    )
+    sonuc["dosya"] = dosya
+    return sonuc
+
+
+def _toplu_pdf_mimetype(dosya: str) -> str:
+    return "application/pdf" if dosya.endswith(".pdf") else "application/zip"
+
+
+@bp.route('/api/toplu-pdf', methods=['POST'])
+@faturalar_gerekli
+def api_toplu_pdf():
+    """Ay sonu fatura / gün sonu makbuz PDF'leri tek ZIP veya yer imli tek PDF (arka plan işi).
+
+    JSON: tur (fatura | makbuz), bicim (zip | pdf), baslangic, bitis (YYYY-MM-DD; fatura /
+    tahsilat tarihi), musteri_ids, hizmet_turleri (liste veya virgüllü), taslaklar_dahil.
+    202 {job_id, durum_url, indir_url}; işçi kapalıysa (JOB_WORKERS=0) aynı istekte çalışır.
+    """
+    from services.fatura_pdf_toplu import TOPLU_PDF_BICIMLERI, TOPLU_PDF_TURLERI, toplu_pdf_dizin
+
+    data = request.get_json(silent=True) or {}
+    params = {
+        "tur": str(data.get("tur") or "fatura").strip().lower(),
+        "bicim": str(data.get("bicim") or "zip").strip().lower(),
+        "baslangic": str(data.get("baslangic") or "").strip()[:10],
+        "bitis": str(data.get("bitis") or "").strip()[:10],
+        "musteri_ids": _toplu_pdf_liste(data.get("musteri_ids")),
+        "hizmet_turleri": _toplu_pdf_liste(data.get("hizmet_turleri")),
+        "taslaklar_dahil": str(data.get("taslaklar_dahil", "0")).strip().lower() in ("1", "true", "yes", "on"),
+    }
+    if params["tur"] not in TOPLU_PDF_TURLERI:
+        return jsonify({"ok": False, "mesaj": "tur fatura veya makbuz olmalı."}), 400
+    if params["bicim"] not in TOPLU_PDF_BICIMLERI:
+        return jsonify({"ok": False, "mesaj": "bicim zip veya pdf olmalı."}), 400
+    for k in ("baslangic", "bitis"):
+        if params[k]:
+            try:
+                datetime.strptime(params[k], "%Y-%m-%d")
+            except ValueError:
+                return jsonify({"ok": False, "mesaj": f"{k} YYYY-MM-DD olmalı."}), 400
+    if not (params["baslangic"] or params["bitis"] or params["musteri_ids"]):
+        return jsonify({"ok": False, "mesaj": "Tarih aralığı veya müşteri seçiniz."}), 400
+    if job_workers_count() <= 0:
+        try:
+            sonuc = _fatura_pdf_toplu_job(params)
+        except ValueError as e:
+            return jsonify({"ok": False, "mesaj": str(e)}), 400
+        except Exception as e:
+            logging.getLogger(__name__).exception("api_toplu_pdf")
+            return jsonify({"ok": False, "mesaj": f"Toplu PDF oluşturulamadı: {e}"}), 500
+        return send_file(
+            os.path.abspath(os.path.join(toplu_pdf_dizin(), sonuc["dosya"])),
+            as_attachment=True,
+            download_name=sonuc["dosya"],
+            mimetype=_toplu_pdf_mimetype(sonuc["dosya"]),
+        )
+    job = enqueue("fatura_pdf_toplu", params, created_by=getattr(current_user, "id", None))
+    return jsonify(
+        {
+            "ok": True,
+            "job_id": job.get("id"),
+            "durum": job.get("status"),
+            "durum_url": url_for("jobs.api_job_durum", job_id=job.get("id")),
+            "indir_url": url_for("faturalar.api_toplu_pdf_indir", job_id=job.get("id")),
+            "mesaj": "Toplu PDF arka planda hazırlanıyor.",
+        }
+    ), 202
+
+
+@bp.route('/api/toplu-pdf/<int:job_id>/indir')
+@faturalar_gerekli
+def api_toplu_pdf_indir(job_id):
+    """Tamamlanmış toplu PDF işinin ZIP / PDF dosyası."""
+    from werkzeug.utils import secure_filename
+
+    from routes.jobs_routes import _job_erisim
+    from services.fatura_pdf_toplu import toplu_pdf_dizin
+    from services.job_queue import JOB_DONE, get_job
+
+    job = get_job(job_id)
+    if not _job_erisim(job) or job.get("kind") != "fatura_pdf_toplu":
+        return jsonify({"ok": False, "mesaj": "İş bulunamadı."}), 404
+    if job.get("status") != JOB_DONE:
+        return jsonify({"ok": False, "mesaj": "Toplu PDF henüz hazır değil.", "durum": job.get("status")}), 409
+    dosya = str((job.get("result") or {}).get("dosya") or "")
+    yol = os.path.join(toplu_pdf_dizin(), dosya)
+    if not dosya or secure_filename(dosya) != dosya or not os.path.isfile(yol):
+        return jsonify({"ok": False, "mesaj": "Dosya bulunamadı veya süresi doldu."}), 410
+    return send_file(
+        os.path.abspath(yol),
+        as_attachment=True,
+        download_name=dosya,
+        mimetype=_toplu_pdf_mimetype(dosya),
+    )
+
+
 @bp.route('/tahsilat-ekle', methods=['POST'])
 @faturalar_gerekli
 def tahsilat_ekle():
@@ -9070,43 +9773,13 @@ def tahsilat_ekle():
         safe_name = re.sub(r'[-\s]+', '_', safe_name)
         pdf_filename = f"Tahsilat_{makbuz_no}_{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
         pdf_path = os.path.join(UPLOAD_MUSTERI_DOSYALARI, pdf_filename)
-        pdf_row = dict(row)
-        try:
-            app_pdf = current_app._get_current_object()
-        except Exception:
-            app_pdf = None
-
-        def _makbuz_pdf_arka_plan():
-            if not app_pdf:
-                return
-            with app_pdf.app_context():
-                try:
-                    banka_hesaplar = fetch_all(
-                        "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar "
-                        "WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') "
-                        "ORDER BY banka_adi"
-                    )
-                    pdf_bytes = build_makbuz_pdf(
-                        pdf_row, musteri_adi, fatura_no, banka_hesaplar=banka_hesaplar
-                    )
-                    with open(pdf_path, "wb") as f:
-                        f.write(pdf_bytes)
-                except Exception as ex_pdf:
-                    try:
-                        current_app.logger.warning("makbuz pdf arka plan: %r", ex_pdf)
-                    except Exception:
-                        pass
-
-        if app_pdf:
-            threading.Thread(target=_makbuz_pdf_arka_plan, daemon=True).start()
-        else:
-            banka_hesaplar = fetch_all(
-                "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar "
-                "WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') "
-                "ORDER BY banka_adi"
-            )
-            with open(pdf_path, "wb") as f:
-                f.write(build_makbuz_pdf(pdf_row, musteri_adi, fatura_no, banka_hesaplar=banka_hesaplar))
+        banka_hesaplar = fetch_all(
+            "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar "
+            "WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') "
+            "ORDER BY banka_adi"
+        )
+        # Makbuz dosyası PDF servisinde (süreç havuzu) yazılır; istek çizimi beklemez.
+        pdf_arka_planda(pdf_path, "makbuz", dict(row), musteri_adi, fatura_no, banka_hesaplar=banka_hesaplar)
 
         dagitim_items = []
         if auto_pay_items:
@@ -9142,12 +9815,27 @@ def tahsilat_ekle():
 
         try:
             from .giris_routes import (
+                _aylik_grid_freshness_fingerprint,
+                _aylik_grid_mem_damgala,
+                _aylik_grid_payload_hucre_yamala,
                 _defer_aylik_grid_cache_rebuild,
                 _read_aylik_grid_cache_payload,
                 sync_musteri_panel_from_tahsil_and_dagitim,
             )
             mid_int = int(musteri_id)
-            cache_pl = _read_aylik_grid_cache_payload(mid_int)
+            grid_fp = _aylik_grid_freshness_fingerprint(mid_int)
+            # Yalnız tahsilatın eşleştiği ay hücreleri yamanır; yamanamazsa eski
+            # önbellek + arka planda tam rebuild.
+            try:
+                cache_pl = _aylik_grid_payload_hucre_yamala(mid_int)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "tahsilat_ekle grid hücre yaması musteri_id=%s", mid_int
+                )
+                cache_pl = None
+            yamali = cache_pl is not None
+            if not yamali:
+                cache_pl = _read_aylik_grid_cache_payload(mid_int)
             dagitim_list = [
                 {"iso": iso, "tutar": round(float(pay or 0), 2)}
                 for iso, pay in dagitim_items
@@ -9158,7 +9846,9 @@ def tahsilat_ekle():
                 tahsilat_tarihi=tahsilat_tarihi,
                 payload=cache_pl,
             )
-            if not cache_pl:
+            if yamali:
+                _aylik_grid_mem_damgala(mid_int, cache_pl, grid_fp)
+            else:
                 _defer_aylik_grid_cache_rebuild(mid_int)
         except Exception:
             try:
@@ -9522,26 +10212,20 @@ def api_tahsilat_raporu():
         )""",
     ]
     params = [bas, bit, bas, bit, bas, bit]
+    dagitim = _tah_dagitim_hazir()
+    if dagitim:
+        # Aynı kural tahsilat_ay_dagitim'den (açıklama taranmaz): fiili tarih veya bir marker günü aralıkta.
+        wh = [f"""(
+            (t.tahsilat_tarihi::date >= %s::date AND t.tahsilat_tarihi::date <= %s::date)
+            OR EXISTS (
+                {_TAH_GUN_DAGITIM_SQL}
+                  AND d.ay IS NOT NULL AND d.gun_metin::date BETWEEN %s::date AND %s::date
+            )
+        )"""]
+        params = [bas, bit, bas, bit]
     if mid > 0:
         wh.insert(0, "(t.musteri_id = %s OR t.customer_id = %s)")
         params = [mid, mid] + params
-    rows = fetch_all(
-        f"""
-        SELECT t.id, t.fatura_id, t.makbuz_no, t.tutar, t.odeme_turu, t.tahsilat_tarihi,
-               t.aciklama, t.tahsil_eden,
-               COALESCE(t.customer_id, t.musteri_id) AS cari_id,
-               COALESCE(NULLIF(TRIM(c.name), ''), '—') AS musteri_adi,
-               COALESCE(
-                   NULLIF(substring(COALESCE(t.aciklama, '') from '\\|AYLIK_TAH\\|([0-9]{4}-[0-9]{2}-[0-9]{2})\\|'), '')::date,
-                   t.tahsilat_tarihi::date
-               ) AS rapor_tarihi
-        FROM tahsilatlar t
-        LEFT JOIN customers c ON COALESCE(t.customer_id, t.musteri_id) = c.id
-        WHERE {" AND ".join(wh)}
-        ORDER BY rapor_tarihi DESC NULLS LAST, t.id DESC
-        """,
-        tuple(params),
-    )
     # Sözleşme/Aylık Tutarlar gridinde görünmeyen aylar rapora düşmesin:
     # marker'lı kayıtlar yalnızca cache.payload.aylar içindeki yıl-ay anahtarlarıyla eşleşirse gösterilir.
     visible_ym = None  # None => cache yok/okunamadı, düşürme yapma.
@@ -9576,10 +10260,36 @@ def api_tahsilat_raporu():
         except Exception:
             visible_ym = None
 
-    filtered_rows = []
-    for r in (rows or []):
+    if dagitim:
+        # Marker günlerinin en erkeni (yazımda artan sırada) — açıklama metni taranmaz.
+        rapor_tarihi_sql = (
+            "COALESCE((SELECT MIN(d.gun_metin)::date FROM tahsilat_ay_dagitim d "
+            "WHERE d.tahsilat_id = t.id AND d.tur = 'tah' AND length(d.gun_metin) = 10 "
+            f"AND d.ay IS NOT NULL), t.tahsilat_tarihi::date) AS rapor_tarihi, {_TAH_GUNLER_SUTUNU} AS tah_gunler"
+        )
+    else:
+        rapor_tarihi_sql = f"""COALESCE(
+                   NULLIF(substring(COALESCE(t.aciklama, '') from '\\|AYLIK_TAH\\|([0-9]{4}-[0-9]{2}-[0-9]{2})\\|'), '')::date,
+                   t.tahsilat_tarihi::date
+               ) AS rapor_tarihi"""
+    rapor_sql = f"""
+        SELECT t.id, t.fatura_id, t.makbuz_no, t.tutar, t.odeme_turu, t.tahsilat_tarihi,
+               t.aciklama, t.tahsil_eden,
+               COALESCE(t.customer_id, t.musteri_id) AS cari_id,
+               COALESCE(NULLIF(TRIM(c.name), ''), '—') AS musteri_adi,
+               {rapor_tarihi_sql}
+        FROM tahsilatlar t
+        LEFT JOIN customers c ON COALESCE(t.customer_id, t.musteri_id) = c.id
+        WHERE {" AND ".join(wh)}
+        """
+
+    def _rapor_satiri(r):
+        """Süzülen satır → JSON öğesi; rapora girmeyecekse None."""
         ac = str((r or {}).get("aciklama") or "")
-        marker_isos = re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2})-[0-9]{2}\|", ac)
+        if dagitim:
+            marker_isos = [g[:7] for g in (r.pop("tah_gunler", None) or [])]
+        else:
+            marker_isos = re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2})-[0-9]{2}\|", ac)
         pay_tokens = re.findall(r"\|AYLIK_PAY\|([0-9]{4}-[0-9]{2}-[0-9]{2})=([0-9]+(?:\.[0-9]+)?)\|", ac)
         if marker_isos and isinstance(visible_ym, set):
             # Marker'lı kayıt: görünür ayda değilse normalde düşer;
@@ -9593,7 +10303,7 @@ def api_tahsilat_raporu():
                     except Exception:
                         td_ok = False
                 if not td_ok:
-                    continue
+                    return None
             # Rapor tutarı:
             # - AYLİK_PAY varsa pay toplamı (manuel oldest dağıtımda gerçek tutar korunur),
             # - tek marker varsa görünür hücreyle hizalama (net/kdv uyumu),
@@ -9614,18 +10324,98 @@ def api_tahsilat_raporu():
                 except (TypeError, ValueError):
                     fatura_id = 0
                 if fatura_id <= 0:
-                    filtered_rows.append(r)
-                    continue
+                    return _row_serializable(r)
                 ym0 = marker_isos[0]
                 if ym0 in visible_tutar_by_ym:
                     try:
                         r["tutar"] = visible_tutar_by_ym[ym0]
                     except Exception:
                         pass
-        filtered_rows.append(r)
+        return _row_serializable(r)
+
+    def _satirlar_iter(sql, sql_params):
+        # Server-side cursor; süzülen satırlar tek tek üretilir, liste tutulmaz.
+        rows_it = fetch_iter(sql, sql_params, header=True)
+        try:
+            kolonlar = next(rows_it)
+            for tup in rows_it:
+                it = _rapor_satiri(dict(zip(kolonlar, tup)))
+                if it is not None:
+                    yield it
+        finally:
+            rows_it.close()
 
-    items = [_row_serializable(r) for r in filtered_rows]
-    toplam = sum(float(it.get("tutar") or 0) for it in items)
+    def _satirlar(sql, sql_params, en_cok):
+        gen = _satirlar_iter(sql, sql_params)
+        out = []
+        try:
+            for it in gen:
+                out.append(it)
+                if len(out) >= en_cok:
+                    break
+        finally:
+            gen.close()
+        return out
+
+    limit = sayfa_boyutu(request.args.get("limit"))
+    if limit is None:
+        # Sayfasız: JSON dizisi satır satır akıtılır (bellekte tüm rapor tutulmaz);
+        # toplam / adet dizinin ardından yazılır.
+        baslik = current_app.json.dumps(
+            {
+                "ok": True,
+                "musteri_id": mid or None,
+                "baslangic": bas.strftime("%Y-%m-%d"),
+                "bitis": bit.strftime("%Y-%m-%d"),
+            }
+        )
+
+        def _akis():
+            adet, toplam_akis = 0, 0.0
+            yield baslik[:-1] + ', "items": ['
+            for it in _satirlar_iter(
+                rapor_sql + " ORDER BY rapor_tarihi DESC NULLS LAST, t.id DESC", tuple(params)
+            ):
+                yield ("," if adet else "") + current_app.json.dumps(it)
+                adet += 1
+                toplam_akis += float(it.get("tutar") or 0)
+            yield '], "toplam": %s, "adet": %d}\n' % (current_app.json.dumps(round(toplam_akis, 2)), adet)
+
+        return Response(
+            stream_with_context(_akis()),
+            mimetype="application/json",
+            headers={"Cache-Control": "no-store, max-age=0"},
+        )
+    else:
+        # Keyset: (rapor_tarihi, id) — NULL tarih en sona (TARIH_EN_ESKI).
+        imza = filtre_imzasi("tahsilat_raporu", mid, bas, bit)
+        sira_sql = f"COALESCE(q.rapor_tarihi, {TARIH_EN_ESKI})"
+        ks_sql, ks_params = keyset_kosulu(sira_sql, "q.id", imlec_coz(request.args.get("imlec"), imza))
+        items = _satirlar(
+            f"SELECT q.*, {sira_sql} AS sira_tarihi FROM ({rapor_sql}) q WHERE TRUE{ks_sql} "
+            f"ORDER BY {sira_sql} DESC, q.id DESC",
+            tuple(params) + ks_params,
+            en_cok=limit + 1,
+        )
+        items, sonraki = sayfa_kes(items, limit, "sira_tarihi", "id", imza)
+        for it in items:
+            it.pop("sira_tarihi", None)
+
+        def _toplamlar():
+            adet, toplam_t = 0, 0.0
+            for it in _satirlar_iter(rapor_sql, tuple(params)):
+                adet += 1
+                toplam_t += float(it.get("tutar") or 0)
+            return {"adet": adet, "toplam": toplam_t}
+
+        tp = liste_toplamlari("tahsilat_raporu", imza, ("tahsilatlar", "musteri_aylik_grid_cache"), _toplamlar)
+        toplam = tp["toplam"]
+        sayfa = {
+            "adet": tp["adet"],
+            "limit": limit,
+            "has_more": sonraki is not None,
+            "sonraki_imlec": sonraki,
+        }
     ok = jsonify(
         {
             "ok": True,
@@ -9634,7 +10424,7 @@ def api_tahsilat_raporu():
             "bitis": bit.strftime("%Y-%m-%d"),
             "items": items,
             "toplam": round(toplam, 2),
-            "adet": len(items),
+            **sayfa,
         }
     )
     ok.headers["Cache-Control"] = "no-store, max-age=0"
@@ -9677,8 +10467,10 @@ def api_gib_kesilmis_fatura_raporu():
             bas, bit = bit, bas
         _nt = sql_expr_fatura_not_gib_taslak("f.notlar")
         _im = sql_expr_fatura_gib_imzalanmis("f.notlar")
-        rows = fetch_all(
-            f"""
+        # Keyset yalnız ERP listesinde: portal birleştirmesi tüm aralığı ister.
+        limit = sayfa_boyutu(request.args.get("limit")) if sadece_erp else None
+        imza = filtre_imzasi("gib_kesilmis", bas, bit)
+        erp_sql = f"""
             SELECT f.id,
                    f.fatura_tarihi,
                    f.fatura_no,
@@ -9701,11 +10493,24 @@ def api_gib_kesilmis_fatura_raporu():
                      AND BTRIM(COALESCE(f.ettn::text, '')) <> '')
                     OR UPPER(BTRIM(COALESCE(f.fatura_no::text, ''))) LIKE 'GIB%%'
                   )
-            ORDER BY f.fatura_tarihi DESC NULLS LAST, f.id DESC
-            """,
-            (bas, bit),
-        )
-        erp_items = [_row_serializable(r) for r in (rows or [])]
+        """
+        sayfa = {}
+        if limit is None:
+            rows = fetch_all(erp_sql + " ORDER BY f.fatura_tarihi DESC NULLS LAST, f.id DESC", (bas, bit))
+            erp_items = [_row_serializable(r) for r in (rows or [])]
+        else:
+            # Tarih aralığı koşulu NULL fatura_tarihi'ni zaten dışlar; (fatura_tarihi, id) doğrudan.
+            ks_sql, ks_params = keyset_kosulu(
+                "f.fatura_tarihi", "f.id", imlec_coz(request.args.get("imlec"), imza)
+            )
+            rows = fetch_all(
+                erp_sql + ks_sql + " ORDER BY f.fatura_tarihi DESC, f.id DESC LIMIT %s",
+                (bas, bit) + ks_params + (limit + 1,),
+            )
+            erp_items, sonraki = sayfa_kes(
+                [_row_serializable(r) for r in (rows or [])], limit, "fatura_tarihi", "id", imza
+            )
+            sayfa = {"limit": limit, "has_more": sonraki is not None, "sonraki_imlec": sonraki}
         gib_hata = None
         gib_kullanildi = False
         portal_norm = []
@@ -9738,18 +10543,37 @@ def api_gib_kesilmis_fatura_raporu():
         def _iptal_satir(it):
             return (it or {}).get("gib_durum") == "İptal"
 
-        toplam_imzali = sum(_tut(it) for it in items if not _taslak_satir(it) and not _iptal_satir(it))
-        toplam_taslak = sum(_tut(it) for it in items if _taslak_satir(it))
-        adet_taslak = sum(1 for it in items if _taslak_satir(it))
+        def _toplamlar(satirlar):
+            return {
+                "toplam": round(
+                    sum(_tut(it) for it in satirlar if not _taslak_satir(it) and not _iptal_satir(it)), 2
+                ),
+                "toplam_taslak": round(sum(_tut(it) for it in satirlar if _taslak_satir(it)), 2),
+                "adet": len(satirlar),
+                "adet_taslak": sum(1 for it in satirlar if _taslak_satir(it)),
+            }
+
+        if limit is None:
+            tp = _toplamlar(items)
+        else:
+            # Sayfa değil tüm aralık; filtre kümesi başına bir kez.
+            tp = liste_toplamlari(
+                "gib_kesilmis",
+                imza,
+                ("faturalar",),
+                lambda: _toplamlar(
+                    _gib_kesilmis_erp_satirlari_yerel_gib_durumu(
+                        [_row_serializable(r) for r in (fetch_all(erp_sql, (bas, bit)) or [])]
+                    )
+                ),
+            )
         payload = {
             "ok": True,
             "baslangic": bas.strftime("%Y-%m-%d"),
             "bitis": bit.strftime("%Y-%m-%d"),
             "items": items,
-            "toplam": round(toplam_imzali, 2),
-            "toplam_taslak": round(toplam_taslak, 2),
-            "adet": len(items),
-            "adet_taslak": adet_taslak,
+            **tp,
+            **sayfa,
             "gib_portal_kullanildi": gib_kullanildi,
             "gib_portal_esik_adet": gib_erp_disi,
         }
@@ -9783,7 +10607,7 @@ def tahsilat_pdf(tahsilat_id):
     banka_hesaplar = fetch_all(
         "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') ORDER BY banka_adi"
     )
-    pdf_bytes = build_makbuz_pdf(row, row.get("musteri_adi"), fatura_no, banka_hesaplar=banka_hesaplar)
+    pdf_bytes = pdf_olustur("makbuz", row, row.get("musteri_adi"), fatura_no, banka_hesaplar=banka_hesaplar)
     indir = request.args.get("indir", "").lower() in ("1", "true", "yes")
     disposition = "attachment" if indir else "inline"
     return Response(pdf_bytes, mimetype="application/pdf", headers={
@@ -9830,14 +10654,15 @@ def tahsilat_makbuz_onizle():
             "tahsilat_tarihi": tahsilat_tarihi,
             "aciklama": aciklama,
             "tahsil_eden": tahsil_eden,
-            "created_at": datetime.now(),
+            # Makbuzda yalnız saat:dakika basılır; aynı dakikadaki tekrar önizleme önbellekten.
+            "created_at": datetime.now().replace(second=0, microsecond=0),
             "cek_detay": cek_list,
             "havale_banka": havale_banka
         }
         banka_hesaplar = fetch_all(
             "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') ORDER BY banka_adi"
         )
-        pdf_bytes = build_makbuz_pdf(fake_row, musteri_adi, None, banka_hesaplar=banka_hesaplar)
+        pdf_bytes = pdf_olustur("makbuz", fake_row, musteri_adi, None, banka_hesaplar=banka_hesaplar)
         return Response(pdf_bytes, mimetype="application/pdf", headers={
             "Content-Disposition": "inline; filename=Tahsilat_Onizleme.pdf",
             "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
@@ -11170,6 +11995,9 @@ def api_gib_durum_tarama():
     Filigran «İPTAL EDİLMİŞTİR» → İptal, «İMZASIZ» → Taslak, hiçbiri yok ve geçerli HTML → İmzalı.
     Bulunan duruma göre ERP notları (`_fatura_gib_bilgilerini_yaz`) güncellenir; HTML önbelleği yazılır.
     """
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     try:
         from gib_earsiv import BestOfficeGIBManager, gib_fatura_html_watermark_etiket
 
@@ -11216,7 +12044,9 @@ def api_gib_durum_tarama():
             "tarama_sayisi": 0,
         }
         ornekler = []
-        for r in rows or []:
+        rows = rows or []
+        for idx, r in enumerate(rows):
+            job_progress(idx, len(rows))
             sonuc["tarama_sayisi"] += 1
             ettn = (r.get("ettn") or "").strip()
             if not ettn:
@@ -11295,6 +12125,9 @@ def api_gib_durum_tarama():
 @faturalar_gerekli
 def api_gib_cek_kaydet_aralik():
     """Üst filtredeki tarih aralığı için GİB portal listesini bir kez çekip tüm satırları ERP'ye yazar."""
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     try:
         from gib_earsiv import BestOfficeGIBManager, portal_kesilen_fatura_listesi_cache_clear
 
@@ -11326,7 +12159,8 @@ def api_gib_cek_kaydet_aralik():
         hatalar = []
         cakisan_no_sayisi = 0
         farkli_tarihte_kalan_sayisi = 0
-        for it in items:
+        for idx, it in enumerate(items):
+            job_progress(idx, len(items))
             it = dict(it or {})
             satir = {
                 "fatura_no": str(it.get("fatura_no") or "").strip(),
@@ -11698,6 +12532,9 @@ def api_auto_fatura_adaylar():
 @bp.route('/api/auto-fatura/secili-olustur', methods=['POST'])
 @faturalar_gerekli
 def api_auto_fatura_secili_olustur():
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     data = request.get_json(silent=True) or {}
     yil, ay_no = _parse_auto_year_month(data.get("yil"), data.get("ay"))
     run_month_date = date(yil, ay_no, 1)
@@ -11735,7 +12572,8 @@ def api_auto_fatura_secili_olustur():
                 gib = None
         except Exception:
             gib = None
-    for mid in musteri_ids:
+    for idx, mid in enumerate(musteri_ids):
+        job_progress(idx, len(musteri_ids))
         try:
             out = _auto_invoice_create_for_customer(mid, run_month_date)
             st = (out.get("status") or "").lower()
@@ -11827,8 +12665,11 @@ def api_musteriler_list():
     """Tahsilat formu için müşteri listesi (WhatsApp için phone döner)."""
     arama = (request.args.get('q') or '').strip()
     base = "SELECT id, name, musteri_adi, phone, tax_number FROM customers "
+    ix = musteri_arama_indeksi() if arama else None
     if not arama:
         rows = fetch_all(base + "ORDER BY name LIMIT 300")
+    elif ix is not None:
+        rows = ix.ara(arama, limit=300, sira=False)
     else:
         w = customers_arama_sql_giris_genis("")
         rows = fetch_all(
@@ -6,11 +6,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import current_user
 from auth import giris_gerekli
 from collections import defaultdict
+from contextlib import contextmanager
 from cache_utils import (
     CACHE_KEY_DUZENLI_FATURA,
     CACHE_KEY_HIZMET_TURLERI,
     CACHE_KEY_TUFE_VERILERI,
     CACHE_TTL_SEC,
+    cache_invalidate_tag,
+    cache_region,
+    musteri_tag,
     simple_cache_get,
     simple_cache_invalidate,
     simple_cache_set,
@@ -41,6 +45,13 @@ from db import (
     ensure_grup2_etiketleri_table,
     ensure_grup2_bizim_hesap_into_array,
     ensure_cari_kart_perf_indexes,
+    ensure_musteri_aylik_grid_cache_table,
+    ensure_musteri_reel_donem_tutar_table,
+    ensure_musteri_tahsilat_panel_detay_table,
+    ensure_musteri_data_version_kart,
+    ensure_musteri_ekstre_snapshot_table,
+    ensure_musteri_aylik_grid_tutar,
+    ensure_tahsilat_ay_dagitim,
     db as get_db,
     get_conn,
     _tenant_schema_for_request,
@@ -69,17 +80,33 @@ from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from utils.text_utils import turkish_lower
+from utils.xlsx_akis import XlsxAkis
 from utils.musteri_arama import (
     customers_arama_params_giris_genis,
     customers_arama_sql_giris_genis,
+    customers_arama_sira_sql_params,
     customers_arama_sql_params_giris_genis_tokens,
     musteri_arama_ilike_pattern_email_duz,
 )
+from utils.musteri_arama_indeks import musteri_arama_indeksi
 from utils.musteri_gorunur import (
     musteri_gorunur_sql,
     musteri_liste_gorunur_sql,
     request_pasifleri_dahil,
 )
+from services.cari_ekstre_toplu import cari_ekstre_workbook_bytes
+from services.job_queue import enqueue, enqueue_view_if_async, job_handler, job_progress, job_workers_count
+from services.pdf_servisi import pdf_olustur
+from services.tufe_motoru import (
+    MOD_BANKA,
+    MOD_KARMA,
+    MOD_NAKIT,
+    tufe_efektif_oran,
+    tufe_en_son_pozitif_oran,
+    tufe_oran_matrisi,
+    yillik_kira_matrisi,
+)
+import hashlib
 import json
 import uuid
 from pathlib import Path
@@ -225,6 +252,8 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf', 'docx'}
 _AYLIK_GRID_CACHE_TABLE_READY = False
 _REEL_DONEM_TUTAR_TABLE_READY = False
 _TAHSILAT_PANEL_DETAY_TABLE_READY = False
+_MUSTERI_DATA_VERSION_TABLE_READY = False
+_EKSTRE_SNAPSHOT_TABLE_READY = False
 
 # Süreç-içi grup cache'i: parent_cari_id çözümlemesi için her tıklamada 500 satır
 # çekiyorduk (~190ms). Grup listesi sık değişmiyor; 60 saniye TTL ile cacheliyoruz.
@@ -270,15 +299,7 @@ def _ensure_aylik_grid_cache_table():
     if _AYLIK_GRID_CACHE_TABLE_READY:
         return
     try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS musteri_aylik_grid_cache (
-                musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
-                payload TEXT NOT NULL,
-                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-            """
-        )
+        ensure_musteri_aylik_grid_cache_table()
     except Exception:
         pass
     _AYLIK_GRID_CACHE_TABLE_READY = True
@@ -289,33 +310,7 @@ def _ensure_musteri_reel_donem_tutar_table():
     if _REEL_DONEM_TUTAR_TABLE_READY:
         return
     try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS musteri_reel_donem_tutar (
-                musteri_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
-                donem_yil INTEGER NOT NULL,
-                tutar_kdv_dahil NUMERIC(14, 2) NOT NULL,
-                giris_tip TEXT,
-                giris_tutar NUMERIC(14, 2),
-                hibrit_toplam NUMERIC(14, 2),
-                hibrit_net NUMERIC(14, 2),
-                hibrit_banka NUMERIC(14, 2),
-                updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
-                PRIMARY KEY (musteri_id, donem_yil)
-            )
-            """
-        )
-        for col_sql in (
-            "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS giris_tip TEXT",
-            "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS giris_tutar NUMERIC(14, 2)",
-            "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_toplam NUMERIC(14, 2)",
-            "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_net NUMERIC(14, 2)",
-            "ALTER TABLE musteri_reel_donem_tutar ADD COLUMN IF NOT EXISTS hibrit_banka NUMERIC(14, 2)",
-        ):
-            try:
-                execute(col_sql)
-            except Exception:
-                pass
+        ensure_musteri_reel_donem_tutar_table()
     except Exception:
         pass
     _REEL_DONEM_TUTAR_TABLE_READY = True
@@ -326,20 +321,111 @@ def _ensure_tahsilat_panel_detay_table():
     if _TAHSILAT_PANEL_DETAY_TABLE_READY:
         return
     try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS musteri_tahsilat_panel_detay (
-                musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
-                by_iso TEXT NOT NULL DEFAULT '{}',
-                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-            """
-        )
+        ensure_musteri_tahsilat_panel_detay_table()
     except Exception:
         pass
     _TAHSILAT_PANEL_DETAY_TABLE_READY = True
 
 
+def _ensure_musteri_data_version_table():
+    global _MUSTERI_DATA_VERSION_TABLE_READY
+    if _MUSTERI_DATA_VERSION_TABLE_READY:
+        return
+    try:
+        ensure_musteri_data_version_kart()
+    except Exception:
+        pass
+    _MUSTERI_DATA_VERSION_TABLE_READY = True
+
+
+def _ensure_musteri_ekstre_snapshot_table():
+    global _EKSTRE_SNAPSHOT_TABLE_READY
+    if _EKSTRE_SNAPSHOT_TABLE_READY:
+        return
+    try:
+        ensure_musteri_ekstre_snapshot_table()
+    except Exception:
+        pass
+    _EKSTRE_SNAPSHOT_TABLE_READY = True
+
+
+def _musteri_data_version_batch(musteri_ids) -> dict[int, int] | None:
+    """musteri_data_version tek sorguda; satırı olmayan müşteri 0 (trigger'dan beri değişmemiş).
+
+    Okunamazsa None — çağıran taraf tazelik bilinmiyor sayar (yeniler).
+    """
+    ids: set[int] = set()
+    for x in musteri_ids or ():
+        try:
+            ids.add(int(x))
+        except (TypeError, ValueError):
+            continue
+    if not ids:
+        return {}
+    _ensure_musteri_data_version_table()
+    try:
+        rows = fetch_all(
+            "SELECT musteri_id, version FROM musteri_data_version WHERE musteri_id = ANY(%s::bigint[])",
+            (sorted(ids),),
+        ) or []
+    except Exception:
+        return None
+    out = dict.fromkeys(ids, 0)
+    for r in rows:
+        try:
+            out[int(r.get("musteri_id"))] = int(r.get("version") or 0)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+# Toplu grid kapsamı (_aylik_grid_bulk_scope): parti müşterilerinin girdileri set tabanlı
+# sorgularla önceden yüklenir; aşağıdaki yükleyiciler önce buraya bakar, panel / grid
+# yazımları tamponlanıp parti sonunda tek upsert ile yazılır. Kapsam dışında etkisiz.
+_GRID_BULK = threading.local()
+_GRID_BULK_YOK = object()
+
+
+def _grid_bulk_on_yukleme(kind: str, musteri_id):
+    """Kapsamdaki müşteri için önceden yüklenmiş değer; kapsam dışıysa _GRID_BULK_YOK."""
+    pre = getattr(_GRID_BULK, "pre", None)
+    if pre is None:
+        return _GRID_BULK_YOK
+    try:
+        mid = int(musteri_id)
+    except (TypeError, ValueError):
+        return _GRID_BULK_YOK
+    if mid not in pre["mids"]:
+        return _GRID_BULK_YOK
+    val = pre[kind].get(mid)
+    if val is None:
+        return _GRID_BULK_VARSAYILAN[kind]()
+    if isinstance(val, (dict, list)):
+        return type(val)(val)
+    return val
+
+
+def _grid_bulk_tampon(kind: str, musteri_id: int, value) -> bool:
+    """Kapsamdaysa yazımı tamponlar (okumalar yeni değeri görür); değilse False."""
+    pre = getattr(_GRID_BULK, "pre", None)
+    if pre is None or musteri_id not in pre["mids"]:
+        return False
+    pre[kind][musteri_id] = value
+    pre["yazilan_" + kind][musteri_id] = value
+    return True
+
+
+_GRID_BULK_VARSAYILAN = {
+    "kyc": dict,
+    "tahsil_rows": list,
+    "tahsil_imza": lambda: "0|0.00|1970-01-01T00:00:00",
+    "reel": dict,
+    "panel": lambda: None,
+    "acik_notlar": list,
+    "grid_payload": lambda: None,
+}
+
+
 def _load_musteri_panel_by_iso(musteri_id: int) -> dict:
     """DB panel kaynağı: {YYYY-MM-01: {aylik, tahsil, kalan, tahsil_tarih?}}."""
     try:
@@ -349,10 +435,14 @@ def _load_musteri_panel_by_iso(musteri_id: int) -> dict:
     if mid <= 0:
         return {}
     _ensure_tahsilat_panel_detay_table()
-    row = fetch_one(
-        "SELECT by_iso FROM musteri_tahsilat_panel_detay WHERE musteri_id = %s",
-        (mid,),
-    )
+    on = _grid_bulk_on_yukleme("panel", mid)
+    if on is not _GRID_BULK_YOK:
+        row = {"by_iso": on}
+    else:
+        row = fetch_one(
+            "SELECT by_iso FROM musteri_tahsilat_panel_detay WHERE musteri_id = %s",
+            (mid,),
+        )
     if not row or not row.get("by_iso"):
         return {}
     try:
@@ -460,6 +550,8 @@ def _save_musteri_panel_by_iso(musteri_id: int, by_iso: dict, prune_no_db_tahsil
             if db_t <= tol_pr:
                 merged.pop(iso_pr, None)
     merged.update(ser)
+    if _grid_bulk_tampon("panel", mid, merged):
+        return
     execute(
         """
         INSERT INTO musteri_tahsilat_panel_detay (musteri_id, by_iso, updated_at)
@@ -775,10 +867,11 @@ def sync_musteri_panel_from_tahsil_and_dagitim(
 def resync_panel_and_grid_after_tahsil_change(musteri_id: int) -> bool:
     """
     Tahsilat silme/değişim sonrası: panel DB'yi canlı tahsil map ile yeniden yaz
-    (bayat ödendi kayıtlarını prune et), ardından grid önbelleğini TEK KEZ yenile.
+    (bayat ödendi kayıtlarını prune et), ardından grid önbelleğini TEK KEZ yaz.
 
-    Sıra kritik: önce panel (trust_grid_odenen=False), sonra upsert — aksi halde
-    _upsert_aylik_grid_cache bayat paneli grid'e geri basar.
+    Payload önbellekten hücre bazında yamanır (yalnız tahsil girdisi değişen aylar);
+    yamanamıyorsa bir kez tam hesaplanır. Sıra kritik: önce panel
+    (trust_grid_odenen=False), sonra yazım — aksi halde bayat panel grid'e geri basılır.
     """
     try:
         mid = int(musteri_id)
@@ -788,12 +881,20 @@ def resync_panel_and_grid_after_tahsil_change(musteri_id: int) -> bool:
         return False
     try:
         _invalidate_aylik_grid_payload_mem(mid)
-        payload = _build_aylik_grid_cache_payload(mid)
+        fp = _aylik_grid_freshness_fingerprint(mid)
+        try:
+            payload = _aylik_grid_payload_hucre_yamala(mid)
+        except Exception:
+            logging.getLogger(__name__).exception("aylik grid hücre yaması musteri_id=%s", mid)
+            payload = None
+        if payload is None:
+            payload = _build_aylik_grid_cache_payload(mid)
         by_iso = _panel_by_iso_from_tahsil_map(
             mid, payload, tahsilat_tarihi=None, trust_grid_odenen=False
         )
         _save_musteri_panel_by_iso(mid, by_iso, prune_no_db_tahsil=True)
-        _upsert_aylik_grid_cache(mid)
+        if isinstance(payload, dict):
+            _aylik_grid_mem_damgala(mid, _persist_grid_cache_with_panel(mid, payload), fp)
         return True
     except Exception:
         logging.getLogger(__name__).exception(
@@ -1145,15 +1246,16 @@ def _persist_grid_cache_with_panel(musteri_id: int, payload: dict | None = None)
         return _upsert_aylik_grid_cache(mid)
     payload = _aylik_grid_cache_payload_tahsil_guncelle(mid, payload)
     _ensure_aylik_grid_cache_table()
-    execute(
-        """
-        INSERT INTO musteri_aylik_grid_cache (musteri_id, payload, updated_at)
-        VALUES (%s, %s, NOW())
-        ON CONFLICT (musteri_id)
-        DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW()
-        """,
-        (mid, json.dumps(payload, ensure_ascii=False)),
-    )
+    if not _grid_bulk_tampon("grid_payload", mid, payload):
+        execute(
+            """
+            INSERT INTO musteri_aylik_grid_cache (musteri_id, payload, updated_at)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (musteri_id)
+            DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW()
+            """,
+            (mid, json.dumps(payload, ensure_ascii=False)),
+        )
     try:
         _aylik_grid_mem_set(mid, payload)
     except (TypeError, ValueError):
@@ -1367,14 +1469,13 @@ def _aylik_grid_cache_horizon_stale(musteri_id, cache_obj):
     return False
 
 
-_tufe_map_mem = {"ts": 0.0, "data": None}
+_TUFE_MAP_CACHE = cache_region("tufe_map", max_entries=64, max_bytes=2 * 1024 * 1024, ttl_sec=300.0)
 
 
 def _tufe_map_mem_reset():
     """TÜFE tablosu değişince GET cache ve grid/ekstre haritasını temizle."""
     simple_cache_invalidate(CACHE_KEY_TUFE_VERILERI)
-    _tufe_map_mem["data"] = None
-    _tufe_map_mem["ts"] = 0.0
+    _TUFE_MAP_CACHE.clear()
 
 
 def _tufe_map_by_year_month():
@@ -1405,34 +1506,36 @@ def _tufe_map_by_year_month():
 
 def _tufe_map_by_year_month_cached(max_age_sec: float = 300.0):
     """TÜFE tablosu nadiren değişir; ekstre/grid her istekte yeniden okumasın."""
-    now = time.time()
-    if _tufe_map_mem["data"] is not None and (now - float(_tufe_map_mem["ts"] or 0)) < max_age_sec:
-        return _tufe_map_mem["data"]
+    m = _TUFE_MAP_CACHE.get("yil_ay", max_age_sec=max_age_sec)
+    if m is not None:
+        return m
     m = _tufe_map_by_year_month()
-    _tufe_map_mem["ts"] = now
-    _tufe_map_mem["data"] = m
+    _TUFE_MAP_CACHE.set("yil_ay", m)
     return m
 
 
+_TUFE_MAP_IMZA: dict = {}
+
+
+def _tufe_map_imza() -> str:
+    """Önbellekteki TÜFE haritasının kısa imzası (ETag); harita nesnesi değişmedikçe yeniden hesaplanmaz."""
+    m = _tufe_map_by_year_month_cached()
+    hit = _TUFE_MAP_IMZA.get("son")
+    if hit and hit[0] is m:
+        return hit[1]
+    duz = sorted(
+        (str(y), sorted((str(a), str(o)) for a, o in v.items()))
+        for y, v in (m or {}).items()
+        if isinstance(v, dict)
+    )
+    imza = hashlib.sha1(repr(duz).encode("utf-8")).hexdigest()[:16]
+    _TUFE_MAP_IMZA["son"] = (m, imza)
+    return imza
+
+
 def _tufe_latest_positive_oran_in_year_map(year_map) -> float:
     """Takvim yılı haritasında (1..12 → %) pozitif oranı olan en büyük ay numarası; TCMB ileri ayları yayınlamadığında projeksiyon."""
-    if not isinstance(year_map, dict) or not year_map:
-        return 0.0
-    best_m, best_o = 0, 0.0
-    for mk, ow in year_map.items():
-        try:
-            mi = int(mk)
-        except (TypeError, ValueError):
-            continue
-        if mi < 1 or mi > 12:
-            continue
-        try:
-            ovv = float(ow or 0)
-        except (TypeError, ValueError):
-            ovv = 0.0
-        if ovv > 0 and math.isfinite(ovv) and mi > best_m:
-            best_m, best_o = mi, ovv
-    return best_o
+    return tufe_en_son_pozitif_oran(year_map)
 
 
 def _aylik_grid_months_inclusive_from(bas_first: date, target_first: date) -> int:
@@ -1541,11 +1644,8 @@ def _kyc_karma_kira_paylari(kyc, aylik_net: float):
     return True, n, b, r_n, r_b
 
 
-def _aylik_grid_contract_core(kyc, tufe_map):
-    """
-    KYC + TÜFE ile sözleşme ufku ve yıllık KDV dahil tutar haritası.
-    Firma özeti raporunda her satır için 240 aylık liste üretmek yerine tek ay okumak için kullanılır.
-    """
+def _aylik_grid_contract_ufuk(kyc):
+    """_aylik_grid_contract_core'un TÜFE'den bağımsız kısmı: ufuk, taban, KDV çarpanı, artış ayı, mod."""
     kyc = dict(kyc or {})
     bas_raw = kyc.get("sozlesme_tarihi")
     bit_raw = kyc.get("sozlesme_bitis")
@@ -1634,7 +1734,6 @@ def _aylik_grid_contract_core(kyc, tufe_map):
     kira_nakit = bool(kyc.get("kira_nakit"))
     split_ok, _nak0, _ban0, r_n, r_b = _kyc_karma_kira_paylari(kyc, aylik_net)
     kdv_mult = 1.0 + kdv_oran / 100.0
-    current = aylik_net
     start_year = bas.year
     max_year = start_year + max(0, (ay_sayisi - 1) // 12)
     artis_raw = kyc.get("kira_artis_tarihi") or bas
@@ -1643,6 +1742,64 @@ def _aylik_grid_contract_core(kyc, tufe_map):
         artis_month = int(artis.month)
     except Exception:
         artis_month = bas.month
+    if split_ok:
+        mod = MOD_KARMA
+    elif kira_nakit:
+        mod = MOD_NAKIT
+    else:
+        mod = MOD_BANKA
+    return {
+        "bas": bas,
+        "bit": bit,
+        "ay_sayisi": ay_sayisi,
+        "start_year": start_year,
+        "max_year": max_year,
+        "artis_month": artis_month,
+        "aylik_net": aylik_net,
+        "ks_int": ks_int_early,
+        "kira_nakit": kira_nakit,
+        "split_kira_odeme": split_ok,
+        "kdv_mult": kdv_mult,
+        "nakit_pay": r_n,
+        "mod": mod,
+    }
+
+
+def _aylik_grid_core_from_ufuk(ufuk: dict, yillik_map: dict) -> dict:
+    return {
+        "bas": ufuk["bas"],
+        "bit": ufuk["bit"],
+        "ay_sayisi": ufuk["ay_sayisi"],
+        "start_year": ufuk["start_year"],
+        "yillik_map": yillik_map,
+        "artis_month": ufuk["artis_month"],
+        "aylik_net": ufuk["aylik_net"],
+        "ks_int": ufuk["ks_int"],
+        "kira_nakit": ufuk["kira_nakit"],
+        "split_kira_odeme": ufuk["split_kira_odeme"],
+    }
+
+
+def _aylik_grid_contract_core(kyc, tufe_map):
+    """
+    KYC + TÜFE ile sözleşme ufku ve yıllık KDV dahil tutar haritası.
+    Firma özeti raporunda her satır için 240 aylık liste üretmek yerine tek ay okumak için kullanılır.
+    Toplu çağıranlar _aylik_grid_core_scope ile NumPy motorunda önceden hesaplatır.
+    """
+    on = _aylik_grid_core_on_hesap(kyc, tufe_map)
+    if on is not _GRID_BULK_YOK:
+        return on
+    ufuk = _aylik_grid_contract_ufuk(kyc)
+    if not ufuk:
+        return None
+    split_ok = ufuk["split_kira_odeme"]
+    kira_nakit = ufuk["kira_nakit"]
+    r_n = ufuk["nakit_pay"]
+    kdv_mult = ufuk["kdv_mult"]
+    start_year = ufuk["start_year"]
+    max_year = ufuk["max_year"]
+    artis_month = ufuk["artis_month"]
+    current = ufuk["aylik_net"]
     yillik_map = {}
     for yil in range(start_year, max_year + 1):
         if split_ok:
@@ -1654,56 +1811,88 @@ def _aylik_grid_contract_core(kyc, tufe_map):
         else:
             yillik_map[yil] = round(current * kdv_mult, 2)
         if yil < max_year:
-            sonraki = yil + 1
-            inner = tufe_map.get(sonraki) or {}
-            if not isinstance(inner, dict):
-                inner = {}
-            raw_o = inner.get(artis_month)
-            if raw_o is None and artis_month is not None:
-                raw_o = inner.get(str(artis_month))
-            try:
-                oran = float(raw_o or 0)
-            except (TypeError, ValueError):
-                oran = 0.0
-            # Gelecek yılın TÜFE satırı henüz yoksa (örn. 2026 Eylül), reel zincirdeki gibi
-            # bir önceki takvim yılının aynı artış ayı oranıyla projeksiyon yap.
-            if (not oran or not math.isfinite(oran)) and sonraki > start_year:
-                inner_prev = tufe_map.get(sonraki - 1) or {}
-                if isinstance(inner_prev, dict):
-                    raw_p = inner_prev.get(artis_month)
-                    if raw_p is None and artis_month is not None:
-                        raw_p = inner_prev.get(str(artis_month))
-                    try:
-                        oran2 = float(raw_p or 0)
-                    except (TypeError, ValueError):
-                        oran2 = 0.0
-                    if oran2 > 0 and math.isfinite(oran2):
-                        oran = oran2
-            # Hedef yılda artış ayı (örn. Eylül) henüz boş; Ocak–Mayıs gibi girilmiş son ayı kullan.
-            if (not oran or not math.isfinite(oran)):
-                o3 = _tufe_latest_positive_oran_in_year_map(inner)
-                if o3 > 0 and math.isfinite(o3):
-                    oran = o3
-            # Hedef yıl tamamen boşsa bir önceki yılın en son girilmiş ayı.
-            if (not oran or not math.isfinite(oran)) and sonraki > start_year:
-                inner_prev2 = tufe_map.get(sonraki - 1) or {}
-                o4 = _tufe_latest_positive_oran_in_year_map(inner_prev2)
-                if o4 > 0 and math.isfinite(o4):
-                    oran = o4
+            # Eksik ay / yıl yedekleri: tufe_efektif_oran (NumPy motoru ile aynı çözüm).
+            oran = tufe_efektif_oran(tufe_map, yil + 1, artis_month, start_year)
             if oran > 0 and math.isfinite(oran):
                 current = round(current * (1 + oran / 100.0), 2)
-    return {
-        "bas": bas,
-        "bit": bit,
-        "ay_sayisi": ay_sayisi,
-        "start_year": start_year,
-        "yillik_map": yillik_map,
-        "artis_month": artis_month,
-        "aylik_net": aylik_net,
-        "ks_int": ks_int_early,
-        "kira_nakit": kira_nakit,
-        "split_kira_odeme": split_ok,
-    }
+    return _aylik_grid_core_from_ufuk(ufuk, yillik_map)
+
+
+def _aylik_grid_contract_cores_batch(kycs, tufe_map) -> list:
+    """Çok KYC için _aylik_grid_contract_core; TÜFE zinciri NumPy motorunda tek seferde."""
+    ufuklar = []
+    for kyc in kycs:
+        try:
+            ufuklar.append(_aylik_grid_contract_ufuk(kyc))
+        except Exception:
+            ufuklar.append(None)
+    dolu = [u for u in ufuklar if u]
+    if not dolu:
+        return [None] * len(ufuklar)
+    mat = yillik_kira_matrisi(
+        [u["start_year"] for u in dolu],
+        [u["max_year"] - u["start_year"] + 1 for u in dolu],
+        [u["artis_month"] for u in dolu],
+        [u["aylik_net"] for u in dolu],
+        [u["kdv_mult"] for u in dolu],
+        [u["mod"] for u in dolu],
+        [u["nakit_pay"] for u in dolu],
+        matris=tufe_oran_matrisi(tufe_map or {}),
+    )
+    out = []
+    satir = 0
+    for u in ufuklar:
+        if not u:
+            out.append(None)
+            continue
+        n_yil = u["max_year"] - u["start_year"] + 1
+        degerler = mat[satir, :n_yil].tolist()
+        satir += 1
+        out.append(_aylik_grid_core_from_ufuk(
+            u, {u["start_year"] + k: v for k, v in enumerate(degerler)}
+        ))
+    return out
+
+
+# Toplu raporlar: kapsam içinde _aylik_grid_contract_core önceden hesaplanmış çekirdeği döner
+# (anahtar: KYC içeriği + TÜFE haritası nesnesi). Kapsam dışında etkisiz.
+_GRID_CORE = threading.local()
+
+
+def _aylik_grid_core_anahtar(kyc):
+    try:
+        return tuple(sorted((str(k), str(v)) for k, v in dict(kyc or {}).items()))
+    except Exception:
+        return None
+
+
+def _aylik_grid_core_on_hesap(kyc, tufe_map):
+    st = getattr(_GRID_CORE, "st", None)
+    if st is None or st["tufe_map"] is not tufe_map:
+        return _GRID_BULK_YOK
+    core = st["cores"].get(_aylik_grid_core_anahtar(kyc))
+    if core is None:
+        return _GRID_BULK_YOK
+    out = dict(core)
+    out["yillik_map"] = dict(core["yillik_map"])
+    return out
+
+
+@contextmanager
+def _aylik_grid_core_scope(kycs, tufe_map):
+    """Verilen KYC'lerin çekirdeklerini tek NumPy geçişinde hesaplar; kapsam boyunca tekrar kullanılır."""
+    kycs = [dict(k) for k in kycs if k]
+    cores = {}
+    for kyc, core in zip(kycs, _aylik_grid_contract_cores_batch(kycs, tufe_map)):
+        anahtar = _aylik_grid_core_anahtar(kyc)
+        if anahtar is not None and core is not None:
+            cores[anahtar] = core
+    onceki = getattr(_GRID_CORE, "st", None)
+    _GRID_CORE.st = {"tufe_map": tufe_map, "cores": cores}
+    try:
+        yield
+    finally:
+        _GRID_CORE.st = onceki
 
 
 def _aylik_grid_single_month_kdv_from_core(core, ref_y, ref_m) -> float:
@@ -1858,6 +2047,17 @@ def _aylik_grid_effective_kyc_for_compute(row) -> dict | None:
     }
 
 
+def _musteri_kyc_grup_satir_son(row) -> dict:
+    """Ham customers+musteri_kyc satırı → grid KYC dict (SENTETIK_KYC_ENABLED'a göre)."""
+    row = dict(row) if row else {}
+    if row:
+        row["has_musteri_kyc"] = row.get("musteri_kyc_id") is not None
+    if SENTETIK_KYC_ENABLED:
+        eff = _aylik_grid_effective_kyc_for_compute(row) if row else None
+        return dict(eff) if eff else {}
+    return row
+
+
 def _musteri_kyc_grup_for_aylik_grid(musteri_id: int):
     """customers + son musteri_kyc — aylık grid / cari ekstre aynı satır.
 
@@ -1870,6 +2070,9 @@ def _musteri_kyc_grup_for_aylik_grid(musteri_id: int):
         return {}
     if mid <= 0:
         return {}
+    on = _grid_bulk_on_yukleme("kyc", mid)
+    if on is not _GRID_BULK_YOK:
+        return _musteri_kyc_grup_satir_son(on)
     now = time.time()
     hit = _musteri_kyc_grid_mem.get(mid)
     if hit and (now - float(hit.get("ts") or 0)) < 45.0 and hit.get("row") is not None:
@@ -1894,14 +2097,7 @@ def _musteri_kyc_grup_for_aylik_grid(musteri_id: int):
         """,
         (mid,),
     ) or {}
-    row = dict(row) if row else {}
-    if row:
-        row["has_musteri_kyc"] = row.get("musteri_kyc_id") is not None
-    if SENTETIK_KYC_ENABLED:
-        eff = _aylik_grid_effective_kyc_for_compute(row) if row else None
-        out = dict(eff) if eff else {}
-    else:
-        out = row
+    out = _musteri_kyc_grup_satir_son(row)
     _musteri_kyc_grid_mem[mid] = {"ts": now, "row": dict(out) if out else {}}
     if len(_musteri_kyc_grid_mem) > 200:
         stale = [k for k, v in _musteri_kyc_grid_mem.items() if (now - float(v.get("ts") or 0)) > 90.0]
@@ -1913,6 +2109,9 @@ def _musteri_kyc_grup_for_aylik_grid(musteri_id: int):
 def _musteri_reel_donem_manual_dict_from_db(musteri_id: int) -> dict[int, float]:
     """musteri_reel_donem_tutar: donem_yil -> tutar_kdv_dahil (boş dict olabilir)."""
     _ensure_musteri_reel_donem_tutar_table()
+    on = _grid_bulk_on_yukleme("reel", musteri_id)
+    if on is not _GRID_BULK_YOK:
+        return on
     rows = fetch_all(
         "SELECT donem_yil, tutar_kdv_dahil FROM musteri_reel_donem_tutar WHERE musteri_id = %s",
         (int(musteri_id),),
@@ -2158,6 +2357,136 @@ def _aylik_grid_payload_reel_overlay_from_db(musteri_id: int, payload: dict | No
     return payload
 
 
+def _aylik_grid_hucre_brut(a) -> float:
+    """Hücrenin brüt KDV dahil tutarı (brut_tutar_kdv; eski satırda tutar_kdv_dahil)."""
+    raw = a.get("brut_tutar_kdv")
+    if raw is None:
+        raw = a.get("tutar_kdv_dahil")
+    try:
+        v = float(raw or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if math.isfinite(v) else 0.0
+
+
+def _aylik_grid_hucre_girdisi(a, tahsil_map, batch_maps, manual_reel_by_year, acik_aylari):
+    """Ay hücresinin tahsil katmanı girdileri → (iso, (tm, mk, te, tt, pay, reel_kap, acik)).
+
+    Hücrenin ödenen / kalan / tam-kısmi alanları brüt tutar ve yalnız bu girdilerle
+    belirlenir; imzası değişmeyen ay yeniden hesaplanmaz.
+    """
+    batch_maps = batch_maps or {}
+    nk = _firma_ozet_normalize_tahsil_ay_key(
+        str(a.get("ay_key") or f"{a.get('yil')}-{a.get('ay')}")
+    )
+    acik = bool(nk and acik_aylari and nk in acik_aylari)
+    try:
+        yy = int(a.get("yil"))
+        iso = date(yy, int(a.get("ay")), 1).isoformat()
+    except (TypeError, ValueError):
+        return "", (0.0, 0.0, 0.0, 0.0, None, 0.0, acik)
+
+    def _tutar(src):
+        try:
+            return round(float((src or {}).get(iso) or 0), 2)
+        except (TypeError, ValueError):
+            return 0.0
+
+    pay_raw = (batch_maps.get("pay") or {}).get(iso)
+    try:
+        pay_t = round(float(pay_raw), 2) if pay_raw is not None else None
+    except (TypeError, ValueError):
+        pay_t = None
+    reel_kap = 0.0
+    if isinstance(manual_reel_by_year, dict):
+        try:
+            reel_kap = round(float(manual_reel_by_year.get(yy) or 0), 2)
+        except (TypeError, ValueError):
+            reel_kap = 0.0
+    return iso, (
+        _tutar(tahsil_map),
+        _tutar(batch_maps.get("marker")),
+        _tutar(batch_maps.get("eslesme")),
+        _tutar(batch_maps.get("tarih_ay")),
+        pay_t,
+        reel_kap,
+        acik,
+    )
+
+
+def _aylik_grid_hucre_imza(girdi) -> str:
+    """Hücre girdisi imzası; tahsilatsız / reel'siz / açık faturasız ay için boş."""
+    tm_t, mk_t, te_t, tt_t, pay_t, reel_kap, acik = girdi
+    if not (tm_t or mk_t or te_t or tt_t or reel_kap or acik) and pay_t is None:
+        return ""
+    pay_s = "" if pay_t is None else f"{pay_t:.2f}"
+    return f"{tm_t:.2f}|{mk_t:.2f}|{te_t:.2f}|{tt_t:.2f}|{pay_s}|{reel_kap:.2f}|{1 if acik else 0}"
+
+
+def _aylik_grid_reel_donem_imza(manual_reel_by_year) -> dict:
+    """musteri_reel_donem_tutar snapshot'ı (JSON: yıl anahtarı str)."""
+    out = {}
+    for k, v in (manual_reel_by_year or {}).items() if isinstance(manual_reel_by_year, dict) else ():
+        try:
+            out[str(int(k))] = round(float(v or 0), 2)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def _aylik_grid_hucre_tahsil_uygula(a, girdi, manual_reel_by_year, tol) -> None:
+    """Tek ay hücresinin tahsil katmanı: |AYLIK_TAH| marker + |AYLIK_PAY| birleşimi, açık fatura bayrağı."""
+    tm_g, mk_g, te_g, tt_g, pay_tb, reel_kap_b, acik = girdi
+    brut = _aylik_grid_hucre_brut(a)
+    try:
+        odenen = float(a.get("odenen_tutar_kdv") or 0)
+    except (TypeError, ValueError):
+        odenen = 0.0
+    try:
+        yy = int(a.get("yil"))
+    except (TypeError, ValueError):
+        yy = 0
+    mk_t = tm_t = te_t = tt_t = 0.0
+    if brut > tol:
+        mk_t, tm_t, te_t, tt_t = mk_g, tm_g, te_g, tt_g
+        odenen = _grid_payload_ay_odenen_kdv(brut, odenen, mk_t, tm_t, te_t, tt_t, tol)
+    kap_b = reel_kap_b if reel_kap_b > tol else round(brut, 2)
+    if _grid_payload_marker_panel_tam_kapandi(
+        mk_t, brut, yy, manual_reel_by_year, tol, pay_t=pay_tb
+    ):
+        a["odenen_tutar_kdv"] = round(mk_t, 2)
+        a["kalan_tutar_kdv"] = 0.0
+        # Güvenlik freni: brut≈0 iken marker olsa bile «tam ödendi» yok.
+        a["tahsil_edildi"] = brut > tol
+        a["kismi_tahsilat"] = False
+    elif mk_t > tol and kap_b > tol:
+        kalan_p = round(max(kap_b - mk_t, 0), 2)
+        a["odenen_tutar_kdv"] = round(mk_t, 2)
+        a["kalan_tutar_kdv"] = kalan_p
+        a["tahsil_edildi"] = brut > tol and kalan_p <= tol
+        a["kismi_tahsilat"] = kalan_p > tol
+    else:
+        kalan = round(max(brut - odenen, 0), 2)
+        a["odenen_tutar_kdv"] = round(odenen, 2)
+        a["kalan_tutar_kdv"] = kalan
+        a["tahsil_edildi"] = brut > tol and kalan <= tol
+        a["kismi_tahsilat"] = odenen > tol and kalan > tol
+    a["tutar_kdv_dahil"] = round(max(brut, 0.01), 2)
+    a.pop("acik_aylik_borc_faturasi", None)
+    if not acik:
+        return
+    odenen = float(a.get("odenen_tutar_kdv") or 0)
+    kalan = float(a.get("kalan_tutar_kdv") or 0)
+    if odenen > tol:
+        a["acik_aylik_borc_faturasi"] = kalan > tol
+    else:
+        a["acik_aylik_borc_faturasi"] = True
+        if not bool(a.get("tahsil_edildi")):
+            a["tahsil_edildi"] = False
+            a["kismi_tahsilat"] = False
+            a["kalan_tutar_kdv"] = round(max(kalan, 0), 2)
+
+
 def _build_aylik_grid_cache_payload(musteri_id, tufe_map=None, kyc_row=None, manual_reel_by_year=None):
     if kyc_row is not None:
         kyc = dict(kyc_row)
@@ -2177,98 +2506,32 @@ def _build_aylik_grid_cache_payload(musteri_id, tufe_map=None, kyc_row=None, man
             )
         acik_aylik_tutar_aylari = _aylik_grid_acik_tutar_ay_keys_normalized(musteri_id)
         tol = float(AYLIK_GRID_TAM_ODENDI_TOLERANS)
-        tahsil_pl_grid = tahsil_map or {}
         batch_grid = _ekstre_tahsil_batch_maps_from_rows(
             _ekstre_tahsil_rows_for_musteri(int(musteri_id))
         )
-        # |AYLIK_TAH| marker tutarı FIFO'dan kaçsa bile her ay için birleştir (yalnızca «açık fatura» aylarında değil).
+        # |AYLIK_TAH| marker tutarı FIFO'dan kaçsa bile her ay için birleştir; hücre girdi
+        # imzası ve reel snapshot'ı artımlı yama (_aylik_grid_payload_hucre_yamala) için saklanır.
+        hucre_girdi = {}
         for a in payload.get("aylar") or []:
             if not isinstance(a, dict):
                 continue
-            try:
-                brut = float(a.get("brut_tutar_kdv") or a.get("tutar_kdv_dahil") or 0)
-            except (TypeError, ValueError):
-                brut = 0.0
-            try:
-                odenen = float(a.get("odenen_tutar_kdv") or 0)
-            except (TypeError, ValueError):
-                odenen = 0.0
-            try:
-                yy = int(a.get("yil"))
-                mm = int(a.get("ay"))
-                iso_m1 = date(yy, mm, 1).isoformat()
-            except Exception:
-                iso_m1 = ""
-            mk_t = tm_t = te_t = tt_t = 0.0
-            if iso_m1 and brut > tol:
-                mk_t = round(float((batch_grid.get("marker") or {}).get(iso_m1) or 0), 2)
-                tm_t = round(float((tahsil_pl_grid or {}).get(iso_m1) or 0), 2)
-                te_t = round(float((batch_grid.get("eslesme") or {}).get(iso_m1) or 0), 2)
-                tt_t = round(float((batch_grid.get("tarih_ay") or {}).get(iso_m1) or 0), 2)
-                odenen = _grid_payload_ay_odenen_kdv(brut, odenen, mk_t, tm_t, te_t, tt_t, tol)
-            reel_kap_b = 0.0
-            if isinstance(manual_reel_by_year, dict):
-                try:
-                    reel_kap_b = round(float(manual_reel_by_year.get(yy) or 0), 2)
-                except (TypeError, ValueError):
-                    reel_kap_b = 0.0
-            kap_b = reel_kap_b if reel_kap_b > tol else round(brut, 2)
-            _pay_raw_b = (batch_grid.get("pay") or {}).get(iso_m1) if iso_m1 else None
-            try:
-                pay_tb = round(float(_pay_raw_b), 2) if _pay_raw_b is not None else None
-            except (TypeError, ValueError):
-                pay_tb = None
-            if _grid_payload_marker_panel_tam_kapandi(
-                mk_t, brut, yy, manual_reel_by_year, tol, pay_t=pay_tb
-            ):
-                a["odenen_tutar_kdv"] = round(mk_t, 2)
-                a["kalan_tutar_kdv"] = 0.0
-                # Güvenlik freni: brut≈0 iken marker olsa bile «tam ödendi» yok.
-                a["tahsil_edildi"] = brut > tol
-                a["kismi_tahsilat"] = False
-            elif mk_t > tol and kap_b > tol:
-                kalan_p = round(max(kap_b - mk_t, 0), 2)
-                a["odenen_tutar_kdv"] = round(mk_t, 2)
-                a["kalan_tutar_kdv"] = kalan_p
-                a["tahsil_edildi"] = brut > tol and kalan_p <= tol
-                a["kismi_tahsilat"] = kalan_p > tol
-            else:
-                kalan = round(max(brut - odenen, 0), 2)
-                a["odenen_tutar_kdv"] = round(odenen, 2)
-                a["kalan_tutar_kdv"] = kalan
-                a["tahsil_edildi"] = brut > tol and kalan <= tol
-                a["kismi_tahsilat"] = odenen > tol and kalan > tol
-            a["tutar_kdv_dahil"] = round(max(brut, 0.01), 2)
-        if acik_aylik_tutar_aylari:
-            for a in payload.get("aylar") or []:
-                if not isinstance(a, dict):
-                    continue
-                nk = _firma_ozet_normalize_tahsil_ay_key(
-                    str(a.get("ay_key") or f"{a.get('yil')}-{a.get('ay')}")
-                )
-                if not nk or nk not in acik_aylik_tutar_aylari:
-                    continue
-                try:
-                    odenen = float(a.get("odenen_tutar_kdv") or 0)
-                except (TypeError, ValueError):
-                    odenen = 0.0
-                try:
-                    kalan = float(a.get("kalan_tutar_kdv") or 0)
-                except (TypeError, ValueError):
-                    kalan = 0.0
-                if odenen > tol:
-                    a["acik_aylik_borc_faturasi"] = kalan > tol
-                else:
-                    a["acik_aylik_borc_faturasi"] = True
-                    if not bool(a.get("tahsil_edildi")):
-                        a["tahsil_edildi"] = False
-                        a["kismi_tahsilat"] = False
-                        a["kalan_tutar_kdv"] = round(max(kalan, 0), 2)
+            iso_m1, girdi = _aylik_grid_hucre_girdisi(
+                a, tahsil_map, batch_grid, manual_reel_by_year, acik_aylik_tutar_aylari
+            )
+            _aylik_grid_hucre_tahsil_uygula(a, girdi, manual_reel_by_year, tol)
+            imza = _aylik_grid_hucre_imza(girdi)
+            if iso_m1 and imza:
+                hucre_girdi[iso_m1] = imza
+        payload["hucre_girdi"] = hucre_girdi
+        payload["reel_donem"] = _aylik_grid_reel_donem_imza(manual_reel_by_year)
         payload["tahsilat_imza"] = _aylik_tahsil_cache_imza(musteri_id)
     return payload
 
 
 def _aylik_tahsil_cache_imza(musteri_id):
+    on = _grid_bulk_on_yukleme("tahsil_imza", musteri_id)
+    if on is not _GRID_BULK_YOK:
+        return on
     row = fetch_one(
         """
         SELECT
@@ -2281,6 +2544,12 @@ def _aylik_tahsil_cache_imza(musteri_id):
         """,
         (musteri_id, musteri_id),
     ) or {}
+    return _aylik_tahsil_imza_from_row(row)
+
+
+def _aylik_tahsil_imza_from_row(row) -> str:
+    """cnt / toplam / mx satırı → ``cnt|toplam|mx`` imzası."""
+    row = row or {}
     try:
         cnt = int(row.get("cnt") or 0)
     except (TypeError, ValueError):
@@ -2297,19 +2566,11 @@ def _aylik_tahsil_cache_imza(musteri_id):
     return f"{cnt}|{toplam:.2f}|{mx}"
 
 
-def _aylik_grid_freshness_ts_str(val) -> str:
-    if val is None:
-        return "1970-01-01T00:00:00"
-    if hasattr(val, "isoformat"):
-        return str(val.isoformat())
-    return str(val or "1970-01-01T00:00:00")
-
-
 def _aylik_grid_freshness_k_from_kyc_row(kyc) -> str:
-    """KYC kritik alan özeti (canlı satır → K bileşeni).
+    """KYC kritik alan özeti (canlı satır; hücre yamasında brüt katman değişti mi).
 
     Not: bitis/durum bilinçli hariç — rolling ufuk payload.bitis'i KYC efektif
-    bitişten uzun tutabilir; Aşama 0'da sürekli k_same=False üretmesin.
+    bitişten uzun tutabilir; sürekli farklı görünmesin.
     """
     if not isinstance(kyc, dict):
         return "none"
@@ -2371,117 +2632,37 @@ def _aylik_grid_freshness_k_from_payload(payload) -> str:
     )
 
 
-def _aylik_grid_freshness_parse_parts(fp: str) -> dict:
-    """T=/R=/P=/K= biçimindeki fingerprint'i parçala (bileşen içi | korunur)."""
-    out = {"T": "", "R": "", "P": "", "K": ""}
-    if not fp:
-        return out
-    s = str(fp)
-    try:
-        t_i = s.find("T=")
-        r_i = s.find("|R=")
-        p_i = s.find("|P=")
-        k_i = s.find("|K=")
-        if t_i == 0 and r_i > 0 and p_i > r_i and k_i > p_i:
-            out["T"] = s[2:r_i]
-            out["R"] = s[r_i + 3 : p_i]
-            out["P"] = s[p_i + 3 : k_i]
-            out["K"] = s[k_i + 3 :]
-    except Exception:
-        pass
-    return out
+def _aylik_grid_freshness_fp_from_version(version) -> str:
+    """Sürüm + hesap revizyonu → fingerprint (V=…|REV=…)."""
+    return f"V={int(version or 0)}|REV={AYLIK_GRID_COMPUTE_REV}"
 
 
-def _aylik_grid_freshness_fingerprint(musteri_id) -> str:
+def _aylik_grid_freshness_fingerprint(musteri_id) -> str | None:
     """
-    Genişletilmiş freshness: T (tahsilat) + R (reel) + P (panel) + K (KYC özeti).
-    Aşama 0: yalnızca ölçüm; skip uygulanmaz.
+    Canlı freshness: musteri_data_version (tahsilat / reel / panel / KYC / kapanış
+    yazımlarında trigger ile artar) + AYLIK_GRID_COMPUTE_REV. Tek indeksli okuma;
+    sürüm okunamazsa None (bilinmiyor → atlama yok).
     """
     try:
         mid = int(musteri_id)
     except (TypeError, ValueError):
-        return "T=|R=|P=|K="
-
-    try:
-        t_part = str(_aylik_tahsil_cache_imza(mid) or "")
-    except Exception:
-        t_part = "ERR"
-
-    try:
-        _ensure_musteri_reel_donem_tutar_table()
-        rrow = fetch_one(
-            """
-            SELECT
-                COUNT(*)::bigint AS cnt,
-                COALESCE(SUM(COALESCE(tutar_kdv_dahil, 0)), 0)::numeric AS toplam,
-                COALESCE(MAX(updated_at), TIMESTAMP '1970-01-01') AS mx
-            FROM musteri_reel_donem_tutar
-            WHERE musteri_id = %s
-            """,
-            (mid,),
-        ) or {}
-        try:
-            rc = int(rrow.get("cnt") or 0)
-        except (TypeError, ValueError):
-            rc = 0
-        try:
-            rt = round(float(rrow.get("toplam") or 0), 2)
-        except (TypeError, ValueError):
-            rt = 0.0
-        r_part = f"{rc}|{rt:.2f}|{_aylik_grid_freshness_ts_str(rrow.get('mx'))}"
-    except Exception:
-        r_part = "ERR"
-
-    try:
-        _ensure_tahsilat_panel_detay_table()
-        prow = fetch_one(
-            """
-            SELECT updated_at
-            FROM musteri_tahsilat_panel_detay
-            WHERE musteri_id = %s
-            """,
-            (mid,),
-        ) or {}
-        p_part = _aylik_grid_freshness_ts_str(prow.get("updated_at")) if prow else "none"
-    except Exception:
-        p_part = "ERR"
-
-    try:
-        kyc = fetch_one(
-            """
-            SELECT mk.sozlesme_tarihi, mk.sozlesme_bitis, mk.kira_suresi_ay, mk.aylik_kira, mk.kira_nakit,
-                   mk.kira_artis_tarihi, mk.kira_nakit_tutar, mk.kira_banka_tutar,
-                   c.kapanis_tarihi, c.kapanis_sonrasi_borc_ay, c.durum
-            FROM customers c
-            LEFT JOIN LATERAL (
-                SELECT sozlesme_tarihi, sozlesme_bitis, kira_suresi_ay, aylik_kira, kira_nakit,
-                       kira_artis_tarihi, kira_nakit_tutar, kira_banka_tutar
-                FROM musteri_kyc
-                WHERE musteri_id = c.id
-                ORDER BY id DESC
-                LIMIT 1
-            ) mk ON TRUE
-            WHERE c.id = %s
-            """,
-            (mid,),
-        )
-        k_part = _aylik_grid_freshness_k_from_kyc_row(kyc) if kyc else "none"
-    except Exception:
-        k_part = "ERR"
-
-    return f"T={t_part}|R={r_part}|P={p_part}|K={k_part}"
+        return None
+    surumler = _musteri_data_version_batch((mid,))
+    if surumler is None:
+        return None
+    return _aylik_grid_freshness_fp_from_version(surumler.get(mid, 0))
 
 
 def _aylik_grid_freshness_stamp(musteri_id, payload, fp=None):
     """
     Refresh sonrası tam freshness fingerprint'i payload'a yazar (Seçenek A: mem).
-    Hata olursa payload'a dokunmaz. fp verilirse yeniden SQL çalıştırmaz.
+    fp, hesap girdileri okunmadan ÖNCE alınmış olmalı; hesaptan sonra okunan sürüm arada
+    ilerlemişse bayat payload taze damga alırdı. fp yoksa damga basılmaz (SQL yok).
+    Hata olursa payload'a dokunmaz.
     """
     try:
         if not isinstance(payload, dict):
             return payload
-        if fp is None:
-            fp = _aylik_grid_freshness_fingerprint(musteri_id)
         if fp is None or str(fp).strip() == "":
             return payload
         payload["freshness_fingerprint"] = str(fp)
@@ -2490,26 +2671,6 @@ def _aylik_grid_freshness_stamp(musteri_id, payload, fp=None):
     return payload
 
 
-def _aylik_grid_freshness_stored_from_payload(payload) -> tuple[str, dict]:
-    """
-    Saklı fingerprint: payload.freshness_fingerprint (tam T+R+P+K) varsa onu kullan;
-    yoksa T=tahsilat_imza + K=payload KYC snapshot; R/P=NA (eski/synth).
-    Dönüş: (fp_string, parts_meta: r_known/p_known bool)
-    """
-    meta = {"r_known": False, "p_known": False, "source": "synth"}
-    if not isinstance(payload, dict):
-        return "T=|R=NA|P=NA|K=", meta
-    raw = payload.get("freshness_fingerprint") or payload.get("freshness_imza")
-    if raw:
-        meta["source"] = "payload"
-        meta["r_known"] = True
-        meta["p_known"] = True
-        return str(raw), meta
-    t_part = str(payload.get("tahsilat_imza") or "")
-    k_part = _aylik_grid_freshness_k_from_payload(payload)
-    return f"T={t_part}|R=NA|P=NA|K={k_part}", meta
-
-
 def _aylik_grid_freshness_money_sig(payload) -> tuple:
     """Ucuz alan imzası: refresh öncesi/sonrası 'değişir miydi' kıyası."""
     if not isinstance(payload, dict):
@@ -2579,14 +2740,11 @@ def _aylik_grid_cache_skip_refresh_enabled() -> bool:
         return False
 
 
-def _aylik_grid_freshness_should_skip(musteri_id, payload) -> tuple[bool, dict]:
+def _aylik_grid_freshness_should_skip(musteri_id, payload, live=None) -> tuple[bool, dict]:
     """
-    Gerçek atlama kararı (katı):
-      - source != "payload" (synth) → False
-      - r_known/p_known False → False
-      - herhangi bir T/R/P/K eksik, NA, ERR, None → False
-      - SADECE dördü de biliniyor VE dördü de aynı → True
-    Bilmiyorum = her zaman güvenli tarafta kal (yenile).
+    Gerçek atlama kararı (katı): payload'a basılı V=/REV= damgası canlı sürümle
+    birebir aynıysa True. Damga yok, eski T=/R=/P=/K= biçimi ya da sürüm okunamadı →
+    False (yenile). live verilirse (toplu sürüm okuması) SQL çalıştırmaz.
     """
     info: dict = {
         "musteri_id": None,
@@ -2594,13 +2752,8 @@ def _aylik_grid_freshness_should_skip(musteri_id, payload) -> tuple[bool, dict]:
         "reason": "init",
         "live": "",
         "stored": "",
-        "stored_source": "synth",
-        "t_same": None,
-        "r_same": None,
-        "p_same": None,
-        "k_same": None,
-        "r_known": False,
-        "p_known": False,
+        "stored_source": "yok",
+        "v_same": None,
     }
     try:
         mid = int(musteri_id)
@@ -2612,85 +2765,32 @@ def _aylik_grid_freshness_should_skip(musteri_id, payload) -> tuple[bool, dict]:
         info["reason"] = "bad_payload"
         return False, info
 
-    try:
-        live = _aylik_grid_freshness_fingerprint(mid)
-    except Exception:
-        info["reason"] = "live_fp_err"
-        return False, info
+    # live önce: atlanmasa da refresh sonrası damga olarak yeniden kullanılır (fp_reuse).
+    if live is None:
+        try:
+            live = _aylik_grid_freshness_fingerprint(mid)
+        except Exception:
+            live = None
     info["live"] = str(live or "")
-    if not live or "ERR" in str(live):
+    if not live:
         info["reason"] = "live_fp_err"
         return False, info
 
-    try:
-        stored, meta = _aylik_grid_freshness_stored_from_payload(payload)
-    except Exception:
-        info["reason"] = "stored_fp_err"
+    stored = str(payload.get("freshness_fingerprint") or "")
+    info["stored"] = stored
+    if not stored:
+        info["reason"] = "damga_yok"
         return False, info
-    info["stored"] = str(stored or "")
-    info["stored_source"] = str((meta or {}).get("source") or "synth")
-    info["r_known"] = bool((meta or {}).get("r_known"))
-    info["p_known"] = bool((meta or {}).get("p_known"))
-
-    live_p = _aylik_grid_freshness_parse_parts(str(live))
-    stor_p = _aylik_grid_freshness_parse_parts(str(stored))
-
-    # Synth / bilinmeyen R-P → asla atlama (T+K yeter sayılmaz)
-    if info["stored_source"] != "payload":
-        info["t_same"] = live_p.get("T") == stor_p.get("T")
-        info["k_same"] = live_p.get("K") == stor_p.get("K")
-        info["r_same"] = None
-        info["p_same"] = None
-        info["reason"] = "synth"
+    if not stored.startswith("V="):
+        info["stored_source"] = "eski"
+        info["reason"] = "eski_fp"
         return False, info
-    if not info["r_known"] or not info["p_known"]:
-        info["t_same"] = live_p.get("T") == stor_p.get("T")
-        info["k_same"] = live_p.get("K") == stor_p.get("K")
-        info["r_same"] = None
-        info["p_same"] = None
-        info["reason"] = "rp_unknown"
+    info["stored_source"] = "payload"
+    info["v_same"] = stored == str(live)
+    if not info["v_same"]:
+        info["reason"] = "v_diff"
         return False, info
-    if "R=NA" in str(stored) or "P=NA" in str(stored):
-        info["reason"] = "rp_na"
-        return False, info
-
-    for part in ("T", "R", "P", "K"):
-        lv = str(live_p.get(part) or "")
-        sv = str(stor_p.get(part) or "")
-        if not lv or not sv:
-            info["reason"] = f"missing_{part}"
-            return False, info
-        if "ERR" in lv or "ERR" in sv:
-            info["reason"] = f"err_{part}"
-            return False, info
-        if sv == "NA" or lv == "NA":
-            info["reason"] = f"na_{part}"
-            return False, info
-
-    t_same = live_p.get("T") == stor_p.get("T")
-    r_same = live_p.get("R") == stor_p.get("R")
-    p_same = live_p.get("P") == stor_p.get("P")
-    k_same = live_p.get("K") == stor_p.get("K")
-    info["t_same"] = bool(t_same)
-    info["r_same"] = bool(r_same)
-    info["p_same"] = bool(p_same)
-    info["k_same"] = bool(k_same)
-
-    if not (t_same and r_same and p_same and k_same):
-        reasons = []
-        if not t_same:
-            reasons.append("t_diff")
-        if not r_same:
-            reasons.append("r_diff")
-        if not p_same:
-            reasons.append("p_diff")
-        if not k_same:
-            reasons.append("k_diff")
-        info["reason"] = "+".join(reasons) if reasons else "diff"
-        info["would_skip"] = False
-        return False, info
-
-    info["reason"] = "all_same"
+    info["reason"] = "v_same"
     info["would_skip"] = True
     return True, info
 
@@ -2708,11 +2808,8 @@ def _aylik_grid_freshness_shadow_begin(musteri_id, payload, hit_kind: str) -> di
         "hit_kind": str(hit_kind or ""),
         "live": info.get("live") or "",
         "stored": info.get("stored") or "",
-        "stored_source": info.get("stored_source") or "synth",
-        "t_same": info.get("t_same"),
-        "r_same": info.get("r_same"),
-        "p_same": info.get("p_same"),
-        "k_same": info.get("k_same"),
+        "stored_source": info.get("stored_source") or "yok",
+        "v_same": info.get("v_same"),
         "would_skip": bool(_skip),
         "skip_reason": info.get("reason"),
         "before_sig": _aylik_grid_freshness_money_sig(payload),
@@ -2728,34 +2825,23 @@ def _aylik_grid_freshness_shadow_end(shadow: dict | None, after_payload, refresh
     # would_skip True iken payload değiştiyse → false-positive adayı
     fp_risk = bool(shadow.get("would_skip")) and payload_changed
     print(
-        "[grid-freshness-shadow] mid=%s hit=%s would_skip=%s "
-        "t_same=%s r_same=%s p_same=%s k_same=%s "
-        "refresh_ms=%.1f payload_changed=%s fp_risk=%s src=%s"
+        "[grid-freshness-shadow] mid=%s hit=%s would_skip=%s v_same=%s reason=%s "
+        "refresh_ms=%.1f payload_changed=%s fp_risk=%s src=%s live=%s stored=%s"
         % (
             shadow.get("musteri_id"),
             shadow.get("hit_kind"),
             shadow.get("would_skip"),
-            shadow.get("t_same"),
-            shadow.get("r_same"),
-            shadow.get("p_same"),
-            shadow.get("k_same"),
+            shadow.get("v_same"),
+            shadow.get("skip_reason"),
             float(refresh_ms or 0),
             payload_changed,
             fp_risk,
             shadow.get("stored_source"),
+            shadow.get("live"),
+            shadow.get("stored"),
         ),
         flush=True,
     )
-    print(
-        "[grid-freshness-shadow] mid=%s live=%s"
-        % (shadow.get("musteri_id"), shadow.get("live")),
-        flush=True,
-    )
-    print(
-        "[grid-freshness-shadow] mid=%s stored=%s"
-        % (shadow.get("musteri_id"), shadow.get("stored")),
-        flush=True,
-    )
 
 
 def _aylik_remaining_brut_by_iso_from_kyc(kyc, tufe_map=None) -> dict[str, float]:
@@ -2786,6 +2872,27 @@ def _aylik_remaining_brut_by_iso_from_kyc(kyc, tufe_map=None) -> dict[str, float
     return remaining_by_iso
 
 
+def _aylik_remaining_by_iso_from_payload(pobj) -> dict:
+    """Önbellek payload'ı (veya ay listesi) → ay başı iso → KDV dahil tutar (FIFO dağıtım tabanı)."""
+    out = {}
+    aylar = pobj if isinstance(pobj, list) else ((pobj or {}).get("aylar") or [])
+    if not isinstance(aylar, list):
+        return out
+    for a in aylar:
+        if not isinstance(a, dict):
+            continue
+        try:
+            yy = int(a.get("yil"))
+            mm = int(a.get("ay"))
+            tv = round(float(a.get("tutar_kdv_dahil") or 0), 2)
+        except (TypeError, ValueError):
+            continue
+        if tv <= 0 or mm < 1 or mm > 12:
+            continue
+        out[date(yy, mm, 1).isoformat()] = tv
+    return out
+
+
 def _aylik_tahsil_tutar_map(musteri_id, tahsil_rows=None, remaining_by_iso=None, kyc_row=None, tufe_map=None):
     """Tahsilat tutarlarını aya dağıtır: |AYLIK_TAH|YYYY-MM-DD| varsa oraya; yoksa fatura ayı, o da yoksa tahsilat tarihi.
 
@@ -2795,6 +2902,10 @@ def _aylik_tahsil_tutar_map(musteri_id, tahsil_rows=None, remaining_by_iso=None,
     - İki geçiş: önce marker'lı (TAH/PAY remaining düşer), sonra marker'sız oldest-open.
     tahsil_rows / remaining_by_iso / kyc_row: ekstre gibi sıcak yollarda tekrarlayan SQL'i keser.
     """
+    if tahsil_rows is None:
+        on = _grid_bulk_on_yukleme("tahsil_rows", musteri_id)
+        if on is not _GRID_BULK_YOK:
+            tahsil_rows = on
     if tahsil_rows is not None:
         rows = tahsil_rows
     else:
@@ -2815,24 +2926,15 @@ def _aylik_tahsil_tutar_map(musteri_id, tahsil_rows=None, remaining_by_iso=None,
     else:
         remaining_by_iso = {}
         try:
-            cr = fetch_one("SELECT payload FROM musteri_aylik_grid_cache WHERE musteri_id = %s", (musteri_id,))
+            on = _grid_bulk_on_yukleme("grid_payload", musteri_id)
+            if on is not _GRID_BULK_YOK:
+                cr = {"payload": on}
+            else:
+                cr = fetch_one("SELECT payload FROM musteri_aylik_grid_cache WHERE musteri_id = %s", (musteri_id,))
             payload_raw = (cr or {}).get("payload")
             if payload_raw:
                 pobj = json.loads(payload_raw) if isinstance(payload_raw, str) else payload_raw
-                aylar = pobj if isinstance(pobj, list) else ((pobj or {}).get("aylar") or [])
-                if isinstance(aylar, list):
-                    for a in aylar:
-                        if not isinstance(a, dict):
-                            continue
-                        try:
-                            yy = int(a.get("yil"))
-                            mm = int(a.get("ay"))
-                            tv = round(float(a.get("tutar_kdv_dahil") or 0), 2)
-                        except (TypeError, ValueError):
-                            continue
-                        if tv <= 0 or mm < 1 or mm > 12:
-                            continue
-                        remaining_by_iso[date(yy, mm, 1).isoformat()] = tv
+                remaining_by_iso = _aylik_remaining_by_iso_from_payload(pobj)
         except Exception:
             remaining_by_iso = {}
 
@@ -2843,8 +2945,11 @@ def _aylik_tahsil_tutar_map(musteri_id, tahsil_rows=None, remaining_by_iso=None,
                 try:
                     # Flag açıkken loader zaten effective KYC döner; kapalıyken ham satır.
                     # Ayrı SELECT yerine tek kaynak → sentetik/ham sapması olmasın.
+                    on = _grid_bulk_on_yukleme("kyc", musteri_id)
                     if SENTETIK_KYC_ENABLED:
                         kyc = _musteri_kyc_grup_for_aylik_grid(int(musteri_id))
+                    elif on is not _GRID_BULK_YOK:
+                        kyc = {k: on.get(k) for k in _AYLIK_REMAINING_KYC_ALANLARI}
                     else:
                         kyc = fetch_one(
                             """
@@ -3025,6 +3130,25 @@ def _aylik_tahsil_tutar_map(musteri_id, tahsil_rows=None, remaining_by_iso=None,
 
 def _load_aylik_tahsil_ay_keys_by_musteri():
     """musteri_id -> {'YYYY-MM-DD', ...} AYLIK_TAH marker anahtarları (ayın 1'i)."""
+    if _tahsilat_ay_dagitim_hazir():
+        rows = fetch_all(
+            """
+            SELECT DISTINCT COALESCE(t.musteri_id, t.customer_id) AS mid, d.gun_metin
+            FROM tahsilat_ay_dagitim d
+            JOIN tahsilatlar t ON t.id = d.tahsilat_id
+            WHERE d.tur = 'tah' AND length(d.gun_metin) = 10
+              AND COALESCE(t.tutar, 0) > 0
+            """
+        ) or []
+        by_mid = defaultdict(set)
+        for r in rows:
+            try:
+                mid = int(r.get("mid") or 0)
+            except (TypeError, ValueError):
+                continue
+            if mid > 0:
+                by_mid[mid].add(r.get("gun_metin"))
+        return by_mid
     rows = fetch_all(
         """
         SELECT musteri_id, customer_id, aciklama, tutar
@@ -3080,6 +3204,54 @@ def _brut_by_iso_from_aylik_grid_payload(payload) -> dict:
     return out
 
 
+_TAHSILAT_AY_DAGITIM_HAZIR: dict = {}
+
+
+def _tahsilat_ay_dagitim_hazir() -> bool:
+    """tahsilat_ay_dagitim trigger'ı bu şemada kurulu mu; şema başına bir kez bakılır."""
+    sema = _tenant_schema_for_request() or "public"
+    hazir = _TAHSILAT_AY_DAGITIM_HAZIR.get(sema)
+    if hazir is None:
+        try:
+            ensure_tahsilat_ay_dagitim()
+        except Exception:
+            pass
+        try:
+            hazir = bool(
+                fetch_one(
+                    "SELECT 1 AS x FROM pg_trigger "
+                    "WHERE tgname = 'trg_tahsilat_ay_dagitim' "
+                    "AND tgrelid = 'tahsilatlar'::regclass"
+                )
+            )
+        except Exception:
+            hazir = False
+        _TAHSILAT_AY_DAGITIM_HAZIR[sema] = hazir
+    return hazir
+
+
+def _tah_aylar_sutunu() -> str:
+    """Tahsilat satır sorgularına ek sütun: |AYLIK_TAH| ayları (tahsilat_ay_dagitim'den); trigger yoksa boş."""
+    if not _tahsilat_ay_dagitim_hazir():
+        return ""
+    return (
+        ", (SELECT array_agg(DISTINCT d.ay) FROM tahsilat_ay_dagitim d"
+        " WHERE d.tahsilat_id = t.id AND d.tur = 'tah' AND length(d.gun_metin) = 10"
+        " AND d.ay IS NOT NULL) AS tah_aylar"
+    )
+
+
+def _aylik_tah_gun_metinleri(iso_day) -> tuple[date | None, list[str]]:
+    """Marker tarih metni adayları: (ayın 1'i, [YYYY-MM-DD, YYYY-M-D]); tarih geçersizse (None, [ham])."""
+    sday = str(iso_day or "").strip()[:10]
+    try:
+        dp = datetime.strptime(sday, "%Y-%m-%d").date()
+    except ValueError:
+        return None, [sday]
+    loose = f"{dp.year}-{dp.month}-{dp.day}"
+    return date(dp.year, dp.month, 1), ([sday, loose] if loose != sday else [sday])
+
+
 def _load_max_aylik_tah_iso_by_musteri(exclude_btufrt=True, only_fully_paid=True):
     """
     Peşin/aylık tahsil marker'larından müşteri bazlı en ileri ay.
@@ -3092,20 +3264,45 @@ def _load_max_aylik_tah_iso_by_musteri(exclude_btufrt=True, only_fully_paid=True
       _aylik_tahsil_tutar_map dağıtımı ≥ grid brüt − AYLIK_GRID_TAM_ODENDI_TOLERANS.
       Brüt, musteri_aylik_grid_cache payload'dan okunur; cache/brüt yoksa ay ufka alınmaz.
     """
-    rows = fetch_all(
-        """
-        SELECT COALESCE(t.musteri_id, t.customer_id) AS mid,
-               t.id,
-               COALESCE(t.aciklama, '') AS aciklama,
-               COALESCE(t.tutar, 0) AS tutar,
-               t.tahsilat_tarihi,
-               f.fatura_tarihi
-        FROM tahsilatlar t
-        LEFT JOIN faturalar f ON f.id = t.fatura_id
-        WHERE COALESCE(t.aciklama, '') LIKE '%%|AYLIK_TAH|%%'
-          AND COALESCE(t.tutar, 0) > 0
-        """
-    ) or []
+    dagitim = _tahsilat_ay_dagitim_hazir()
+    if dagitim:
+        # Marker'lı tahsilatlar tahsilat_ay_dagitim'den (açıklamada LIKE taraması yok); ay kümesi hazır.
+        rows = fetch_all(
+            """
+            SELECT COALESCE(t.musteri_id, t.customer_id) AS mid,
+                   t.id,
+                   COALESCE(t.aciklama, '') AS aciklama,
+                   COALESCE(t.tutar, 0) AS tutar,
+                   t.tahsilat_tarihi,
+                   f.fatura_tarihi,
+                   d.tah_aylar
+            FROM (
+                SELECT tahsilat_id,
+                       array_agg(DISTINCT ay) FILTER (WHERE ay IS NOT NULL) AS tah_aylar
+                FROM tahsilat_ay_dagitim
+                WHERE tur = 'tah' AND length(gun_metin) = 10
+                GROUP BY tahsilat_id
+            ) d
+            JOIN tahsilatlar t ON t.id = d.tahsilat_id
+            LEFT JOIN faturalar f ON f.id = t.fatura_id
+            WHERE COALESCE(t.tutar, 0) > 0
+            """
+        ) or []
+    else:
+        rows = fetch_all(
+            """
+            SELECT COALESCE(t.musteri_id, t.customer_id) AS mid,
+                   t.id,
+                   COALESCE(t.aciklama, '') AS aciklama,
+                   COALESCE(t.tutar, 0) AS tutar,
+                   t.tahsilat_tarihi,
+                   f.fatura_tarihi
+            FROM tahsilatlar t
+            LEFT JOIN faturalar f ON f.id = t.fatura_id
+            WHERE COALESCE(t.aciklama, '') LIKE '%%|AYLIK_TAH|%%'
+              AND COALESCE(t.tutar, 0) > 0
+            """
+        ) or []
 
     by_mid_rows = defaultdict(list)
     marker_isos_by_mid = defaultdict(set)
@@ -3119,6 +3316,10 @@ def _load_max_aylik_tah_iso_by_musteri(exclude_btufrt=True, only_fully_paid=True
         ac = str(r.get("aciklama") or "")
         if exclude_btufrt and "|BTUFRT|" in ac:
             continue
+        if dagitim:
+            by_mid_rows[mid].append(r)
+            marker_isos_by_mid[mid].update(a.isoformat() for a in (r.get("tah_aylar") or []))
+            continue
         isos = re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac)
         if not isos:
             continue
@@ -3303,54 +3504,389 @@ def _load_manual_fatura_ay_by_musteri():
     return by_mid
 
 
-def _upsert_aylik_grid_cache(musteri_id, tufe_map=None):
+def _upsert_aylik_grid_cache(musteri_id, tufe_map=None, fp=None):
+    """Tam hesap + yazım; bellek kopyası hesap öncesi okunan sürümle (fp) damgalanır."""
+    if fp is None:
+        fp = _aylik_grid_freshness_fingerprint(musteri_id)
     payload = _build_aylik_grid_cache_payload(musteri_id, tufe_map=tufe_map)
     if not payload:
         return None
-    return _persist_grid_cache_with_panel(musteri_id, payload)
+    payload = _persist_grid_cache_with_panel(musteri_id, payload)
+    _aylik_grid_mem_damgala(musteri_id, payload, fp)
+    return payload
 
 
-# Kısa süreli bellek önbelleği: aynı müşteri için grid-cache + tahsil-durum arka arkaya gelince
-# _build_aylik_grid_cache_payload tekrar çalışmasın (Supabase round-trip + ağır hesap).
-_aylik_grid_payload_mem: dict = {}
+def _aylik_grid_tahsil_rows_sirali(musteri_id) -> list:
+    """Ekstre tahsil satırları, _aylik_tahsil_tutar_map sorgusunun sırasıyla (tarih ASC NULLS LAST, id)."""
+    rows = _ekstre_tahsil_rows_for_musteri(musteri_id) or []
 
+    def _anahtar(r):
+        t = r.get("tahsilat_tarihi")
+        try:
+            rid = int(r.get("id") or 0)
+        except (TypeError, ValueError):
+            rid = 0
+        return (t is None, str(t.isoformat() if hasattr(t, "isoformat") else (t or "")), rid)
 
-def _tenant_cache_part():
-    """Production isteklerinde None (g.tenant_schema yok); kiracı aktifse şema adı."""
-    return _tenant_schema_for_request()
+    return sorted(rows, key=_anahtar)
 
 
-def _aylik_grid_mem_key(musteri_id):
-    return (_tenant_cache_part(), int(musteri_id))
+def _aylik_grid_payload_hucre_yamala(musteri_id, tufe_map=None):
+    """Önbellekteki grid payload'ını yalnız girdisi değişen aylarda yeniden hesaplar (yazmaz).
+
+    Bağımlılık modeli:
+    - tahsilat → eşleştiği ay(lar): hücre girdi imzası (``hucre_girdi``) değişen aylar,
+    - reel dönem / KYC → yürürlük tarihinden sonraki aylar: brüt katmanı yeniden
+      hesaplanır, yalnız brütü değişen hücreler (ve tahsil katmanları) yazılır.
+    Tam hesap gerekiyorsa (önbellek yok, imzasız eski payload, compute_rev farkı,
+    ay ufku değişmiş) None döner.
+    """
+    try:
+        mid = int(musteri_id)
+    except (TypeError, ValueError):
+        return None
+    if mid <= 0:
+        return None
+    _ensure_aylik_grid_cache_table()
+    row = fetch_one("SELECT payload FROM musteri_aylik_grid_cache WHERE musteri_id = %s", (mid,))
+    payload = _parse_aylik_grid_cache_payload_raw((row or {}).get("payload"))
+    if not isinstance(payload, dict) or not isinstance(payload.get("aylar"), list):
+        return None
+    if not isinstance(payload.get("hucre_girdi"), dict) or not isinstance(payload.get("reel_donem"), dict):
+        return None
+    try:
+        if int(payload.get("compute_rev") or 0) != AYLIK_GRID_COMPUTE_REV:
+            return None
+    except (TypeError, ValueError):
+        return None
+    kyc = _musteri_kyc_grup_for_aylik_grid(mid)
+    if not kyc:
+        return None
+    tol = float(AYLIK_GRID_TAM_ODENDI_TOLERANS)
+    aylar = payload["aylar"]
+    manual = _musteri_reel_donem_manual_dict_from_db(mid)
+    reel_imza = _aylik_grid_reel_donem_imza(manual)
+    # FIFO tabanı yamadan önceki önbellekten (tam hesap da diskteki payload'ı okur).
+    try:
+        remaining = _aylik_remaining_by_iso_from_payload(payload)
+    except (TypeError, ValueError):
+        remaining = {}
+
+    kirli: set[str] = set()
+    k_farkli = _aylik_grid_freshness_k_from_kyc_row(kyc) != _aylik_grid_freshness_k_from_payload(payload)
+    if k_farkli or reel_imza != payload.get("reel_donem"):
+        tm = tufe_map if tufe_map is not None else _tufe_map_by_year_month_cached()
+        taze = _aylik_grid_compute(mid, kyc, tm, None)
+        if not isinstance(taze, dict):
+            return None
+        if manual:
+            _aylik_grid_apply_reel_donem_overlay_to_payload(mid, kyc, tm, taze, manual_reel_by_year=manual)
+        taze_aylar = taze.get("aylar") or []
+
+        def _ay_anahtarlari(liste):
+            return [(a.get("yil"), a.get("ay")) if isinstance(a, dict) else None for a in liste]
+
+        if _ay_anahtarlari(aylar) != _ay_anahtarlari(taze_aylar):
+            return None
+        for a, a_taze in zip(aylar, taze_aylar):
+            if not isinstance(a, dict):
+                continue
+            if round(_aylik_grid_hucre_brut(a), 2) == round(_aylik_grid_hucre_brut(a_taze), 2):
+                continue
+            a["brut_tutar_kdv"] = a_taze.get("brut_tutar_kdv")
+            a["tutar_kdv_dahil"] = a_taze.get("tutar_kdv_dahil")
+            try:
+                kirli.add(date(int(a.get("yil")), int(a.get("ay")), 1).isoformat())
+            except (TypeError, ValueError):
+                continue
+        for k, v in taze.items():
+            if k != "aylar":
+                payload[k] = v
+
+    rows = _aylik_grid_tahsil_rows_sirali(mid)
+    tahsil_map = _aylik_tahsil_tutar_map(mid, tahsil_rows=rows, remaining_by_iso=remaining or None)
+    batch = _ekstre_tahsil_batch_maps_from_rows(rows)
+    acik_aylari = _aylik_grid_acik_tutar_ay_keys_normalized(mid)
+    eski_imza = payload.get("hucre_girdi") or {}
+    yeni_imza = {}
+    yamali = 0
+    for a in aylar:
+        if not isinstance(a, dict):
+            continue
+        iso, girdi = _aylik_grid_hucre_girdisi(a, tahsil_map, batch, manual, acik_aylari)
+        imza = _aylik_grid_hucre_imza(girdi)
+        if iso and imza:
+            yeni_imza[iso] = imza
+        if not iso or (iso not in kirli and imza == eski_imza.get(iso, "")):
+            continue
+        # brut≤tol ayda ödenen tahsil haritasından gelir (compute ile aynı başlangıç).
+        if _aylik_grid_hucre_brut(a) <= tol:
+            a["odenen_tutar_kdv"] = girdi[0]
+        _aylik_grid_hucre_tahsil_uygula(a, girdi, manual, tol)
+        yamali += 1
+    payload["hucre_girdi"] = yeni_imza
+    payload["reel_donem"] = reel_imza
+    payload.pop("freshness_fingerprint", None)
+    payload["tahsilat_imza"] = _aylik_tahsil_cache_imza(mid)
+    payload["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    logging.getLogger(__name__).debug(
+        "aylik grid hücre yaması musteri_id=%s yamali=%s/%s brut_kirli=%s",
+        mid, yamali, len(aylar), len(kirli),
+    )
+    return payload
+
+
+def _aylik_grid_mem_damgala(musteri_id, payload, fp) -> None:
+    """Yazılmış payload'ı belleğe koyar; fp (girdiler okunmadan önceki sürüm) varsa damgalı."""
+    if not isinstance(payload, dict):
+        return
+    try:
+        _aylik_grid_mem_set(int(musteri_id), _aylik_grid_freshness_stamp(musteri_id, payload, fp=fp))
+    except (TypeError, ValueError):
+        pass
+
+
+def _upsert_aylik_grid_cache_artimli(musteri_id, tufe_map=None, fp=None):
+    """Tahsilat / reel yazıcıları: önbelleği hücre bazında yamar; yamanamıyorsa tam _upsert_aylik_grid_cache."""
+    if fp is None:
+        fp = _aylik_grid_freshness_fingerprint(musteri_id)
+    try:
+        payload = _aylik_grid_payload_hucre_yamala(musteri_id, tufe_map=tufe_map)
+    except Exception:
+        logging.getLogger(__name__).exception("aylik grid hücre yaması musteri_id=%s", musteri_id)
+        payload = None
+    if payload is None:
+        return _upsert_aylik_grid_cache(musteri_id, tufe_map=tufe_map, fp=fp)
+    payload = _persist_grid_cache_with_panel(musteri_id, payload)
+    _aylik_grid_mem_damgala(musteri_id, payload, fp)
+    return payload
+
+
+# Toplu yeniden hesap: parti başına ~7 set tabanlı SELECT + 2 çok satırlı upsert.
+AYLIK_GRID_BULK_BATCH = 200
+# _aylik_tahsil_tutar_map kalan-brüt yedeğinin okuduğu KYC alanları (ham satır alt kümesi).
+_AYLIK_REMAINING_KYC_ALANLARI = (
+    "sozlesme_tarihi", "sozlesme_bitis", "aylik_kira", "kira_artis_tarihi",
+    "kira_suresi_ay", "kira_nakit", "kira_nakit_tutar", "kira_banka_tutar",
+)
+
+
+def _grid_bulk_yukle(musteri_ids) -> dict:
+    """Parti müşterileri için grid girdilerini set tabanlı sorgularla yükler."""
+    ids = sorted({int(m) for m in musteri_ids if m and int(m) > 0})
+    pre = {"mids": set(ids)}
+    for kind in _GRID_BULK_VARSAYILAN:
+        pre[kind] = {}
+    pre["yazilan_panel"] = {}
+    pre["yazilan_grid_payload"] = {}
+    if not ids:
+        return pre
+    _ensure_musteri_reel_donem_tutar_table()
+    _ensure_tahsilat_panel_detay_table()
+    _ensure_aylik_grid_cache_table()
+
+    for r in fetch_all(
+        """
+        SELECT c.id AS _mid, mk.id AS musteri_kyc_id,
+               mk.sozlesme_tarihi, mk.sozlesme_bitis, mk.aylik_kira, mk.kira_artis_tarihi, mk.kira_suresi_ay, mk.kira_nakit,
+               mk.kira_nakit_tutar, mk.kira_banka_tutar, mk.kdv_oran,
+               c.kapanis_tarihi, c.kapanis_sonrasi_borc_ay, c.durum, c.rent_start_date,
+               c.ilk_kira_bedeli
+        FROM customers c
+        LEFT JOIN LATERAL (
+            SELECT id, sozlesme_tarihi, sozlesme_bitis, aylik_kira, kira_artis_tarihi, kira_suresi_ay, kira_nakit,
+                   kira_nakit_tutar, kira_banka_tutar, kdv_oran
+            FROM musteri_kyc
+            WHERE musteri_id = c.id
+            ORDER BY id DESC
+            LIMIT 1
+        ) mk ON TRUE
+        WHERE c.id = ANY(%s)
+        """,
+        (ids,),
+    ) or []:
+        row = dict(r)
+        pre["kyc"][int(row.pop("_mid"))] = row
+
+    # musteri_id veya customer_id eşleşmesi — tekil sorgulardaki OR ile aynı küme.
+    tahsil_rows = defaultdict(list)
+    for r in fetch_all(
+        """
+        SELECT k.mid AS _mid, t.id, COALESCE(t.aciklama, '') AS aciklama, COALESCE(t.tutar, 0) AS tutar,
+               t.tahsilat_tarihi, f.fatura_tarihi""" + _tah_aylar_sutunu() + """
+        FROM unnest(%s::bigint[]) AS k(mid)
+        JOIN tahsilatlar t ON (t.musteri_id = k.mid OR t.customer_id = k.mid)
+        LEFT JOIN faturalar f ON f.id = t.fatura_id
+        WHERE COALESCE(t.tutar, 0) > 0
+        ORDER BY k.mid, t.tahsilat_tarihi ASC NULLS LAST, t.id ASC
+        """,
+        (ids,),
+    ) or []:
+        row = dict(r)
+        tahsil_rows[int(row.pop("_mid"))].append(row)
+    pre["tahsil_rows"] = dict(tahsil_rows)
+
+    for r in fetch_all(
+        """
+        SELECT k.mid AS _mid,
+            COUNT(*)::bigint AS cnt,
+            COALESCE(SUM(COALESCE(t.tutar, 0)), 0)::numeric AS toplam,
+            COALESCE(MAX(t.tahsilat_tarihi::timestamp), TIMESTAMP '1970-01-01') AS mx
+        FROM unnest(%s::bigint[]) AS k(mid)
+        JOIN tahsilatlar t ON (t.musteri_id = k.mid OR t.customer_id = k.mid)
+        WHERE COALESCE(t.tutar, 0) > 0
+        GROUP BY k.mid
+        """,
+        (ids,),
+    ) or []:
+        pre["tahsil_imza"][int(r["_mid"])] = _aylik_tahsil_imza_from_row(r)
+
+    for r in fetch_all(
+        "SELECT musteri_id, donem_yil, tutar_kdv_dahil FROM musteri_reel_donem_tutar WHERE musteri_id = ANY(%s)",
+        (ids,),
+    ) or []:
+        try:
+            pre["reel"].setdefault(int(r["musteri_id"]), {})[int(r.get("donem_yil"))] = round(
+                float(r.get("tutar_kdv_dahil") or 0), 2
+            )
+        except (TypeError, ValueError):
+            continue
+
+    for r in fetch_all(
+        "SELECT musteri_id, by_iso FROM musteri_tahsilat_panel_detay WHERE musteri_id = ANY(%s)",
+        (ids,),
+    ) or []:
+        pre["panel"][int(r["musteri_id"])] = r.get("by_iso")
+
+    for r in fetch_all(
+        f"""
+        SELECT musteri_id, COALESCE(notlar, '') AS notlar
+        FROM faturalar
+        WHERE musteri_id = ANY(%s)
+          AND COALESCE(notlar, '') LIKE '%%|AYLIK_TUTAR|%%'
+          AND COALESCE(durum, '') != 'odendi'
+          AND {sql_expr_fatura_gib_no_tasindi_degil("notlar")}
+        """,
+        (ids,),
+    ) or []:
+        pre["acik_notlar"].setdefault(int(r["musteri_id"]), []).append(r.get("notlar") or "")
+
+    for r in fetch_all(
+        "SELECT musteri_id, payload FROM musteri_aylik_grid_cache WHERE musteri_id = ANY(%s)",
+        (ids,),
+    ) or []:
+        pre["grid_payload"][int(r["musteri_id"])] = r.get("payload")
+    return pre
+
+
+def _grid_bulk_yaz(pre: dict) -> None:
+    """Tamponlanmış panel ve grid yazımları — tablo başına tek çok satırlı upsert."""
+    from psycopg2.extras import execute_values
+
+    panel = pre.get("yazilan_panel") or {}
+    grid = pre.get("yazilan_grid_payload") or {}
+    if not panel and not grid:
+        return
+    with get_db() as conn:
+        cur = conn.cursor()
+        if panel:
+            execute_values(
+                cur,
+                """
+                INSERT INTO musteri_tahsilat_panel_detay (musteri_id, by_iso, updated_at)
+                VALUES %s
+                ON CONFLICT (musteri_id)
+                DO UPDATE SET by_iso = EXCLUDED.by_iso, updated_at = NOW()
+                """,
+                [(mid, json.dumps(v, ensure_ascii=False)) for mid, v in sorted(panel.items())],
+                template="(%s, %s, NOW())",
+                page_size=500,
+            )
+        if grid:
+            execute_values(
+                cur,
+                """
+                INSERT INTO musteri_aylik_grid_cache (musteri_id, payload, updated_at)
+                VALUES %s
+                ON CONFLICT (musteri_id)
+                DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW()
+                """,
+                [(mid, json.dumps(v, ensure_ascii=False)) for mid, v in sorted(grid.items())],
+                template="(%s, %s, NOW())",
+                page_size=500,
+            )
+
+
+@contextmanager
+def _aylik_grid_bulk_scope(musteri_ids):
+    """Kapsam içinde grid yükleyicileri önceden yüklenmiş veriyi kullanır; çıkışta tamponu yazar."""
+    pre = _grid_bulk_yukle(musteri_ids)
+    onceki = getattr(_GRID_BULK, "pre", None)
+    _GRID_BULK.pre = pre
+    try:
+        yield pre
+    finally:
+        _GRID_BULK.pre = onceki
+        _grid_bulk_yaz(pre)
+
+
+def _upsert_aylik_grid_cache_bulk(musteri_ids, tufe_map=None, batch_size=AYLIK_GRID_BULK_BATCH) -> int:
+    """Çok müşteri için _upsert_aylik_grid_cache; girdiler / yazımlar parti parti toplu."""
+    ids = [int(m) for m in musteri_ids if m]
+    tm = tufe_map if tufe_map is not None else _tufe_map_by_year_month_cached()
+    updated = 0
+    for i in range(0, len(ids), max(1, int(batch_size))):
+        parti = ids[i : i + max(1, int(batch_size))]
+        # Sürümler parti girdileri yüklenmeden önce: arada yazım olursa damga eski kalır → yenilenir.
+        surumler = _musteri_data_version_batch(parti)
+        with _aylik_grid_bulk_scope(parti) as pre, _aylik_grid_core_scope(
+            [_musteri_kyc_grup_satir_son(k) for k in pre["kyc"].values()], tm
+        ):
+            for j, mid in enumerate(parti):
+                job_progress(i + j, len(ids))
+                try:
+                    fp = None if surumler is None else _aylik_grid_freshness_fp_from_version(surumler.get(mid, 0))
+                    if _upsert_aylik_grid_cache(mid, tufe_map=tm, fp=fp):
+                        updated += 1
+                except Exception:
+                    logging.getLogger(__name__).exception("aylik grid toplu rebuild musteri_id=%s", mid)
+    return updated
+
+
+# Kısa süreli bellek önbelleği: aynı müşteri için grid-cache + tahsil-durum arka arkaya gelince
+# _build_aylik_grid_cache_payload tekrar çalışmasın (Supabase round-trip + ağır hesap).
+# Değer: (yazılma time.time(), payload) — çağıranlar kendi tazelik eşiğini uygular.
+_AYLIK_GRID_PAYLOAD_CACHE = cache_region(
+    "aylik_grid_payload", max_entries=4000, max_bytes=48 * 1024 * 1024, ttl_sec=120.0
+)
 
 
 def _aylik_grid_mem_get(musteri_id):
     try:
-        return _aylik_grid_payload_mem.get(_aylik_grid_mem_key(musteri_id))
+        return _AYLIK_GRID_PAYLOAD_CACHE.get(int(musteri_id))
     except (TypeError, ValueError):
         return None
 
 
 def _aylik_grid_mem_set(musteri_id, payload, ts=None) -> None:
     try:
-        _aylik_grid_payload_mem[_aylik_grid_mem_key(musteri_id)] = (
-            time.time() if ts is None else ts,
-            payload,
-        )
+        mid = int(musteri_id)
     except (TypeError, ValueError):
-        pass
+        return
+    _AYLIK_GRID_PAYLOAD_CACHE.set(
+        mid,
+        (time.time() if ts is None else ts, payload),
+        tags=(musteri_tag(mid),),
+    )
 
 
 def _invalidate_aylik_grid_payload_mem(musteri_id=None) -> None:
+    """Grid bellek önbelleği; müşteri verilirse o müşteriye etiketli tüm bölgeler (ekstre, kart, özet)."""
     if musteri_id is None:
-        _aylik_grid_payload_mem.clear()
+        _AYLIK_GRID_PAYLOAD_CACHE.clear()
         return
     try:
-        mid = int(musteri_id)
-        tenant = _tenant_cache_part()
-        _aylik_grid_payload_mem.pop((tenant, mid), None)
-        if tenant is None:
-            _aylik_grid_payload_mem.pop(mid, None)
+        cache_invalidate_tag(musteri_tag(musteri_id))
     except (TypeError, ValueError):
         pass
 
@@ -3412,6 +3948,19 @@ def _defer_aylik_grid_cache_rebuild(musteri_id) -> None:
     except Exception:
         captured_tenant = None
     _invalidate_aylik_grid_payload_mem(mid)
+    if job_workers_count() > 0:
+        # Kuyruk: aynı müşteri için bekleyen iş varsa yenisi açılmaz (ardışık kaydetler tek rebuild).
+        try:
+            enqueue(
+                "aylik_grid_rebuild",
+                {"musteri_id": mid},
+                tenant_schema=captured_tenant,
+                dedupe_key=f"musteri:{mid}",
+                max_attempts=2,
+            )
+            return
+        except Exception as ex:
+            logging.getLogger(__name__).warning("defer grid cache kuyruk mid=%s: %r", mid, ex)
     try:
         app = current_app._get_current_object()
     except Exception:
@@ -3432,6 +3981,14 @@ def _defer_aylik_grid_cache_rebuild(musteri_id) -> None:
     threading.Thread(target=_work, daemon=True).start()
 
 
+@job_handler("aylik_grid_rebuild", kisa=True)
+def _aylik_grid_rebuild_job(params):
+    mid = int(params.get("musteri_id") or 0)
+    if mid <= 0:
+        return {"ok": False}
+    return {"ok": bool(_upsert_aylik_grid_cache(mid)), "musteri_id": mid}
+
+
 def _parse_aylik_grid_cache_payload_raw(raw):
     if raw is None:
         return None
@@ -3487,6 +4044,21 @@ def _read_aylik_grid_cache_payload_batch(musteri_ids, mem_ttl: float = 12.0) ->
                 out[mid] = hit[1]
         else:
             need_db.append(mid)
+    # Sürüm damgalı bellek kopyaları tek sorguyla doğrulanır; sürümü ilerlemiş olan diskten okunur.
+    damgali = [
+        m for m, p in out.items()
+        if isinstance(p, dict) and str(p.get("freshness_fingerprint") or "").startswith("V=")
+    ]
+    if damgali:
+        surumler = _musteri_data_version_batch(damgali)
+        if surumler is not None:
+            for m in damgali:
+                taze, _info = _aylik_grid_freshness_should_skip(
+                    m, out[m], live=_aylik_grid_freshness_fp_from_version(surumler.get(m, 0))
+                )
+                if not taze:
+                    out.pop(m, None)
+                    need_db.append(m)
     if need_db:
         rows = fetch_all(
             "SELECT musteri_id, payload FROM musteri_aylik_grid_cache WHERE musteri_id = ANY(%s::bigint[])",
@@ -3811,15 +4383,25 @@ def api_musteriler():
     )
     # Autocomplete dropdown için 100 yeterli; dar aramada zaten eşleşenler üste gelir.
     limit_n = 100 if arama else 1000
+    ix = musteri_arama_indeksi() if arama else None
     if not arama:
         rows = fetch_all(base + f"WHERE {gor} ORDER BY name LIMIT {limit_n}")
+    elif ix is not None:
+        # Eşleşme + sıralama bellekte (kelimeler AND); görünürlük ve alanlar SQL'de, indeks sırasıyla.
+        rows = fetch_all(
+            base
+            + "JOIN unnest(%s::int[]) WITH ORDINALITY AS ix(ix_id, ix_sira) ON ix.ix_id = customers.id "
+            + f"WHERE {gor} ORDER BY ix.ix_sira LIMIT {limit_n}",
+            (ix.idler(arama, tokenli=True),),
+        )
     else:
         # Boşlukla ayrılmış her kelime tüm alanlarda aranır, kelimeler AND ile birleştirilir.
         # «Mehmet Erdoğdu» ve «Erdoğdu Mehmet» aynı kartı bulur.
         w, p = customers_arama_sql_params_giris_genis_tokens(arama, "")
+        sira, sira_p = customers_arama_sira_sql_params(arama, "")
         rows = fetch_all(
-            base + f"WHERE {w} AND {gor} ORDER BY name LIMIT {limit_n}",
-            p,
+            base + f"WHERE {w} AND {gor} ORDER BY {sira}, name LIMIT {limit_n}",
+            tuple(p) + sira_p,
         )
         # Geniş WHERE bazen e-postayı kaçırır (@, normalizasyon); boşsa sadece e-posta kolonlarında düz ILIKE dene
         if (not rows) and ("@" in arama):
@@ -4326,26 +4908,130 @@ def senaryo01_kayit_yillari_parse(raw) -> list[int]:
             continue
         if y in seen:
             continue
-        seen.add(y)
-        out.append(y)
-    return out
+        seen.add(y)
+        out.append(y)
+    return out
+
+
+def senaryo01_kayit_yili_eslesir(bas, yillar) -> bool:
+    """Filtre yoksa True. Varken bas yili listede olmali; bas yoksa haric."""
+    ys = list(yillar or [])
+    if not ys:
+        return True
+    d = _aylik_grid_coerce_date(bas)
+    if d is None:
+        return False
+    return int(d.year) in set(ys)
+
+
+_SENARYO01_GRID_TUTAR_HAZIR: dict = {}
+
+
+def _senaryo01_grid_tutar_hazir() -> bool:
+    """musteri_aylik_grid_tutar trigger'ı bu şemada kurulu mu; şema başına bir kez bakılır."""
+    sema = _tenant_schema_for_request() or "public"
+    hazir = _SENARYO01_GRID_TUTAR_HAZIR.get(sema)
+    if hazir is None:
+        try:
+            ensure_musteri_aylik_grid_tutar()
+        except Exception:
+            pass
+        try:
+            hazir = bool(
+                fetch_one(
+                    "SELECT 1 AS x FROM pg_trigger "
+                    "WHERE tgname = 'trg_musteri_aylik_grid_tutar' "
+                    "AND tgrelid = 'musteri_aylik_grid_cache'::regclass"
+                )
+            )
+        except Exception:
+            hazir = False
+        _SENARYO01_GRID_TUTAR_HAZIR[sema] = hazir
+    return hazir
+
+
+def _senaryo01_grid_tutar_map(
+    mids: list[int], yil_bas: int, yil_bit: int
+) -> tuple[dict[int, dict[str, float]], dict]:
+    """Senaryo 01: yıl aralığındaki KDV dahil ay tutarları — musteri_aylik_grid_tutar sütun kopyasından.
+
+    Tablo grid cache yazımlarında trigger ile üretilir (placeholder sınıflaması ve ay başına
+    en büyük tutar SQL'de); burada iki indeksli okuma: durum (varlık / compute_rev) + ay aralığı.
+    Trigger kurulu değilse payload JSON'unu açan eski yol. Dönüş: (tutarlar[mid][ay_key]=float, meta).
+    """
+    if not _senaryo01_grid_tutar_hazir():
+        return _senaryo01_grid_tutar_map_payload(mids, yil_bas, yil_bit)
+    meta = {
+        "cache_var_adet": 0,
+        "cache_eksik_adet": 0,
+        "cache_rev_uyumsuz_adet": 0,
+        "placeholder_atlanan_adet": 0,
+        "tutar_satir_adet": 0,
+    }
+    clean_set: set[int] = set()
+    for raw in mids or []:
+        try:
+            mid = int(raw)
+        except (TypeError, ValueError):
+            continue
+        if mid > 0:
+            clean_set.add(mid)
+    clean = sorted(clean_set)
+    if not clean:
+        return {}, meta
+    y_bas, y_bit = sorted((int(yil_bas), int(yil_bit)))
+    gecerli_rev = [27, 28, 29, int(AYLIK_GRID_COMPUTE_REV)]
+    try:
+        durumlar = fetch_all(
+            """
+            SELECT musteri_id, payload_tipi, compute_rev
+            FROM musteri_aylik_grid_tutar_durum
+            WHERE musteri_id = ANY(%s::int[])
+            """,
+            (clean,),
+        ) or []
+        rows = fetch_all(
+            """
+            SELECT t.musteri_id, EXTRACT(YEAR FROM t.ay)::int AS yil, EXTRACT(MONTH FROM t.ay)::int AS ay,
+                   t.tutar, t.placeholder_adet
+            FROM musteri_aylik_grid_tutar t
+            JOIN musteri_aylik_grid_tutar_durum d ON d.musteri_id = t.musteri_id
+            WHERE t.musteri_id = ANY(%s::int[])
+              AND t.ay BETWEEN %s AND %s
+              AND (d.payload_tipi = 'array' OR (d.payload_tipi = 'object' AND d.compute_rev = ANY(%s::int[])))
+            """,
+            (clean, date(y_bas, 1, 1), date(y_bit, 12, 1), gecerli_rev),
+        ) or []
+    except Exception as exc:
+        logging.getLogger(__name__).warning("senaryo01 grid tutar tablo: %r", exc)
+        return _senaryo01_grid_tutar_map_payload(mids, yil_bas, yil_bit)
 
+    rev_kume = set(gecerli_rev)
+    for d in durumlar:
+        meta["cache_var_adet"] += 1
+        tip = str(d.get("payload_tipi") or "")
+        if tip == "object":
+            if d.get("compute_rev") is None or int(d["compute_rev"]) not in rev_kume:
+                meta["cache_rev_uyumsuz_adet"] += 1
+        elif tip != "array":
+            meta["cache_rev_uyumsuz_adet"] += 1
+    meta["cache_eksik_adet"] = len(clean) - meta["cache_var_adet"]
 
-def senaryo01_kayit_yili_eslesir(bas, yillar) -> bool:
-    """Filtre yoksa True. Varken bas yili listede olmali; bas yoksa haric."""
-    ys = list(yillar or [])
-    if not ys:
-        return True
-    d = _aylik_grid_coerce_date(bas)
-    if d is None:
-        return False
-    return int(d.year) in set(ys)
+    tutarlar: dict[int, dict[str, float]] = {}
+    for row in rows:
+        meta["placeholder_atlanan_adet"] += int(row.get("placeholder_adet") or 0)
+        tutar = float(row.get("tutar") or 0)
+        if tutar <= 0:
+            continue
+        tutarlar.setdefault(int(row["musteri_id"]), {})[_senaryo01_ay_key(row["yil"], row["ay"])] = round(tutar, 2)
+    meta["tutar_satir_adet"] = sum(len(v) for v in tutarlar.values())
+    return tutarlar, meta
 
 
-def _senaryo01_grid_tutar_map(
+def _senaryo01_grid_tutar_map_payload(
     mids: list[int], yil_bas: int, yil_bit: int
 ) -> tuple[dict[int, dict[str, float]], dict]:
-    """Senaryo 01: grid cache'ten yıl aralığındaki KDV dahil tutarları tek batch okur.
+    """Senaryo 01 (yedek yol): grid cache'ten yıl aralığındaki KDV dahil tutarları tek batch okur.
 
     Fatura Raporu ``_firma_ozet_referans_ay_grid_tutar_map`` deseni:
     WITH parsed AS MATERIALIZED + jsonb_array_elements; compute_rev ∈ {27,28,29,30};
@@ -5054,6 +5740,9 @@ def api_musteri_komsu():
     )
 
 
+_MUSTERI_DETAY_CACHE = cache_region("musteri_detay", max_entries=512, max_bytes=8 * 1024 * 1024, ttl_sec=35.0)
+
+
 @bp.route('/api/musteri/<int:mid>')
 @giris_gerekli
 def api_musteri_detay(mid):
@@ -5063,18 +5752,9 @@ def api_musteri_detay(mid):
     force = str(request.args.get("force") or "").lower() in ("1", "true", "yes", "on")
     cache_key = f"{int(mid)}:{1 if _hesapla_tahsilat_ozet else 0}"
     if not force:
-        try:
-            now = time.time()
-            ttl = 35.0
-            cache = getattr(api_musteri_detay, "_cache", None)
-            if cache is None:
-                cache = {}
-                setattr(api_musteri_detay, "_cache", cache)
-            hit = cache.get(cache_key)
-            if hit and (now - float(hit.get("ts") or 0)) <= ttl and hit.get("payload"):
-                return jsonify(hit["payload"])
-        except Exception:
-            pass
+        hit = _MUSTERI_DETAY_CACHE.get(cache_key)
+        if hit:
+            return jsonify(hit)
 
     ensure_customers_bizim_hesap()
     ensure_customers_grup2_secimleri()
@@ -5250,12 +5930,7 @@ def api_musteri_detay(mid):
 
     payload = {"ok": True, "musteri": out}
     if not force:
-        try:
-            cache = getattr(api_musteri_detay, "_cache", None)
-            if isinstance(cache, dict):
-                cache[cache_key] = {"ts": time.time(), "payload": payload}
-        except Exception:
-            pass
+        _MUSTERI_DETAY_CACHE.set(cache_key, payload, tags=(musteri_tag(mid),))
     return jsonify(payload)
 
 
@@ -5918,9 +6593,6 @@ def api_tufe_verileri():
 def kira_senaryo_excel():
     """Kira senaryo Excel çıktısı"""
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        
         data = request.get_json() or {}
 
         satirlar = data.get('satirlar') or []
@@ -5931,45 +6603,39 @@ def kira_senaryo_excel():
         nakit_mod = bool(data.get("kira_nakit_senaryo"))
         hibrit_mod = bool(data.get("kira_hibrit_senaryo"))
 
-        # Workbook oluştur
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Kira Senaryo"
+        # Akış kitabı (write-only): sütun genişlikleri / birleştirme ilk satırdan önce
+        genislikler = {'A': 15, 'B': 18, 'C': 18, 'D': 15, 'E': 18}
+        if not nakit_mod:
+            genislikler['F'] = 18
+        x = XlsxAkis("Kira Senaryo", genislikler=genislikler)
+        x.birlestir('A1:E1' if nakit_mod else 'A1:F1')
 
         # Başlık
         _excel_baslik_ek = ' (Nakit / KDV yok)' if nakit_mod else (' (Hibrit)' if hibrit_mod else '')
-        ws['A1'] = 'KİRA SENARYO HESAPLAMA' + _excel_baslik_ek
-        ws['A1'].font = Font(bold=True, size=14)
-        ws.merge_cells('A1:E1' if nakit_mod else 'A1:F1')
-        ws['A1'].alignment = Alignment(horizontal='center')
+        x.satir(['KİRA SENARYO HESAPLAMA' + _excel_baslik_ek], 'baslik')
+        x.bos()
 
         # Parametreler
-        ws['A3'] = 'Müşteri İsmi:'
-        ws['B3'] = musteri_ismi or '-'
-        ws['A4'] = 'Başlangıç Kira:'
-        ws['B4'] = baslangic_kira
-        ws['A5'] = 'Başlangıç Tarihi:'
-        ws['B5'] = baslangic_tarih
-        ws['A6'] = 'Yıl Sayısı:'
-        ws['B6'] = yil_sayisi
+        x.satir(['Müşteri İsmi:', musteri_ismi or '-'])
+        x.satir(['Başlangıç Kira:', baslangic_kira])
+        x.satir(['Başlangıç Tarihi:', baslangic_tarih])
+        x.satir(['Yıl Sayısı:', yil_sayisi])
+        x.bos()
 
         # Tablo başlıkları (Nakit: KDV sütunu yok — ekranla uyumlu)
         if nakit_mod:
             headers = ['Yıl', 'Aylık Kira', 'Artış %', 'Yıllık Toplam', 'Artış Tutar']
+            satir_stil = (None, 'para', 'yuzde', 'para', 'para')
         else:
             headers = ['Yıl', 'Aylık Kira', 'KDV Dahil', 'Artış %', 'Yıllık Toplam', 'Artış Tutar']
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=8, column=col)
-            cell.value = header
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='0097A7', end_color='0097A7', fill_type='solid')
-            cell.alignment = Alignment(horizontal='center')
+            satir_stil = (None, 'para', 'para', 'yuzde', 'para', 'para')
+        x.satir(headers, 'tablo_baslik_koyu')
 
         toplam_gelir = 0.0
 
         if satirlar:
             # Frontend'de hesaplanan tabloyu birebir Excel'e yaz
-            for i, s in enumerate(satirlar, start=1):
+            for s in satirlar:
                 try:
                     yil = int(s.get('yil'))
                 except Exception:
@@ -5996,17 +6662,8 @@ def kira_senaryo_excel():
 
                 toplam_gelir += yillik
 
-                row = 8 + i
-                ws.cell(row=row, column=1).value = yil
-                ws.cell(row=row, column=2).value = aylik
-                ws.cell(row=row, column=2).number_format = '#,##0.00'
                 if nakit_mod:
-                    ws.cell(row=row, column=3).value = artis_yuzde
-                    ws.cell(row=row, column=3).number_format = '0.00%'
-                    ws.cell(row=row, column=4).value = yillik
-                    ws.cell(row=row, column=4).number_format = '#,##0.00'
-                    ws.cell(row=row, column=5).value = artis_tutar
-                    ws.cell(row=row, column=5).number_format = '#,##0.00'
+                    x.satir([yil, aylik, artis_yuzde, yillik, artis_tutar], satir_stil)
                 else:
                     kd_raw = s.get("kdv_dahil_aylik")
                     kd_row = None
@@ -6023,14 +6680,7 @@ def kira_senaryo_excel():
                         kdv_dahil = kd_row
                     else:
                         kdv_dahil = aylik * 1.20
-                    ws.cell(row=row, column=3).value = kdv_dahil
-                    ws.cell(row=row, column=3).number_format = '#,##0.00'
-                    ws.cell(row=row, column=4).value = artis_yuzde
-                    ws.cell(row=row, column=4).number_format = '0.00%'
-                    ws.cell(row=row, column=5).value = yillik
-                    ws.cell(row=row, column=5).number_format = '#,##0.00'
-                    ws.cell(row=row, column=6).value = artis_tutar
-                    ws.cell(row=row, column=6).number_format = '#,##0.00'
+                    x.satir([yil, aylik, kdv_dahil, artis_yuzde, yillik, artis_tutar], satir_stil)
         else:
             # Eski davranış: sabit TÜFE oranı ile hesapla (geriye dönük uyumluluk için)
             tufe_oran = float(data.get('tufe_oran') or 0) / 100.0
@@ -6041,62 +6691,32 @@ def kira_senaryo_excel():
                 toplam_gelir += yillik_toplam
                 artis_oran = 0 if i == 1 else tufe_oran
                 artis_tutar = 0 if i == 1 else mevcut_kira - (mevcut_kira / (1 + tufe_oran or 1))
-                row = 8 + i
-                ws.cell(row=row, column=1).value = yil + i - 1
-                ws.cell(row=row, column=2).value = mevcut_kira
-                ws.cell(row=row, column=2).number_format = '#,##0.00'
                 if nakit_mod:
-                    ws.cell(row=row, column=3).value = artis_oran
-                    ws.cell(row=row, column=3).number_format = '0.00%'
-                    ws.cell(row=row, column=4).value = yillik_toplam
-                    ws.cell(row=row, column=4).number_format = '#,##0.00'
-                    ws.cell(row=row, column=5).value = artis_tutar
-                    ws.cell(row=row, column=5).number_format = '#,##0.00'
+                    x.satir([yil + i - 1, mevcut_kira, artis_oran, yillik_toplam, artis_tutar], satir_stil)
                 else:
                     kdv_dahil = mevcut_kira * 1.20
-                    ws.cell(row=row, column=3).value = kdv_dahil
-                    ws.cell(row=row, column=3).number_format = '#,##0.00'
-                    ws.cell(row=row, column=4).value = artis_oran
-                    ws.cell(row=row, column=4).number_format = '0.00%'
-                    ws.cell(row=row, column=5).value = yillik_toplam
-                    ws.cell(row=row, column=5).number_format = '#,##0.00'
-                    ws.cell(row=row, column=6).value = artis_tutar
-                    ws.cell(row=row, column=6).number_format = '#,##0.00'
+                    x.satir(
+                        [yil + i - 1, mevcut_kira, kdv_dahil, artis_oran, yillik_toplam, artis_tutar],
+                        satir_stil,
+                    )
                 if i < yil_sayisi:
                     mevcut_kira = mevcut_kira * (1 + tufe_oran)
 
         # Toplam
         satir_sayisi = len(satirlar) or yil_sayisi
-        son_satir = 8 + satir_sayisi + 2
         toplam_col = 4 if nakit_mod else 5
-        ws.cell(row=son_satir, column=1).value = f'TOPLAM ({satir_sayisi} Yıl):'
-        ws.cell(row=son_satir, column=1).font = Font(bold=True)
-        ws.cell(row=son_satir, column=toplam_col).value = toplam_gelir
-        ws.cell(row=son_satir, column=toplam_col).number_format = '#,##0.00'
-        ws.cell(row=son_satir, column=toplam_col).font = Font(bold=True)
-        ws.cell(row=son_satir, column=toplam_col).fill = PatternFill(start_color='4CAF50', end_color='4CAF50', fill_type='solid')
-
-        # Sütun genişlikleri
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 18
-        ws.column_dimensions['C'].width = 18
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 18
-        if not nakit_mod:
-            ws.column_dimensions['F'].width = 18
-        
-        # Dosya kaydet (bellekten gönder)
+        x.bos()
+        toplam_satir = [None] * toplam_col
+        toplam_satir[0] = f'TOPLAM ({satir_sayisi} Yıl):'
+        toplam_satir[toplam_col - 1] = toplam_gelir
+        toplam_stil = [None] * toplam_col
+        toplam_stil[0] = 'kalin'
+        toplam_stil[toplam_col - 1] = 'para_toplam'
+        x.satir(toplam_satir, toplam_stil)
+
         filename = f"Kira_Senaryo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        buf = io.BytesIO()
-        wb.save(buf)
-        buf.seek(0)
-        return send_file(
-            buf,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        
+        return x.yanit(filename)
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -6522,7 +7142,8 @@ def kira_bildirgesi_pdf():
             hizmet_turu = ""
         else:
             hizmet_turu = str(ht_raw).strip()
-        pdf_bytes = build_kira_bildirgesi_pdf(
+        pdf_bytes = pdf_olustur(
+            "kira_bildirgesi",
             musteri_adi,
             sozlesme_tarihi,
             gecerlilik_tarihi,
@@ -6833,38 +7454,7 @@ def _reel_kart_yillik_toplam_haritasi(kyc: dict, tufe_map: dict, y_start: int, y
 
 
 def _reel_tufe_oran_yillik_gecis(tufe_map: dict, y: int, artis_month: int, y_start: int) -> float:
-    inner = tufe_map.get(y) if isinstance(tufe_map, dict) else {}
-    if not isinstance(inner, dict):
-        inner = {}
-    raw_o = inner.get(artis_month)
-    if raw_o is None and artis_month is not None:
-        raw_o = inner.get(str(artis_month))
-    try:
-        oran = float(raw_o or 0)
-    except (TypeError, ValueError):
-        oran = 0.0
-    if (not oran or not math.isfinite(oran)) and y > y_start:
-        inner_prev = tufe_map.get(y - 1) if isinstance(tufe_map, dict) else {}
-        if isinstance(inner_prev, dict):
-            raw_p = inner_prev.get(artis_month)
-            if raw_p is None and artis_month is not None:
-                raw_p = inner_prev.get(str(artis_month))
-            try:
-                oran2 = float(raw_p or 0)
-            except (TypeError, ValueError):
-                oran2 = 0.0
-            if oran2 > 0 and math.isfinite(oran2):
-                oran = oran2
-    if not oran or not math.isfinite(oran):
-        o3 = _tufe_latest_positive_oran_in_year_map(inner)
-        if o3 > 0 and math.isfinite(o3):
-            oran = o3
-    if (not oran or not math.isfinite(oran)) and y > y_start:
-        inner_prev2 = tufe_map.get(y - 1) or {} if isinstance(tufe_map, dict) else {}
-        o4 = _tufe_latest_positive_oran_in_year_map(inner_prev2)
-        if o4 > 0 and math.isfinite(o4):
-            oran = o4
-    return oran if (oran and math.isfinite(oran)) else 0.0
+    return tufe_efektif_oran(tufe_map, y, artis_month, y_start)
 
 
 def _reel_donem_effective_yillik_for_ekstre(
@@ -7254,17 +7844,21 @@ def _firma_ozet_normalize_tahsil_ay_key(k: str) -> str | None:
 
 def _aylik_grid_acik_tutar_ay_keys_normalized(musteri_id: int) -> set[str]:
     """Bu müşteride açık (durum != odendi) |AYLIK_TUTAR| faturası bulunan aylar (YYYY-M)."""
-    rows = fetch_all(
-        f"""
-        SELECT COALESCE(notlar, '') AS notlar
-        FROM faturalar
-        WHERE musteri_id = %s
-          AND COALESCE(notlar, '') LIKE '%%|AYLIK_TUTAR|%%'
-          AND COALESCE(durum, '') != 'odendi'
-          AND {sql_expr_fatura_gib_no_tasindi_degil("notlar")}
-        """,
-        (musteri_id,),
-    ) or []
+    on = _grid_bulk_on_yukleme("acik_notlar", musteri_id)
+    if on is not _GRID_BULK_YOK:
+        rows = [{"notlar": n} for n in on]
+    else:
+        rows = fetch_all(
+            f"""
+            SELECT COALESCE(notlar, '') AS notlar
+            FROM faturalar
+            WHERE musteri_id = %s
+              AND COALESCE(notlar, '') LIKE '%%|AYLIK_TUTAR|%%'
+              AND COALESCE(durum, '') != 'odendi'
+              AND {sql_expr_fatura_gib_no_tasindi_degil("notlar")}
+            """,
+            (musteri_id,),
+        ) or []
     out: set[str] = set()
     for r in rows:
         for iso in re.findall(r"\|AYLIK_TUTAR\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", str((r or {}).get("notlar") or "")):
@@ -7356,7 +7950,7 @@ def _ekstre_invalidate_after_change(
     musteri_id: int, affected_isos: list | None = None
 ) -> dict:
     """Ekstre düzenle/sil: önce panel DB (grid tahsilden-cikar ile aynı), sonra grid önbelleği."""
-    _cari_ekstre_api_cache.clear()
+    _CARI_EKSTRE_API_CACHE.clear()
     _invalidate_aylik_grid_payload_mem(musteri_id)
     payload = None
     panel_now = None
@@ -7376,7 +7970,7 @@ def _ekstre_invalidate_after_change(
     except (TypeError, ValueError):
         pass
     try:
-        payload = _upsert_aylik_grid_cache(mid)
+        payload = _upsert_aylik_grid_cache_artimli(mid)
     except Exception:
         payload = None
         grid_hata = True
@@ -7392,6 +7986,16 @@ def _ekstre_invalidate_after_change(
             iso_check.add(date(dd.year, dd.month, 1).isoformat())
         except ValueError:
             pass
+    if iso_check:
+        # Değişen en eski aydan sonraki açılış snapshot'ları artık eşleşmez; öncekiler geçerli kalır.
+        try:
+            _ensure_musteri_ekstre_snapshot_table()
+            execute(
+                "DELETE FROM musteri_ekstre_snapshot WHERE musteri_id = %s AND ay > %s::date",
+                (mid, min(iso_check)),
+            )
+        except Exception:
+            logging.getLogger(__name__).exception("ekstre snapshot temizliği mid=%s", mid)
     for iso_k in (_load_musteri_panel_by_iso(mid) or {}).keys():
         iso_check.add(str(iso_k)[:10])
     borc_satirlar = []
@@ -7479,11 +8083,14 @@ def _ekstre_tahsil_rows_for_musteri(musteri_id: int) -> list:
         return []
     if mid <= 0:
         return []
+    on = _grid_bulk_on_yukleme("tahsil_rows", mid)
+    if on is not _GRID_BULK_YOK:
+        return on
     return fetch_all(
         """
         SELECT t.id, COALESCE(t.tutar, 0) AS tutar,
                COALESCE(t.aciklama, '') AS aciklama,
-               t.tahsilat_tarihi, f.fatura_tarihi
+               t.tahsilat_tarihi, f.fatura_tarihi""" + _tah_aylar_sutunu() + """
         FROM tahsilatlar t
         LEFT JOIN faturalar f ON f.id = t.fatura_id
         WHERE (t.musteri_id = %s OR t.customer_id = %s)
@@ -7977,6 +8584,26 @@ def _aylik_tahsil_marker_odeme_toplam_for_iso(musteri_id: int, iso_day: str) ->
     sday = str(iso_day or "").strip()[:10]
     if not sday or len(sday) < 10:
         return 0.0
+    ay, gunler = _aylik_tah_gun_metinleri(sday)
+    if ay is not None and _tahsilat_ay_dagitim_hazir():
+        row = fetch_one(
+            """
+            SELECT COALESCE(SUM(COALESCE(t.tutar, 0)), 0)::numeric AS s
+            FROM tahsilatlar t
+            WHERE t.id IN (
+                    SELECT d.tahsilat_id FROM tahsilat_ay_dagitim d
+                    WHERE d.musteri_id = %s AND d.ay = %s
+                      AND d.tur = 'tah' AND d.gun_metin = ANY(%s)
+                  )
+              AND COALESCE(t.tutar, 0) > 0
+            """,
+            (musteri_id, ay, gunler),
+        ) or {}
+        try:
+            v = float(row.get("s") or 0)
+        except (TypeError, ValueError):
+            v = 0.0
+        return round(v, 2) if math.isfinite(v) else 0.0
     pat1 = f"%|AYLIK_TAH|{sday}|%"
     loose_m = None
     try:
@@ -8030,7 +8657,23 @@ def _aylik_tahsil_marker_kayitlari_for_iso(musteri_id: int, iso_day: str) -> lis
     except Exception:
         pass
     pat2 = f"%|AYLIK_TAH|{loose_m}|%" if loose_m else None
-    if pat2 and pat2 != pat1:
+    ay, gunler = _aylik_tah_gun_metinleri(sday)
+    if ay is not None and _tahsilat_ay_dagitim_hazir():
+        rows = fetch_all(
+            """
+            SELECT t.id, COALESCE(t.tutar, 0) AS tutar, t.makbuz_no
+            FROM tahsilatlar t
+            WHERE t.id IN (
+                    SELECT d.tahsilat_id FROM tahsilat_ay_dagitim d
+                    WHERE d.musteri_id = %s AND d.ay = %s
+                      AND d.tur = 'tah' AND d.gun_metin = ANY(%s)
+                  )
+              AND COALESCE(t.tutar, 0) > 0
+            ORDER BY t.id DESC
+            """,
+            (musteri_id, ay, gunler),
+        ) or []
+    elif pat2 and pat2 != pat1:
         rows = fetch_all(
             """
             SELECT t.id, COALESCE(t.tutar, 0) AS tutar, t.makbuz_no
@@ -8088,14 +8731,17 @@ def _ekstre_tahsil_ids_by_iso_from_rows(rows) -> dict[str, list[int]]:
             continue
         if tid <= 0:
             continue
-        ac = str(r.get("aciklama") or "")
         iso_keys: list[str] = []
-        for iso_raw in re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac):
-            try:
-                dd = datetime.strptime(iso_raw[:10], "%Y-%m-%d").date()
-                iso_keys.append(date(dd.year, dd.month, 1).isoformat())
-            except ValueError:
-                pass
+        if "tah_aylar" in r:
+            iso_keys.extend(a.isoformat() for a in (r.get("tah_aylar") or []))
+        else:
+            ac = str(r.get("aciklama") or "")
+            for iso_raw in re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac):
+                try:
+                    dd = datetime.strptime(iso_raw[:10], "%Y-%m-%d").date()
+                    iso_keys.append(date(dd.year, dd.month, 1).isoformat())
+                except ValueError:
+                    pass
         iso_e = _tahsil_row_ekstre_eslesme_ay_iso(r)
         if iso_e:
             iso_keys.append(iso_e)
@@ -8136,6 +8782,22 @@ def _aylik_tahsil_marker_aylar_set_normalized(musteri_id: int) -> set[str]:
     frontend yeşil durumunun kaybolmaması amacıyla ayrıca döndürülür.
     """
     out: set[str] = set()
+    if _tahsilat_ay_dagitim_hazir():
+        rows = fetch_all(
+            """
+            SELECT DISTINCT d.gun_metin
+            FROM tahsilat_ay_dagitim d
+            JOIN tahsilatlar t ON t.id = d.tahsilat_id
+            WHERE d.musteri_id = %s AND d.tur = 'tah' AND length(d.gun_metin) = 10
+              AND COALESCE(t.tutar, 0) > 0
+            """,
+            (musteri_id,),
+        ) or []
+        for r in rows:
+            nk = _firma_ozet_normalize_tahsil_ay_key(str((r or {}).get("gun_metin") or ""))
+            if nk:
+                out.add(nk)
+        return out
     rows = fetch_all(
         """
         SELECT COALESCE(aciklama, '') AS aciklama
@@ -8538,30 +9200,33 @@ def musteri_aylik_grid_hucre_kdv_dahil_takvim_ayi_batch(musteri_ids: list, ref:
         reel_by_mid.setdefault(mid_r, {})[yil] = tut
 
     out: dict[int, float] = {}
-    for mid in mids:
-        row = row_by_id.get(mid)
-        kyc_for_grid = _firma_ozet_kyc_dict_from_grid_sql_row(row) if row else None
-        if not kyc_for_grid:
-            out[mid] = 0.0
-            continue
-        reel_manual = dict(reel_by_mid.get(mid) or {})
-        try:
-            v = float(
-                firma_ozet_aylik_grid_hucre_kdv_dahil(
-                    mid,
-                    ref_y,
-                    ref_m,
-                    tufe_map,
-                    kyc_for_grid,
-                    None,
-                    reel_manual,
-                    skip_disk_cache=True,
-                    skip_reel_overlay=False,
+    # TÜFE zinciri tüm satırlar için tek NumPy geçişinde; döngüdeki çekirdek çağrıları buradan okur.
+    kycs = [_firma_ozet_kyc_dict_from_grid_sql_row(r) for r in row_by_id.values()]
+    with _aylik_grid_core_scope(kycs, tufe_map):
+        for mid in mids:
+            row = row_by_id.get(mid)
+            kyc_for_grid = _firma_ozet_kyc_dict_from_grid_sql_row(row) if row else None
+            if not kyc_for_grid:
+                out[mid] = 0.0
+                continue
+            reel_manual = dict(reel_by_mid.get(mid) or {})
+            try:
+                v = float(
+                    firma_ozet_aylik_grid_hucre_kdv_dahil(
+                        mid,
+                        ref_y,
+                        ref_m,
+                        tufe_map,
+                        kyc_for_grid,
+                        None,
+                        reel_manual,
+                        skip_disk_cache=True,
+                        skip_reel_overlay=False,
+                    )
                 )
-            )
-            out[mid] = round(v, 2) if math.isfinite(v) else 0.0
-        except Exception:
-            out[mid] = 0.0
+                out[mid] = round(v, 2) if math.isfinite(v) else 0.0
+            except Exception:
+                out[mid] = 0.0
     return out
 
 
@@ -8663,11 +9328,9 @@ def prewarm_aylik_grid_cache_for_musteriler(
                     rebuilt += 1
             except Exception:
                 logging.getLogger(__name__).exception("prewarm grid cache worker")
-    if rebuilt and hasattr(musteri_firma_ozet_grid_ozet_batch, "_cache"):
-        bc = musteri_firma_ozet_grid_ozet_batch._cache
-        if isinstance(bc, dict):
-            for mid in need:
-                bc.pop((int(mid), ref_y, ref_m), None)
+    if rebuilt:
+        for mid in need:
+            _FIRMA_OZET_GRID_OZET_CACHE.invalidate((int(mid), ref_y, ref_m))
     return rebuilt
 
 
@@ -8785,6 +9448,17 @@ def _grup_rapor_ilk_ve_donem_kira(kyc_for_grid, tufe_map, ref_y: int, ref_m: int
     return round(ilk, 2), round(donem, 2)
 
 
+_FIRMA_OZET_GRID_OZET_CACHE = cache_region(
+    "firma_ozet_grid_ozet", max_entries=8000, max_bytes=16 * 1024 * 1024, ttl_sec=120.0
+)
+
+
+def _firma_ozet_grid_ozet_cache_set(musteri_id, ref_y: int, ref_m: int, ozet) -> None:
+    _FIRMA_OZET_GRID_OZET_CACHE.set(
+        (int(musteri_id), ref_y, ref_m), dict(ozet or {}), tags=(musteri_tag(musteri_id),)
+    )
+
+
 def musteri_firma_ozet_grid_ozet_batch(musteri_ids: list, ref: date | None = None) -> dict[int, dict]:
     """
     Grup raporları için tek geçişte:
@@ -8810,18 +9484,12 @@ def musteri_firma_ozet_grid_ozet_batch(musteri_ids: list, ref: date | None = Non
         mids.append(i)
     if not mids:
         return {}
-    if not hasattr(musteri_firma_ozet_grid_ozet_batch, "_cache"):
-        musteri_firma_ozet_grid_ozet_batch._cache = {}
-    cache = musteri_firma_ozet_grid_ozet_batch._cache
-    cache_ttl = 120.0
-    now_ts = time.time()
     cached_out: dict[int, dict] = {}
     need_mids: list[int] = []
     for mid in mids:
-        ckey = (int(mid), ref_y, ref_m)
-        cval = cache.get(ckey)
-        if cval and (now_ts - float(cval[0])) <= cache_ttl:
-            cached_out[mid] = dict(cval[1] or {})
+        cval = _FIRMA_OZET_GRID_OZET_CACHE.get((int(mid), ref_y, ref_m))
+        if cval is not None:
+            cached_out[mid] = dict(cval)
         else:
             need_mids.append(mid)
     if not need_mids:
@@ -8846,7 +9514,7 @@ def musteri_firma_ozet_grid_ozet_batch(musteri_ids: list, ref: date | None = Non
             o["ilk_kira"] = ilk_h
             o["donem_kira"] = donem_h
             cached_out[mid] = o
-            cache[(int(mid), ref_y, ref_m)] = (now_ts, dict(o))
+            _firma_ozet_grid_ozet_cache_set(mid, ref_y, ref_m, o)
         return cached_out
 
     try:
@@ -8915,88 +9583,95 @@ def musteri_firma_ozet_grid_ozet_batch(musteri_ids: list, ref: date | None = Non
             pass
         return 0
 
-    for mid in need_mids:
-        row = row_by_id.get(mid)
-        kyc_for_grid = _firma_ozet_kyc_dict_from_grid_sql_row(row) if row else None
-        gun = _sozlesme_gun_from_grid_row(row)
-        cached_pl = cache_payloads.get(mid)
-        fast = (
-            _firma_ozet_ozet_from_grid_cache_payload(cached_pl, ref_y, ref_m)
-            if cached_pl
-            else None
-        )
-        if fast is not None:
-            fast["sozlesme_gun"] = gun
-            out[mid] = fast
-            cache[(int(mid), ref_y, ref_m)] = (now_ts, dict(fast))
-            continue
-        if not kyc_for_grid:
-            out[mid] = {
-                "borc_month": 0.0,
-                "borc_month_placeholder": False,
-                "toplam_borc": 0.0,
-                "geciken_ay": 0,
-                "sozlesme_gun": gun,
-            }
-            cache[(int(mid), ref_y, ref_m)] = (now_ts, dict(out[mid]))
-            continue
-        reel_manual = dict(reel_by_mid.get(mid) or {})
-        try:
-            borc_month = float(
-                firma_ozet_aylik_grid_hucre_kdv_dahil(
+    # Önbelleği olmayanlar canlı hesaplanır: TÜFE zinciri tek NumPy geçişinde.
+    kycs = [
+        _firma_ozet_kyc_dict_from_grid_sql_row(row_by_id[m])
+        for m in need_mids
+        if m in row_by_id and not cache_payloads.get(m)
+    ]
+    with _aylik_grid_core_scope(kycs, tufe_map):
+        for mid in need_mids:
+            row = row_by_id.get(mid)
+            kyc_for_grid = _firma_ozet_kyc_dict_from_grid_sql_row(row) if row else None
+            gun = _sozlesme_gun_from_grid_row(row)
+            cached_pl = cache_payloads.get(mid)
+            fast = (
+                _firma_ozet_ozet_from_grid_cache_payload(cached_pl, ref_y, ref_m)
+                if cached_pl
+                else None
+            )
+            if fast is not None:
+                fast["sozlesme_gun"] = gun
+                out[mid] = fast
+                _firma_ozet_grid_ozet_cache_set(mid, ref_y, ref_m, fast)
+                continue
+            if not kyc_for_grid:
+                out[mid] = {
+                    "borc_month": 0.0,
+                    "borc_month_placeholder": False,
+                    "toplam_borc": 0.0,
+                    "geciken_ay": 0,
+                    "sozlesme_gun": gun,
+                }
+                _firma_ozet_grid_ozet_cache_set(mid, ref_y, ref_m, out[mid])
+                continue
+            reel_manual = dict(reel_by_mid.get(mid) or {})
+            try:
+                borc_month = float(
+                    firma_ozet_aylik_grid_hucre_kdv_dahil(
+                        mid,
+                        ref_y,
+                        ref_m,
+                        tufe_map,
+                        kyc_for_grid,
+                        None,
+                        reel_manual,
+                        skip_disk_cache=False,
+                        skip_reel_overlay=False,
+                    )
+                )
+                if not math.isfinite(borc_month):
+                    borc_month = 0.0
+                borc_month_placeholder = False
+                # Canlı hücre 0.01 zeminini, cache ay satırındaki gerçek brüt ile ayır.
+                if 0 < borc_month < float(PLACEHOLDER_BRUT_MAX) and isinstance(cached_pl, dict):
+                    for _a in cached_pl.get("aylar") or []:
+                        if not isinstance(_a, dict):
+                            continue
+                        try:
+                            if int(_a.get("yil")) == ref_y and int(_a.get("ay")) == ref_m:
+                                borc_month, borc_month_placeholder = _firma_ozet_classify_borc_month(
+                                    borc_month, _a.get("brut_tutar_kdv")
+                                )
+                                break
+                        except (TypeError, ValueError):
+                            continue
+                tborc, gec = firma_ozet_toplam_borc_ve_geciken_ay(
                     mid,
                     ref_y,
                     ref_m,
                     tufe_map,
                     kyc_for_grid,
-                    None,
                     reel_manual,
-                    skip_disk_cache=False,
-                    skip_reel_overlay=False,
+                    tahsil_n_override=tahsil_by_mid.get(mid, set()),
+                    skip_disk_cache_for_months=False,
                 )
-            )
-            if not math.isfinite(borc_month):
-                borc_month = 0.0
-            borc_month_placeholder = False
-            # Canlı hücre 0.01 zeminini, cache ay satırındaki gerçek brüt ile ayır.
-            if 0 < borc_month < float(PLACEHOLDER_BRUT_MAX) and isinstance(cached_pl, dict):
-                for _a in cached_pl.get("aylar") or []:
-                    if not isinstance(_a, dict):
-                        continue
-                    try:
-                        if int(_a.get("yil")) == ref_y and int(_a.get("ay")) == ref_m:
-                            borc_month, borc_month_placeholder = _firma_ozet_classify_borc_month(
-                                borc_month, _a.get("brut_tutar_kdv")
-                            )
-                            break
-                    except (TypeError, ValueError):
-                        continue
-            tborc, gec = firma_ozet_toplam_borc_ve_geciken_ay(
-                mid,
-                ref_y,
-                ref_m,
-                tufe_map,
-                kyc_for_grid,
-                reel_manual,
-                tahsil_n_override=tahsil_by_mid.get(mid, set()),
-                skip_disk_cache_for_months=False,
-            )
-            out[mid] = {
-                "borc_month": round(borc_month, 2),
-                "borc_month_placeholder": bool(borc_month_placeholder),
-                "toplam_borc": round(float(tborc or 0.0), 2),
-                "geciken_ay": int(gec or 0),
-                "sozlesme_gun": gun,
-            }
-        except Exception:
-            out[mid] = {
-                "borc_month": 0.0,
-                "borc_month_placeholder": False,
-                "toplam_borc": 0.0,
-                "geciken_ay": 0,
-                "sozlesme_gun": gun,
-            }
-        cache[(int(mid), ref_y, ref_m)] = (now_ts, dict(out[mid]))
+                out[mid] = {
+                    "borc_month": round(borc_month, 2),
+                    "borc_month_placeholder": bool(borc_month_placeholder),
+                    "toplam_borc": round(float(tborc or 0.0), 2),
+                    "geciken_ay": int(gec or 0),
+                    "sozlesme_gun": gun,
+                }
+            except Exception:
+                out[mid] = {
+                    "borc_month": 0.0,
+                    "borc_month_placeholder": False,
+                    "toplam_borc": 0.0,
+                    "geciken_ay": 0,
+                    "sozlesme_gun": gun,
+                }
+            _firma_ozet_grid_ozet_cache_set(mid, ref_y, ref_m, out[mid])
     out.update(cached_out)
     # ATTACH_ILK_DONEM_PASS — bilgi alanları (borc_month / net / alacak toplamlarına karışmaz)
     missing_row_ids = [m for m in mids if m not in row_by_id]
@@ -9022,7 +9697,7 @@ def musteri_firma_ozet_grid_ozet_batch(musteri_ids: list, ref: date | None = Non
         o["ilk_kira"] = ilk_a
         o["donem_kira"] = donem_a
         out[mid] = o
-        cache[(int(mid), ref_y, ref_m)] = (now_ts, dict(o))
+        _firma_ozet_grid_ozet_cache_set(mid, ref_y, ref_m, o)
     return out
 
 
@@ -9244,6 +9919,167 @@ def _ekstre_devreden_toplamlari(
     return round(dev_borc_r, 2), round(dev_alacak_r, 2)
 
 
+_EKSTRE_MARKER_RE = re.compile(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|")
+# musteri_ekstre_snapshot imza sürümü: FIFO / imza kuralı değişirse artır (eski satırlar eşleşmez).
+_EKSTRE_SNAPSHOT_REV = 1
+
+
+def _ekstre_marker_hedefleri(pr) -> list[str]:
+    """|AYLIK_TAH| tahsilatının hedef ayları (YYYY-MM-01, tekrarlar korunur)."""
+    out = []
+    for iso_raw in _EKSTRE_MARKER_RE.findall(str(pr.get("tahsilat_aciklama") or "")):
+        try:
+            dd = datetime.strptime(iso_raw[:10], "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        out.append(date(dd.year, dd.month, 1).isoformat())
+    return out
+
+
+def _ekstre_fifo_durum_ilerlet(
+    durum,
+    full_borc_for_fifo,
+    hedef_iso,
+    pays_fifo,
+    floor_pay,
+    tol=0.01,
+    batch_maps=None,
+    manual_reel_by_year=None,
+):
+    """Açılış FIFO durumunu ``durum['ay']``dan ``hedef_iso``ya ilerletir (durum None = sözleşme başı).
+
+    Durum: ``acik`` = hedef öncesi ayların kalan borcu, ``kredi`` = hedef öncesi genel
+    tahsilatların o aylara sığmayan artıkları (sırayla sonraki aylara akar). Tam hesapla
+    aynı sıra: önce |AYLIK_TAH| payları (yalnız yeni aylara), sonra kredi, sonra aralıktaki
+    genel tahsilatlar. Önceki aya dönük marker aralıkta varsa artımlı sonuç tam hesaptan
+    sapar → None (çağıran sıfırdan ilerletir).
+    """
+    bas_iso = str((durum or {}).get("ay") or "")
+    hedef_iso = str(hedef_iso)
+    tum_aylar = set(full_borc_for_fifo.keys())
+    need = {
+        iso: round(float(v or 0), 2)
+        for iso, v in ((durum or {}).get("acik") or {}).items()
+    }
+    yeni_aylar = sorted(iso for iso in tum_aylar if bas_iso <= str(iso) < hedef_iso)
+    for iso in yeni_aylar:
+        need[iso] = round(float(full_borc_for_fifo.get(iso) or 0), 2)
+    aylar_sirali = sorted(need.keys())
+
+    def _aralikta(pr, alt):
+        es = str(pr.get("eslesme_tarihi") or "")[:10]
+        return bool(es) and es >= floor_pay and es >= alt and es < hedef_iso
+
+    marker_pays = []
+    general_pays = []
+    for pr in pays_fifo or []:
+        if _EKSTRE_MARKER_RE.search(str(pr.get("tahsilat_aciklama") or "")):
+            marker_pays.append(pr)
+        else:
+            general_pays.append(pr)
+
+    for pr in marker_pays:
+        if not _aralikta(pr, ""):
+            continue
+        try:
+            v = round(float(pr.get("tutar") or 0), 2)
+        except (TypeError, ValueError):
+            v = 0.0
+        if v <= tol:
+            continue
+        target_isos = [iso for iso in _ekstre_marker_hedefleri(pr) if iso in tum_aylar]
+        if not target_isos:
+            continue
+        if bas_iso and str(pr.get("eslesme_tarihi") or "")[:10] >= bas_iso and any(
+            iso < bas_iso for iso in target_isos
+        ):
+            return None
+        n_m = len(target_isos)
+        cents_total = int(round(v * 100))
+        if cents_total <= 0:
+            continue
+        base_c = cents_total // n_m
+        rem_c = cents_total % n_m
+        for mi, iso_m in enumerate(target_isos):
+            # Durumdaki (eski) aylara bu paylar zaten uygulanmış.
+            if not (bas_iso <= iso_m < hedef_iso):
+                continue
+            share = (base_c + (1 if mi < rem_c else 0)) / 100.0
+            if share <= tol:
+                continue
+            rem = float(need.get(iso_m) or 0)
+            if rem <= tol:
+                continue
+            take = round(min(share, rem), 2)
+            if take <= tol:
+                continue
+            need[iso_m] = round(rem - take, 2)
+            # C2: Kural A tam kapandı → need artığı 0 (nakit take değişmez).
+            try:
+                yy_c2 = int(str(iso_m)[:4])
+                mk_c2 = round(
+                    float(((batch_maps or {}).get("marker") or {}).get(iso_m) or 0),
+                    2,
+                )
+                _pay_raw_c2 = ((batch_maps or {}).get("pay") or {}).get(iso_m)
+                pay_c2 = (
+                    round(float(_pay_raw_c2), 2)
+                    if _pay_raw_c2 is not None
+                    else None
+                )
+                brut_c2 = round(float(full_borc_for_fifo.get(iso_m) or 0), 2)
+            except (TypeError, ValueError):
+                yy_c2 = 0
+                mk_c2 = 0.0
+                pay_c2 = None
+                brut_c2 = 0.0
+            if _grid_payload_marker_panel_tam_kapandi(
+                mk_c2,
+                brut_c2,
+                yy_c2,
+                manual_reel_by_year,
+                float(AYLIK_GRID_TAM_ODENDI_TOLERANS),
+                pay_t=pay_c2,
+            ):
+                need[iso_m] = 0.0
+
+    kredi = []
+
+    def _fifo(v, aylar):
+        for iso in aylar:
+            if v <= tol:
+                break
+            rem = float(need.get(iso) or 0)
+            if rem <= tol:
+                continue
+            take = round(min(v, rem), 2)
+            if take <= tol:
+                continue
+            need[iso] = round(rem - take, 2)
+            v = round(v - take, 2)
+        if v > tol:
+            kredi.append(v)
+
+    for v in (durum or {}).get("kredi") or []:
+        _fifo(round(float(v or 0), 2), yeni_aylar)
+    for pr in general_pays:
+        if not _aralikta(pr, bas_iso):
+            continue
+        try:
+            v = round(float(pr.get("tutar") or 0), 2)
+        except (TypeError, ValueError):
+            v = 0.0
+        if v <= tol:
+            continue
+        _fifo(v, aylar_sirali)
+    return {"ay": hedef_iso, "acik": {iso: need[iso] for iso in aylar_sirali}, "kredi": kredi}
+
+
+def _ekstre_durum_acilis(durum) -> float:
+    """Durumdaki açık ay kalanlarının toplamı (açılış bakiyesi)."""
+    return round(sum(max(0.0, round(float(v or 0), 2)) for v in ((durum or {}).get("acik") or {}).values()), 2)
+
+
 def _ekstre_acilis_bakiyesi_fifo(
     full_borc_for_fifo,
     bas_iso_cmp,
@@ -9256,115 +10092,143 @@ def _ekstre_acilis_bakiyesi_fifo(
     """Dönem başlangıcı öncesi net bakiye: FIFO ile yalnızca bas öncesi ödemeler mahsup edilir."""
     if not isinstance(full_borc_for_fifo, dict):
         return 0.0
-    month_order_all = sorted(full_borc_for_fifo.keys())
-    pre_months = [iso for iso in month_order_all if str(iso) < str(bas_iso_cmp)]
-    if not pre_months:
-        return 0.0
-    need = {
-        iso: round(float(full_borc_for_fifo.get(iso) or 0), 2)
-        for iso in month_order_all
-    }
-    marker_pays = []
-    general_pays = []
-    for pr in pays_fifo or []:
-        ac0 = str(pr.get("tahsilat_aciklama") or "")
-        if re.search(r"\|AYLIK_TAH\|\d{4}-\d{2}-\d{2}\|", ac0):
-            marker_pays.append(pr)
-        else:
-            general_pays.append(pr)
+    durum = _ekstre_fifo_durum_ilerlet(
+        None,
+        full_borc_for_fifo,
+        bas_iso_cmp,
+        pays_fifo,
+        floor_pay,
+        tol=tol,
+        batch_maps=batch_maps,
+        manual_reel_by_year=manual_reel_by_year,
+    )
+    return _ekstre_durum_acilis(durum)
 
-    def _fifo_pay_alloc_open(pr, restrict_marker_months=False):
+
+def _ekstre_snapshot_imza(
+    ay_iso, full_borc_for_fifo, pays_fifo, floor_pay, tol=0.01, batch_maps=None, manual_reel_by_year=None
+) -> str:
+    """``ay_iso`` başındaki açılış durumunu belirleyen girdilerin özeti (içerik adresli).
+
+    Ay öncesi borçlar, ay öncesi tahsilatlar (marker hedeflerinin grid'de olup olmadığı
+    dahil — pay bölümü buna bağlı), o aylara ait marker / AYLIK_PAY özetleri ve reel
+    dönem yılları. Sonraki aylardaki değişiklik eski ayların imzasını bozmaz.
+    """
+    ay_iso = str(ay_iso)
+    tum_aylar = set(full_borc_for_fifo.keys())
+    borc = [
+        (iso, round(float(full_borc_for_fifo.get(iso) or 0), 2))
+        for iso in sorted(tum_aylar)
+        if str(iso) < ay_iso
+    ]
+    pays = []
+    for pr in pays_fifo or []:
         es = str(pr.get("eslesme_tarihi") or "")[:10]
-        if not es or es < floor_pay or es >= str(bas_iso_cmp):
-            return
+        if not es or es < floor_pay or es >= ay_iso:
+            continue
+        hedefler = tuple((iso, iso in tum_aylar) for iso in _ekstre_marker_hedefleri(pr))
+        pays.append((pr.get("id"), str(pr.get("tutar")), es, hedefler))
+    bm = batch_maps or {}
+    mk = sorted((k, str(v)) for k, v in (bm.get("marker") or {}).items() if str(k) < ay_iso)
+    pay = sorted((k, str(v)) for k, v in (bm.get("pay") or {}).items() if str(k) < ay_iso)
+    reel = sorted(
+        (str(y), str(v)) for y, v in (manual_reel_by_year or {}).items() if str(y) <= ay_iso[:4]
+    )
+    ham = repr((_EKSTRE_SNAPSHOT_REV, floor_pay, tol, borc, pays, mk, pay, reel))
+    return hashlib.sha1(ham.encode("utf-8")).hexdigest()
+
+
+def _ekstre_acilis_bakiyesi_snapshotli(
+    musteri_id,
+    full_borc_for_fifo,
+    bas_iso_cmp,
+    pays_fifo,
+    floor_pay,
+    tol=0.01,
+    batch_maps=None,
+    manual_reel_by_year=None,
+    yaz=True,
+):
+    """_ekstre_acilis_bakiyesi_fifo ile aynı sonuç; en yakın geçerli musteri_ekstre_snapshot'tan
+    yalnız aradaki aylar ilerletilir. Kapanmış aylar için sonuç snapshot olarak yazılır.
+    """
+    if not isinstance(full_borc_for_fifo, dict):
+        return 0.0
+    bas_iso_cmp = str(bas_iso_cmp)
+    kw = {"tol": tol, "batch_maps": batch_maps, "manual_reel_by_year": manual_reel_by_year}
+    try:
+        mid = int(musteri_id)
+    except (TypeError, ValueError):
+        return _ekstre_acilis_bakiyesi_fifo(full_borc_for_fifo, bas_iso_cmp, pays_fifo, floor_pay, **kw)
+    _ensure_musteri_ekstre_snapshot_table()
+    durum = None
+    kaynak = None
+    try:
+        adaylar = fetch_all(
+            """
+            SELECT ay, imza, fifo_durum
+            FROM musteri_ekstre_snapshot
+            WHERE musteri_id = %s AND ay <= %s::date
+            ORDER BY ay DESC
+            LIMIT 4
+            """,
+            (mid, bas_iso_cmp),
+        ) or []
+    except Exception:
+        adaylar = []
+    for r in adaylar:
+        ay_iso = r["ay"].isoformat() if hasattr(r.get("ay"), "isoformat") else str(r.get("ay") or "")[:10]
+        if not ay_iso or r.get("imza") != _ekstre_snapshot_imza(
+            ay_iso, full_borc_for_fifo, pays_fifo, floor_pay, **kw
+        ):
+            continue
         try:
-            v = round(float(pr.get("tutar") or 0), 2)
+            d0 = json.loads(r.get("fifo_durum") or "{}")
         except (TypeError, ValueError):
-            v = 0.0
-        if v <= tol:
-            return
-        if restrict_marker_months:
-            ac_m = str(pr.get("tahsilat_aciklama") or "")
-            raw_markers = re.findall(
-                r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac_m
+            continue
+        d0["ay"] = ay_iso
+        if ay_iso == bas_iso_cmp:
+            return _ekstre_durum_acilis(d0)
+        durum = _ekstre_fifo_durum_ilerlet(d0, full_borc_for_fifo, bas_iso_cmp, pays_fifo, floor_pay, **kw)
+        if durum is not None:
+            kaynak = ay_iso
+            break
+    if durum is None:
+        durum = _ekstre_fifo_durum_ilerlet(None, full_borc_for_fifo, bas_iso_cmp, pays_fifo, floor_pay, **kw)
+    acilis = _ekstre_durum_acilis(durum)
+    logging.getLogger(__name__).debug(
+        "ekstre açılış musteri_id=%s ay=%s snapshot=%s", mid, bas_iso_cmp, kaynak or "-"
+    )
+    # Yalnız kapanmış ay: içinde bulunulan ayın tahsilatları henüz akıyor.
+    if yaz and bas_iso_cmp < date.today().replace(day=1).isoformat():
+        borc_t, alacak_t = _ekstre_devreden_satir_toplamlari(full_borc_for_fifo, bas_iso_cmp, acilis, tol=tol)
+        try:
+            execute(
+                """
+                INSERT INTO musteri_ekstre_snapshot
+                    (musteri_id, ay, imza, acilis_bakiye, borc_toplam, alacak_toplam, fifo_durum, updated_at)
+                VALUES (%s, %s::date, %s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (musteri_id, ay) DO UPDATE SET
+                    imza = EXCLUDED.imza,
+                    acilis_bakiye = EXCLUDED.acilis_bakiye,
+                    borc_toplam = EXCLUDED.borc_toplam,
+                    alacak_toplam = EXCLUDED.alacak_toplam,
+                    fifo_durum = EXCLUDED.fifo_durum,
+                    updated_at = NOW()
+                """,
+                (
+                    mid,
+                    bas_iso_cmp,
+                    _ekstre_snapshot_imza(bas_iso_cmp, full_borc_for_fifo, pays_fifo, floor_pay, **kw),
+                    acilis,
+                    borc_t,
+                    alacak_t,
+                    json.dumps({"acik": durum["acik"], "kredi": durum["kredi"]}),
+                ),
             )
-            target_isos = []
-            for iso_raw in raw_markers:
-                try:
-                    dd = datetime.strptime(iso_raw[:10], "%Y-%m-%d").date()
-                    iso_m = date(dd.year, dd.month, 1).isoformat()
-                    if iso_m in need:
-                        target_isos.append(iso_m)
-                except ValueError:
-                    continue
-            if not target_isos:
-                return
-            n_m = len(target_isos)
-            cents_total = int(round(v * 100))
-            if cents_total <= 0:
-                return
-            base_c = cents_total // n_m
-            rem_c = cents_total % n_m
-            for mi, iso_m in enumerate(target_isos):
-                share = (base_c + (1 if mi < rem_c else 0)) / 100.0
-                if share <= tol:
-                    continue
-                rem = float(need.get(iso_m) or 0)
-                if rem <= tol:
-                    continue
-                take = round(min(share, rem), 2)
-                if take <= tol:
-                    continue
-                need[iso_m] = round(rem - take, 2)
-                # C2: Kural A tam kapandı → need artığı 0 (nakit take değişmez).
-                try:
-                    yy_c2 = int(str(iso_m)[:4])
-                    mk_c2 = round(
-                        float(((batch_maps or {}).get("marker") or {}).get(iso_m) or 0),
-                        2,
-                    )
-                    _pay_raw_c2 = ((batch_maps or {}).get("pay") or {}).get(iso_m)
-                    pay_c2 = (
-                        round(float(_pay_raw_c2), 2)
-                        if _pay_raw_c2 is not None
-                        else None
-                    )
-                    brut_c2 = round(float(full_borc_for_fifo.get(iso_m) or 0), 2)
-                except (TypeError, ValueError):
-                    yy_c2 = 0
-                    mk_c2 = 0.0
-                    pay_c2 = None
-                    brut_c2 = 0.0
-                if _grid_payload_marker_panel_tam_kapandi(
-                    mk_c2,
-                    brut_c2,
-                    yy_c2,
-                    manual_reel_by_year,
-                    float(AYLIK_GRID_TAM_ODENDI_TOLERANS),
-                    pay_t=pay_c2,
-                ):
-                    need[iso_m] = 0.0
-            return
-        for iso in month_order_all:
-            if v <= tol:
-                break
-            rem = float(need.get(iso) or 0)
-            if rem <= tol:
-                continue
-            take = round(min(v, rem), 2)
-            if take <= tol:
-                continue
-            need[iso] = round(rem - take, 2)
-            v = round(v - take, 2)
-
-    for pr in marker_pays:
-        _fifo_pay_alloc_open(pr, restrict_marker_months=True)
-    for pr in general_pays:
-        _fifo_pay_alloc_open(pr, restrict_marker_months=False)
-    opening = 0.0
-    for iso in pre_months:
-        opening += max(0.0, round(float(need.get(iso) or 0), 2))
-    return round(opening, 2)
+        except Exception:
+            logging.getLogger(__name__).exception("ekstre snapshot yazılamadı musteri_id=%s", mid)
+    return acilis
 
 
 def _ekstre_devreden_satir_toplamlari(full_borc_for_fifo, bas_iso_cmp, opening_bakiye, tol=0.01):
@@ -10378,7 +11242,8 @@ def _cari_ekstre_hareketler(
                 "bakiye": None,
                 "tahsilat_ids": [pr.get("id")],
             })
-        acilis_fifo = _ekstre_acilis_bakiyesi_fifo(
+        acilis_fifo = _ekstre_acilis_bakiyesi_snapshotli(
+            musteri_id,
             full_borc_for_fifo,
             dev_cutoff_iso,
             pays_fifo,
@@ -10386,6 +11251,7 @@ def _cari_ekstre_hareketler(
             tol=tol_f,
             batch_maps=ekstre_batch_maps,
             manual_reel_by_year=manual_reel_pass,
+            yaz=not reel_preview,
         )
         dev_borc_r, dev_alacak_r = _ekstre_devreden_satir_toplamlari(
             full_borc_for_fifo,
@@ -10799,6 +11665,9 @@ def _row_to_plain_dict(row):
     return out
 
 
+_CARI_KART_API_CACHE = cache_region("cari_kart", max_entries=512, max_bytes=16 * 1024 * 1024, ttl_sec=45.0)
+
+
 @bp.route('/api/cari-kart/<int:mid>')
 @giris_gerekli
 def api_cari_kart(mid):
@@ -10811,31 +11680,27 @@ def api_cari_kart(mid):
         pass
     try:
         force = str(request.args.get("force") or "").lower() in ("1", "true", "yes", "on")
+        etag = None
         if not force:
-            try:
-                now = time.time()
-                ttl = 45.0
-                cache = getattr(api_cari_kart, "_cache", None)
-                if cache is None:
-                    cache = {}
-                    setattr(api_cari_kart, "_cache", cache)
-                hit = cache.get(int(mid))
-                if hit and (now - float(hit.get("ts") or 0)) <= ttl and hit.get("payload"):
-                    return jsonify(hit["payload"])
-            except Exception:
-                pass
+            etag = _musteri_etag("cari_kart", mid)
+            yanit_304 = _etag_304(etag)
+            if yanit_304 is not None:
+                return yanit_304
+            hit = _CARI_KART_API_CACHE.get(int(mid))
+            if hit:
+                return _etag_uygula(jsonify(hit), etag)
 
         resp = _api_cari_kart_impl(mid)
         if not force:
             try:
                 payload = resp.get_json(silent=True) if hasattr(resp, "get_json") else None
                 if isinstance(payload, dict) and payload.get("ok"):
-                    cache = getattr(api_cari_kart, "_cache", None)
-                    if isinstance(cache, dict):
-                        cache[int(mid)] = {"ts": time.time(), "payload": payload}
+                    _CARI_KART_API_CACHE.set(int(mid), payload, tags=(musteri_tag(mid),))
             except Exception:
                 pass
-        return resp
+        if isinstance(resp, tuple):
+            return resp
+        return _etag_uygula(resp, etag)
     except Exception as e:
         logging.getLogger(__name__).exception("api_cari_kart mid=%s", mid)
         return jsonify({"ok": False, "mesaj": f"Cari kart verisi alınamadı: {e}"}), 500
@@ -10980,7 +11845,7 @@ def _cari_ekstre_varsayilan_son_tam_ay():
     return date(y, m, 1), date(y, m, son)
 
 
-_cari_ekstre_api_cache: dict = {}
+_CARI_EKSTRE_API_CACHE = cache_region("cari_ekstre", max_entries=240, max_bytes=32 * 1024 * 1024, ttl_sec=300.0)
 
 
 def _cari_ekstre_cache_invalidate_musteri(musteri_id):
@@ -10989,29 +11854,32 @@ def _cari_ekstre_cache_invalidate_musteri(musteri_id):
         mid = int(musteri_id)
     except (TypeError, ValueError):
         return 0
-    tenant = _tenant_cache_part()
-    silinecek = []
-    for key in list(_cari_ekstre_api_cache.keys()):
-        if not isinstance(key, tuple) or not key:
-            continue
-        if key[0] == tenant and len(key) > 1 and key[1] == mid:
-            silinecek.append(key)
-        elif tenant is None and key[0] == mid:
-            silinecek.append(key)
-    for key in silinecek:
-        _cari_ekstre_api_cache.pop(key, None)
-    return len(silinecek)
+    return _CARI_EKSTRE_API_CACHE.invalidate_tag(musteri_tag(mid))
 
 
 def _cari_ekstre_build_payload_from_request():
     """api_cari_ekstre ile Excel export'un PAYLAŞTIĞI ortak mantık.
     Dönüş: (payload_dict, None) başarılıysa, (None, (response, status)) hata varsa."""
-    musteri_id = request.args.get("musteri_id", type=int)
+    payload, err = _cari_ekstre_build_payload(request.args)
+    if err:
+        mesaj, status = err
+        return None, (jsonify({"ok": False, "mesaj": mesaj}), status)
+    return payload, None
+
+
+def _cari_ekstre_build_payload(args, max_by_mid=None):
+    """Cari ekstre payload'ı — istekten bağımsız çekirdek (toplu ekstre işi de kullanır).
+
+    args: ``request.args`` ile aynı arayüz (``get(key, type=...)``; ör. werkzeug MultiDict).
+    max_by_mid: peşin ufuk için ``_load_max_aylik_tah_iso_by_musteri`` sonucu (toplu işte bir kez yüklenir).
+    Dönüş: (payload_dict, None) veya (None, (mesaj, http_status)).
+    """
+    musteri_id = args.get("musteri_id", type=int)
     if not musteri_id:
-        return None, (jsonify({"ok": False, "mesaj": "musteri_id gerekli."}), 400)
+        return None, ("musteri_id gerekli.", 400)
     cust = fetch_one("SELECT id, name FROM customers WHERE id = %s", (musteri_id,))
     if not cust:
-        return None, (jsonify({"ok": False, "mesaj": "Müşteri bulunamadı."}), 404)
+        return None, ("Müşteri bulunamadı.", 404)
     def_b, def_bit_cari_ay = _cari_ekstre_varsayilan_son_tam_ay()
     kyc = _musteri_kyc_grup_for_aylik_grid(int(musteri_id))
     soz_bit = _aylik_grid_coerce_date((kyc or {}).get("sozlesme_bitis"))
@@ -11029,16 +11897,17 @@ def _cari_ekstre_build_payload_from_request():
             def_bit = def_bit_cari_ay
     else:
         def_bit = soz_bit or def_bit_cari_ay
-    baslangic = request.args.get("baslangic")
-    bitis = request.args.get("bitis")
+    baslangic = args.get("baslangic")
+    bitis = args.get("bitis")
     kullanici_araligi_verildi = bool(baslangic or bitis)
     # Peşin ufuk: yalnız açık bitis YOKSA varsayılan bitişi peşin ödenen aya kadar uzat.
     # (Kullanıcı bitis verdiyse dokunma — C kuralı.)
     if not (bitis and str(bitis).strip()):
         try:
-            max_by_mid = _load_max_aylik_tah_iso_by_musteri(
-                exclude_btufrt=True, only_fully_paid=True
-            )
+            if max_by_mid is None:
+                max_by_mid = _load_max_aylik_tah_iso_by_musteri(
+                    exclude_btufrt=True, only_fully_paid=True
+                )
             horizon_ay = _pesin_borclandirma_horizon_for_musteri(
                 int(musteri_id), max_by_mid=max_by_mid
             )
@@ -11072,26 +11941,26 @@ def _cari_ekstre_build_payload_from_request():
         else:
             bas, bit = bit, bas
     # (genislet kaldırıldı - artık sözleşme bitiş tarihi varsayılan bitiş olarak kullanılıyor)
-    aylik_kira = request.args.get("aylik_kira", type=float) or 0
-    kdv_oran = request.args.get("kdv_oran", type=float) or 20
-    kira_nakit_q = request.args.get("kira_nakit", type=str, default="") or ""
+    aylik_kira = args.get("aylik_kira", type=float) or 0
+    kdv_oran = args.get("kdv_oran", type=float) or 20
+    kira_nakit_q = args.get("kira_nakit", type=str, default="") or ""
     kira_nakit_ekstre = str(kira_nakit_q).lower() in ("1", "true", "on", "yes")
     # form_bazli_kira=1: sözleşme formundaki aylık kira KYC'ye yazılır; reel dönem DB+TÜFE haritası yine de borçta kullanılır.
-    _fb = str(request.args.get("form_bazli_kira") or "").strip().lower()
+    _fb = str(args.get("form_bazli_kira") or "").strip().lower()
     use_reel_cells = _fb not in ("1", "true", "yes", "on", "evet")
-    _tbh = str(request.args.get("tahsilat_borca_hizala") or "1").strip().lower()
+    _tbh = str(args.get("tahsilat_borca_hizala") or "1").strip().lower()
     tahsilat_borca_hizala = _tbh in ("1", "true", "yes", "on", "evet")
     # Borçlar: normalde net + KDV; nakit kiracıda forma girilen tutar doğrudan aylık borç
     if kira_nakit_ekstre and aylik_kira:
         aylik_kira_kdv_dahil = round(aylik_kira, 2)
     else:
         aylik_kira_kdv_dahil = round(aylik_kira * (1 + kdv_oran / 100), 2) if aylik_kira else 0
-    db_esas = str(request.args.get("db_esas") or "1").strip().lower() in (
+    db_esas = str(args.get("db_esas") or "1").strip().lower() in (
         "1", "true", "yes", "on", "evet",
     )
     reel_client = None
     if not db_esas:
-        rj_raw = (request.args.get("reel_json") or "").strip()
+        rj_raw = (args.get("reel_json") or "").strip()
         if rj_raw and len(rj_raw) < 8000:
             try:
                 rj_obj = json.loads(rj_raw)
@@ -11118,7 +11987,7 @@ def _cari_ekstre_build_payload_from_request():
             reel_key = str(reel_merged_key)
     panel_by_iso = {}
     if not db_esas:
-        ptj_raw = (request.args.get("panel_tahsil_json") or "").strip()
+        ptj_raw = (args.get("panel_tahsil_json") or "").strip()
         if ptj_raw and len(ptj_raw) < 32000:
             panel_by_iso = _panel_tahsil_by_iso_parse(ptj_raw)
         # db_esas=0 önizleme: FE json yoksa panel DB; db_esas=1'de panel hiç yüklenmez
@@ -11128,7 +11997,6 @@ def _cari_ekstre_build_payload_from_request():
     if panel_by_iso:
         panel_by_iso = _ekstre_panel_filter_db_tahsil(int(musteri_id), panel_by_iso)
     cache_key = (
-        _tenant_cache_part(),
         int(musteri_id),
         bas.isoformat(),
         bit.isoformat(),
@@ -11139,12 +12007,10 @@ def _cari_ekstre_build_payload_from_request():
         bool(db_esas),
         "reel_hucre_v6_db",
     )
-    now = time.time()
-    hit = None
     if not panel_by_iso:
-        hit = _cari_ekstre_api_cache.get(cache_key)
-        if hit and (now - float(hit.get("ts") or 0)) < 300.0 and hit.get("payload"):
-            return dict(hit["payload"]), None
+        hit = _CARI_EKSTRE_API_CACHE.get(cache_key)
+        if hit:
+            return dict(hit), None
     try:
         hareketler = _cari_ekstre_hareketler(
             musteri_id,
@@ -11159,7 +12025,7 @@ def _cari_ekstre_build_payload_from_request():
         )
     except Exception as e:
         logging.getLogger(__name__).exception("api_cari_ekstre musteri_id=%s", musteri_id)
-        return None, (jsonify({"ok": False, "mesaj": f"Ekstre hesaplanamadı: {e}"}), 500)
+        return None, (f"Ekstre hesaplanamadı: {e}", 500)
     toplam_borc = sum(h.get("borc") or 0 for h in hareketler)
     toplam_alacak = sum(h.get("alacak") or 0 for h in hareketler)
     if hareketler:
@@ -11180,92 +12046,10 @@ def _cari_ekstre_build_payload_from_request():
         "bit_iso": bit.isoformat(),
     }
     if not panel_by_iso:
-        _cari_ekstre_api_cache[cache_key] = {"ts": now, "payload": payload}
-    if len(_cari_ekstre_api_cache) > 120:
-        stale = [k for k, v in _cari_ekstre_api_cache.items() if (now - float(v.get("ts") or 0)) > 60.0]
-        for k in stale:
-            _cari_ekstre_api_cache.pop(k, None)
+        _CARI_EKSTRE_API_CACHE.set(cache_key, payload, tags=(musteri_tag(musteri_id),))
     return payload, None
 
 
-def _cari_ekstre_workbook_bytes(payload, bas_iso, bit_iso):
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cari Ekstre"
-
-    arial = Font(name="Arial", size=11)
-    arial_bold = Font(name="Arial", size=11, bold=True)
-    baslik_font = Font(name="Arial", size=14, bold=True)
-    header_fill = PatternFill(start_color="0097A7", end_color="0097A7", fill_type="solid")
-    header_font = Font(name="Arial", size=11, bold=True, color="FFFFFF")
-
-    ws.merge_cells("A1:E1")
-    ws["A1"] = "CARİ EKSTRE"
-    ws["A1"].font = baslik_font
-    ws["A1"].alignment = Alignment(horizontal="center")
-
-    ws["A2"] = "Müşteri:"
-    ws["B2"] = payload.get("musteri_adi") or ""
-    ws["A3"] = "Dönem:"
-    ws["B3"] = f"{bas_iso} - {bit_iso}"
-    for c in ("A2", "A3"):
-        ws[c].font = arial_bold
-    for c in ("B2", "B3"):
-        ws[c].font = arial
-
-    headers = ["Tarih", "Açıklama", "Borç", "Alacak", "Bakiye"]
-    header_row = 5
-    for i, h in enumerate(headers, start=1):
-        cell = ws.cell(row=header_row, column=i, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    hareketler = payload.get("hareketler") or []
-    row = header_row + 1
-    for h in hareketler:
-        ws.cell(row=row, column=1, value=h.get("tarih") or "").font = arial
-        ws.cell(row=row, column=2, value=h.get("aciklama") or "").font = arial
-        bc = ws.cell(row=row, column=3, value=float(h.get("borc") or 0))
-        bc.font = arial
-        bc.number_format = "#,##0.00"
-        ac = ws.cell(row=row, column=4, value=float(h.get("alacak") or 0))
-        ac.font = arial
-        ac.number_format = "#,##0.00"
-        kc = ws.cell(row=row, column=5, value=float(h.get("bakiye") or 0))
-        kc.font = arial
-        kc.number_format = "#,##0.00"
-        row += 1
-
-    last_data_row = row - 1
-    if last_data_row >= header_row + 1:
-        toplam_row = row + 1
-        ws.cell(row=toplam_row, column=2, value="TOPLAM").font = arial_bold
-        tb = ws.cell(row=toplam_row, column=3, value=f"=SUM(C{header_row + 1}:C{last_data_row})")
-        tb.font = arial_bold
-        tb.number_format = "#,##0.00"
-        ta = ws.cell(row=toplam_row, column=4, value=f"=SUM(D{header_row + 1}:D{last_data_row})")
-        ta.font = arial_bold
-        ta.number_format = "#,##0.00"
-        tk = ws.cell(row=toplam_row, column=5, value=f"=E{last_data_row}")
-        tk.font = arial_bold
-        tk.number_format = "#,##0.00"
-
-    ws.column_dimensions["A"].width = 12
-    ws.column_dimensions["B"].width = 45
-    ws.column_dimensions["C"].width = 14
-    ws.column_dimensions["D"].width = 14
-    ws.column_dimensions["E"].width = 14
-
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf
-
-
 @bp.route('/api/cari-ekstre')
 @giris_gerekli
 def api_cari_ekstre():
@@ -11289,7 +12073,7 @@ def api_cari_ekstre_excel():
         return err
     bas_iso = payload.get("bas_iso") or ""
     bit_iso = payload.get("bit_iso") or ""
-    buf = _cari_ekstre_workbook_bytes(payload, bas_iso, bit_iso)
+    buf = cari_ekstre_workbook_bytes(payload, bas_iso, bit_iso)
     musteri_adi_safe = (payload.get("musteri_adi") or "musteri").replace(" ", "_")
     filename = f"Cari_Ekstre_{musteri_adi_safe}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return send_file(
@@ -11300,6 +12084,146 @@ def api_cari_ekstre_excel():
     )
 
 
+# Toplu ekstre ZIP'leri: kiracı başına dizin; CARI_EKSTRE_TOPLU_SAKLAMA_SAAT (varsayılan 24) sonra silinir.
+CARI_EKSTRE_TOPLU_KLASOR = os.path.join("uploads", "cari_ekstre_toplu")
+
+
+def _cari_ekstre_toplu_dizin() -> str:
+    return os.path.join(CARI_EKSTRE_TOPLU_KLASOR, _tenant_schema_for_request() or "public")
+
+
+def _cari_ekstre_toplu_eskileri_sil(dizin: str) -> None:
+    try:
+        saat = float(os.environ.get("CARI_EKSTRE_TOPLU_SAKLAMA_SAAT") or 24)
+    except ValueError:
+        saat = 24.0
+    sinir = time.time() - max(1.0, saat) * 3600.0
+    try:
+        adlar = os.listdir(dizin)
+    except OSError:
+        return
+    for ad in adlar:
+        yol = os.path.join(dizin, ad)
+        try:
+            if os.path.getmtime(yol) < sinir:
+                os.remove(yol)
+        except OSError:
+            continue
+
+
+def _cari_ekstre_toplu_liste(v) -> list:
+    """JSON listesi veya virgüllü metin → boş olmayan öğeler."""
+    if isinstance(v, str):
+        v = v.split(",")
+    if not isinstance(v, (list, tuple)):
+        return []
+    return [str(x).strip() for x in v if str(x).strip()]
+
+
+@job_handler("cari_ekstre_toplu")
+def _cari_ekstre_toplu_job(params):
+    from services.cari_ekstre_toplu import toplu_ekstre_musteri_idleri, toplu_ekstre_zip_yaz
+
+    ids = []
+    for m in params.get("musteri_ids") or []:
+        try:
+            ids.append(int(m))
+        except (TypeError, ValueError):
+            continue
+    if not ids:
+        ids = toplu_ekstre_musteri_idleri(
+            sadece_aktif=bool(params.get("sadece_aktif", True)),
+            grup2=params.get("grup2") or [],
+            hizmet_turleri=params.get("hizmet_turleri") or [],
+        )
+    dizin = _cari_ekstre_toplu_dizin()
+    _cari_ekstre_toplu_eskileri_sil(dizin)
+    dosya = f"cari_ekstre_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.zip"
+    sonuc = toplu_ekstre_zip_yaz(
+        ids,
+        os.path.join(dizin, dosya),
+        baslangic=params.get("baslangic") or None,
+        bitis=params.get("bitis") or None,
+    )
+    sonuc["dosya"] = dosya
+    return sonuc
+
+
+@bp.route('/api/cari-ekstre-toplu', methods=['POST'])
+@giris_gerekli
+def api_cari_ekstre_toplu():
+    """Ay sonu toplu cari ekstre: filtreye uyan müşterilerin Excel ekstreleri tek ZIP (arka plan işi).
+
+    JSON: baslangic, bitis (YYYY-MM-DD; boşsa müşteri başına tekil ekstrenin varsayılanı),
+    sadece_aktif (varsayılan true), grup2, hizmet_turleri (liste veya virgüllü), musteri_ids
+    (verilirse filtre yerine). 202 {job_id, durum_url}; iş bitince /api/cari-ekstre-toplu/<job_id>/indir.
+    İşçi kapalıysa (JOB_WORKERS=0) aynı istekte çalışır.
+    """
+    data = request.get_json(silent=True) or {}
+    params = {
+        "baslangic": str(data.get("baslangic") or "").strip()[:10],
+        "bitis": str(data.get("bitis") or "").strip()[:10],
+        "sadece_aktif": str(data.get("sadece_aktif", "1")).strip().lower() in ("1", "true", "yes", "on"),
+        "grup2": _cari_ekstre_toplu_liste(data.get("grup2")),
+        "hizmet_turleri": _cari_ekstre_toplu_liste(data.get("hizmet_turleri")),
+        "musteri_ids": _cari_ekstre_toplu_liste(data.get("musteri_ids")),
+    }
+    for k in ("baslangic", "bitis"):
+        if params[k]:
+            try:
+                datetime.strptime(params[k], "%Y-%m-%d")
+            except ValueError:
+                return jsonify({"ok": False, "mesaj": f"{k} YYYY-MM-DD olmalı."}), 400
+    if job_workers_count() <= 0:
+        try:
+            sonuc = _cari_ekstre_toplu_job(params)
+        except Exception as e:
+            logging.getLogger(__name__).exception("api_cari_ekstre_toplu")
+            return jsonify({"ok": False, "mesaj": f"Toplu ekstre oluşturulamadı: {e}"}), 500
+        dosya_yol = os.path.join(_cari_ekstre_toplu_dizin(), sonuc["dosya"])
+        return send_file(
+            os.path.abspath(dosya_yol),
+            as_attachment=True,
+            download_name=sonuc["dosya"],
+            mimetype="application/zip",
+        )
+    job = enqueue("cari_ekstre_toplu", params, created_by=getattr(current_user, "id", None))
+    return jsonify(
+        {
+            "ok": True,
+            "job_id": job.get("id"),
+            "durum": job.get("status"),
+            "durum_url": url_for("jobs.api_job_durum", job_id=job.get("id")),
+            "indir_url": url_for("giris.api_cari_ekstre_toplu_indir", job_id=job.get("id")),
+            "mesaj": "Toplu ekstre arka planda hazırlanıyor.",
+        }
+    ), 202
+
+
+@bp.route('/api/cari-ekstre-toplu/<int:job_id>/indir')
+@giris_gerekli
+def api_cari_ekstre_toplu_indir(job_id):
+    """Tamamlanmış toplu ekstre işinin ZIP'i."""
+    from routes.jobs_routes import _job_erisim
+    from services.job_queue import JOB_DONE, get_job
+
+    job = get_job(job_id)
+    if not _job_erisim(job) or job.get("kind") != "cari_ekstre_toplu":
+        return jsonify({"ok": False, "mesaj": "İş bulunamadı."}), 404
+    if job.get("status") != JOB_DONE:
+        return jsonify({"ok": False, "mesaj": "Toplu ekstre henüz hazır değil.", "durum": job.get("status")}), 409
+    dosya = str((job.get("result") or {}).get("dosya") or "")
+    yol = os.path.join(_cari_ekstre_toplu_dizin(), dosya)
+    if not dosya or secure_filename(dosya) != dosya or not os.path.isfile(yol):
+        return jsonify({"ok": False, "mesaj": "Dosya bulunamadı veya süresi doldu."}), 410
+    return send_file(
+        os.path.abspath(yol),
+        as_attachment=True,
+        download_name=dosya,
+        mimetype="application/zip",
+    )
+
+
 def _next_fatura_no_aylik(prefix=None):
     """Yıla göre artan fatura no; finans ile aynı seri (GIB/INV .env)."""
     try:
@@ -11383,6 +12307,7 @@ def api_aylik_tutarlardan_borclandir():
     atlanan = []
     tahsil_silinen = []
     tahsil_silinen_aylar = set()
+    dagitim = _tahsilat_ay_dagitim_hazir()
 
     for raw in satirlar:
         if not isinstance(raw, dict):
@@ -11414,18 +12339,31 @@ def api_aylik_tutarlardan_borclandir():
         pay_marker_pat = f"%|AYLIK_PAY|{ay_anahtar}=%"
         # Borçlandırılan (veya zaten borçlu kabul edilen) ayda aylık tahsilat kaydı kalmasın:
         # ekstrede aynı ayda hem borç hem tahsil görünmesini önler.
-        silinen_rows = fetch_all(
-            """
-            DELETE FROM tahsilatlar
-            WHERE (musteri_id = %s OR customer_id = %s)
-              AND (
-                COALESCE(aciklama, '') LIKE %s
-                OR COALESCE(aciklama, '') LIKE %s
-              )
-            RETURNING id, makbuz_no
-            """,
-            (musteri_id, musteri_id, tah_marker_pat, pay_marker_pat),
-        ) or []
+        if dagitim:
+            silinen_rows = fetch_all(
+                """
+                DELETE FROM tahsilatlar
+                WHERE id IN (
+                    SELECT d.tahsilat_id FROM tahsilat_ay_dagitim d
+                    WHERE d.musteri_id = %s AND d.ay = %s AND d.gun_metin = %s
+                )
+                RETURNING id, makbuz_no
+                """,
+                (musteri_id, ay_bir, ay_anahtar),
+            ) or []
+        else:
+            silinen_rows = fetch_all(
+                """
+                DELETE FROM tahsilatlar
+                WHERE (musteri_id = %s OR customer_id = %s)
+                  AND (
+                    COALESCE(aciklama, '') LIKE %s
+                    OR COALESCE(aciklama, '') LIKE %s
+                  )
+                RETURNING id, makbuz_no
+                """,
+                (musteri_id, musteri_id, tah_marker_pat, pay_marker_pat),
+            ) or []
         if silinen_rows:
             tahsil_silinen_aylar.add((yil, ay))
             for tr in silinen_rows:
@@ -11437,18 +12375,27 @@ def api_aylik_tutarlardan_borclandir():
                         "ay": ay,
                     }
                 )
+        if dagitim:
+            marker_var_sql = """
+                    SELECT 1
+                    FROM tahsilat_ay_dagitim d
+                    WHERE d.musteri_id = %s AND d.ay = %s AND d.tur = 'tah' AND d.gun_metin = %s"""
+            marker_var_params = (musteri_id, ay_bir, ay_anahtar)
+        else:
+            marker_var_sql = """
+                    SELECT 1
+                    FROM tahsilatlar t
+                    WHERE (t.musteri_id = %s OR t.customer_id = %s)
+                      AND COALESCE(t.aciklama, '') LIKE %s"""
+            marker_var_params = (musteri_id, musteri_id, tah_marker_pat)
         var = fetch_one(
-            """
+            f"""
             SELECT
                 id,
                 fatura_no,
                 ettn,
                 COALESCE(durum, '') AS durum,
-                EXISTS(
-                    SELECT 1
-                    FROM tahsilatlar t
-                    WHERE (t.musteri_id = %s OR t.customer_id = %s)
-                      AND COALESCE(t.aciklama, '') LIKE %s
+                EXISTS({marker_var_sql}
                 ) AS tahsil_marker_var
             FROM faturalar
             WHERE musteri_id = %s
@@ -11456,7 +12403,7 @@ def api_aylik_tutarlardan_borclandir():
             ORDER BY id DESC
             LIMIT 1
             """,
-            (musteri_id, musteri_id, tah_marker_pat, musteri_id, f"%{marker}%"),
+            marker_var_params + (musteri_id, f"%{marker}%"),
         )
         if var:
             # Fatura zaten var: yeni fatura açma; tahsil temizlendi → panel/grid borçlu senkronu.
@@ -11529,7 +12476,7 @@ def api_aylik_tutarlardan_borclandir():
     except Exception:
         pass
     try:
-        _cari_ekstre_api_cache.clear()
+        _CARI_EKSTRE_API_CACHE.clear()
     except Exception:
         pass
     # Kaydet deseni: tam grid rebuild isteği bekletmesin (çift upsert + ekstre
@@ -11681,6 +12628,7 @@ def api_aylik_tutarlardan_tahsil_et():
             return v.date()
         return v
 
+    dagitim = _tahsilat_ay_dagitim_hazir()
     try:
         with get_db() as conn:
             cur = conn.cursor()
@@ -11707,24 +12655,40 @@ def api_aylik_tutarlardan_tahsil_et():
             # bu yüzden "0 oluşturuldu, N atlandı" hatalı görülüyordu.
             dup_makbuz_by_ab = {}
             if month_starts:
-                cur.execute(
-                    """
-                    SELECT t.id, t.makbuz_no, COALESCE(t.aciklama, '') AS aciklama
-                    FROM tahsilatlar t
-                    WHERE (t.musteri_id = %s OR t.customer_id = %s)
-                      AND COALESCE(t.tutar, 0) > 0
-                      AND COALESCE(t.aciklama, '') LIKE '%%|AYLIK_TAH|%%'
-                    ORDER BY t.id DESC
-                    """,
-                    (musteri_id, musteri_id),
-                )
                 by_iso = {}
-                for row in cur.fetchall() or []:
-                    ac = str(row.get("aciklama") or "")
-                    mb = row.get("makbuz_no")
-                    for iso in re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac):
-                        if iso not in by_iso:
-                            by_iso[iso] = mb
+                if dagitim:
+                    cur.execute(
+                        """
+                        SELECT t.id, t.makbuz_no, d.gun_metin
+                        FROM tahsilat_ay_dagitim d
+                        JOIN tahsilatlar t ON t.id = d.tahsilat_id
+                        WHERE d.musteri_id = %s AND d.ay = ANY(%s)
+                          AND d.tur = 'tah' AND length(d.gun_metin) = 10
+                          AND COALESCE(t.tutar, 0) > 0
+                        ORDER BY t.id DESC
+                        """,
+                        (musteri_id, list(month_starts)),
+                    )
+                    for row in cur.fetchall() or []:
+                        by_iso.setdefault(row.get("gun_metin"), row.get("makbuz_no"))
+                else:
+                    cur.execute(
+                        """
+                        SELECT t.id, t.makbuz_no, COALESCE(t.aciklama, '') AS aciklama
+                        FROM tahsilatlar t
+                        WHERE (t.musteri_id = %s OR t.customer_id = %s)
+                          AND COALESCE(t.tutar, 0) > 0
+                          AND COALESCE(t.aciklama, '') LIKE '%%|AYLIK_TAH|%%'
+                        ORDER BY t.id DESC
+                        """,
+                        (musteri_id, musteri_id),
+                    )
+                    for row in cur.fetchall() or []:
+                        ac = str(row.get("aciklama") or "")
+                        mb = row.get("makbuz_no")
+                        for iso in re.findall(r"\|AYLIK_TAH\|([0-9]{4}-[0-9]{2}-[0-9]{2})\|", ac):
+                            if iso not in by_iso:
+                                by_iso[iso] = mb
                 for p in parsed:
                     iso = p["ay_bir"].isoformat()
                     if iso in by_iso:
@@ -11920,23 +12884,37 @@ def api_aylik_tutarlardan_tahsil_et():
     except Exception as e:
         return jsonify({"ok": False, "mesaj": f"Tahsilat toplu kayıt hatası: {e}"}), 500
 
+    # Seçilen ayların hücreleri önbellekte yamanır; yamanamazsa satır silinir ve
+    # rebuild frontend isteğinde yapılır (force=1).
+    grid_yamali = None
     try:
-        sync_musteri_panel_from_tahsil_and_dagitim(musteri_id)
+        grid_fp = _aylik_grid_freshness_fingerprint(musteri_id)
+        try:
+            grid_yamali = _aylik_grid_payload_hucre_yamala(musteri_id)
+        except Exception:
+            logging.getLogger(__name__).exception(
+                "aylik grid hücre yaması musteri_id=%s", musteri_id
+            )
+            grid_yamali = None
+        sync_musteri_panel_from_tahsil_and_dagitim(musteri_id, payload=grid_yamali)
+        if grid_yamali is not None:
+            _aylik_grid_mem_damgala(musteri_id, grid_yamali, grid_fp)
     except Exception:
+        grid_yamali = None
         try:
             _upsert_aylik_grid_cache(musteri_id, tufe_map=_tufe_map_by_year_month())
         except Exception:
             pass
-    try:
-        _invalidate_aylik_grid_payload_mem(int(musteri_id))
-        execute(
-            "DELETE FROM musteri_aylik_grid_cache WHERE musteri_id=%s",
-            (int(musteri_id),)
-        )
-    except Exception:
-        pass
-    # Cache rebuild frontend isteğinde yapılacak (force=1)
-    _cari_ekstre_api_cache.clear()
+    if grid_yamali is None:
+        try:
+            _invalidate_aylik_grid_payload_mem(int(musteri_id))
+            execute(
+                "DELETE FROM musteri_aylik_grid_cache WHERE musteri_id=%s",
+                (int(musteri_id),)
+            )
+        except Exception:
+            pass
+    _CARI_EKSTRE_API_CACHE.clear()
     zaten_n = sum(
         1 for x in atlanan if isinstance(x, dict) and x.get("neden") == "zaten_tahsil"
     )
@@ -11959,6 +12937,7 @@ def api_aylik_tutarlardan_tahsil_et():
         "mesaj": mesaj,
         "ls_temizle": True,
         "cache_updated": True,
+        "grid_yamali": grid_yamali is not None,
     })
 
 
@@ -12077,7 +13056,7 @@ def api_aylik_tutarlardan_tahsilden_cikar():
         )
     except Exception:
         try:
-            _cari_ekstre_api_cache.clear()
+            _CARI_EKSTRE_API_CACHE.clear()
         except Exception:
             pass
     return jsonify(
@@ -12178,8 +13157,83 @@ def api_aylik_tutarlardan_borctan_cikar():
     )
 
 
-def _json_no_cache(payload, status=200):
+# Müşteri kartı uçları için koşullu GET: ETag musteri_data_version'dan (trigger ile artar) türetilir;
+# If-None-Match eşleşirse payload hesaplanmadan / serileştirilmeden 304 döner.
+_MUSTERI_ETAG_HAZIR: dict = {}
+
+
+def _musteri_etag_hazir() -> bool:
+    """Kart kapsamı trigger'ları (musteri_data_version_kart) bu şemada kurulu mu; şema başına bir kez bakılır."""
+    sema = _tenant_schema_for_request() or "public"
+    hazir = _MUSTERI_ETAG_HAZIR.get(sema)
+    if hazir is None:
+        _ensure_musteri_data_version_table()
+        try:
+            hazir = bool(
+                fetch_one(
+                    "SELECT 1 AS x FROM pg_trigger "
+                    "WHERE tgname = 'trg_faturalar_data_version_upd' AND tgrelid = 'faturalar'::regclass"
+                )
+            )
+        except Exception:
+            hazir = False
+        _MUSTERI_ETAG_HAZIR[sema] = hazir
+    return hazir
+
+
+def _musteri_etag(uc: str, musteri_id, *ekler) -> str | None:
+    """Güçlü ETag (tırnaksız): şema + uç + rol + müşteri veri sürümü + gün + ekler.
+
+    Trigger kapsamı yoksa veya sürüm okunamazsa None — yanıt eskisi gibi no-store.
+    Gün parçası: gecikme / aging / ufuk bugüne göre hesaplanır.
+    """
+    try:
+        mid = int(musteri_id)
+    except (TypeError, ValueError):
+        return None
+    if not _musteri_etag_hazir():
+        return None
+    surumler = _musteri_data_version_batch((mid,))
+    if surumler is None:
+        return None
+    ham = "|".join(
+        str(x)
+        for x in (
+            _tenant_schema_for_request() or "public",
+            uc,
+            getattr(current_user, "role", ""),
+            mid,
+            surumler.get(mid, 0),
+            date.today().isoformat(),
+            *ekler,
+        )
+    )
+    return hashlib.sha1(ham.encode("utf-8")).hexdigest()
+
+
+def _etag_uygula(response, etag):
+    """200 yanıta ETag: tarayıcı saklar ama her kullanımda doğrular (private, no-cache)."""
+    if etag and getattr(response, "status_code", None) == 200:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.headers.pop("Pragma", None)
+    return response
+
+
+def _etag_304(etag):
+    """If-None-Match eşleşirse gövdesiz 304, değilse None."""
+    if not etag or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _json_no_cache(payload, status=200, etag=None):
     response = make_response(jsonify(payload), status)
+    if etag and status == 200:
+        return _etag_uygula(response, etag)
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     return response
@@ -12194,6 +13248,14 @@ def api_aylik_grid_cache():
     force = str(request.args.get("force") or "").lower() in ("1", "true", "yes", "on")
     skip_match = str(request.args.get("skip_match") or "").lower() in ("1", "true", "yes", "on")
     _ensure_aylik_grid_cache_table()
+    etag = None
+    if not force:
+        etag = _musteri_etag(
+            "aylik_grid", musteri_id, AYLIK_GRID_COMPUTE_REV, _tufe_map_imza(), int(skip_match)
+        )
+        yanit_304 = _etag_304(etag)
+        if yanit_304 is not None:
+            return yanit_304
     if not force:
         try:
             mem_hit = _aylik_grid_mem_get(musteri_id)
@@ -12263,7 +13325,8 @@ def api_aylik_grid_cache():
                                 "cache": mem_hit[1],
                                 "cached": True,
                                 "mem": True,
-                            }
+                            },
+                            etag=etag,
                         )
                     mem_payload = _aylik_grid_cache_payload_tahsil_guncelle(musteri_id, mem_hit[1])
                     mem_payload = _aylik_grid_payload_reel_overlay_from_db(musteri_id, mem_payload)
@@ -12312,7 +13375,7 @@ def api_aylik_grid_cache():
                         _aylik_grid_mem_set(musteri_id, mem_payload)
                     except (TypeError, ValueError):
                         pass
-                    return _json_no_cache({"ok": True, "cache": mem_payload, "cached": True, "mem": True})
+                    return _json_no_cache({"ok": True, "cache": mem_payload, "cached": True, "mem": True}, etag=etag)
         except (TypeError, ValueError):
             pass
         row = fetch_one("SELECT payload FROM musteri_aylik_grid_cache WHERE musteri_id = %s", (musteri_id,))
@@ -12391,13 +13454,13 @@ def api_aylik_grid_cache():
                         _aylik_grid_mem_set(musteri_id, cache_obj)
                     except (TypeError, ValueError):
                         pass
-                    return _json_no_cache({"ok": True, "cache": cache_obj, "cached": True})
+                    return _json_no_cache({"ok": True, "cache": cache_obj, "cached": True}, etag=etag)
             except Exception:
                 pass
     if not fetch_one("SELECT id FROM customers WHERE id = %s", (musteri_id,)):
         return _json_no_cache({"ok": False, "mesaj": "Müşteri bulunamadı."}, 404)
     payload = _upsert_aylik_grid_cache(musteri_id)
-    return _json_no_cache({"ok": True, "cache": payload or {}, "cached": False})
+    return _json_no_cache({"ok": True, "cache": payload or {}, "cached": False}, etag=etag)
 
 
 @bp.route("/api/reel-donem-tutarlar")
@@ -12406,6 +13469,10 @@ def api_reel_donem_tutarlar():
     musteri_id = request.args.get("musteri_id", type=int)
     if not musteri_id:
         return jsonify({"ok": False, "mesaj": "musteri_id gerekli."}), 400
+    etag = _musteri_etag("reel_donem", musteri_id)
+    yanit_304 = _etag_304(etag)
+    if yanit_304 is not None:
+        return yanit_304
     # Müşteri var mı kontrolünü kaldırdık; doğrudan tablo sorgusu yapıyoruz.
     # Yoksa 0 satır döner, çağıran tarafa zaten ok=True/empty map geliyor.
     _ensure_musteri_reel_donem_tutar_table()
@@ -12438,7 +13505,7 @@ def api_reel_donem_tutarlar():
             "hibrit_net": float(r.get("hibrit_net")) if r.get("hibrit_net") is not None else None,
             "hibrit_banka": float(r.get("hibrit_banka")) if r.get("hibrit_banka") is not None else None,
         }
-    return jsonify({"ok": True, "map": m, "detay_map": detay_map})
+    return _etag_uygula(jsonify({"ok": True, "map": m, "detay_map": detay_map}), etag)
 
 
 @bp.route("/api/musteri-kart-bundle")
@@ -12459,6 +13526,9 @@ def api_musteri_kart_bundle():
       - odemeler → musteri detayına (varsayılan 1)
       - debug_timing → 1/true/yes/on ise alt-adım süreleri log + timings_ms
 
+    If-None-Match: ETag müşteri veri sürümünden (bkz. _musteri_etag); eşleşirse alt
+    çağrılar hiç çalışmadan 304. force / debug_timing ile koşulsuz.
+
     Env:
       - BUNDLE_PARALLEL_MG=1/true/yes/on → musteri ∥ grid (Aşama B1);
         kapalı/yoksa mevcut sıralı musteri→grid.
@@ -12491,6 +13561,15 @@ def api_musteri_kart_bundle():
     force_grid = str(request.args.get("force") or "").lower() in ("1", "true", "yes", "on")
     odemeler = str(request.args.get("odemeler", "1") or "1")
     debug_timing = str(request.args.get("debug_timing") or "").lower() in ("1", "true", "yes", "on")
+    # Koşullu GET: force / debug_timing her zaman tam yanıt (timings_ms ölçüm içindir).
+    etag = None
+    if not (force_grid or debug_timing):
+        etag = _musteri_etag(
+            "kart_bundle", mid, AYLIK_GRID_COMPUTE_REV, _tufe_map_imza(), int(skip_match), odemeler
+        )
+        yanit_304 = _etag_304(etag)
+        if yanit_304 is not None:
+            return yanit_304
     parallel_mg = str(os.getenv("BUNDLE_PARALLEL_MG") or "").strip().lower() in (
         "1",
         "true",
@@ -12848,7 +13927,9 @@ def api_musteri_kart_bundle():
             }
         except Exception:
             pass
-    return _json_no_cache(out)
+    # Kısmi başarı saklanmaz: yalnız dört parça da ok ise ETag.
+    tam = all(isinstance(out[k], dict) and out[k].get("ok") for k in ("musteri", "tahsil_durum", "grid", "reel"))
+    return _json_no_cache(out, etag=etag if tam else None)
 
 
 @bp.route("/api/reel-donem-tutar", methods=["POST"])
@@ -13272,7 +14353,7 @@ def api_reel_donem_tutar_delete():
     if n <= 0:
         return jsonify({"ok": False, "mesaj": "Reel dönem kaydı bulunamadı."}), 404
     try:
-        _cari_ekstre_api_cache.clear()
+        _CARI_EKSTRE_API_CACHE.clear()
     except Exception:
         pass
     try:
@@ -13294,14 +14375,11 @@ def api_reel_donem_tutar_delete():
 @bp.route('/api/aylik-grid-cache/rebuild-all', methods=['POST'])
 @giris_gerekli
 def api_aylik_grid_cache_rebuild_all():
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     rows = fetch_all("SELECT id FROM customers ORDER BY id") or []
-    updated = 0
-    for r in rows:
-        mid = r.get("id")
-        if not mid:
-            continue
-        if _upsert_aylik_grid_cache(int(mid)):
-            updated += 1
+    updated = _upsert_aylik_grid_cache_bulk([r.get("id") for r in rows])
     return jsonify({"ok": True, "updated": updated, "mesaj": f"{updated} müşteri için aylık grid cache güncellendi."})
 
 
@@ -13341,6 +14419,9 @@ def api_aylik_kira_guncelle_ve_borclandir_all():
 
     Performans: TÜFE ve KYC tek seferde; peşin max ay tek toplu yükleme; fatura INSERT tek bağlantıda toplu.
     """
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     ensure_faturalar_amount_columns()
     try:
         data = request.get_json(force=True, silent=True) or {}
@@ -13425,7 +14506,8 @@ def api_aylik_kira_guncelle_ve_borclandir_all():
         exclude_btufrt=True, only_fully_paid=True
     )
 
-    for r in rows:
+    for idx, r in enumerate(rows):
+        job_progress(idx, len(rows))
         mid = int(r.get("id") or 0)
         if mid <= 0:
             continue
@@ -13552,6 +14634,9 @@ def api_tufe_borclandir_nakit_tahsil_toplu():
 
     POST JSON (isteğe bağlı): musteri_ids: [1,2,3] → yalnız bu müşteriler.
     """
+    kuyruk = enqueue_view_if_async()
+    if kuyruk is not None:
+        return kuyruk
     ensure_faturalar_amount_columns()
     try:
         data = request.get_json(force=True, silent=True) or {}
@@ -13683,7 +14768,8 @@ def api_tufe_borclandir_nakit_tahsil_toplu():
     tahsil_atlandi = 0
     harf = _odeme_turu_harf(odeme)
 
-    for r in rows:
+    for idx, r in enumerate(rows):
+        job_progress(idx, len(rows))
         mid = int(r.get("id") or 0)
         if mid <= 0:
             continue
@@ -13945,11 +15031,10 @@ def api_tufe_borclandir_nakit_tahsil_toplu():
     finally:
         conn.close()
 
-    for mid_cache in sorted(touched_mids):
-        try:
-            _upsert_aylik_grid_cache(mid_cache, tufe_map=tufe_map)
-        except Exception:
-            pass
+    try:
+        _upsert_aylik_grid_cache_bulk(sorted(touched_mids), tufe_map=tufe_map)
+    except Exception:
+        logging.getLogger(__name__).exception("tufe toplu sonrasi grid cache")
 
     tahsil_eklenen = len(tahsil_plan)
     return jsonify({
@@ -0,0 +1,58 @@
+"""
+Arka plan işleri — durum / iptal / yeniden dene (bkz. services/job_queue).
+İlerleme istemcide durum uç noktası yoklanarak izlenir (static/js/bo-jobs.js).
+"""
+from flask import Blueprint, jsonify, request
+from flask_login import current_user
+
+from auth import giris_gerekli
+from services.job_queue import cancel_job, get_job, list_jobs, retry_job
+
+bp = Blueprint("jobs", __name__)
+
+
+def _job_erisim(job) -> bool:
+    """Kiracı filtresi get_job'da; ek olarak yalnız işi başlatan veya admin."""
+    if not job:
+        return False
+    if getattr(current_user, "role", None) == "admin":
+        return True
+    sahip = job.get("created_by")
+    return sahip is None or sahip == getattr(current_user, "id", None)
+
+
+@bp.route("/api/<int:job_id>")
+@giris_gerekli
+def api_job_durum(job_id):
+    job = get_job(job_id)
+    if not _job_erisim(job):
+        return jsonify({"ok": False, "mesaj": "İş bulunamadı."}), 404
+    return jsonify({"ok": True, "job": job})
+
+
+@bp.route("/api/<int:job_id>/iptal", methods=["POST"])
+@giris_gerekli
+def api_job_iptal(job_id):
+    if not _job_erisim(get_job(job_id)):
+        return jsonify({"ok": False, "mesaj": "İş bulunamadı."}), 404
+    if not cancel_job(job_id):
+        return jsonify({"ok": False, "mesaj": "İş zaten bitmiş."}), 409
+    return jsonify({"ok": True, "job": get_job(job_id)})
+
+
+@bp.route("/api/<int:job_id>/yeniden", methods=["POST"])
+@giris_gerekli
+def api_job_yeniden(job_id):
+    if not _job_erisim(get_job(job_id)):
+        return jsonify({"ok": False, "mesaj": "İş bulunamadı."}), 404
+    if not retry_job(job_id):
+        return jsonify({"ok": False, "mesaj": "Yalnız hatalı veya iptal edilmiş iş yeniden denenebilir."}), 409
+    return jsonify({"ok": True, "job": get_job(job_id)})
+
+
+@bp.route("/api/liste")
+@giris_gerekli
+def api_job_liste():
+    limit = request.args.get("limit", type=int) or 20
+    jobs = [j for j in list_jobs(limit) if _job_erisim(j)]
+    return jsonify({"ok": True, "jobs": jobs})
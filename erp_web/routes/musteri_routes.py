@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from auth import yetki_gerekli, giris_gerekli
 from db import (
     fetch_all,
+    fetch_iter,
     fetch_one,
     execute,
     execute_returning,
@@ -21,7 +22,12 @@ from db import (
     clear_all_customers,
     get_conn,
 )
-from utils.musteri_arama import customers_arama_sql_giris_genis, customers_arama_params_giris_genis
+from utils.musteri_arama import (
+    customers_arama_params_giris_genis,
+    customers_arama_sira_sql_params,
+    customers_arama_sql_giris_genis,
+)
+from utils.musteri_arama_indeks import musteri_arama_indeksi
 from utils.musteri_gorunur import musteri_liste_gorunur_and, request_pasifleri_dahil
 import pandas as pd
 import calendar
@@ -33,6 +39,7 @@ import os
 import sys
 import re
 import threading
+from decimal import Decimal
 from services.cari_service import CariService
 
 _HAZIR_OFIS_ODA_MIN, _HAZIR_OFIS_ODA_MAX = 200, 230
@@ -1233,10 +1240,16 @@ def api_ara():
     q = (request.args.get("q") or "").strip()
     if not q or len(q) < 1:
         return jsonify([])
+    ix = musteri_arama_indeksi()
+    if ix is not None:
+        return jsonify(
+            [{"id": r["id"], "name": r["name"], "musteri_adi": r["musteri_adi"]} for r in ix.ara(q, limit=25)]
+        )
     w3 = customers_arama_sql_giris_genis("")
+    sira, sira_p = customers_arama_sira_sql_params(q, "")
     rows = fetch_all(
-        f"SELECT id, name, musteri_adi FROM customers WHERE {w3} ORDER BY name LIMIT 25",
-        customers_arama_params_giris_genis(q),
+        f"SELECT id, name, musteri_adi FROM customers WHERE {w3} ORDER BY {sira}, name LIMIT 25",
+        tuple(customers_arama_params_giris_genis(q)) + sira_p,
     )
     return jsonify(rows or [])
 
@@ -1726,39 +1739,43 @@ def tumunu_sil():
 @bp.route("/export")
 @giris_gerekli
 def export_excel():
-    """Müşteri listesini Excel olarak dışa aktar"""
+    """Müşteri listesini Excel olarak dışa aktar (satırlar akıtılır; tüm tablo belleğe alınmaz)."""
+    from utils.xlsx_akis import XlsxAkis
+
     tum_yillar_odenmis = request.args.get("tum_yillar_odenmis") == "1"
     if tum_yillar_odenmis:
-        rows = fetch_all("""
+        sql = """
             SELECT c.* FROM customers c
             WHERE NOT EXISTS (
                 SELECT 1 FROM faturalar f
                 WHERE f.musteri_id = c.id AND (f.durum IS NULL OR f.durum != 'odendi')
             )
             ORDER BY c.name
-        """)
+        """
     else:
-        rows = fetch_all("SELECT * FROM customers ORDER BY name")
-    if not rows:
+        sql = "SELECT * FROM customers ORDER BY name"
+    it = fetch_iter(sql, header=True)
+    kolonlar = next(it)
+    ilk = next(it, None)
+    if ilk is None:
+        it.close()
         flash("Dışa aktarılacak müşteri yok.", "warning")
         return redirect(url_for("musteriler.index"))
-    df = pd.DataFrame(rows)
-    for col in list(df.columns):
-        try:
-            df[col] = df[col].apply(
-                lambda x: x.isoformat()[:10] if hasattr(x, "isoformat") and x is not None else (x if x is not None else "")
-            )
-        except Exception:
-            pass
-    buf = BytesIO()
-    df.to_excel(buf, index=False, engine="openpyxl")
-    buf.seek(0)
-    return send_file(
-        buf,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        as_attachment=True,
-        download_name=f"musteriler_{date.today().isoformat()}.xlsx",
-    )
+
+    def _hucre(x):
+        if x is None:
+            return ""
+        if hasattr(x, "isoformat"):
+            return x.isoformat()[:10]
+        if isinstance(x, (str, int, float, Decimal, bool)):
+            return x
+        return str(x)
+
+    x = XlsxAkis("Sheet1")
+    x.satir(kolonlar, "kalin")
+    x.satir([_hucre(v) for v in ilk])
+    x.satirlar([_hucre(v) for v in row] for row in it)
+    return x.yanit(f"musteriler_{date.today().isoformat()}.xlsx")
 
 
 @bp.route("/gemini-analiz")
@@ -2108,9 +2125,10 @@ def api_musteri_ara():
         rows = fetch_all("SELECT id, name, musteri_adi FROM customers ORDER BY name LIMIT 50")
     else:
         w3 = customers_arama_sql_giris_genis("")
+        sira, sira_p = customers_arama_sira_sql_params(q, "")
         rows = fetch_all(
-            f"SELECT id, name, musteri_adi FROM customers WHERE {w3} ORDER BY name LIMIT 30",
-            customers_arama_params_giris_genis(q),
+            f"SELECT id, name, musteri_adi FROM customers WHERE {w3} ORDER BY {sira}, name LIMIT 30",
+            tuple(customers_arama_params_giris_genis(q)) + sira_p,
         )
     return jsonify(rows)
 
@@ -2,10 +2,6 @@
 """
 Personel Devam Takip, İzin Yönetimi, Personel Yönetimi
 """
-import io
-import os
-import sys
-
 from flask import Blueprint, render_template, request, jsonify, Response
 from flask_login import current_user
 from auth import giris_gerekli
@@ -13,12 +9,7 @@ from db import fetch_all, fetch_one, execute, execute_returning
 from datetime import date, datetime, timedelta
 from utils.devam_bulut_sync import sync_devam_gunu_buluta
 from routes.pdovam_routes import pdovam_toplam_fark_dk_for_personel
-
-_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-if _PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, _PROJECT_ROOT)
-
-from izin_form_pdf import izin_formu_olustur
+from services.pdf_servisi import pdf_olustur
 
 
 MESAI_SABAH_DK = 9 * 60
@@ -1421,13 +1412,11 @@ def api_izin_pdf(izin_id):
         except (ValueError, TypeError):
             pass
     data = _izin_pdf_data_from_row(dict(row), izin_bakiye)
-    buf = io.BytesIO()
     try:
-        izin_formu_olustur(data, buf)
+        pdf_bytes = pdf_olustur("izin_formu", data)
     except Exception as e:
         return jsonify({"ok": False, "mesaj": str(e)}), 500
 
-    pdf_bytes = buf.getvalue()
     import unicodedata
     ad_raw = str(row.get("ad_soyad") or "izin")
     ad_slug = unicodedata.normalize('NFKD', ad_raw)
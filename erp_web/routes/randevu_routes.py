@@ -6,7 +6,12 @@ Toplantı Odası ve Randevu Takip Sistemi
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required
 from db import fetch_all, fetch_one, execute, execute_returning
-from utils.musteri_arama import customers_arama_sql_randevu, customers_arama_params_6_randevu
+from utils.musteri_arama import (
+    customers_arama_params_6_randevu,
+    customers_arama_sira_sql_params,
+    customers_arama_sql_randevu,
+)
+from utils.musteri_arama_indeks import musteri_arama_indeksi
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal
 
@@ -263,13 +268,18 @@ def api_rapor():
 def api_musteriler():
     """Müşteri/firma arama: geniş kart+KYC alanları + notlar (customers.notes)."""
     q = (request.args.get("q") or "").strip()[:80]
+    ix = musteri_arama_indeksi() if q else None
     if not q:
         rows = fetch_all("SELECT id, name, musteri_adi, phone FROM customers ORDER BY name LIMIT 30")
+    elif ix is not None:
+        # customers.notes belge metninde: randevu ek koşulu indekste de karşılanır.
+        rows = ix.ara(q, limit=30)
     else:
         w = customers_arama_sql_randevu()
+        sira, sira_p = customers_arama_sira_sql_params(q, "")
         rows = fetch_all(
-            f"SELECT id, name, musteri_adi, phone FROM customers WHERE {w} ORDER BY name LIMIT 30",
-            customers_arama_params_6_randevu(q),
+            f"SELECT id, name, musteri_adi, phone FROM customers WHERE {w} ORDER BY {sira}, name LIMIT 30",
+            tuple(customers_arama_params_6_randevu(q)) + sira_p,
         )
     return jsonify(
         [
@@ -3,7 +3,7 @@
 """
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, abort
 from auth import giris_gerekli, admin_gerekli
-from db import fetch_all, fetch_one, execute, execute_returning
+from db import fetch_all, fetch_one, execute, execute_returning, ensure_urunler_kdv_column
 
 bp = Blueprint("urunler", __name__)
 
@@ -11,7 +11,7 @@ bp = Blueprint("urunler", __name__)
 def _ensure_urunler_kdv_column():
     """urunler tablosuna kdv_orani kolonu yoksa ekle (tek seferlik)."""
     try:
-        execute("ALTER TABLE urunler ADD COLUMN IF NOT EXISTS kdv_orani INTEGER DEFAULT 20")
+        ensure_urunler_kdv_column()
     except Exception:
         # Eski Postgres sürümlerinde veya yetki sorununda ana akışı bozmasın
         return
@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request
 from datetime import date, datetime
-from db import fetch_all, fetch_one, execute
+from db import fetch_all, fetch_one, execute, ensure_whatsapp_geciken_haric_table
 from auth import giris_gerekli
 
 bp = Blueprint('whatsapp', __name__, url_prefix='/whatsapp')
@@ -13,14 +13,7 @@ def _ensure_whatsapp_geciken_haric_table():
     if _WHATSAPP_GECIKEN_HARIC_TABLE_READY:
         return
     try:
-        execute(
-            """
-            CREATE TABLE IF NOT EXISTS whatsapp_geciken_haric (
-                musteri_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
-                created_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-            """
-        )
+        ensure_whatsapp_geciken_haric_table()
     except Exception:
         pass
     _WHATSAPP_GECIKEN_HARIC_TABLE_READY = True
@@ -71,7 +64,7 @@ def api_geciken_liste():
     bugun = date.today()
     from routes.giris_routes import (
         musteri_firma_ozet_grid_ozet_batch,
-        _aylik_grid_contract_core,
+        _aylik_grid_contract_cores_batch,
         _musteri_aylik_grid_customer_kyc_select_sql,
         _firma_ozet_kyc_dict_from_grid_sql_row,
         _tufe_map_by_year_month_cached,
@@ -126,6 +119,7 @@ def api_geciken_liste():
         tufe_map_local = _tufe_map_by_year_month_cached()
         base_sql_local = _musteri_aylik_grid_customer_kyc_select_sql()
         kyc_rows_local = fetch_all(base_sql_local + " WHERE c.id = ANY(%s)", (musteri_ids_all,)) or []
+        kyc_by_mid_k = {}
         for kr in kyc_rows_local:
             try:
                 mid_k = int(kr.get('id') or 0)
@@ -134,10 +128,11 @@ def api_geciken_liste():
             if mid_k <= 0:
                 continue
             kyc_for_grid_k = _firma_ozet_kyc_dict_from_grid_sql_row(kr)
-            if not kyc_for_grid_k:
-                continue
+            if kyc_for_grid_k:
+                kyc_by_mid_k[mid_k] = kyc_for_grid_k
+        cores_k = _aylik_grid_contract_cores_batch(list(kyc_by_mid_k.values()), tufe_map_local)
+        for mid_k, core_k in zip(kyc_by_mid_k, cores_k):
             try:
-                core_k = _aylik_grid_contract_core(kyc_for_grid_k, tufe_map_local)
                 if core_k and isinstance(core_k.get('yillik_map'), dict):
                     ik = core_k['yillik_map'].get(core_k.get('start_year'))
                     if ik is not None:
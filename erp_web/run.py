@@ -2,7 +2,8 @@
 Render / gunicorn run:app için giriş noktası.
 Flask uygulaması app.py'de tanımlı.
 """
-from app import app
+from app import _start_job_workers, app
 
 if __name__ == "__main__":
+    _start_job_workers()
     app.run(host="0.0.0.0", port=int(__import__("os").environ.get("PORT", 5000)))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Fatura durum sütunları (gib_taslak, erp_taslak, gib_imzali, gib_no_tasindi) ile
+notlar regex'lerinin aynı sonucu verdiğini doğrular (db.fatura_not_durum_farklari).
+
+Kullanım (erp_web içinde):
+  python scripts/fatura_not_durum_dogrula.py
+  python scripts/fatura_not_durum_dogrula.py --tenant tenant_ornek
+
+Uyuşmazlık varsa çıkış kodu 1. Sorgular geçici olarak regex'e döndürülecekse:
+FATURA_NOT_DURUM_REGEX=1.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+load_dotenv(ROOT / ".env")
+sys.path.insert(0, str(ROOT))
+
+from db import ensure_faturalar_not_durum_kolonlari, fatura_not_durum_farklari, tenant_schema_scope  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tenant", default=None, help="Kiracı şeması (tenant_...); boş → public")
+    a = ap.parse_args()
+
+    with tenant_schema_scope(a.tenant):
+        ensure_faturalar_not_durum_kolonlari()
+        farklar = fatura_not_durum_farklari()
+    toplam = farklar.pop("toplam", 0)
+    print(f"{toplam} fatura")
+    hatali = 0
+    for ad, adet in farklar.items():
+        print(f"  {ad}: {'OK' if not adet else f'{adet} uyuşmazlık'}")
+        hatali += adet
+    if hatali:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Ay sonu toplu cari ekstre: filtreye uyan müşterilerin Excel ekstrelerini tek ZIP'e yazar
+(/api/cari-ekstre-toplu ile aynı çekirdek: services/cari_ekstre_toplu.py).
+
+Kullanım (erp_web içinde):
+  python scripts/toplu_cari_ekstre.py --cikti ekstre_2026_09.zip --bas 2026-09-01 --bit 2026-09-30
+  python scripts/toplu_cari_ekstre.py --cikti sanal.zip --hizmet-turu "Sanal Ofis" --grup2 bizim_hesap
+  python scripts/toplu_cari_ekstre.py --cikti pasifler.zip --tum --musteri-id 357 --musteri-id 412
+  python scripts/toplu_cari_ekstre.py --tenant tenant_ornek --cikti ekstre.zip
+
+Tarih verilmezse her müşteri tekil ekstrenin varsayılan aralığını alır.
+Çizim süreç sayısı: CARI_EKSTRE_TOPLU_PROCESSES (boş → CPU, en çok 4).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+load_dotenv(ROOT / ".env")
+sys.path.insert(0, str(ROOT))
+
+from db import tenant_schema_scope  # noqa: E402
+from services.cari_ekstre_toplu import toplu_ekstre_musteri_idleri, toplu_ekstre_zip_yaz  # noqa: E402
+
+
+def _tarih(s):
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s[:10], "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise SystemExit(f"Tarih biçimi YYYY-MM-DD olmalı: {s}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cikti", required=True, help="ZIP dosya yolu")
+    ap.add_argument("--bas", help="Başlangıç (YYYY-MM-DD)")
+    ap.add_argument("--bit", help="Bitiş (YYYY-MM-DD)")
+    ap.add_argument("--tum", action="store_true", help="Pasif müşteriler dahil")
+    ap.add_argument("--grup2", action="append", default=[], help="Grup 2 slug (tekrarlanabilir; hepsi olmalı)")
+    ap.add_argument("--hizmet-turu", action="append", default=[], help="Hizmet türü (tekrarlanabilir)")
+    ap.add_argument("--musteri-id", action="append", type=int, default=[], help="Yalnız bu müşteriler")
+    ap.add_argument("--tenant", default=None, help="Kiracı şeması (tenant_...); boş → public")
+    a = ap.parse_args()
+    bas, bit = _tarih(a.bas), _tarih(a.bit)
+
+    with tenant_schema_scope(a.tenant):
+        ids = a.musteri_id or toplu_ekstre_musteri_idleri(
+            sadece_aktif=not a.tum, grup2=a.grup2, hizmet_turleri=a.hizmet_turu
+        )
+        print(f"{len(ids)} müşteri")
+        if not ids:
+            return
+        t0 = time.monotonic()
+        son = [0.0]
+
+        def _ilerleme(yapilan, toplam):
+            now = time.monotonic()
+            if now - son[0] >= 1.0 or yapilan >= toplam:
+                son[0] = now
+                print(f"  {yapilan}/{toplam}", flush=True)
+
+        sonuc = toplu_ekstre_zip_yaz(ids, a.cikti, baslangic=bas, bitis=bit, ilerleme=_ilerleme)
+    print(
+        f"Yazıldı: {a.cikti} ({sonuc['adet']} ekstre, {sonuc['boyut'] / 1024 / 1024:.1f} MB, "
+        f"{time.monotonic() - t0:.1f} sn)"
+    )
+    for h in sonuc["hatalar"]:
+        print(f"  HATA musteri_id={h['musteri_id']}: {h['mesaj']}")
+    if sonuc["hata_sayisi"] > len(sonuc["hatalar"]):
+        print(f"  ... toplam {sonuc['hata_sayisi']} hata (tamamı ZIP içinde HATALAR.txt)")
+
+
+if __name__ == "__main__":
+    main()
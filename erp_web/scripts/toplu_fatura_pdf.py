@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Toplu fatura / makbuz PDF: filtreye uyan belgeleri tek ZIP'e veya yer imli tek PDF'e yazar
+(/faturalar/api/toplu-pdf ile aynı çekirdek: services/fatura_pdf_toplu.py).
+
+Kullanım (erp_web içinde):
+  python scripts/toplu_fatura_pdf.py --cikti faturalar_2026_09.zip --bas 2026-09-01 --bit 2026-09-30
+  python scripts/toplu_fatura_pdf.py --tur makbuz --cikti makbuz_0930.pdf --bas 2026-09-30 --bit 2026-09-30
+  python scripts/toplu_fatura_pdf.py --cikti sanal.zip --bas 2026-09-01 --hizmet-turu "Sanal Ofis"
+  python scripts/toplu_fatura_pdf.py --tenant tenant_ornek --cikti f.zip --musteri-id 357 --musteri-id 412
+
+Çıktı uzantısı .pdf ise tek PDF (pypdf gerekir, en çok TOPLU_PDF_BIRLESIK_MAX belge), değilse ZIP.
+Çizim süreç sayısı: PDF_SERVIS_PROCESSES (boş → CPU, en çok 2).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+load_dotenv(ROOT / ".env")
+sys.path.insert(0, str(ROOT))
+
+from db import tenant_schema_scope  # noqa: E402
+from services.fatura_pdf_toplu import toplu_pdf_yaz  # noqa: E402
+
+
+def _tarih(s):
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s[:10], "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise SystemExit(f"Tarih biçimi YYYY-MM-DD olmalı: {s}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cikti", required=True, help="ZIP veya PDF dosya yolu")
+    ap.add_argument("--tur", choices=("fatura", "makbuz"), default="fatura")
+    ap.add_argument("--bas", help="Başlangıç (YYYY-MM-DD)")
+    ap.add_argument("--bit", help="Bitiş (YYYY-MM-DD)")
+    ap.add_argument("--hizmet-turu", action="append", default=[], help="Hizmet türü (tekrarlanabilir)")
+    ap.add_argument("--musteri-id", action="append", type=int, default=[], help="Yalnız bu müşteriler")
+    ap.add_argument("--taslaklar", action="store_true", help="GİB / ERP taslak faturalar dahil")
+    ap.add_argument("--tenant", default=None, help="Kiracı şeması (tenant_...); boş → public")
+    a = ap.parse_args()
+    bas, bit = _tarih(a.bas), _tarih(a.bit)
+    if not (bas or bit or a.musteri_id):
+        raise SystemExit("Tarih aralığı (--bas / --bit) veya --musteri-id verin.")
+    bicim = "pdf" if a.cikti.lower().endswith(".pdf") else "zip"
+
+    t0 = time.monotonic()
+    son = [0.0]
+
+    def _ilerleme(yapilan, toplam):
+        now = time.monotonic()
+        if now - son[0] >= 1.0 or yapilan >= toplam:
+            son[0] = now
+            print(f"  {yapilan}/{toplam}", flush=True)
+
+    with tenant_schema_scope(a.tenant):
+        try:
+            sonuc = toplu_pdf_yaz(
+                a.tur,
+                a.cikti,
+                bicim=bicim,
+                baslangic=bas,
+                bitis=bit,
+                musteri_ids=a.musteri_id,
+                hizmet_turleri=a.hizmet_turu,
+                taslaklar_dahil=a.taslaklar,
+                ilerleme=_ilerleme,
+            )
+        except ValueError as e:
+            raise SystemExit(str(e))
+    print(
+        f"Yazıldı: {a.cikti} ({sonuc['adet']}/{sonuc['toplam']} belge, {sonuc['boyut'] / 1024 / 1024:.1f} MB, "
+        f"{time.monotonic() - t0:.1f} sn)"
+    )
+    for h in sonuc["hatalar"]:
+        print(f"  HATA {h['belge']}: {h['mesaj']}")
+    if sonuc["hata_sayisi"] > len(sonuc["hatalar"]):
+        print(f"  ... toplam {sonuc['hata_sayisi']} hata")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Toplu cari ekstre (ay sonu): filtrelenen müşterilerin Excel ekstreleri tek ZIP'te.
+
+- ``toplu_ekstre_musteri_idleri``: aktif / Grup 2 / hizmet türü filtresiyle müşteri listesi.
+- ``toplu_ekstre_zip_yaz``: payload'lar ``AYLIK_GRID_BULK_BATCH``'lik partiler hâlinde grid
+  toplu kapsamında (KYC, reel, panel, tahsilat set tabanlı önceden yüklü) hesaplanır; Excel
+  çizimi süreç havuzunda (spawn) yapılır, ZIP diske akıtılır; ilerleme ``job_progress`` ile.
+- ``cari_ekstre_workbook_bytes``: tekil Excel export'un da kullandığı çizici.
+
+Havuz çocukları bu modülü içe aktarır; modül üstünde yalnız stdlib var (DB / Flask
+içe aktarımları fonksiyon içinde).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sys
+import zipfile
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Havuz bu sayının altındaki işlerde açılmaz (süreç başlatma maliyeti çizimden pahalı).
+TOPLU_EKSTRE_MIN_HAVUZ = 16
+
+
+def cari_ekstre_workbook_bytes(payload, bas_iso, bit_iso):
+    """Cari ekstre Excel'i (başa sarılmış dosya) — tekil export ve toplu ZIP aynı çizici."""
+    from utils.xlsx_akis import XlsxAkis
+
+    x = XlsxAkis(
+        "Cari Ekstre",
+        font_adi="Arial",
+        font_boyut=11,
+        genislikler={"A": 12, "B": 45, "C": 14, "D": 14, "E": 14},
+    )
+    x.birlestir("A1:E1")
+    x.satir(["CARİ EKSTRE"], "baslik")
+    x.satir(["Müşteri:", payload.get("musteri_adi") or ""], ("kalin", None))
+    x.satir(["Dönem:", f"{bas_iso} - {bit_iso}"], ("kalin", None))
+    x.bos()
+    header_row = x.satir(["Tarih", "Açıklama", "Borç", "Alacak", "Bakiye"], "tablo_baslik")
+
+    hareketler = payload.get("hareketler") or []
+    n = x.satirlar(
+        (
+            [
+                h.get("tarih") or "",
+                h.get("aciklama") or "",
+                float(h.get("borc") or 0),
+                float(h.get("alacak") or 0),
+                float(h.get("bakiye") or 0),
+            ]
+            for h in hareketler
+        ),
+        stiller=(None, None, "para", "para", "para"),
+    )
+    if n:
+        last_data_row = header_row + n
+        x.bos()
+        x.satir(
+            [
+                None,
+                "TOPLAM",
+                f"=SUM(C{header_row + 1}:C{last_data_row})",
+                f"=SUM(D{header_row + 1}:D{last_data_row})",
+                f"=E{last_data_row}",
+            ],
+            (None, "kalin", "para_kalin", "para_kalin", "para_kalin"),
+        )
+    return x.dosya()
+
+
+def _cizim_surec_sayisi(n: int) -> int:
+    """CARI_EKSTRE_TOPLU_PROCESSES: 1/off → tek süreç; boş/auto → CPU (en çok 4; Windows'ta 1)."""
+    raw = (os.environ.get("CARI_EKSTRE_TOPLU_PROCESSES") or "").strip().lower()
+    if raw in ("1", "off", "false", "0"):
+        return 1
+    if raw.isdigit():
+        w = int(raw)
+    elif sys.platform == "win32":
+        return 1
+    else:
+        w = min(os.cpu_count() or 1, 4)
+    return max(1, min(w, max(1, n)))
+
+
+def _zip_dosya_adi(musteri_id: int, payload: dict) -> str:
+    ad = re.sub(r"[^\w\-]+", "_", str(payload.get("musteri_adi") or "musteri"), flags=re.UNICODE).strip("_")
+    return f"{int(musteri_id):05d}_{(ad or 'musteri')[:80]}.xlsx"
+
+
+def _cizim_isi(musteri_id: int, payload: dict) -> tuple[str, bytes]:
+    """Havuz işçisi: (ZIP içi ad, xlsx baytları)."""
+    with cari_ekstre_workbook_bytes(payload, payload.get("bas_iso") or "", payload.get("bit_iso") or "") as f:
+        return _zip_dosya_adi(musteri_id, payload), f.read()
+
+
+def toplu_ekstre_musteri_idleri(sadece_aktif=True, grup2=None, hizmet_turleri=None) -> list[int]:
+    """Filtreye uyan müşteri id'leri (id sırasıyla).
+
+    grup2: seçilen tüm etiketler caride işaretli olmalı (müşteri listesi ``@>`` kuralı).
+    hizmet_turleri: son KYC, yoksa customers hizmet türü (büyük/küçük harf duyarsız).
+    """
+    from db import fetch_all
+
+    sql = """
+        SELECT c.id
+        FROM customers c
+        LEFT JOIN LATERAL (
+            SELECT mkx.hizmet_turu
+            FROM musteri_kyc mkx
+            WHERE mkx.musteri_id = c.id
+            ORDER BY mkx.id DESC
+            LIMIT 1
+        ) mk ON TRUE
+        WHERE TRUE
+    """
+    params: list = []
+    if sadece_aktif:
+        sql += """
+          AND COALESCE(c.is_active, TRUE) = TRUE
+          AND LOWER(TRIM(COALESCE(c.durum, ''))) = 'aktif'
+        """
+    slugs = [str(s).strip() for s in (grup2 or []) if str(s).strip()]
+    if slugs:
+        sql += """
+          AND (
+            COALESCE(c.grup2_secimleri, ARRAY[]::text[])
+            || CASE WHEN COALESCE(c.bizim_hesap, FALSE) THEN ARRAY['bizim_hesap']::text[] ELSE ARRAY[]::text[] END
+            || CASE WHEN COALESCE(NULLIF(TRIM(COALESCE(c.vergi_dairesi, '')), ''), '') != ''
+                    THEN ARRAY['vergi_dairesi']::text[] ELSE ARRAY[]::text[] END
+          ) @> %s::text[]
+        """
+        params.append(slugs)
+    turler = sorted({str(h).strip().lower() for h in (hizmet_turleri or []) if str(h).strip()})
+    if turler:
+        sql += """
+          AND LOWER(TRIM(COALESCE(NULLIF(TRIM(mk.hizmet_turu), ''), NULLIF(TRIM(c.hizmet_turu), ''), ''))) = ANY(%s)
+        """
+        params.append(turler)
+    sql += " ORDER BY c.id"
+    return [int(r["id"]) for r in (fetch_all(sql, tuple(params)) or [])]
+
+
+def toplu_ekstre_zip_yaz(musteri_ids, hedef_yol: str, baslangic=None, bitis=None, ilerleme=None) -> dict:
+    """Müşterilerin cari ekstrelerini ``hedef_yol`` ZIP'ine yazar (önce ``.part``, bitince yeniden adlandırılır).
+
+    baslangic / bitis (YYYY-MM-DD) boşsa her müşteri tekil ekstrenin varsayılan aralığını alır.
+    ilerleme: ``(yapilan, toplam)`` çağrılabilir (CLI); iş içinde ayrıca ``job_progress`` yazılır.
+    Hesaplanamayan müşteriler ZIP'teki HATALAR.txt'ye ve sonuçtaki ``hatalar`` listesine düşer.
+    """
+    from werkzeug.datastructures import MultiDict
+
+    from routes.giris_routes import (
+        AYLIK_GRID_BULK_BATCH,
+        _aylik_grid_bulk_scope,
+        _cari_ekstre_build_payload,
+        _load_max_aylik_tah_iso_by_musteri,
+    )
+    from services.job_queue import job_progress
+
+    ids = [int(m) for m in musteri_ids if m and int(m) > 0]
+    toplam = len(ids)
+    hatalar: list[dict] = []
+    yazilan = 0
+    yapilan = 0
+
+    def _ilerle(mesaj=None):
+        job_progress(yapilan, toplam, mesaj)
+        if ilerleme is not None:
+            ilerleme(yapilan, toplam)
+
+    os.makedirs(os.path.dirname(os.path.abspath(hedef_yol)), exist_ok=True)
+    gecici = hedef_yol + ".part"
+    surec = _cizim_surec_sayisi(toplam) if toplam >= TOPLU_EKSTRE_MIN_HAVUZ else 1
+    havuz = None
+    if surec > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        havuz = ProcessPoolExecutor(max_workers=surec, mp_context=multiprocessing.get_context("spawn"))
+    # Çizimi bekleyen işler: pencere dolunca en eskisi ZIP'e yazılır (bellekte en çok ~4×süreç ekstre).
+    bekleyen: deque = deque()
+    try:
+        # xlsx zaten sıkıştırılmış: STORED ile CPU harcanmaz, boyut neredeyse aynı.
+        with zipfile.ZipFile(gecici, "w", zipfile.ZIP_STORED) as zf:
+
+            def _yaz(ad, veri):
+                nonlocal yazilan, yapilan
+                zf.writestr(ad, veri)
+                yazilan += 1
+                yapilan += 1
+                _ilerle()
+
+            def _bosalt(sinir):
+                nonlocal yapilan
+                while len(bekleyen) > sinir:
+                    mid, fut = bekleyen.popleft()
+                    try:
+                        _yaz(*fut.result())
+                    except Exception as e:
+                        log.exception("toplu ekstre çizim musteri_id=%s", mid)
+                        hatalar.append({"musteri_id": mid, "mesaj": f"Excel oluşturulamadı: {e}"})
+                        yapilan += 1
+                        _ilerle()
+
+            _ilerle("Ekstreler hazırlanıyor")
+            max_by_mid = _load_max_aylik_tah_iso_by_musteri(exclude_btufrt=True, only_fully_paid=True)
+            for i in range(0, toplam, AYLIK_GRID_BULK_BATCH):
+                parti = ids[i : i + AYLIK_GRID_BULK_BATCH]
+                with _aylik_grid_bulk_scope(parti):
+                    for mid in parti:
+                        args = MultiDict({"musteri_id": str(mid)})
+                        if baslangic:
+                            args["baslangic"] = str(baslangic)[:10]
+                        if bitis:
+                            args["bitis"] = str(bitis)[:10]
+                        try:
+                            payload, err = _cari_ekstre_build_payload(args, max_by_mid=max_by_mid)
+                        except Exception as e:
+                            log.exception("toplu ekstre musteri_id=%s", mid)
+                            payload, err = None, (f"Ekstre hesaplanamadı: {e}", 500)
+                        if err:
+                            hatalar.append({"musteri_id": mid, "mesaj": err[0]})
+                            yapilan += 1
+                            _ilerle()
+                            continue
+                        if havuz is None:
+                            _yaz(*_cizim_isi(mid, payload))
+                        else:
+                            bekleyen.append((mid, havuz.submit(_cizim_isi, mid, payload)))
+                            _bosalt(surec * 4)
+            _bosalt(0)
+            if hatalar:
+                zf.writestr(
+                    "HATALAR.txt",
+                    "\n".join(f"{h['musteri_id']}\t{h['mesaj']}" for h in hatalar) + "\n",
+                )
+        os.replace(gecici, hedef_yol)
+    finally:
+        if havuz is not None:
+            havuz.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(gecici):
+            try:
+                os.remove(gecici)
+            except OSError:
+                pass
+    return {
+        "ok": True,
+        "adet": yazilan,
+        "toplam": toplam,
+        "hata_sayisi": len(hatalar),
+        "hatalar": hatalar[:50],
+        "boyut": os.path.getsize(hedef_yol),
+    }
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""Toplu fatura / makbuz PDF dışa aktarımı (ay sonu arşiv, gün sonu tahsilat makbuzları).
+
+- ``toplu_pdf_yaz(tur, hedef_yol, ...)``: filtreye uyan faturaların (``tur="fatura"``) veya
+  tahsilat makbuzlarının (``tur="makbuz"``) PDF'lerini tek ZIP'e ya da yer imli tek PDF'e yazar.
+- Veri tek akış sorgusuyla gelir (fetch_iter): fatura + satirlar_json + müşteri + son KYC
+  (makbuzda tahsilat + müşteri + fatura no; banka hesapları bir kez). Satır başına sorgu yok.
+- Çizim ``services.pdf_servisi.pdf_toplu`` ile süreç havuzunda; girdiler tekil önizleme
+  ekranlarıyla aynı olduğundan daha önce önizlenmiş belgeler disk önbelleğinden okunur.
+- ZIP diske akıtılır (önce ``.part``); birleşik PDF ``pypdf`` ister ve
+  ``TOPLU_PDF_BIRLESIK_MAX`` belgeyle sınırlıdır (tamamı bellekte birleştirilir).
+- İlerleme ``job_progress`` ve isteğe bağlı ``ilerleme(yapilan, toplam)`` ile.
+
+Çizilemeyen belgeler ZIP'te HATALAR.txt'ye ve sonuçtaki ``hatalar`` listesine düşer.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import time
+import zipfile
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+TOPLU_PDF_TURLERI = ("fatura", "makbuz")
+TOPLU_PDF_BICIMLERI = ("zip", "pdf")
+
+# Toplu PDF çıktıları: kiracı başına dizin; TOPLU_PDF_SAKLAMA_SAAT (varsayılan 24) sonra silinir.
+TOPLU_PDF_KLASOR = os.path.join("uploads", "toplu_pdf")
+
+
+def _env_int(ad: str, varsayilan: int) -> int:
+    try:
+        return int((os.environ.get(ad) or "").strip() or varsayilan)
+    except ValueError:
+        return varsayilan
+
+
+TOPLU_PDF_BIRLESIK_MAX = max(1, _env_int("TOPLU_PDF_BIRLESIK_MAX", 500))
+
+_HIZMET_TURU_SQL = (
+    "LOWER(TRIM(COALESCE(NULLIF(TRIM(mk.hizmet_turu), ''), NULLIF(TRIM(c.hizmet_turu), ''), '')))"
+)
+
+
+def toplu_pdf_dizin() -> str:
+    from db import _tenant_schema_for_request
+
+    return os.path.join(TOPLU_PDF_KLASOR, _tenant_schema_for_request() or "public")
+
+
+def toplu_pdf_eskileri_sil(dizin: str) -> None:
+    try:
+        saat = float(os.environ.get("TOPLU_PDF_SAKLAMA_SAAT") or 24)
+    except ValueError:
+        saat = 24.0
+    sinir = time.time() - max(1.0, saat) * 3600.0
+    try:
+        adlar = os.listdir(dizin)
+    except OSError:
+        return
+    for ad in adlar:
+        yol = os.path.join(dizin, ad)
+        try:
+            if os.path.getmtime(yol) < sinir:
+                os.remove(yol)
+        except OSError:
+            continue
+
+
+def _filtre(tarih_sql: str, musteri_sql: str, baslangic, bitis, musteri_ids, hizmet_turleri) -> tuple[str, list]:
+    sql = ""
+    params: list = []
+    if baslangic:
+        sql += f" AND {tarih_sql} >= %s::date"
+        params.append(str(baslangic)[:10])
+    if bitis:
+        sql += f" AND {tarih_sql} <= %s::date"
+        params.append(str(bitis)[:10])
+    ids = sorted({int(m) for m in (musteri_ids or []) if str(m).strip().isdigit() and int(m) > 0})
+    if ids:
+        sql += f" AND {musteri_sql} = ANY(%s)"
+        params.append(ids)
+    turler = sorted({str(h).strip().lower() for h in (hizmet_turleri or []) if str(h).strip()})
+    if turler:
+        sql += f" AND {_HIZMET_TURU_SQL} = ANY(%s)"
+        params.append(turler)
+    return sql, params
+
+
+def _fatura_sorgusu(baslangic, bitis, musteri_ids, hizmet_turleri, taslaklar_dahil) -> tuple[str, list]:
+    from db import sql_expr_fatura_not_gib_taslak
+
+    kosul, params = _filtre("f.fatura_tarihi", "f.musteri_id", baslangic, bitis, musteri_ids, hizmet_turleri)
+    if not taslaklar_dahil:
+        kosul += " AND " + sql_expr_fatura_not_gib_taslak("f.notlar")
+    sql = f"""
+        FROM faturalar f
+        LEFT JOIN customers c ON c.id = f.musteri_id
+        LEFT JOIN LATERAL (
+            SELECT k.vergi_dairesi, k.vergi_no, k.yeni_adres, k.hizmet_turu
+            FROM musteri_kyc k
+            WHERE k.musteri_id = f.musteri_id
+            ORDER BY k.id DESC
+            LIMIT 1
+        ) mk ON TRUE
+        WHERE TRUE {kosul}
+    """
+    return sql, params
+
+
+def _makbuz_sorgusu(baslangic, bitis, musteri_ids, hizmet_turleri) -> tuple[str, list]:
+    kosul, params = _filtre(
+        "t.tahsilat_tarihi", "COALESCE(t.customer_id, t.musteri_id)", baslangic, bitis, musteri_ids, hizmet_turleri
+    )
+    sql = f"""
+        FROM tahsilatlar t
+        LEFT JOIN customers c ON COALESCE(t.customer_id, t.musteri_id) = c.id
+        LEFT JOIN faturalar fa ON fa.id = t.fatura_id
+        LEFT JOIN LATERAL (
+            SELECT k.hizmet_turu
+            FROM musteri_kyc k
+            WHERE k.musteri_id = c.id
+            ORDER BY k.id DESC
+            LIMIT 1
+        ) mk ON TRUE
+        WHERE TRUE {kosul}
+    """
+    return sql, params
+
+
+def _guvenli_ad(s, varsayilan: str) -> str:
+    ad = re.sub(r"[^\w\-]+", "_", str(s or ""), flags=re.UNICODE).strip("_")
+    return (ad or varsayilan)[:80]
+
+
+def _fatura_isleri(baslangic, bitis, musteri_ids, hizmet_turleri, taslaklar_dahil):
+    """(toplam, iş üreteci); iş = (ZIP adı, yer imi, tür, args, kwargs)."""
+    from db import fetch_iter, fetch_one
+    from routes.faturalar_routes import _fatura_pdf_girdileri, _fatura_pdf_musteri
+
+    govde, params = _fatura_sorgusu(baslangic, bitis, musteri_ids, hizmet_turleri, taslaklar_dahil)
+    toplam = int((fetch_one("SELECT COUNT(*) AS n " + govde, tuple(params)) or {}).get("n") or 0)
+
+    def _uret():
+        it = fetch_iter(
+            f"""
+            SELECT f.id, f.fatura_no, f.fatura_tarihi, f.musteri_id, f.musteri_adi, f.tutar, f.kdv_tutar,
+                   f.toplam, f.notlar, f.satirlar_json, f.sevk_adresi, f.ettn,
+                   c.id AS c_id, c.name AS c_name, c.address AS c_address, c.tax_number AS c_tax_number,
+                   c.vergi_dairesi AS c_vergi_dairesi,
+                   mk.vergi_dairesi AS k_vergi_dairesi, mk.vergi_no AS k_vergi_no, mk.yeni_adres AS k_yeni_adres
+            {govde}
+            ORDER BY f.fatura_tarihi, f.id
+            """,
+            tuple(params),
+            batch_size=500,
+            header=True,
+        )
+        try:
+            basliklar = next(it, None)
+            for tup in it:
+                r = dict(zip(basliklar, tup))
+                cust = {k[2:]: r.pop(k) for k in list(r) if k.startswith("c_")}
+                kyc = {k[2:]: r.pop(k) for k in list(r) if k.startswith("k_")}
+                musteri = _fatura_pdf_musteri(r, cust if cust.get("id") else None, kyc)
+                fatura, satirlar = _fatura_pdf_girdileri(r)
+                no = r.get("fatura_no") or f"id{r['id']}"
+                tarih = str(r.get("fatura_tarihi") or "")[:10]
+                yield (
+                    f"{tarih}_{_guvenli_ad(no, 'fatura')}_{_guvenli_ad(musteri.get('name'), 'musteri')}.pdf",
+                    f"{no} — {musteri.get('name') or ''} ({r.get('fatura_tarihi_str') or tarih})",
+                    "fatura",
+                    (fatura, musteri, satirlar),
+                    {},
+                )
+        finally:
+            it.close()
+
+    return toplam, _uret()
+
+
+def _makbuz_isleri(baslangic, bitis, musteri_ids, hizmet_turleri):
+    from db import fetch_all, fetch_iter, fetch_one
+    from routes.faturalar_routes import _ensure_tahsil_eden_column
+
+    _ensure_tahsil_eden_column()
+    govde, params = _makbuz_sorgusu(baslangic, bitis, musteri_ids, hizmet_turleri)
+    toplam = int((fetch_one("SELECT COUNT(*) AS n " + govde, tuple(params)) or {}).get("n") or 0)
+    banka_hesaplar = fetch_all(
+        "SELECT banka_adi, hesap_adi, iban FROM banka_hesaplar WHERE COALESCE(is_active::int, 1) = 1 AND (iban IS NOT NULL AND iban != '') ORDER BY banka_adi"
+    )
+
+    def _uret():
+        # Sütunlar tahsilat_pdf ile aynı: girdiler (dolayısıyla PDF önbellek anahtarı) ortak.
+        it = fetch_iter(
+            f"""
+            SELECT t.id, t.makbuz_no, t.tutar, t.odeme_turu, t.tahsilat_tarihi, t.aciklama, t.created_at, t.fatura_id,
+                   t.tahsil_eden,
+                   t.cek_detay, t.havale_banka, c.name as musteri_adi,
+                   fa.fatura_no AS fa_fatura_no
+            {govde}
+            ORDER BY t.tahsilat_tarihi, t.id
+            """,
+            tuple(params),
+            batch_size=1000,
+            header=True,
+        )
+        try:
+            basliklar = next(it, None)
+            for tup in it:
+                row = dict(zip(basliklar, tup))
+                fatura_no = row.pop("fa_fatura_no", None)
+                no = row.get("makbuz_no") or f"id{row['id']}"
+                tarih = str(row.get("tahsilat_tarihi") or "")[:10]
+                yield (
+                    f"{tarih}_{_guvenli_ad(no, 'makbuz')}_{_guvenli_ad(row.get('musteri_adi'), 'musteri')}.pdf",
+                    f"{no} — {row.get('musteri_adi') or ''} ({tarih})",
+                    "makbuz",
+                    (row, row.get("musteri_adi"), fatura_no),
+                    {"banka_hesaplar": banka_hesaplar},
+                )
+        finally:
+            it.close()
+
+    return toplam, _uret()
+
+
+def toplu_pdf_yaz(
+    tur: str,
+    hedef_yol: str,
+    bicim: str = "zip",
+    baslangic=None,
+    bitis=None,
+    musteri_ids=None,
+    hizmet_turleri=None,
+    taslaklar_dahil: bool = False,
+    ilerleme=None,
+) -> dict:
+    """Filtreye uyan fatura / makbuz PDF'lerini ``hedef_yol``'a yazar (önce ``.part``).
+
+    bicim: ``zip`` (belge başına bir PDF) veya ``pdf`` (tek PDF, belge başına yer imi).
+    baslangic / bitis: fatura tarihi / tahsilat tarihi (YYYY-MM-DD, dahil).
+    taslaklar_dahil: yalnız fatura; GİB / ERP taslakları varsayılan olarak hariç.
+    """
+    from services.job_queue import job_progress
+    from services.pdf_servisi import pdf_toplu
+
+    if tur not in TOPLU_PDF_TURLERI:
+        raise ValueError(f"tur: {' / '.join(TOPLU_PDF_TURLERI)} olmalı")
+    if bicim not in TOPLU_PDF_BICIMLERI:
+        raise ValueError(f"bicim: {' / '.join(TOPLU_PDF_BICIMLERI)} olmalı")
+    if tur == "fatura":
+        toplam, isler = _fatura_isleri(baslangic, bitis, musteri_ids, hizmet_turleri, taslaklar_dahil)
+    else:
+        toplam, isler = _makbuz_isleri(baslangic, bitis, musteri_ids, hizmet_turleri)
+    birlestirici = None
+    if bicim == "pdf":
+        if toplam > TOPLU_PDF_BIRLESIK_MAX:
+            isler.close()
+            raise ValueError(
+                f"Tek PDF en çok {TOPLU_PDF_BIRLESIK_MAX} belge olabilir ({toplam} bulundu); ZIP seçin veya aralığı daraltın."
+            )
+        try:
+            from pypdf import PdfReader, PdfWriter
+        except ImportError:
+            isler.close()
+            raise ValueError("Birleşik PDF için pypdf kurulu olmalı (pip install pypdf); ZIP seçebilirsiniz.") from None
+        birlestirici = PdfWriter()
+
+    hatalar: list[dict] = []
+    yazilan = 0
+    yapilan = 0
+
+    def _ilerle(mesaj=None):
+        job_progress(yapilan, toplam, mesaj)
+        if ilerleme is not None:
+            ilerleme(yapilan, toplam)
+
+    # pdf_toplu sonuçları girdi sırasıyla döner: ad / yer imi aynı sırayla bu kuyruktan alınır.
+    etiketler: deque = deque()
+    adlar: set = set()
+
+    def _cizim_isleri():
+        for ad, yer_imi, t, args, kwargs in isler:
+            etiketler.append((ad, yer_imi))
+            yield t, args, kwargs
+
+    os.makedirs(os.path.dirname(os.path.abspath(hedef_yol)), exist_ok=True)
+    gecici = hedef_yol + ".part"
+    try:
+        _ilerle("PDF'ler hazırlanıyor")
+        zf = None
+        if birlestirici is None:
+            # PDF akışları kısmen sıkıştırılmış: hızlı seviye ~%20 kazanç, ana süreç CPU'su düşük.
+            zf = zipfile.ZipFile(gecici, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        try:
+            for veri, hata in pdf_toplu(_cizim_isleri(), onbellege_yaz=False):
+                ad, yer_imi = etiketler.popleft()
+                yapilan += 1
+                if hata is not None:
+                    hatalar.append({"belge": ad, "mesaj": f"PDF oluşturulamadı: {hata}"})
+                elif zf is not None:
+                    if ad in adlar:
+                        ad = f"{ad[:-4]}_{yapilan}.pdf"
+                    adlar.add(ad)
+                    zf.writestr(ad, veri)
+                    yazilan += 1
+                else:
+                    birlestirici.append(PdfReader(io.BytesIO(veri)), outline_item=yer_imi)
+                    yazilan += 1
+                _ilerle()
+            if zf is not None and hatalar:
+                zf.writestr("HATALAR.txt", "\n".join(f"{h['belge']}\t{h['mesaj']}" for h in hatalar) + "\n")
+        finally:
+            if zf is not None:
+                zf.close()
+        if birlestirici is not None:
+            birlestirici.page_mode = "/UseOutlines"
+            with open(gecici, "wb") as f:
+                birlestirici.write(f)
+        os.replace(gecici, hedef_yol)
+    finally:
+        isler.close()
+        if os.path.exists(gecici):
+            try:
+                os.remove(gecici)
+            except OSError:
+                pass
+    return {
+        "ok": True,
+        "tur": tur,
+        "bicim": bicim,
+        "adet": yazilan,
+        "toplam": toplam,
+        "hata_sayisi": len(hatalar),
+        "hatalar": hatalar[:50],
+        "boyut": os.path.getsize(hedef_yol),
+    }
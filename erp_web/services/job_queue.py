@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+"""Kalıcı arka plan iş kuyruğu (public.bo_jobs) + süreç içi işçi havuzu.
+
+Uzun toplu işlemler (grid rebuild, toplu borçlandırma, GİB tarama...) gunicorn
+isteği içinde ``--timeout 120`` ile yarıda kesilmesin diye kuyruğa alınır;
+endpoint hemen ``202 {"job_id": ...}`` döner, istemci ``/jobs/api/<id>`` ile
+ilerlemeyi izler.
+
+- ``enqueue(kind, params)``: iş ekler; ``dedupe_key`` aynıysa kuyruktaki işi döndürür.
+- ``job_handler(kind)``: işleyici kaydı; işleyici ``params`` dict'i alır, JSON'lanabilir sonuç döner.
+- ``job_progress(done, total, mesaj)``: işleyici içinden ilerleme; iptal istenmişse
+  ``JobCancelled`` fırlatır. İş dışında no-op (aynı kod senkron yolda da çalışır).
+- Adalet: bir kiracı aynı anda hat başına en fazla ``JOB_TENANT_MAX`` (uzun) /
+  ``JOB_TENANT_MAX_KISA`` (kısa) iş çalıştırır; sıradaki iş, o an en az işi çalışan
+  kiracıdan seçilir. Sayım + seçim ``pg_advisory_xact_lock`` altında (iki işçi aynı
+  kiracı için sınırı birlikte aşamaz).
+- Hatlar: ``job_handler(kind, kisa=True)`` ile kaydedilen kısa türler (kayıt sonrası grid
+  rebuild) uzun işlerin (rebuild-all, GİB tarama, otomatik fatura...) arkasında beklemez:
+  ayrı sınırla sayılır ve yalnız kısa türleri alan ``JOB_WORKERS_KISA`` thread'i vardır.
+- Eşzamanlılık: süreç başına ``JOB_WORKERS`` thread (varsayılan 2; 0 = kapalı) + kısa hat.
+- Kalp atışı: bakım thread'i çalışan işlerin ``heartbeat_at`` alanını yeniler;
+  ``JOB_STALE_SEC`` boyunca atmayan iş (ölü worker) yeniden kuyruğa / failed'a alınır.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+
+from psycopg2.extras import Json
+
+from db import (
+    db,
+    ensure_bo_jobs_table,
+    execute,
+    fetch_all,
+    fetch_one,
+    sql_profile_scope,
+    tenant_schema_scope,
+    _tenant_schema_for_request,
+)
+
+log = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TERMINAL = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+_JOB_COLS = (
+    "id, kind, tenant_schema, params, status, progress_done, progress_total, mesaj, result, error, "
+    "attempts, max_attempts, cancel_requested, dedupe_key, created_by, run_after, created_at, "
+    "started_at, heartbeat_at, finished_at"
+)
+
+_HANDLERS: dict = {}
+_KISA_KINDS: set = set()
+_CURRENT = threading.local()
+_WAKE = threading.Event()
+_STOP = threading.Event()
+_POOL_LOCK = threading.Lock()
+_POOL_THREADS: list = []
+# Bu süreçte çalışan işler: id -> iptal Event'i (bakım thread'i heartbeat + iptal bayrağı)
+_RUNNING_LOCAL: dict = {}
+_RUNNING_LOCK = threading.Lock()
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+_TABLE_READY = False
+_TABLE_LOCK = threading.Lock()
+
+
+class JobCancelled(BaseException):
+    """job_progress iptal isteği gördüğünde işleyiciyi durdurur.
+
+    BaseException: endpoint gövdelerindeki ``except Exception`` blokları yutmasın.
+    """
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.environ.get(name) or str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+def job_workers_count() -> int:
+    return max(0, _env_int("JOB_WORKERS", 2))
+
+
+def _ensure_table() -> None:
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+    with _TABLE_LOCK:
+        if _TABLE_READY:
+            return
+        with tenant_schema_scope(None):
+            ensure_bo_jobs_table()
+        _TABLE_READY = True
+
+
+def job_handler(kind: str, kisa: bool = False):
+    """``@job_handler("aylik_grid_rebuild", kisa=True)`` — işleyiciyi türe kaydeder.
+
+    kisa=True: saniyeler süren, kullanıcı işleminin hemen ardından beklenen iş (kısa hat).
+    """
+
+    def deco(fn):
+        _HANDLERS[kind] = fn
+        if kisa:
+            _KISA_KINDS.add(kind)
+        return fn
+
+    return deco
+
+
+def in_job() -> bool:
+    return getattr(_CURRENT, "job", None) is not None
+
+
+def job_progress(done: int, total: int | None = None, mesaj: str | None = None) -> None:
+    """İşleyici içinden ilerleme (0.5 sn'de bir DB'ye yazılır); iptal varsa JobCancelled."""
+    job = getattr(_CURRENT, "job", None)
+    if job is None:
+        return
+    if job["iptal"].is_set():
+        raise JobCancelled()
+    job["done"] = int(done)
+    if total is not None:
+        job["total"] = int(total)
+    if mesaj is not None:
+        job["mesaj"] = str(mesaj)[:500]
+    now = time.monotonic()
+    if now - job["yazildi"] < 0.5 and not (job["total"] and job["done"] >= job["total"]):
+        return
+    job["yazildi"] = now
+    row = fetch_one(
+        """
+        UPDATE public.bo_jobs
+        SET progress_done = %s, progress_total = %s, mesaj = COALESCE(%s, mesaj), heartbeat_at = NOW()
+        WHERE id = %s
+        RETURNING cancel_requested
+        """,
+        (job["done"], job["total"], job["mesaj"], job["id"]),
+    )
+    if row and row.get("cancel_requested"):
+        job["iptal"].set()
+        raise JobCancelled()
+
+
+def _row_public(row: dict | None) -> dict | None:
+    if not row:
+        return None
+    out = {}
+    for k, v in row.items():
+        out[k] = v.isoformat() if hasattr(v, "isoformat") else v
+    total = row.get("progress_total")
+    out["yuzde"] = (
+        round(100.0 * float(row.get("progress_done") or 0) / float(total), 1) if total else None
+    )
+    return out
+
+
+def enqueue(
+    kind: str,
+    params: dict | None = None,
+    *,
+    tenant_schema=False,
+    dedupe_key: str | None = None,
+    max_attempts: int = 1,
+    created_by: int | None = None,
+    delay_sec: float = 0.0,
+) -> dict:
+    """İş ekler ve satırı döndürür. tenant_schema verilmezse aktif istek kiracısı."""
+    if kind not in _HANDLERS:
+        raise ValueError(f"bilinmeyen iş türü: {kind}")
+    _ensure_table()
+    tenant = _tenant_schema_for_request() if tenant_schema is False else tenant_schema
+    with tenant_schema_scope(None):
+        row = fetch_one(
+            f"""
+            INSERT INTO public.bo_jobs
+                (kind, tenant_schema, params, dedupe_key, max_attempts, created_by, run_after)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))
+            ON CONFLICT DO NOTHING
+            RETURNING {_JOB_COLS}
+            """,
+            (kind, tenant, Json(params or {}), dedupe_key, max(1, int(max_attempts)), created_by, float(delay_sec)),
+        )
+        if row is None and dedupe_key:
+            row = fetch_one(
+                f"""
+                SELECT {_JOB_COLS} FROM public.bo_jobs
+                WHERE COALESCE(tenant_schema, '') = COALESCE(%s, '') AND kind = %s
+                  AND dedupe_key = %s AND status = 'queued'
+                ORDER BY id DESC LIMIT 1
+                """,
+                (tenant, kind, dedupe_key),
+            )
+    _WAKE.set()
+    return _row_public(row) or {}
+
+
+def get_job(job_id: int, tenant_schema=False) -> dict | None:
+    """Kiracıya ait işi döndürür (başka kiracının işi None)."""
+    _ensure_table()
+    tenant = _tenant_schema_for_request() if tenant_schema is False else tenant_schema
+    with tenant_schema_scope(None):
+        row = fetch_one(
+            f"SELECT {_JOB_COLS} FROM public.bo_jobs "
+            "WHERE id = %s AND COALESCE(tenant_schema, '') = COALESCE(%s, '')",
+            (int(job_id), tenant),
+        )
+    return _row_public(row)
+
+
+def list_jobs(limit: int = 20, tenant_schema=False) -> list:
+    _ensure_table()
+    tenant = _tenant_schema_for_request() if tenant_schema is False else tenant_schema
+    with tenant_schema_scope(None):
+        rows = fetch_all(
+            f"SELECT {_JOB_COLS} FROM public.bo_jobs "
+            "WHERE COALESCE(tenant_schema, '') = COALESCE(%s, '') "
+            "ORDER BY created_at DESC LIMIT %s",
+            (tenant, max(1, min(200, int(limit)))),
+        ) or []
+    return [_row_public(r) for r in rows]
+
+
+def cancel_job(job_id: int, tenant_schema=False) -> bool:
+    """Kuyruktaki iş hemen iptal; çalışan iş bir sonraki job_progress'te durur."""
+    tenant = _tenant_schema_for_request() if tenant_schema is False else tenant_schema
+    with tenant_schema_scope(None):
+        n = execute(
+            """
+            UPDATE public.bo_jobs
+            SET cancel_requested = TRUE,
+                status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+                finished_at = CASE WHEN status = 'queued' THEN NOW() ELSE finished_at END
+            WHERE id = %s AND COALESCE(tenant_schema, '') = COALESCE(%s, '')
+              AND status IN ('queued', 'running')
+            """,
+            (int(job_id), tenant),
+        )
+    return bool(n)
+
+
+def retry_job(job_id: int, tenant_schema=False) -> bool:
+    """failed / cancelled işi aynı parametrelerle yeniden kuyruğa alır."""
+    tenant = _tenant_schema_for_request() if tenant_schema is False else tenant_schema
+    with tenant_schema_scope(None):
+        n = execute(
+            """
+            UPDATE public.bo_jobs
+            SET status = 'queued', cancel_requested = FALSE, error = NULL, result = NULL,
+                progress_done = 0, mesaj = NULL, max_attempts = attempts + 1,
+                run_after = NOW(), started_at = NULL, finished_at = NULL, heartbeat_at = NULL
+            WHERE id = %s AND COALESCE(tenant_schema, '') = COALESCE(%s, '')
+              AND status IN ('failed', 'cancelled')
+            """,
+            (int(job_id), tenant),
+        )
+    if n:
+        _WAKE.set()
+    return bool(n)
+
+
+def _claim(yalniz_kisa: bool = False) -> dict | None:
+    """Sıradaki işi al: kiracı × hat başına sınır, en az çalışan kiracı önce.
+
+    Çalışan sayımı ile sahiplenme aynı transaction'da, tüm claim'leri sıraya sokan
+    advisory lock altında: önceki claim commit edilmeden sonraki sayım yapılmaz.
+    """
+    kinds = sorted(_KISA_KINDS if yalniz_kisa else _HANDLERS.keys())
+    if not kinds:
+        return None
+    kisa = sorted(_KISA_KINDS)
+    with tenant_schema_scope(None), db() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('bo_jobs_claim')::bigint)")
+        cur.execute(
+            f"""
+            WITH calisan AS (
+                SELECT COALESCE(tenant_schema, '') AS t, (kind = ANY(%s)) AS kisa, COUNT(*) AS n
+                FROM public.bo_jobs WHERE status = 'running'
+                GROUP BY 1, 2
+            ),
+            aday AS (
+                SELECT j.id
+                FROM public.bo_jobs j
+                LEFT JOIN calisan c ON c.t = COALESCE(j.tenant_schema, '') AND c.kisa = (j.kind = ANY(%s))
+                WHERE j.status = 'queued' AND j.run_after <= NOW() AND j.kind = ANY(%s)
+                  AND COALESCE(c.n, 0) < CASE WHEN j.kind = ANY(%s) THEN %s ELSE %s END
+                ORDER BY COALESCE(c.n, 0), j.id
+                LIMIT 1
+                FOR UPDATE OF j SKIP LOCKED
+            )
+            UPDATE public.bo_jobs b
+            SET status = 'running', attempts = b.attempts + 1, worker = %s,
+                started_at = NOW(), heartbeat_at = NOW(), cancel_requested = FALSE
+            FROM aday
+            WHERE b.id = aday.id
+            RETURNING {", ".join("b." + c.strip() for c in _JOB_COLS.split(","))}
+            """,
+            (
+                kisa,
+                kisa,
+                kinds,
+                kisa,
+                max(1, _env_int("JOB_TENANT_MAX_KISA", 2)),
+                max(1, _env_int("JOB_TENANT_MAX", 1)),
+                _WORKER_ID,
+            ),
+        )
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+
+def _finish(job_id: int, status: str, result=None, error: str | None = None, mesaj: str | None = None) -> None:
+    with tenant_schema_scope(None):
+        execute(
+            """
+            UPDATE public.bo_jobs
+            SET status = %s, result = %s, error = %s, mesaj = COALESCE(%s, mesaj),
+                finished_at = NOW(), heartbeat_at = NOW(),
+                progress_done = CASE WHEN %s = 'done' AND progress_total IS NOT NULL
+                                     THEN progress_total ELSE progress_done END
+            WHERE id = %s
+            """,
+            (status, Json(result) if result is not None else None, error, mesaj, status, int(job_id)),
+        )
+
+
+def _requeue_or_fail(job: dict, error: str) -> None:
+    """Deneme hakkı varsa geri-çekilmeli yeniden kuyruk, yoksa failed."""
+    attempts = int(job.get("attempts") or 1)
+    if attempts < int(job.get("max_attempts") or 1):
+        gecikme = min(300, 5 * (2 ** (attempts - 1)))
+        with tenant_schema_scope(None):
+            execute(
+                """
+                UPDATE public.bo_jobs
+                SET status = 'queued', error = %s, worker = NULL,
+                    run_after = NOW() + make_interval(secs => %s)
+                WHERE id = %s
+                """,
+                (error, gecikme, int(job["id"])),
+            )
+        return
+    _finish(job["id"], JOB_FAILED, error=error)
+
+
+def _run(app, job: dict) -> None:
+    from flask import g
+
+    kind = job["kind"]
+    handler = _HANDLERS.get(kind)
+    iptal = threading.Event()
+    with _RUNNING_LOCK:
+        _RUNNING_LOCAL[int(job["id"])] = iptal
+    _CURRENT.job = {
+        "id": int(job["id"]),
+        "iptal": iptal,
+        "done": 0,
+        "total": job.get("progress_total"),
+        "mesaj": None,
+        "yazildi": 0.0,
+    }
+    tenant = job.get("tenant_schema")
+    try:
+        with app.app_context():
+            if tenant is not None:
+                g.tenant_schema = tenant
+            with tenant_schema_scope(tenant), sql_profile_scope(f"job:{kind}"):
+                params = job.get("params") or {}
+                if isinstance(params, str):
+                    params = json.loads(params)
+                result = handler(params)
+        _finish(job["id"], JOB_DONE, result=result)
+    except JobCancelled:
+        _finish(job["id"], JOB_CANCELLED, mesaj="İptal edildi.")
+    except Exception as e:
+        log.exception("bo_jobs iş hatası id=%s kind=%s", job.get("id"), kind)
+        _requeue_or_fail(job, f"{type(e).__name__}: {e}"[:2000])
+    finally:
+        _CURRENT.job = None
+        with _RUNNING_LOCK:
+            _RUNNING_LOCAL.pop(int(job["id"]), None)
+
+
+def _worker_loop(app, yalniz_kisa: bool = False) -> None:
+    poll = max(0.5, float(_env_int("JOB_POLL_SEC", 2)))
+    while not _STOP.is_set():
+        try:
+            _ensure_table()
+            job = _claim(yalniz_kisa)
+        except Exception as e:
+            log.warning("bo_jobs claim hatası: %s", e)
+            job = None
+        if job is None:
+            _WAKE.wait(poll)
+            _WAKE.clear()
+            continue
+        _run(app, job)
+
+
+def _maintenance_loop() -> None:
+    """Yerel çalışan işlerin kalp atışı + iptal bayrağı; ölü worker işlerini geri al."""
+    stale = max(60, _env_int("JOB_STALE_SEC", 300))
+    while not _STOP.wait(15.0):
+        if not _TABLE_READY:
+            continue
+        try:
+            with _RUNNING_LOCK:
+                ids = list(_RUNNING_LOCAL.keys())
+            with tenant_schema_scope(None):
+                if ids:
+                    rows = fetch_all(
+                        """
+                        UPDATE public.bo_jobs SET heartbeat_at = NOW()
+                        WHERE id = ANY(%s) AND status = 'running'
+                        RETURNING id, cancel_requested
+                        """,
+                        (ids,),
+                    ) or []
+                    for r in rows:
+                        if r.get("cancel_requested"):
+                            with _RUNNING_LOCK:
+                                ev = _RUNNING_LOCAL.get(int(r["id"]))
+                            if ev is not None:
+                                ev.set()
+                execute(
+                    """
+                    UPDATE public.bo_jobs
+                    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                        error = 'İşçi yanıt vermiyor (kalp atışı zaman aşımı).',
+                        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE NOW() END,
+                        worker = NULL
+                    WHERE status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %s)
+                    """,
+                    (stale,),
+                )
+        except Exception as e:
+            log.warning("bo_jobs bakım hatası: %s", e)
+
+
+def start_job_workers(app) -> int:
+    """Süreç başına işçi havuzunu başlatır (idempotent); başlatılan thread sayısı.
+
+    Süreç havuzu çocuklarında (multiprocessing) hiç başlamaz: çocuk erken çıkınca
+    sahiplendiği iş (max_attempts=1) kalıcı olarak failed olurdu.
+    """
+    if multiprocessing.parent_process() is not None:
+        return 0
+    n = job_workers_count()
+    if n <= 0:
+        return 0
+    with _POOL_LOCK:
+        if _POOL_THREADS:
+            return len(_POOL_THREADS)
+        _STOP.clear()
+        for i in range(n):
+            th = threading.Thread(target=_worker_loop, args=(app,), name=f"bo-job-{i}", daemon=True)
+            th.start()
+            _POOL_THREADS.append(th)
+        # Kısa hat: yalnız kısa türler; uzun işler tüm genel işçileri tutsa da beklemez.
+        for i in range(max(0, _env_int("JOB_WORKERS_KISA", 1))):
+            th = threading.Thread(target=_worker_loop, args=(app, True), name=f"bo-job-kisa-{i}", daemon=True)
+            th.start()
+            _POOL_THREADS.append(th)
+        th = threading.Thread(target=_maintenance_loop, name="bo-job-bakim", daemon=True)
+        th.start()
+        _POOL_THREADS.append(th)
+        return n
+
+
+# ── Endpoint'i kuyruğa alma (async=1) ───────────────────────────────────────
+# Mevcut toplu endpoint'ler gövdelerini değiştirmeden işe dönüşür: istek
+# ``async=1`` ile gelirse view'in endpoint'i, gövdesi ve kullanıcısı "view" işi
+# olarak kaydedilir; işçi aynı view'i test_request_context içinde çalıştırır.
+
+def _async_requested(req) -> bool:
+    raw = str(req.args.get("async") or req.headers.get("X-Bo-Async") or "").strip().lower()
+    if raw in ("1", "true", "yes", "on"):
+        return True
+    body = req.get_json(silent=True)
+    return isinstance(body, dict) and body.get("async") in (True, 1, "1", "true")
+
+
+def enqueue_view_if_async(max_attempts: int = 1):
+    """İstek async isterse view'i kuyruğa alır ve 202 yanıtı döner; aksi halde None."""
+    from flask import jsonify, request, url_for
+    from flask_login import current_user
+
+    if in_job() or not _async_requested(request):
+        return None
+    if job_workers_count() <= 0:
+        return None
+    body = request.get_json(silent=True)
+    params = {
+        "endpoint": request.endpoint,
+        "path": request.path,
+        "method": request.method,
+        "query": [[k, v] for k, v in request.args.items(multi=True) if k != "async"],
+        "json": body if isinstance(body, (dict, list)) else None,
+        "view_args": dict(request.view_args or {}),
+        "user_id": getattr(current_user, "id", None),
+    }
+    imza = hashlib.sha1(
+        json.dumps([params["query"], params["json"]], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    job = enqueue(
+        "view",
+        params,
+        dedupe_key=f"{request.endpoint}:{imza}",
+        max_attempts=max_attempts,
+        created_by=params["user_id"],
+    )
+    return (
+        jsonify(
+            {
+                "ok": True,
+                "job_id": job.get("id"),
+                "durum": job.get("status"),
+                "durum_url": url_for("jobs.api_job_durum", job_id=job.get("id")),
+                "mesaj": "İşlem arka planda başlatıldı.",
+            }
+        ),
+        202,
+    )
+
+
+@job_handler("view")
+def _run_view_job(params: dict):
+    """Kuyruğa alınmış endpoint'i kayıtlı kullanıcı + gövde ile çalıştırır; JSON yanıtı sonuç olur."""
+    from flask import current_app
+    from flask_login import login_user
+
+    from auth import load_user
+    from db import commit_request_conn
+
+    view = current_app.view_functions[params["endpoint"]]
+    with current_app.test_request_context(
+        params.get("path") or "/",
+        method=params.get("method") or "POST",
+        query_string=[tuple(x) for x in params.get("query") or []],
+        json=params.get("json"),
+    ):
+        uid = params.get("user_id")
+        user = load_user(str(uid)) if uid is not None else None
+        if user is not None:
+            login_user(user)
+        resp = current_app.make_response(view(**(params.get("view_args") or {})))
+        commit_request_conn()
+        data = resp.get_json(silent=True)
+        if resp.status_code >= 500 or (resp.status_code >= 400 and not isinstance(data, dict)):
+            mesaj = data.get("mesaj") if isinstance(data, dict) else None
+            raise RuntimeError(mesaj or f"HTTP {resp.status_code}")
+        return {"http_status": resp.status_code, "yanit": data}
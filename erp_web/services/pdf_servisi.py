@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+"""PDF çizim servisi: fatura / makbuz / kira bildirgesi / izin formu (ReportLab).
+
+- ``pdf_olustur(tur, *args, **kwargs)``: tek PDF baytları. Önce içerik özeti anahtarlı disk
+  önbelleğine bakılır (``PDF_CACHE_DIR``, varsayılan uploads/pdf_cache/<kiracı>/); yoksa sıcak
+  süreç havuzunda çizilir ve önbelleğe yazılır. Değişmemiş fatura / makbuzun yeniden
+  önizlemesi dosya okumasıdır.
+- ``pdf_toplu(isler)``: ``(tur, args, kwargs)`` dizisi → aynı sırada ``(bytes | None, hata | None)``;
+  havuza pencere hâlinde dağıtılır (bellekte en çok ~4×süreç PDF).
+- ``pdf_arka_planda(hedef_yol, tur, *args, **kwargs)``: dosyaya yazımı havuza bırakır (future).
+
+Havuz (spawn) süreçleri başlarken fontları kaydeder, GİB logosunun okuyucu / en-boyunu,
+qrcode'u ve izin formu paragraf stillerini yükler; sonraki işler bunları yeniden yapmaz.
+PDF_SERVIS_PROCESSES: 0/off → havuz yok (çağıran thread'de çizim); boş → CPU (en çok 2;
+Windows'ta 0). Havuz ilk kullanımda açılır, ısınana kadar çizim süreç içinde yapılır;
+havuz kırılırsa (BrokenProcessPool) süreç içi çizime düşülür, havuz geri çekilmeyle yeniden
+açılır (PDF_SERVIS_YENIDEN_SN, ardışık kırılmada ×2, en çok 10 dk). PDF_SERVIS_TIMEOUT_SN
+aşılırsa iş iptal edilir; çizime başlamışsa takılan süreç sonlandırılıp havuz yenilenir.
+
+Önbellek anahtarı: tür + girdiler (JSON) + çizici sürümü (kaynak dosyaların mtime/boyutu,
+FIRMA_* ortam değişkenleri). Kod veya firma bilgisi değişince eski dosyalar kullanılmaz,
+``PDF_CACHE_MAX_MB`` aşılınca en eski erişilenler silinir. PDF_CACHE=0 → önbellek kapalı.
+
+Havuz çocukları bu modülü içe aktarır; modül üstünde yalnız stdlib var.
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+_KOK = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# tur → (modül, fonksiyon, kaynak dosya — sürüm özeti için)
+_CIZICILER = {
+    "fatura": ("routes.faturalar_routes", "build_fatura_pdf", os.path.join(_KOK, "routes", "faturalar_routes.py")),
+    "makbuz": ("routes.faturalar_routes", "build_makbuz_pdf", os.path.join(_KOK, "routes", "faturalar_routes.py")),
+    "kira_bildirgesi": (
+        "routes.giris_routes",
+        "build_kira_bildirgesi_pdf",
+        os.path.join(_KOK, "routes", "giris_routes.py"),
+    ),
+    "izin_formu": (__name__, "_izin_formu_bytes", os.path.join(os.path.dirname(_KOK), "izin_form_pdf.py")),
+}
+
+_CACHE_KAPALI = (os.environ.get("PDF_CACHE", "1") or "").strip().lower() in ("0", "false", "no", "off")
+_CACHE_DIR = (os.environ.get("PDF_CACHE_DIR") or "").strip() or os.path.join("uploads", "pdf_cache")
+
+
+def _env_float(ad: str, varsayilan: float) -> float:
+    try:
+        return float((os.environ.get(ad) or "").strip() or varsayilan)
+    except ValueError:
+        return varsayilan
+
+
+_CACHE_MAX_BAYT = int(max(1.0, _env_float("PDF_CACHE_MAX_MB", 512.0)) * 1024 * 1024)
+# Bu kadar yazımda bir boyut denetimi (dizin taraması).
+_BUDAMA_ARALIGI = 200
+_ZAMAN_ASIMI_SN = max(5.0, _env_float("PDF_SERVIS_TIMEOUT_SN", 60.0))
+# Kırılan havuzu yeniden açmadan önce bekleme (ardışık kırılmada ikiye katlanır).
+_YENIDEN_SN = max(1.0, _env_float("PDF_SERVIS_YENIDEN_SN", 5.0))
+_YENIDEN_MAX_SN = 600.0
+
+_HAVUZ = None
+_HAVUZ_PID = None
+_HAVUZ_HAZIR = threading.Event()
+_HAVUZ_BEKLE_SONU = 0.0  # time.monotonic(); bu ana kadar havuz açılmaz
+_KIRILMA = 0
+_HAVUZ_LOCK = threading.Lock()
+_SURUM = None
+_YAZIM_SAYACI = 0
+_BUDAMA_LOCK = threading.Lock()
+
+
+# ── Çiziciler (havuz süreçlerinde de çalışır) ────────────────────────────────
+
+
+def _proje_koku_yolda() -> None:
+    """izin_form_pdf proje kökünde (erp_web'in üstü)."""
+    kok = os.path.dirname(_KOK)
+    if kok not in sys.path:
+        sys.path.insert(0, kok)
+
+
+def _izin_formu_bytes(data: dict) -> bytes:
+    _proje_koku_yolda()
+    from izin_form_pdf import izin_formu_olustur
+
+    buf = io.BytesIO()
+    izin_formu_olustur(data, buf)
+    return buf.getvalue()
+
+
+def _isci_hazirla() -> None:
+    """Havuz süreci başlangıcı: font, logo, QR ve stil hazırlığı (her iş başında tekrar edilmez)."""
+    try:
+        from routes.faturalar_routes import _gib_logo_aspect_ratio, _register_arial, _resolve_gib_logo_path
+
+        _register_arial()
+        _gib_logo_aspect_ratio(_resolve_gib_logo_path())
+    except Exception as e:
+        log.warning("pdf servisi: fatura çizicisi hazırlanamadı: %s", e)
+    try:
+        from routes.giris_routes import _register_arial as _register_arial_giris
+
+        _register_arial_giris()
+    except Exception as e:
+        log.warning("pdf servisi: kira bildirgesi çizicisi hazırlanamadı: %s", e)
+    try:
+        import qrcode  # noqa: F401
+        import qrcode.constants  # noqa: F401
+    except Exception:
+        pass
+    try:
+        _proje_koku_yolda()
+        import izin_form_pdf
+
+        izin_form_pdf._register_fonts()
+        izin_form_pdf._stiller()
+    except Exception as e:
+        log.warning("pdf servisi: izin formu çizicisi hazırlanamadı: %s", e)
+
+
+def _hazir() -> int:
+    return os.getpid()
+
+
+def _cizici(tur: str):
+    try:
+        modul, ad, _ = _CIZICILER[tur]
+    except KeyError:
+        raise ValueError(f"bilinmeyen PDF türü: {tur}") from None
+    return getattr(importlib.import_module(modul), ad)
+
+
+def _ciz(tur: str, args: tuple, kwargs: dict) -> bytes:
+    """Havuz işçisi: PDF baytları."""
+    return _cizici(tur)(*args, **kwargs)
+
+
+def _ciz_ve_yaz(hedef_yol: str, tur: str, args: tuple, kwargs: dict) -> int:
+    """Havuz işçisi: PDF'i ``hedef_yol``'a yazar (önce ``.part``); yazılan bayt sayısı."""
+    veri = _ciz(tur, args, kwargs)
+    gecici = f"{hedef_yol}.{os.getpid()}.part"
+    with open(gecici, "wb") as f:
+        f.write(veri)
+    os.replace(gecici, hedef_yol)
+    return len(veri)
+
+
+# ── Süreç havuzu ─────────────────────────────────────────────────────────────
+
+
+def _surec_sayisi() -> int:
+    """PDF_SERVIS_PROCESSES: 0/off → havuz yok; boş/auto → CPU (en çok 2; Windows'ta 0)."""
+    raw = (os.environ.get("PDF_SERVIS_PROCESSES") or "").strip().lower()
+    if raw in ("0", "off", "false", "no"):
+        return 0
+    if raw.isdigit():
+        return int(raw)
+    if sys.platform == "win32":
+        return 0
+    return min(os.cpu_count() or 1, 2)
+
+
+def _isinma_bitti(havuz, futures: list) -> None:
+    def _cb(f_):
+        global _KIRILMA
+        if f_.cancelled():
+            return
+        e = f_.exception()
+        if e is not None:
+            _havuz_kirildi(e, havuz)
+        elif all(f.done() for f in futures) and havuz is _HAVUZ:
+            _KIRILMA = 0
+            _HAVUZ_HAZIR.set()
+
+    for f in futures:
+        f.add_done_callback(_cb)
+
+
+def _havuz():
+    """Süreç başına tek havuz (fork sonrası yeniden açılır); kapalı / kırılma sonrası beklemedeyse None."""
+    global _HAVUZ, _HAVUZ_PID
+    if _HAVUZ is not None and _HAVUZ_PID == os.getpid():
+        return _HAVUZ
+    if time.monotonic() < _HAVUZ_BEKLE_SONU:
+        return None
+    n = _surec_sayisi()
+    if n <= 0:
+        return None
+    with _HAVUZ_LOCK:
+        if _HAVUZ is None or _HAVUZ_PID != os.getpid():
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _HAVUZ_HAZIR.clear()
+            havuz = ProcessPoolExecutor(
+                max_workers=n,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_isci_hazirla,
+            )
+            # Tüm süreçleri şimdi başlat; ısınana kadar çağıranlar süreç içi çizer.
+            _isinma_bitti(havuz, [havuz.submit(_hazir) for _ in range(n)])
+            _HAVUZ, _HAVUZ_PID = havuz, os.getpid()
+    return _HAVUZ
+
+
+def _havuz_birak(havuz, sebep, kirik: bool) -> None:
+    """``havuz`` hâlâ güncel havuzsa bırakır: bekleyen işler iptal, süreçler sonlandırılır.
+
+    kirik: yeniden açma ``_YENIDEN_SN`` × 2^(ardışık kırılma - 1) ertelenir (en çok ``_YENIDEN_MAX_SN``);
+    değilse (zaman aşımı) sonraki çağrı hemen yeni havuz açar.
+    """
+    global _HAVUZ, _HAVUZ_BEKLE_SONU, _KIRILMA
+    with _HAVUZ_LOCK:
+        if havuz is None or havuz is not _HAVUZ:
+            return
+        _HAVUZ = None
+        if kirik:
+            _KIRILMA += 1
+            bekle = min(_YENIDEN_MAX_SN, _YENIDEN_SN * 2 ** (_KIRILMA - 1))
+            _HAVUZ_BEKLE_SONU = time.monotonic() + bekle
+    if kirik:
+        log.warning("pdf servisi: süreç havuzu kırıldı, %.0f sn süreç içi çizim: %s", bekle, sebep)
+    else:
+        log.warning("pdf servisi: süreç havuzu yenileniyor: %s", sebep)
+    surecler = list((getattr(havuz, "_processes", None) or {}).values())
+    havuz.shutdown(wait=False, cancel_futures=True)
+    for p in surecler:
+        if p.is_alive():
+            p.terminate()
+
+
+def _havuz_kirildi(e: Exception, havuz=None) -> None:
+    _havuz_birak(havuz if havuz is not None else _HAVUZ, e, kirik=True)
+
+
+def _zaman_asimi(havuz, fut, tur: str) -> None:
+    """Süresi dolan iş: kuyruktaysa iptal; çizimdeyse takılan süreç yuvayı tutmasın, havuz yenilenir."""
+    if not fut.cancel():
+        _havuz_birak(havuz, f"{tur} çizimi {_ZAMAN_ASIMI_SN:.0f} sn'de bitmedi", kirik=False)
+
+
+def _hazir_havuz():
+    havuz = _havuz()
+    if havuz is None or not _HAVUZ_HAZIR.is_set():
+        return None
+    return havuz
+
+
+def _sade(v):
+    """Havuza gidecek girdiler: dict alt sınıfları (RealDictRow) düz dict / list'e."""
+    if isinstance(v, dict):
+        return {k: _sade(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_sade(x) for x in v]
+    return v
+
+
+# ── Disk önbelleği ───────────────────────────────────────────────────────────
+
+
+def _cizici_surumu() -> str:
+    global _SURUM
+    if _SURUM is not None:
+        return _SURUM
+    parcalar = []
+    for dosya in sorted({c[2] for c in _CIZICILER.values()} | {os.path.abspath(__file__)}):
+        try:
+            st = os.stat(dosya)
+            parcalar.append((os.path.basename(dosya), st.st_mtime_ns, st.st_size))
+        except OSError:
+            parcalar.append((os.path.basename(dosya), 0, 0))
+    parcalar.append(sorted((k, v) for k, v in os.environ.items() if k.startswith("FIRMA_")))
+    _SURUM = hashlib.sha1(json.dumps(parcalar).encode("utf-8")).hexdigest()[:12]
+    return _SURUM
+
+
+def _cache_yolu(tur: str, args, kwargs) -> str | None:
+    if _CACHE_KAPALI:
+        return None
+    try:
+        ham = json.dumps(
+            [tur, _cizici_surumu(), args, kwargs],
+            default=str,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    except (TypeError, ValueError):
+        return None
+    ozet = hashlib.sha256(ham.encode("utf-8")).hexdigest()
+    from db import _tenant_schema_for_request
+
+    sema = _tenant_schema_for_request() or "public"
+    return os.path.join(_CACHE_DIR, sema, ozet[:2], f"{tur}_{ozet}.pdf")
+
+
+def _cache_oku(yol: str | None) -> bytes | None:
+    if not yol:
+        return None
+    try:
+        with open(yol, "rb") as f:
+            veri = f.read()
+        os.utime(yol)  # budamada "en son erişilen" sırası
+        return veri
+    except OSError:
+        return None
+
+
+def _cache_yaz(yol: str | None, veri: bytes) -> None:
+    global _YAZIM_SAYACI
+    if not yol or not veri:
+        return
+    gecici = f"{yol}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        os.makedirs(os.path.dirname(yol), exist_ok=True)
+        with open(gecici, "wb") as f:
+            f.write(veri)
+        os.replace(gecici, yol)
+    except OSError as e:
+        log.warning("pdf önbelleği yazılamadı: %s", e)
+        try:
+            os.remove(gecici)
+        except OSError:
+            pass
+        return
+    _YAZIM_SAYACI += 1
+    if _YAZIM_SAYACI % _BUDAMA_ARALIGI == 0:
+        _cache_buda()
+
+
+def _cache_buda() -> None:
+    """Toplam boyut sınırı aşıldıysa en eski erişilen dosyaları siler (%80'e iner)."""
+    if not _BUDAMA_LOCK.acquire(blocking=False):
+        return
+    try:
+        dosyalar = []
+        toplam = 0
+        for kok, _, adlar in os.walk(_CACHE_DIR):
+            for ad in adlar:
+                if not ad.endswith(".pdf"):
+                    continue
+                yol = os.path.join(kok, ad)
+                try:
+                    st = os.stat(yol)
+                except OSError:
+                    continue
+                dosyalar.append((st.st_mtime, st.st_size, yol))
+                toplam += st.st_size
+        if toplam <= _CACHE_MAX_BAYT:
+            return
+        hedef = int(_CACHE_MAX_BAYT * 0.8)
+        for _, boyut, yol in sorted(dosyalar):
+            try:
+                os.remove(yol)
+            except OSError:
+                continue
+            toplam -= boyut
+            if toplam <= hedef:
+                break
+    finally:
+        _BUDAMA_LOCK.release()
+
+
+# ── Dış API ──────────────────────────────────────────────────────────────────
+
+
+def _havuzda_ciz(tur: str, args: list, kwargs: dict) -> bytes:
+    """Havuzda çizer; havuz yok / kırık / zaman aşımı / iptal → süreç içi çizim."""
+    havuz = _hazir_havuz()
+    if havuz is not None:
+        from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+        from concurrent.futures.process import BrokenProcessPool
+
+        fut = None
+        try:
+            fut = havuz.submit(_ciz, tur, args, kwargs)
+            return fut.result(timeout=_ZAMAN_ASIMI_SN)
+        except BrokenProcessPool as e:
+            _havuz_kirildi(e, havuz)
+        except FutureTimeoutError:
+            _zaman_asimi(havuz, fut, tur)
+        except CancelledError:
+            pass  # başka bir çağrı havuzu yeniledi
+        except RuntimeError:
+            if fut is not None:
+                raise
+            # kapatılmış havuza submit: başka bir çağrı havuzu bıraktı
+    return _ciz(tur, args, kwargs)
+
+
+def pdf_olustur(tur: str, *args, **kwargs) -> bytes:
+    """``tur`` çizicisiyle PDF baytları (önbellek → havuz → süreç içi)."""
+    if tur not in _CIZICILER:
+        raise ValueError(f"bilinmeyen PDF türü: {tur}")
+    args, kwargs = _sade(args), _sade(kwargs)
+    yol = _cache_yolu(tur, args, kwargs)
+    veri = _cache_oku(yol)
+    if veri is not None:
+        return veri
+    veri = _havuzda_ciz(tur, args, kwargs)
+    _cache_yaz(yol, veri)
+    return veri
+
+
+def pdf_toplu(isler, pencere: int | None = None, onbellege_yaz: bool = True):
+    """``(tur, args, kwargs)`` iteratörü → aynı sırada ``(bytes | None, hata_mesajı | None)`` üretir.
+
+    Önbellekte olanlar okunur, kalanlar havuza dağıtılır; bekleyen iş en çok ``pencere``
+    (varsayılan 4×süreç) tanedir. Havuz yoksa / kırılırsa süreç içinde sırayla çizilir.
+    İteratör tembel tüketilir (her sonuçtan önce en çok ``pencere`` iş okunmuş olur).
+    onbellege_yaz=False: arşiv dışa aktarımı gibi tek seferlik büyük kümeler önbelleği doldurmasın.
+    """
+    from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+    from concurrent.futures.process import BrokenProcessPool
+
+    havuz = _havuz()
+    sinir = pencere or max(1, _surec_sayisi()) * 4
+    bekleyen: deque = deque()
+
+    def _sonuc(is_):
+        nonlocal havuz
+        tur, args, kwargs, yol, veri, fut = is_
+        if veri is not None:
+            return veri, None
+        try:
+            if fut is not None:
+                try:
+                    veri = fut.result(timeout=_ZAMAN_ASIMI_SN)
+                except (BrokenProcessPool, CancelledError, FutureTimeoutError) as e:
+                    # Havuz bırakıldıysa kalan işler de süreç içi çizilir.
+                    if isinstance(e, FutureTimeoutError):
+                        _zaman_asimi(havuz, fut, tur)
+                        if not fut.cancelled():
+                            havuz = None
+                    elif havuz is not None:
+                        if isinstance(e, BrokenProcessPool):
+                            _havuz_kirildi(e, havuz)
+                        havuz = None
+                    veri = _ciz(tur, args, kwargs)
+            else:
+                veri = _ciz(tur, args, kwargs)
+        except Exception as e:
+            log.warning("pdf toplu çizim (%s): %s", tur, e)
+            return None, str(e)
+        if onbellege_yaz:
+            _cache_yaz(yol, veri)
+        return veri, None
+
+    for tur, args, kwargs in isler:
+        if tur not in _CIZICILER:
+            raise ValueError(f"bilinmeyen PDF türü: {tur}")
+        args, kwargs = _sade(tuple(args or ())), _sade(dict(kwargs or {}))
+        yol = _cache_yolu(tur, args, kwargs)
+        veri = _cache_oku(yol)
+        fut = None
+        if veri is None and havuz is not None:
+            try:
+                fut = havuz.submit(_ciz, tur, args, kwargs)
+            except BrokenProcessPool as e:
+                _havuz_kirildi(e, havuz)
+                havuz = None
+            except RuntimeError:
+                havuz = None  # başka bir çağrı havuzu kapattı (shutdown sonrası submit)
+        bekleyen.append((tur, args, kwargs, yol, veri, fut))
+        # Sıra korunur: baştaki iş hazırsa (önbellek / süreç içi) hemen, değilse pencere dolunca.
+        while bekleyen and (len(bekleyen) > sinir or bekleyen[0][5] is None):
+            yield _sonuc(bekleyen.popleft())
+    while bekleyen:
+        yield _sonuc(bekleyen.popleft())
+
+
+_ARKA_PLAN = None
+
+
+def pdf_arka_planda(hedef_yol: str, tur: str, *args, **kwargs):
+    """PDF'i ``hedef_yol``'a arka planda yazar; ``concurrent.futures.Future`` döner.
+
+    Havuz varsa süreçte çizilir; yoksa tek thread'lik yürütücüde (istek bekletilmez).
+    Önbellekte varsa doğrudan kopyalanır. Hata future'da kalır ve loglanır.
+    """
+    global _ARKA_PLAN
+    args, kwargs = _sade(args), _sade(kwargs)
+    os.makedirs(os.path.dirname(os.path.abspath(hedef_yol)), exist_ok=True)
+    yol = _cache_yolu(tur, args, kwargs)
+    veri = _cache_oku(yol)
+    havuz = _havuz()
+    if veri is not None or havuz is None:
+        if _ARKA_PLAN is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with _HAVUZ_LOCK:
+                if _ARKA_PLAN is None:
+                    _ARKA_PLAN = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-arka-plan")
+
+        def _yaz():
+            icerik = veri if veri is not None else _ciz(tur, args, kwargs)
+            if veri is None:
+                _cache_yaz(yol, icerik)
+            gecici = f"{hedef_yol}.{os.getpid()}.part"
+            with open(gecici, "wb") as f:
+                f.write(icerik)
+            os.replace(gecici, hedef_yol)
+            return len(icerik)
+
+        fut = _ARKA_PLAN.submit(_yaz)
+    else:
+        fut = havuz.submit(_ciz_ve_yaz, os.path.abspath(hedef_yol), tur, args, kwargs)
+
+    def _logla(f):
+        e = f.exception()
+        if e is not None:
+            log.warning("pdf arka plan (%s → %s): %r", tur, hedef_yol, e)
+
+    fut.add_done_callback(_logla)
+    return fut
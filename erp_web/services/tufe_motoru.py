@@ -0,0 +1,171 @@
+"""
+TÜFE kira artış motoru (NumPy).
+
+Aylık grid / firma özeti / reel kart, her sözleşme için yıl yıl TÜFE uygulayan
+Python döngüsü çalıştırıyordu. Burada:
+
+- ``tufe_oran_matrisi``: yıl × ay yoğun efektif oran matrisi (eksik ay / yıl
+  yedekleri ``tufe_efektif_oran`` ile aynı sırada çözülmüş),
+- ``yillik_kira_matrisi``: başlangıç yılı, artış ayı ve taban kira vektörleriyle
+  binlerce sözleşmenin yıllık KDV dahil tutarını yıl adımı başına tek vektör
+  işlemiyle üretir.
+
+Yuvarlama skaler döngüyle birebirdir: her yıl ``round(…, 2)`` (Python round;
+np.round yarım-nokta komşuluğunda ölçekleme hatasıyla sapabildiği için
+``round2`` o elemanları Python round ile düzeltir).
+"""
+import math
+
+import numpy as np
+
+# Kira modu: KDV dahil banka, nakit (KDV'siz), karma (nakit + banka payı).
+MOD_BANKA = 0
+MOD_NAKIT = 1
+MOD_KARMA = 2
+
+
+def round2(arr) -> np.ndarray:
+    """Eleman bazında Python ``round(x, 2)`` ile aynı sonuç."""
+    a = np.asarray(arr, dtype=np.float64)
+    out = np.round(a, 2)
+    s = a * 100.0
+    with np.errstate(invalid="ignore"):
+        yakin = np.abs(s - np.floor(s) - 0.5) < np.maximum(1e-6, np.abs(s) * 1e-14)
+    for i in np.flatnonzero(yakin):
+        out.flat[i] = round(float(a.flat[i]), 2)
+    return out
+
+
+def tufe_en_son_pozitif_oran(year_map) -> float:
+    """Takvim yılı haritasında (1..12 → %) pozitif oranı olan en büyük ay numarası; TCMB ileri ayları yayınlamadığında projeksiyon."""
+    if not isinstance(year_map, dict) or not year_map:
+        return 0.0
+    best_m, best_o = 0, 0.0
+    for mk, ow in year_map.items():
+        try:
+            mi = int(mk)
+        except (TypeError, ValueError):
+            continue
+        if mi < 1 or mi > 12:
+            continue
+        try:
+            ovv = float(ow or 0)
+        except (TypeError, ValueError):
+            ovv = 0.0
+        if ovv > 0 and math.isfinite(ovv) and mi > best_m:
+            best_m, best_o = mi, ovv
+    return best_o
+
+
+def _ay_orani(inner, ay):
+    raw = inner.get(ay)
+    if raw is None and ay is not None:
+        raw = inner.get(str(ay))
+    try:
+        return float(raw or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def tufe_efektif_oran(tufe_map: dict, y: int, artis_month: int, y_start: int) -> float:
+    """``y`` yılına geçişte uygulanacak oran (%): o yılın artış ayı → önceki yılın aynı ayı →
+    o yılın son girilmiş ayı → önceki yılın son girilmiş ayı. Geçersizse 0."""
+    inner = tufe_map.get(y) if isinstance(tufe_map, dict) else {}
+    if not isinstance(inner, dict):
+        inner = {}
+    oran = _ay_orani(inner, artis_month)
+    if (not oran or not math.isfinite(oran)) and y > y_start:
+        inner_prev = tufe_map.get(y - 1) if isinstance(tufe_map, dict) else {}
+        if isinstance(inner_prev, dict):
+            oran2 = _ay_orani(inner_prev, artis_month)
+            if oran2 > 0 and math.isfinite(oran2):
+                oran = oran2
+    if not oran or not math.isfinite(oran):
+        o3 = tufe_en_son_pozitif_oran(inner)
+        if o3 > 0 and math.isfinite(o3):
+            oran = o3
+    if (not oran or not math.isfinite(oran)) and y > y_start:
+        inner_prev2 = tufe_map.get(y - 1) or {} if isinstance(tufe_map, dict) else {}
+        o4 = tufe_en_son_pozitif_oran(inner_prev2)
+        if o4 > 0 and math.isfinite(o4):
+            oran = o4
+    return oran if (oran and math.isfinite(oran)) else 0.0
+
+
+def tufe_oran_matrisi(tufe_map: dict) -> tuple[int, np.ndarray]:
+    """(ilk_yil, M): ``M[y - ilk_yil, ay]`` = y yılına geçişte ``ay`` artış ayının efektif oranı.
+
+    Matris dışındaki yıllar için oran 0'dır (veri yılı yok, önceki yıl da yok).
+    Başlangıç yılından sonraki geçişler için hesaplanır (``y > y_start`` dalları açık).
+    """
+    yillar = []
+    for k in (tufe_map or {}).keys() if isinstance(tufe_map, dict) else ():
+        if isinstance(k, int):
+            yillar.append(k)
+    if not yillar:
+        return 0, np.zeros((0, 13), dtype=np.float64)
+    y0, y1 = min(yillar), max(yillar) + 1
+    m = np.zeros((y1 - y0 + 1, 13), dtype=np.float64)
+    for y in range(y0, y1 + 1):
+        for ay in range(1, 13):
+            m[y - y0, ay] = tufe_efektif_oran(tufe_map, y, ay, y - 1)
+    return y0, m
+
+
+def _matris_oku(y0: int, m: np.ndarray, yillar: np.ndarray, aylar: np.ndarray) -> np.ndarray:
+    idx = yillar - y0
+    gecerli = (idx >= 0) & (idx < m.shape[0])
+    out = np.zeros(yillar.shape, dtype=np.float64)
+    out[gecerli] = m[idx[gecerli], aylar[gecerli]]
+    return out
+
+
+def yillik_kira_matrisi(
+    start_year,
+    yil_sayisi,
+    artis_ay,
+    aylik_net,
+    kdv_mult,
+    mod,
+    nakit_pay,
+    tufe_map: dict | None = None,
+    matris: tuple[int, np.ndarray] | None = None,
+) -> np.ndarray:
+    """N sözleşme × K yıl KDV dahil tutar matrisi (sözleşmenin yıl sayısı dışı NaN).
+
+    Satır i, yıl k: skaler ``_aylik_grid_contract_core`` döngüsünün ``start_year[i] + k``
+    yılı değeri. Yıl başına: tutar = mod'a göre yuvarlanmış KDV dahil; sonraki yıl
+    için ``current = round(current * (1 + oran / 100), 2)`` (oran > 0 ise).
+    """
+    sy = np.asarray(start_year, dtype=np.int64)
+    n_yil = np.asarray(yil_sayisi, dtype=np.int64)
+    ay = np.asarray(artis_ay, dtype=np.int64)
+    cur = np.asarray(aylik_net, dtype=np.float64).copy()
+    kdv = np.asarray(kdv_mult, dtype=np.float64)
+    md = np.asarray(mod, dtype=np.int64)
+    r_n = np.asarray(nakit_pay, dtype=np.float64)
+    n = sy.shape[0]
+    k_max = int(n_yil.max()) if n else 0
+    out = np.full((n, k_max), np.nan, dtype=np.float64)
+    if not n or not k_max:
+        return out
+    y0, m = matris if matris is not None else tufe_oran_matrisi(tufe_map or {})
+    karma = md == MOD_KARMA
+    nakit = md == MOD_NAKIT
+    for k in range(k_max):
+        aktif = k < n_yil
+        deger = round2(cur * kdv)
+        if nakit.any():
+            deger = np.where(nakit, round2(cur * 1.0), deger)
+        if karma.any():
+            nak = round2(cur * r_n)
+            ban = round2(cur - nak)
+            deger = np.where(karma, round2(nak + ban * kdv), deger)
+        out[:, k] = np.where(aktif, deger, np.nan)
+        if k + 1 >= k_max:
+            break
+        oran = _matris_oku(y0, m, sy + k + 1, ay)
+        artir = (k < n_yil - 1) & (oran > 0)
+        if artir.any():
+            cur = np.where(artir, round2(cur * (1 + oran / 100.0)), cur)
+    return out
@@ -0,0 +1,79 @@
+/**
+ * Arka plan işleri (bkz. services/job_queue.py).
+ * Toplu endpoint'ler ?async=1 ile çağrılınca hemen 202 {job_id, durum_url} döner;
+ * boJobSonuc(j) işi /jobs/api/<id> üzerinden yoklar ve işin asıl JSON yanıtıyla çözülür.
+ * Yanıtta job_id yoksa (senkron yanıt) j aynen döner — çağıran kod değişmeden çalışır.
+ */
+(function (w) {
+  'use strict';
+
+  function boJobUrl(url) {
+    return url + (url.indexOf('?') >= 0 ? '&' : '?') + 'async=1';
+  }
+
+  function boJobIlerlemeMetni(job, baslik) {
+    var t = baslik || 'İşlem sürüyor';
+    if (!job) return t + '…';
+    if (job.status === 'queued') return t + ': sırada bekliyor…';
+    if (job.progress_total) {
+      return t + ': ' + (job.progress_done || 0) + ' / ' + job.progress_total +
+        (job.yuzde != null ? ' (%' + job.yuzde + ')' : '') + '…';
+    }
+    return t + '…';
+  }
+
+  function boJobSonuc(j, opts) {
+    opts = opts || {};
+    if (!j || !j.job_id || !j.durum_url) return Promise.resolve(j);
+    var aralik = opts.aralikMs || 1500;
+    var onIlerleme = typeof opts.onIlerleme === 'function' ? opts.onIlerleme : null;
+    var hata = 0;
+    return new Promise(function (resolve, reject) {
+      function yokla() {
+        fetch(j.durum_url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+          .then(function (r) { return r.json(); })
+          .then(function (d) {
+            hata = 0;
+            var job = (d && d.job) || null;
+            if (!job) {
+              resolve(d || { ok: false, mesaj: 'İş bulunamadı.' });
+              return;
+            }
+            if (onIlerleme) {
+              try { onIlerleme(job); } catch (e) { /* yoksay */ }
+            }
+            if (job.status === 'done') {
+              var sonuc = job.result || {};
+              resolve(sonuc.yanit || sonuc);
+            } else if (job.status === 'failed' || job.status === 'cancelled') {
+              resolve({ ok: false, job_id: job.id, mesaj: job.error || job.mesaj || 'İşlem tamamlanamadı.' });
+            } else {
+              setTimeout(yokla, aralik);
+            }
+          })
+          .catch(function (err) {
+            hata += 1;
+            if (hata > 20) {
+              reject(err);
+              return;
+            }
+            setTimeout(yokla, aralik * 2);
+          });
+      }
+      yokla();
+    });
+  }
+
+  function boJobIptal(jobId) {
+    return fetch('/jobs/api/' + encodeURIComponent(jobId) + '/iptal', {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: { 'Accept': 'application/json' }
+    }).then(function (r) { return r.json(); });
+  }
+
+  w.boJobUrl = boJobUrl;
+  w.boJobSonuc = boJobSonuc;
+  w.boJobIptal = boJobIptal;
+  w.boJobIlerlemeMetni = boJobIlerlemeMetni;
+})(window);
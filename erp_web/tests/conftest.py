@@ -0,0 +1,5 @@
+import os
+import sys
+
+# erp_web modülleri (db, config …) düz içe aktarılır.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
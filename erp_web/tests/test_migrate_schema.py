@@ -0,0 +1,92 @@
+"""migrate_schema: birimin yakalayıp yuttuğu DB hataları ve defter (schema_migrations) kaydı.
+
+Veritabanı gerekmez: bağlantı ve execute sahte, defter yazımları listeye düşer.
+"""
+import contextlib
+
+import pytest
+
+import db
+
+
+class _KaliciHata(Exception):
+    pgcode = "23505"  # unique_violation — eski veride aynı makbuz_no
+
+
+class _GeciciHata(Exception):
+    pgcode = "55P03"  # lock_not_available
+
+
+class _SahteBaglanti:
+    def cursor(self):
+        return self
+
+    def execute(self, *args, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def defter(monkeypatch):
+    yazilan = []
+
+    @contextlib.contextmanager
+    def _baglanti():
+        yield _SahteBaglanti()
+
+    def _execute(sql, params=()):
+        if params:
+            yazilan.append(params[0])
+        return 0
+
+    monkeypatch.setattr(db, "_db_baglanti", _baglanti)
+    monkeypatch.setattr(db, "get_conn", _SahteBaglanti)
+    monkeypatch.setattr(db, "_release_conn", lambda conn: None)
+    monkeypatch.setattr(db, "_schema_ledger_version", lambda key: 0)
+    monkeypatch.setattr(db, "_reset_ensure_once_flags", lambda: None)
+    monkeypatch.setattr(db, "_SCHEMA_LEDGER_STATE", {})
+    monkeypatch.setattr(db, "fetch_all", lambda *args, **kwargs: [])
+    monkeypatch.setattr(db, "execute", _execute)
+    return yazilan
+
+
+def _yutan_birim(hata):
+    def _birim():
+        try:
+            with db.db():
+                raise hata
+        except Exception as e:
+            print(f"atlandı: {e}")
+
+    return _birim
+
+
+def _birimler(monkeypatch, *fns):
+    monkeypatch.setattr(
+        db, "SCHEMA_MIGRATIONS", tuple((i, f"birim_{i}", fn, "all") for i, fn in enumerate(fns, 1))
+    )
+
+
+def test_kabul_edilen_hata_birimi_deftere_yazar(defter, monkeypatch):
+    _birimler(monkeypatch, _yutan_birim(_KaliciHata("could not create unique index")), lambda: None)
+    assert db.migrate_schema() == 2
+    assert defter == [1, 2]
+
+
+def test_yutulan_gecici_hata_birimi_durdurur(defter, monkeypatch):
+    _birimler(monkeypatch, lambda: None, _yutan_birim(_GeciciHata("lock timeout")), lambda: None)
+    with pytest.raises(RuntimeError):
+        db.migrate_schema()
+    assert defter == [1]
+
+
+def test_istege_bagli_ddl_gecici_hatayi_da_kabul_eder(defter, monkeypatch):
+    def _birim():
+        with db.istege_bagli_ddl():
+            _yutan_birim(_GeciciHata("permission denied to create extension"))()
+
+    _birimler(monkeypatch, _birim)
+    assert db.migrate_schema() == 1
+    assert defter == [1]
@@ -8,10 +8,17 @@ customers tablosunda ortak metin araması.
 Geniş arama (`customers_arama_sql_giris_genis`): ayrıca vergi dairesi, adresler, telefonlar,
 e-postalar, T.C., KYC alanları (ünvan, ikametgah, yetkili iletişim vb.). Telefonda ayrıca
 sorgudaki rakamlar (en az 3 hane) format fark etmeksizin cep / cep 2 / KYC yetkili hatlar ile eşleşir.
+
+Arama belgesi (db.ensure_musteri_arama_belge): aynı alanlar müşteri başına fold edilmiş tek
+metinde (musteri_arama_belge; trigger'la güncel, pg_trgm GIN indeksli). Kuruluysa tüm
+``customers_arama_*`` koşulları belge üzerinden ``id IN (SELECT …)`` üretir; değilse alan
+alan LIKE (eski yol). MUSTERI_ARAMA_BELGE=0 → her zaman eski yol (karşılaştırma için).
+SQL ve params aynı kipten üretilir — ikisi birlikte çağrılmalı.
 """
 
 from __future__ import annotations
 
+import os
 import re
 import unicodedata
 
@@ -20,6 +27,45 @@ from utils.text_utils import turkish_lower
 # Telefon kısmi arama: sorgudan çıkan rakam sayısı bu eşikten azsa devreye girmez (her şeyi eşleştirmeyi önler)
 _GIRIS_GENIS_TELEFON_RAKAM_MIN = 3
 
+_ARAMA_BELGE_KAPALI = (os.environ.get("MUSTERI_ARAMA_BELGE", "1") or "").strip().lower() in (
+    "0", "false", "no", "off"
+)
+_ARAMA_BELGE_HAZIR: dict = {}
+
+
+def musteri_arama_belge_hazir() -> bool:
+    """musteri_arama_belge trigger'ları bu şemada kurulu mu; şema başına bir kez bakılır."""
+    if _ARAMA_BELGE_KAPALI:
+        return False
+    try:
+        from db import _tenant_schema_for_request, ensure_musteri_arama_belge, fetch_one
+    except Exception:
+        return False
+    sema = _tenant_schema_for_request() or "public"
+    hazir = _ARAMA_BELGE_HAZIR.get(sema)
+    if hazir is None:
+        try:
+            ensure_musteri_arama_belge()
+        except Exception:
+            pass
+        try:
+            row = fetch_one(
+                "SELECT COUNT(*) AS n FROM pg_trigger "
+                "WHERE tgname = 'trg_musteri_arama_belge' "
+                "AND tgrelid IN ('customers'::regclass, 'musteri_kyc'::regclass)"
+            ) or {}
+            hazir = int(row.get("n") or 0) == 2
+        except Exception:
+            hazir = False
+        _ARAMA_BELGE_HAZIR[sema] = hazir
+    return hazir
+
+
+def _belge_kosulu(table_alias: str, kosul: str) -> str:
+    """customers satırı için belge koşulu: ``id IN (SELECT musteri_id FROM musteri_arama_belge b WHERE …)``."""
+    a = f"{table_alias.strip()}." if table_alias and table_alias.strip() else ""
+    return f"{a}id IN (SELECT b.musteri_id FROM musteri_arama_belge b WHERE {kosul})"
+
 
 def normalize_musteri_arama_tr(q: str) -> str:
     """
@@ -115,25 +161,37 @@ def _giris_genis_eposta_sql(table_alias: str) -> str:
     )
 
 
-def customers_arama_sql_3(alias: str = "") -> str:
-    """name, musteri_adi, musteri_kyc.musteri_adi (EXISTS), yetkili_kisi — 4 ILIKE."""
+def _cekirdek_sql(alias: str = "") -> str:
+    """name, musteri_adi, musteri_kyc.musteri_adi, yetkili_kisi — dış parantezsiz OR bloğu."""
+    if musteri_arama_belge_hazir():
+        return _belge_kosulu(alias, "b.ad LIKE %s")
     a = f"{alias.strip()}." if alias and alias.strip() else ""
     name_expr = f"COALESCE({a}name, '')"
     musteri_expr = f"COALESCE({a}musteri_adi, '')"
     yetkili_expr = f"COALESCE({a}yetkili_kisi, '')"
     mk_expr = "COALESCE(mk.musteri_adi, '')"
     return (
-        f"({_fold_sql_text(name_expr)} LIKE %s "
+        f"{_fold_sql_text(name_expr)} LIKE %s "
         f"OR {_fold_sql_text(musteri_expr)} LIKE %s "
         f"OR EXISTS (SELECT 1 FROM musteri_kyc mk WHERE mk.musteri_id = {a}id "
         f"AND {_fold_sql_text(mk_expr)} LIKE %s) "
-        f"OR {_fold_sql_text(yetkili_expr)} LIKE %s)"
+        f"OR {_fold_sql_text(yetkili_expr)} LIKE %s"
     )
 
 
-def customers_arama_params_4(q: str):
+def _cekirdek_params(q: str) -> tuple:
+    """_cekirdek_sql placeholder'ları: belgede 1, alan alan 4."""
     p = _pct(q)
-    return (p, p, p, p)
+    return (p,) if musteri_arama_belge_hazir() else (p, p, p, p)
+
+
+def customers_arama_sql_3(alias: str = "") -> str:
+    """name, musteri_adi, musteri_kyc.musteri_adi (EXISTS), yetkili_kisi — 4 ILIKE (belgede tek LIKE)."""
+    return "(" + _cekirdek_sql(alias) + ")"
+
+
+def customers_arama_params_4(q: str):
+    return _cekirdek_params(q)
 
 
 def customers_arama_sql_3_plus_tax_office() -> str:
@@ -142,16 +200,16 @@ def customers_arama_sql_3_plus_tax_office() -> str:
     office_expr = "COALESCE(office_code::text, '')"
     return (
         "("
-        + customers_arama_sql_3("").strip("()")
+        + _cekirdek_sql("")
         + f" OR {_fold_sql_text(tax_expr)} LIKE %s"
         + f" OR {_fold_sql_text(office_expr)} LIKE %s)"
     )
 
 
 def customers_arama_params_6(q: str):
-    """`customers_arama_sql_3_plus_phone_tax` ile uyumlu 6 placeholder."""
+    """`customers_arama_sql_3_plus_phone_tax` / `_plus_tax_office` ile uyumlu: çekirdek + 2."""
     p = _pct(q)
-    return (p, p, p, p, p, p)
+    return _cekirdek_params(q) + (p, p)
 
 
 # Geniş müşteri araması: formdaki tüm ana iletişim / kimlik alanları + KYC satırları
@@ -250,11 +308,26 @@ def _giris_genis_cust_search_exprs(table_alias: str = "") -> list[tuple[str, str
     ]
 
 
+def _giris_genis_belge_sql(table_alias: str) -> str:
+    """
+    Geniş aramanın belge karşılığı: metin LIKE (alanlar) + rakam LIKE (telefon) + eposta strpos.
+    5× %s — (desen, rakam, rakam, eposta iğnesi, eposta iğnesi).
+    """
+    return _belge_kosulu(
+        table_alias,
+        "b.metin LIKE %s"
+        f" OR (char_length(%s) >= {_GIRIS_GENIS_TELEFON_RAKAM_MIN} AND b.rakam LIKE ('%%' || %s || '%%'))"
+        " OR (%s <> '' AND strpos(b.eposta, %s) > 0)",
+    )
+
+
 def customers_arama_sql_giris_genis(table_alias: str = "") -> str:
     """
     Müşteri kartı + Giriş üst arama + Cari kart listesi için tam metin araması.
     table_alias: örn. \"c\" → kolonlar c.name, EXISTS ... mk.musteri_id = c.id
     """
+    if musteri_arama_belge_hazir():
+        return "(" + _giris_genis_belge_sql(table_alias) + ")"
     a = f"{table_alias.strip()}." if table_alias and table_alias.strip() else ""
     id_ref = f"{a}id"
     mk_parts = [
@@ -271,6 +344,10 @@ def customers_arama_sql_giris_genis(table_alias: str = "") -> str:
 
 
 def customers_arama_params_giris_genis(q: str):
+    if musteri_arama_belge_hazir():
+        digits = _telefon_arama_digits(q)
+        eposta = re.sub(r"\s+", "", normalize_musteri_arama_tr(q or "").lower())
+        return (_pct(q), digits, digits, eposta, eposta)
     _ensure_musteri_kyc_arama_kolonlari_lazy()
     p = _pct(q)
     n = len(_GIRIS_GENIS_MK_ALANLARI) + len(_giris_genis_cust_search_exprs())
@@ -314,20 +391,13 @@ def customers_arama_sql_params_giris_genis_tokens(q: str, table_alias: str = "")
 def customers_arama_sql_3_plus_phone_tax(alias: str = "c") -> str:
     """Dashboard: çekirdek + telefon + vergi no."""
     a = f"{alias.strip()}."
-    name_expr = f"COALESCE({a}name, '')"
-    musteri_adi_expr = f"COALESCE({a}musteri_adi, '')"
-    yetkili_expr = f"COALESCE({a}yetkili_kisi, '')"
     phone_expr = f"COALESCE({a}phone, '')"
     tax_expr = f"COALESCE({a}tax_number::text, '')"
-    mk_expr = "COALESCE(mk.musteri_adi, '')"
     return (
-        f"({_fold_sql_text(name_expr)} LIKE %s "
-        f"OR {_fold_sql_text(musteri_adi_expr)} LIKE %s "
-        f"OR EXISTS (SELECT 1 FROM musteri_kyc mk WHERE mk.musteri_id = {a}id "
-        f"AND {_fold_sql_text(mk_expr)} LIKE %s) "
-        f"OR {_fold_sql_text(yetkili_expr)} LIKE %s "
-        f"OR {_fold_sql_text(phone_expr)} LIKE %s "
-        f"OR {_fold_sql_text(tax_expr)} LIKE %s)"
+        "("
+        + _cekirdek_sql(alias)
+        + f" OR {_fold_sql_text(phone_expr)} LIKE %s"
+        + f" OR {_fold_sql_text(tax_expr)} LIKE %s)"
     )
 
 
@@ -336,14 +406,13 @@ def customers_arama_sql_3_plus_tax() -> str:
     tax_expr = "COALESCE(tax_number::text, '')"
     return (
         "("
-        + customers_arama_sql_3("").strip("()")
+        + _cekirdek_sql("")
         + f" OR {_fold_sql_text(tax_expr)} LIKE %s)"
     )
 
 
 def customers_arama_params_5(q: str):
-    p = _pct(q)
-    return (p, p, p, p, p)
+    return _cekirdek_params(q) + (_pct(q),)
 
 
 def customers_arama_sql_3_plus_phone() -> str:
@@ -351,20 +420,19 @@ def customers_arama_sql_3_plus_phone() -> str:
     phone_expr = "COALESCE(c.phone, '')"
     return (
         "("
-        + customers_arama_sql_3("c").strip("()")
+        + _cekirdek_sql("c")
         + f" OR {_fold_sql_text(phone_expr)} LIKE %s)"
     )
 
 
 def customers_arama_params_5_phone(q: str):
-    p = _pct(q)
-    return (p, p, p, p, p)
+    return _cekirdek_params(q) + (_pct(q),)
 
 
 def customers_arama_sql_randevu() -> str:
     """Randevu combobox: geniş arama + notlar."""
     notes_expr = "COALESCE(notes, '')"
-    return "(" + customers_arama_sql_giris_genis("").strip("()") + f" OR {_fold_sql_text(notes_expr)} LIKE %s)"
+    return "(" + customers_arama_sql_giris_genis("") + f" OR {_fold_sql_text(notes_expr)} LIKE %s)"
 
 
 def customers_arama_params_6_randevu(q: str):
@@ -372,6 +440,30 @@ def customers_arama_params_6_randevu(q: str):
     return customers_arama_params_giris_genis(q) + (p,)
 
 
+def _like_kacis(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def customers_arama_sira_sql_params(q: str, table_alias: str = "") -> tuple[str, tuple]:
+    """ORDER BY için eşleşme kalitesi (küçük önce): 0 ünvan sorguyla başlar, 1 ünvanda kelime başı
+    veya müşteri adı sorguyla başlar, 2 ünvan / müşteri adı / yetkili içinde, 3 diğer alanlar.
+    Çok kelimeli sorguda kelimeler tek boşlukla birleşik ifade aranır.
+    """
+    a = f"{table_alias.strip()}." if table_alias and table_alias.strip() else ""
+    n = _like_kacis(" ".join(customers_arama_tokens_split(normalize_musteri_arama_tr(q or ""))))
+    ad = _fold_sql_text(f"COALESCE({a}name, '')")
+    madi = _fold_sql_text(f"COALESCE({a}musteri_adi, '')")
+    yet = _fold_sql_text(f"COALESCE({a}yetkili_kisi, '')")
+    sql = (
+        f"CASE WHEN {ad} LIKE %s THEN 0 "
+        f"WHEN {ad} LIKE %s OR {madi} LIKE %s THEN 1 "
+        f"WHEN {ad} LIKE %s OR {madi} LIKE %s OR {yet} LIKE %s THEN 2 "
+        "ELSE 3 END"
+    )
+    bas, kelime, ic = f"{n}%", f"% {n}%", f"%{n}%"
+    return sql, (bas, kelime, bas, ic, ic, ic)
+
+
 # Eski yanlış isimlerle import eden kodlar kırılmasın (4 = çekirdek ILIKE sayısı değil; tarihsel isim)
 customers_arama_params_3 = customers_arama_params_4
 customers_arama_params_4_phone = customers_arama_params_5_phone
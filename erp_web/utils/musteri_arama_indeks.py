@@ -0,0 +1,289 @@
+"""
+Müşteri seçicileri için süreç içi arama indeksi (type-ahead).
+
+Kiracı başına bir ``MusteriAramaIndeksi``: musteri_arama_belge (metin / rakam / eposta;
+db.ensure_musteri_arama_belge) + customers görünen alanları + son KYC kimlik numaraları.
+Belge metni üzerinde trigram posting listeleri tutulur; sorgu en seyrek trigramının
+adayları ``in`` ile doğrulanır (1-2 karakterlik parçalar tüm belgeleri tarar, yine bellekte).
+Eşleşme kuralı ``customers_arama_sql_giris_genis`` belge yoluyla aynıdır; sıralama
+``customers_arama_sira_sql_params`` ile aynı dört kademedir.
+
+Tazelik: belge tablosunun sürümü (satır sayısı + updated_at toplamı) en çok
+``MUSTERI_ARAMA_INDEKS_KONTROL_SN`` saniyede bir okunur (0 → her istekte). Sürüm
+değiştiyse veya indeks henüz yoksa ``musteri_arama_indeksi()`` None döner, arka planda
+yeniden kurulur; çağıran o arada eski SQL yoluna düşer. MUSTERI_ARAMA_INDEKS=0 → kapalı.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+
+from utils.musteri_arama import (
+    _GIRIS_GENIS_TELEFON_RAKAM_MIN,
+    _fold_sql_text,
+    _telefon_arama_digits,
+    customers_arama_tokens_split,
+    musteri_arama_belge_hazir,
+    normalize_musteri_arama_tr,
+)
+
+logger = logging.getLogger(__name__)
+
+_INDEKS_KAPALI = (os.environ.get("MUSTERI_ARAMA_INDEKS", "1") or "").strip().lower() in (
+    "0", "false", "no", "off"
+)
+
+
+def _env_float(ad: str, varsayilan: float) -> float:
+    try:
+        return float((os.environ.get(ad) or "").strip() or varsayilan)
+    except ValueError:
+        return varsayilan
+
+
+_KONTROL_SN = max(0.0, _env_float("MUSTERI_ARAMA_INDEKS_KONTROL_SN", 1.0))
+# Bundan büyük müşteri tablosunda indeks kurulmaz (bellek); SQL yolu kullanılır.
+_MAX_MUSTERI = int(_env_float("MUSTERI_ARAMA_INDEKS_MAX", 50000))
+
+_NGRAM = 3
+_AYRAC = "\x1f"
+
+_LOCK = threading.Lock()
+_INDEKSLER: dict = {}
+_INSA_EDILIYOR: set = set()
+
+_SURUM_SQL = (
+    "SELECT COUNT(*) AS n, "
+    "COALESCE(SUM(EXTRACT(EPOCH FROM updated_at)::numeric), 0) AS t "
+    "FROM musteri_arama_belge"
+)
+
+
+def _rakam_sql(expr: str) -> str:
+    return f"regexp_replace(COALESCE({expr}::text, ''), '[^0-9]', '', 'g')"
+
+
+_INSA_SQL = f"""
+    SELECT c.id, c.name, c.musteri_adi, c.phone, c.tax_number,
+           {_fold_sql_text("COALESCE(c.name, '')")} AS ad_k,
+           {_fold_sql_text("COALESCE(c.musteri_adi, '')")} AS madi_k,
+           {_fold_sql_text("COALESCE(c.yetkili_kisi, '')")} AS yet_k,
+           b.metin, b.rakam, b.eposta,
+           {_rakam_sql("c.tax_number")} AS vergi_rakam,
+           {_rakam_sql("kx.vergi_no")} AS kyc_vergi_rakam,
+           {_rakam_sql("kx.yetkili_tcno")} AS kyc_tc_rakam
+    FROM customers c
+    JOIN musteri_arama_belge b ON b.musteri_id = c.id
+    LEFT JOIN LATERAL (
+        SELECT k.vergi_no, k.yetkili_tcno
+        FROM musteri_kyc k
+        WHERE k.musteri_id = c.id
+        ORDER BY k.id DESC
+        LIMIT 1
+    ) kx ON TRUE
+"""
+
+
+def _ngramlar(s: str) -> set:
+    return {s[i:i + _NGRAM] for i in range(len(s) - _NGRAM + 1)}
+
+
+def _kimlik_ekle(d: dict, no: str, mid: int) -> None:
+    if len(no) in (10, 11) and mid > d.get(no, 0):
+        d[no] = mid
+
+
+class MusteriAramaIndeksi:
+    """Tek kiracının değişmez indeks anlık görüntüsü; sürüm değişince yenisi kurulur."""
+
+    def __init__(self, rows, surum):
+        self.surum = surum
+        self.kontrol_zamani = time.monotonic()
+        n = len(rows)
+        self.kayitlar = []
+        self.ad_k = []
+        self.madi_k = []
+        self.yet_k = []
+        self.metin = []
+        self.rakam = []
+        self.eposta = []
+        self.vergi = {}
+        self.kyc_kimlik = {}
+        postings: dict = {}
+        for i, r in enumerate(rows):
+            mid = int(r["id"])
+            self.kayitlar.append(
+                {
+                    "id": mid,
+                    "name": r.get("name"),
+                    "musteri_adi": r.get("musteri_adi"),
+                    "phone": r.get("phone"),
+                    "tax_number": r.get("tax_number"),
+                }
+            )
+            self.ad_k.append(r.get("ad_k") or "")
+            self.madi_k.append(r.get("madi_k") or "")
+            self.yet_k.append(r.get("yet_k") or "")
+            metin, rakam, eposta = r.get("metin") or "", r.get("rakam") or "", r.get("eposta") or ""
+            self.metin.append(metin)
+            self.rakam.append(rakam)
+            self.eposta.append(eposta)
+            for g in _ngramlar(_AYRAC.join((metin, rakam, eposta))):
+                lst = postings.get(g)
+                if lst is None:
+                    postings[g] = [i]
+                else:
+                    lst.append(i)
+            _kimlik_ekle(self.vergi, r.get("vergi_rakam") or "", mid)
+            _kimlik_ekle(self.kyc_kimlik, r.get("kyc_vergi_rakam") or "", mid)
+            _kimlik_ekle(self.kyc_kimlik, r.get("kyc_tc_rakam") or "", mid)
+        # Liste → array('I'): posting başına Python int nesnesi tutulmaz.
+        self.postings = {g: array("I", lst) for g, lst in postings.items()}
+        self.boyut = n
+
+    def _adaylar(self, igne: str, alan: list) -> list:
+        """``igne in alan[i]`` olan indeksler; 3+ karakterde en seyrek trigramdan."""
+        if len(igne) < _NGRAM:
+            return [i for i, s in enumerate(alan) if igne in s]
+        en_kucuk = None
+        for g in _ngramlar(igne):
+            p = self.postings.get(g)
+            if p is None:
+                return []
+            if en_kucuk is None or len(p) < len(en_kucuk):
+                en_kucuk = p
+        return [i for i in en_kucuk if igne in alan[i]]
+
+    def _eslesenler(self, q: str) -> set:
+        """Tek parça: geniş aramanın belge koşulu (metin OR telefon rakamı OR e-posta)."""
+        norm = normalize_musteri_arama_tr(q or "")
+        sonuc = set(self._adaylar(norm, self.metin))
+        rakam = _telefon_arama_digits(q)
+        if len(rakam) >= _GIRIS_GENIS_TELEFON_RAKAM_MIN:
+            sonuc.update(self._adaylar(rakam, self.rakam))
+        eposta = re.sub(r"\s+", "", norm.lower())
+        if eposta:
+            sonuc.update(self._adaylar(eposta, self.eposta))
+        return sonuc
+
+    def _sira(self, i: int, n: str) -> int:
+        ad = self.ad_k[i]
+        if ad.startswith(n):
+            return 0
+        madi = self.madi_k[i]
+        if f" {n}" in ad or madi.startswith(n):
+            return 1
+        if n in ad or n in madi or n in self.yet_k[i]:
+            return 2
+        return 3
+
+    def _sirali(self, q: str, tokenli: bool, sira: bool, limit: int | None) -> list:
+        parcalar = customers_arama_tokens_split(q) if tokenli else [q]
+        if not parcalar:
+            idx = set(range(self.boyut))
+        else:
+            idx = None
+            for p in sorted(parcalar, key=len, reverse=True):
+                e = self._eslesenler(p)
+                idx = e if idx is None else idx & e
+                if not idx:
+                    return []
+        if sira:
+            n = " ".join(customers_arama_tokens_split(normalize_musteri_arama_tr(q or "")))
+
+            def anahtar(i):
+                return (self._sira(i, n), self.ad_k[i], self.kayitlar[i]["id"])
+        else:
+
+            def anahtar(i):
+                return (self.ad_k[i], self.kayitlar[i]["id"])
+
+        if limit is not None and limit < len(idx):
+            return heapq.nsmallest(limit, idx, key=anahtar)
+        return sorted(idx, key=anahtar)
+
+    def ara(self, q: str, limit: int | None = None, sira: bool = True, tokenli: bool = False) -> list[dict]:
+        """Eşleşen müşterilerin görünen alanları (id, name, musteri_adi, phone, tax_number).
+
+        sira=False → yalnız ünvana göre (SQL ``ORDER BY name`` karşılığı).
+        tokenli=True → boşlukla ayrılmış her kelime ayrı eşleşmeli (AND).
+        """
+        return [dict(self.kayitlar[i]) for i in self._sirali(q, tokenli, sira, limit)]
+
+    def idler(self, q: str, limit: int | None = None, sira: bool = True, tokenli: bool = False) -> list[int]:
+        """``ara`` ile aynı sırada yalnız müşteri id'leri (SQL'de ek filtre / alan için)."""
+        return [self.kayitlar[i]["id"] for i in self._sirali(q, tokenli, sira, limit)]
+
+    def kimlik_bul(self, kimlik_no: str) -> int | None:
+        """10/11 haneli VKN/TCKN: önce customers.tax_number, sonra son KYC vergi no / yetkili T.C."""
+        no = re.sub(r"\D", "", str(kimlik_no or ""))
+        return self.vergi.get(no) or self.kyc_kimlik.get(no)
+
+
+def _indeks_surumu() -> tuple:
+    from db import fetch_one
+
+    row = fetch_one(_SURUM_SQL) or {}
+    return int(row.get("n") or 0), str(row.get("t") or 0)
+
+
+def _insa(sema: str) -> None:
+    from db import fetch_all, tenant_schema_scope
+
+    t0 = time.monotonic()
+    try:
+        with tenant_schema_scope(None if sema == "public" else sema):
+            surum = _indeks_surumu()
+            if surum[0] > _MAX_MUSTERI:
+                logger.info("musteri arama indeksi atlandı (%s): %s müşteri", sema, surum[0])
+                return
+            ix = MusteriAramaIndeksi(fetch_all(_INSA_SQL) or [], surum)
+        with _LOCK:
+            _INDEKSLER[sema] = ix
+        logger.info(
+            "musteri arama indeksi kuruldu (%s): %s müşteri, %.2f sn",
+            sema, ix.boyut, time.monotonic() - t0,
+        )
+    except Exception as e:
+        logger.warning("musteri arama indeksi kurulamadı (%s): %s", sema, e)
+    finally:
+        with _LOCK:
+            _INSA_EDILIYOR.discard(sema)
+
+
+def _insa_baslat(sema: str) -> None:
+    with _LOCK:
+        if sema in _INSA_EDILIYOR:
+            return
+        _INSA_EDILIYOR.add(sema)
+    threading.Thread(target=_insa, args=(sema,), name=f"musteri-arama-indeks-{sema}", daemon=True).start()
+
+
+def musteri_arama_indeksi() -> MusteriAramaIndeksi | None:
+    """Aktif kiracının güncel indeksi; soğuk / bayat / kapalıysa None (çağıran SQL yoluna düşer)."""
+    if _INDEKS_KAPALI or not musteri_arama_belge_hazir():
+        return None
+    from db import _tenant_schema_for_request
+
+    sema = _tenant_schema_for_request() or "public"
+    ix = _INDEKSLER.get(sema)
+    now = time.monotonic()
+    if ix is not None and now - ix.kontrol_zamani < _KONTROL_SN:
+        return ix
+    try:
+        surum = _indeks_surumu()
+    except Exception:
+        return None
+    if ix is not None and ix.surum == surum:
+        ix.kontrol_zamani = now
+        return ix
+    if surum[0] <= _MAX_MUSTERI:
+        _insa_baslat(sema)
+    return None
+
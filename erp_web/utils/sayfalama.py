@@ -0,0 +1,155 @@
+"""
+Anahtar kümesi (keyset) sayfalama — fatura / tahsilat / banka listeleri için ortak.
+
+Sıra ``(tarih, id)``; sonraki sayfa ``(tarih, id) < (son_tarih, son_id)`` koşuluyla başlar,
+OFFSET yok: derin sayfa ve çok yıllık aralık ilk sayfa ile aynı maliyette. İmleç istemciye
+opak verilir (urlsafe base64 JSON) ve filtre imzasını taşır; başka filtreyle gelen imleç
+yok sayılır (ilk sayfa döner).
+
+Tarih sütunu NULL olabilen listelerde sıralama ifadesi COALESCE ile uç tarihe çekilir
+(``TARIH_EN_ESKI`` / ``TARIH_EN_YENI``): ``DESC NULLS LAST`` / ``ASC NULLS LAST`` karşılığı,
+satır karşılaştırması NULL'a düşmez.
+
+Toplamlar (adet / tutar) filtre kümesi başına bir kez hesaplanıp ``liste_toplamlari``
+bölgesinde tutulur; anahtar ilgili tabloların yazma sayaçlarını (``bo_yazma_<tablo>_seq``,
+commit anında trigger ile artar; db.ensure_tablo_yazma_sayaci) içerir, commit edilen her
+yazımdan sonra yeni anahtar → yeniden hesap. Sayacı olmayan tablo → önbellek yok. Filtresiz
+görünümler ``tahmini_satir_sayisi`` (pg_class.reltuples) ile sayılabilir.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+from datetime import date
+
+from cache_utils import cache_region
+
+TARIH_EN_ESKI = "DATE '0001-01-01'"
+TARIH_EN_YENI = "DATE '9999-12-31'"
+
+SAYFA_VARSAYILAN = 100
+SAYFA_UST = 1000
+
+
+def _env_float(ad: str, varsayilan: float) -> float:
+    try:
+        return float((os.environ.get(ad) or "").strip() or varsayilan)
+    except ValueError:
+        return varsayilan
+
+
+# Üst sınır: sayaç değişmese de bu sürede tazelenir.
+_TOPLAM_TTL_SN = max(1.0, _env_float("LISTE_TOPLAM_CACHE_SN", 300.0))
+_TOPLAMLAR = cache_region("liste_toplamlari", max_entries=512, max_bytes=2 * 1024 * 1024, ttl_sec=_TOPLAM_TTL_SN)
+
+
+def sayfa_boyutu(raw) -> int | None:
+    """``limit`` sorgu parametresi; yoksa None (çağıran eski tam liste yoluna düşer)."""
+    s = str(raw or "").strip()
+    if not s:
+        return None
+    try:
+        n = int(s)
+    except ValueError:
+        return SAYFA_VARSAYILAN
+    return max(1, min(n, SAYFA_UST))
+
+
+def filtre_imzasi(*parcalar) -> str:
+    """Liste adı + filtre değerlerinden kısa sabit özet (imleç ve toplam önbelleği anahtarı)."""
+    ham = json.dumps(parcalar, default=str, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(ham.encode("utf-8")).hexdigest()[:16]
+
+
+def imlec_kodla(tarih, kayit_id, imza: str) -> str:
+    """Sayfanın son satırından opak imleç."""
+    if isinstance(tarih, date):
+        tarih = tarih.isoformat()
+    ham = json.dumps([str(tarih)[:10], int(kayit_id), imza], separators=(",", ":"))
+    return base64.urlsafe_b64encode(ham.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def imlec_coz(imlec, imza: str) -> tuple[str, int] | None:
+    """Geçerli ve aynı filtreye ait imleçten (tarih_iso, id); değilse None."""
+    s = str(imlec or "").strip()
+    if not s:
+        return None
+    try:
+        ham = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+        tarih, kayit_id, im = json.loads(ham.decode("utf-8"))
+        date.fromisoformat(tarih)
+        kayit_id = int(kayit_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if im != imza:
+        return None
+    return tarih, kayit_id
+
+
+def keyset_kosulu(tarih_sql: str, id_sql: str, imlec: tuple | None, azalan: bool = True) -> tuple[str, tuple]:
+    """İmleçten sonraki satırlar için ``AND (tarih, id) < / > (...)`` parçası ve parametreleri."""
+    if not imlec:
+        return "", ()
+    op = "<" if azalan else ">"
+    return f" AND ({tarih_sql}, {id_sql}) {op} (%s::date, %s)", (imlec[0], int(imlec[1]))
+
+
+def sayfa_kes(rows: list, limit: int, tarih_anahtari: str, id_anahtari: str, imza: str) -> tuple[list, str | None]:
+    """``limit + 1`` satırdan sayfa + sonraki imleç (fazla satır yoksa None)."""
+    if len(rows) <= limit:
+        return rows, None
+    sayfa = rows[:limit]
+    son = sayfa[-1]
+    return sayfa, imlec_kodla(son[tarih_anahtari], son[id_anahtari], imza)
+
+
+def tablo_yazma_surumu(*tablolar: str):
+    """Tabloların commit edilmiş yazma sayaçları (``bo_yazma_<tablo>_seq``); biri yoksa / okunamazsa None.
+
+    pg_stat_user_tables kullanılmaz: sayaçları backend'ler gecikmeli (≥1 sn, boşta daha geç)
+    aktarır, yazımdan hemen sonra anahtar değişmez.
+    """
+    from db import fetch_all
+
+    try:
+        rows = fetch_all(
+            "SELECT t AS ad, to_regclass('bo_yazma_' || t || '_seq') IS NOT NULL AS var, "
+            "pg_sequence_last_value(to_regclass('bo_yazma_' || t || '_seq')) AS n "
+            "FROM unnest(%s::text[]) AS t ORDER BY 1",
+            (list(tablolar),),
+        ) or []
+    except Exception:
+        return None
+    if len(rows) != len(tablolar) or not all(r.get("var") for r in rows):
+        return None
+    return tuple((r.get("ad"), int(r.get("n") or 0)) for r in rows)
+
+
+def liste_toplamlari(ad: str, imza: str, tablolar: tuple, hesapla):
+    """Filtre kümesinin toplamları; önbellekte yoksa ``hesapla()`` bir kez çalışır."""
+    surum = tablo_yazma_surumu(*tablolar)
+    if surum is None:
+        return hesapla()
+    anahtar = (ad, imza, surum)
+    deger = _TOPLAMLAR.get(anahtar)
+    if deger is None:
+        deger = hesapla()
+        _TOPLAMLAR.set(anahtar, deger)
+    return deger
+
+
+def tahmini_satir_sayisi(tablo: str) -> int | None:
+    """pg_class.reltuples (son ANALYZE / autovacuum tahmini); hiç analiz edilmemişse None."""
+    from db import fetch_one
+
+    try:
+        row = fetch_one("SELECT reltuples::bigint AS n FROM pg_class WHERE oid = %s::regclass", (tablo,)) or {}
+    except Exception:
+        return None
+    n = row.get("n")
+    if n is None or int(n) < 0:
+        return None
+    return int(n)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Akış (write-only) XLSX yazıcı — ekstre / rapor export'ları için ortak.
+
+openpyxl ``write_only`` kipinde satırlar eklendikçe sayfa XML'i geçici dosyaya
+yazılır; tablo belleğe alınmaz. Çıktı ``SpooledTemporaryFile`` (küçükse bellekte,
+büyürse diskte) — ``send_file`` ile parça parça gönderilir.
+
+Kullanım::
+
+    x = XlsxAkis("Cari Ekstre", font_adi="Arial", genislikler={"A": 12, "B": 45})
+    x.birlestir("A1:E1")
+    x.satir(["CARİ EKSTRE"], "baslik")
+    x.satirlar(([h["tarih"], h["borc"]] for h in hareketler), stiller=(None, "para"))
+    return x.yanit("ekstre.xlsx")
+
+Sütun genişlikleri ve birleştirmeler ilk satırdan önce verilmelidir (write-only kısıtı).
+"""
+from __future__ import annotations
+
+import tempfile
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Stil önayarları: font (ek alanlar), fill rengi, hizalama, sayı biçimi.
+STIL_ONAYARLARI = {
+    "metin": {},
+    "kalin": {"font": {"bold": True}},
+    "baslik": {"font": {"bold": True, "size": 14}, "hizala": "center"},
+    "tablo_baslik": {"font": {"bold": True, "color": "FFFFFF"}, "dolgu": "0097A7", "hizala": "center"},
+    "tablo_baslik_koyu": {"font": {"bold": True}, "dolgu": "0097A7", "hizala": "center"},
+    "para": {"bicim": "#,##0.00"},
+    "para_kalin": {"font": {"bold": True}, "bicim": "#,##0.00"},
+    "para_toplam": {"font": {"bold": True}, "dolgu": "4CAF50", "bicim": "#,##0.00"},
+    "yuzde": {"bicim": "0.00%"},
+}
+
+
+class XlsxAkis:
+    """Tek sayfalık write-only çalışma kitabı; satırlar sırayla eklenir."""
+
+    def __init__(self, sayfa_adi="Sheet1", font_adi=None, font_boyut=None, genislikler=None):
+        from openpyxl import Workbook
+
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(sayfa_adi)
+        self._font = {k: v for k, v in (("name", font_adi), ("size", font_boyut)) if v}
+        self._stil_cache: dict = {}
+        self.satir_no = 0
+        for harf, gen in (genislikler or {}).items():
+            self._ws.column_dimensions[harf].width = gen
+
+    def birlestir(self, aralik: str) -> None:
+        from openpyxl.worksheet.cell_range import CellRange
+
+        self._ws.merged_cells.add(CellRange(aralik))
+
+    def _stil(self, ad):
+        st = self._stil_cache.get(ad)
+        if st is not None:
+            return st
+        from openpyxl.styles import Alignment, Font, PatternFill
+
+        tanim = STIL_ONAYARLARI[ad]
+        font_alan = {**self._font, **(tanim.get("font") or {})}
+        st = (
+            Font(**font_alan) if font_alan else None,
+            PatternFill(start_color=tanim["dolgu"], end_color=tanim["dolgu"], fill_type="solid")
+            if tanim.get("dolgu") else None,
+            Alignment(horizontal=tanim["hizala"]) if tanim.get("hizala") else None,
+            tanim.get("bicim"),
+        )
+        self._stil_cache[ad] = st
+        return st
+
+    def _hucre(self, deger, ad):
+        from openpyxl.cell import WriteOnlyCell
+
+        if ad is None:
+            if not self._font:
+                return deger
+            ad = "metin"
+        font, dolgu, hiza, bicim = self._stil(ad)
+        c = WriteOnlyCell(self._ws, value=deger)
+        if font is not None:
+            c.font = font
+        if dolgu is not None:
+            c.fill = dolgu
+        if hiza is not None:
+            c.alignment = hiza
+        if bicim:
+            c.number_format = bicim
+        return c
+
+    def satir(self, degerler, stiller=None) -> int:
+        """Bir satır ekler; stiller tek ad (tüm hücreler) veya hücre başına ad dizisi. Satır no döner."""
+        if isinstance(stiller, str) or stiller is None:
+            hucreler = [self._hucre(v, stiller) for v in degerler]
+        else:
+            hucreler = [
+                self._hucre(v, stiller[i] if i < len(stiller) else None) for i, v in enumerate(degerler)
+            ]
+        self._ws.append(hucreler)
+        self.satir_no += 1
+        return self.satir_no
+
+    def satirlar(self, iterable, stiller=None) -> int:
+        """Satır iteratörünü akıtır; eklenen satır sayısı."""
+        n = 0
+        for degerler in iterable:
+            self.satir(degerler, stiller)
+            n += 1
+        return n
+
+    def bos(self, n: int = 1) -> None:
+        for _ in range(n):
+            self._ws.append([])
+            self.satir_no += 1
+
+    def dosya(self, bellek_siniri: int = 4 * 1024 * 1024):
+        """Kitabı kaydeder; başa sarılmış SpooledTemporaryFile döner (çağıran kapatır)."""
+        buf = tempfile.SpooledTemporaryFile(max_size=bellek_siniri)
+        self._wb.save(buf)
+        buf.seek(0)
+        return buf
+
+    def yanit(self, download_name: str):
+        """Flask ek yanıtı (dosya parça parça akıtılır)."""
+        from flask import send_file
+
+        return send_file(
+            self.dosya(),
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=download_name,
+        )
@@ -2,6 +2,7 @@
 E-Arsiv Fatura PDF Uretici - GIB Resmi Standart Format
 Ornek faturaya gore birebir ayarlanmis.
 """
+import functools
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -25,16 +26,21 @@ MAVI     = colors.HexColor("#003399")
 BEYAZ    = colors.white
 
 
-def p(text, size=8, bold=False, align=TA_LEFT, color=SIYAH, leading=None):
+@functools.lru_cache(maxsize=None)
+def _stil(size, bold, align, color, leading):
+    """Aynı parametreli stil bir kez kurulur (fatura başına yüzlerce Paragraph)."""
     font = "Helvetica-Bold" if bold else "Helvetica"
-    style = ParagraphStyle(
+    return ParagraphStyle(
         name=f"_{size}_{bold}_{align}",
         fontName=font, fontSize=size,
         leading=leading or (size * 1.35),
         textColor=color, alignment=align,
         wordWrap='CJK',
     )
-    return Paragraph(str(text or ""), style)
+
+
+def p(text, size=8, bold=False, align=TA_LEFT, color=SIYAH, leading=None):
+    return Paragraph(str(text or ""), _stil(size, bold, align, color, leading))
 
 
 def tl(val):
@@ -13,6 +13,7 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from pathlib import Path
+import functools
 import os
 
 # Windows Arial font yolları
@@ -52,27 +53,9 @@ def _resolve_izin_logo():
     return None
 
 
-def izin_formu_olustur(data: dict, cikti_yolu: str = None) -> str:
-    """
-    İzin formu PDF oluşturur.
-    data: {
-        personel_ad, tc_no, unvan, departman,
-        izin_turu, baslangic, bitis, gun_sayisi, yari_gun,
-        ise_baslama, aciklama, firma_adi
-    }
-    """
-    _register_fonts()
-    if not cikti_yolu:
-        ad = data.get("personel_ad", "izin").replace(" ", "_")
-        cikti_yolu = str(Path(__file__).parent / f"izin_formu_{ad}.pdf")
-
-    doc = SimpleDocTemplate(
-        cikti_yolu,
-        pagesize=A4,
-        leftMargin=1.5*cm, rightMargin=1.5*cm,
-        topMargin=0.5*cm, bottomMargin=1.5*cm
-    )
-
+@functools.lru_cache(maxsize=1)
+def _stiller():
+    """Paragraf stilleri (süreç başına bir kez; her formda yeniden kurulmaz)."""
     styles = getSampleStyleSheet()
 
     # Özel stiller
@@ -104,6 +87,49 @@ def izin_formu_olustur(data: dict, cikti_yolu: str = None) -> str:
                                  fontName="Arial",
                                  fontSize=8, alignment=TA_CENTER)
 
+    return {
+        "ornek": styles,
+        "baslik": baslik_style,
+        "alt_baslik": alt_baslik_style,
+        "bolum": bolum_style,
+        "alan": alan_style,
+        "kucuk": kucuk_style,
+        "header_sag": header_sag_style,
+        "imza": imza_style,
+    }
+
+
+def izin_formu_olustur(data: dict, cikti_yolu: str = None) -> str:
+    """
+    İzin formu PDF oluşturur.
+    data: {
+        personel_ad, tc_no, unvan, departman,
+        izin_turu, baslangic, bitis, gun_sayisi, yari_gun,
+        ise_baslama, aciklama, firma_adi
+    }
+    """
+    _register_fonts()
+    if not cikti_yolu:
+        ad = data.get("personel_ad", "izin").replace(" ", "_")
+        cikti_yolu = str(Path(__file__).parent / f"izin_formu_{ad}.pdf")
+
+    doc = SimpleDocTemplate(
+        cikti_yolu,
+        pagesize=A4,
+        leftMargin=1.5*cm, rightMargin=1.5*cm,
+        topMargin=0.5*cm, bottomMargin=1.5*cm
+    )
+
+    st = _stiller()
+    styles = st["ornek"]
+    baslik_style = st["baslik"]
+    alt_baslik_style = st["alt_baslik"]
+    bolum_style = st["bolum"]
+    alan_style = st["alan"]
+    kucuk_style = st["kucuk"]
+    header_sag_style = st["header_sag"]
+    imza_style = st["imza"]
+
     story = []
 
     # ── Üst logo / firma alanı ──
@@ -12,8 +12,9 @@ if os.path.isdir(_erp_web) and _erp_web not in sys.path:
     sys.path.insert(0, _erp_web)
 
 # Uygulama erp_web/app.py içinde
-from app import app
+from app import _start_job_workers, app
 
 if __name__ == "__main__":
+    _start_job_workers()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)